@@ -0,0 +1,387 @@
+"""
+Hardware backends for the sensors, the camera and the status LEDs.
+
+main.py talks to hardware only through these classes, so the service can run
+off a Pi. The real drivers import their libraries lazily when constructed;
+the simulated ones need nothing but the standard library (plus Pillow, if
+installed, for nicer camera frames). Backends are chosen by environment
+variable:
+
+    AGROX_BACKEND         default for all three: "hardware" or "sim"
+    AGROX_SENSOR_BACKEND  "dht22" or "sim"; "sim" also simulates every
+                          sensor listed in sensors.json
+    AGROX_CAMERA_BACKEND  "picamera2", "sim" or "none"
+    AGROX_GPIO_BACKEND    "rpi" or "sim"
+    AGROX_SIM_ERROR_RATE  fraction of simulated reads that raise RuntimeError
+    AGROX_SIM_READ_DELAY  seconds a simulated sensor read takes
+    AGROX_SIM_CAPTURE_DELAY  seconds a simulated capture takes
+    AGROX_SIM_INIT_DELAY  seconds a simulated sensor or camera takes to
+                          initialize, like importing and starting the
+                          real drivers does
+"""
+
+import base64
+import io
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+
+class SensorBackend:
+    """
+    A sensor that reports a temperature and one other value.
+
+    ``FIELDS`` names the two values ``read()`` returns. The second one is
+    relative humidity for air sensors and volumetric moisture for soil
+    probes.
+    """
+
+    FIELDS = ("temperature_c", "humidity")
+
+    def read(self):
+        """
+        Take one reading.
+
+        Returns:
+            tuple: (temperature_c, <FIELDS[1]>)
+
+        Raises:
+            RuntimeError: On a transient read failure; the caller should retry
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CameraBackend:
+    """
+    A still camera that writes JPEG files, and optionally grabs raw frames
+    for capture.py to encode off the camera thread.
+    """
+
+    # (width, height) of the frames capture_array() fills; None if the
+    # backend can only capture_file()
+    frame_size = None
+
+    def capture_file(self, path):
+        raise NotImplementedError
+
+    def capture_array(self, out):
+        """Grab one frame into ``out``, a (height, width, 3) uint8 RGB array."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LedBackend:
+    """Digital output pins driving the status and camera LEDs."""
+
+    def setup(self, pins):
+        raise NotImplementedError
+
+    def output(self, pin, high):
+        raise NotImplementedError
+
+    def cleanup(self):
+        pass
+
+
+# ----------------------------------------------------------------------
+# Real hardware
+# ----------------------------------------------------------------------
+class DHT22Sensor(SensorBackend):
+    def __init__(self, pin="D4"):
+        import board
+        import adafruit_dht
+        self._sensor = adafruit_dht.DHT22(getattr(board, pin))
+
+    def read(self):
+        temperature_c = self._sensor.temperature
+        humidity = self._sensor.humidity
+        if temperature_c is None or humidity is None:
+            raise RuntimeError("DHT sensor returned no data")
+        return temperature_c, humidity
+
+    def close(self):
+        self._sensor.exit()
+
+
+class SoilMoistureSensor(SensorBackend):
+    """Adafruit STEMMA capacitive soil probe (seesaw over I2C)."""
+
+    FIELDS = ("temperature_c", "moisture")
+
+    # Raw capacitance readings for dry air and a probe in water
+    DRY, WET = 200, 2000
+
+    def __init__(self, address=0x36):
+        import board
+        from adafruit_seesaw.seesaw import Seesaw
+        self._probe = Seesaw(board.I2C(), addr=address)
+
+    def read(self):
+        try:
+            raw = self._probe.moisture_read()
+            temperature_c = self._probe.get_temp()
+        except OSError as e:
+            # I2C hiccups are as transient as DHT checksum errors
+            raise RuntimeError(f"Soil probe read failed: {e}") from e
+        moisture = (raw - self.DRY) / (self.WET - self.DRY) * 100
+        return round(temperature_c, 1), round(min(100.0, max(0.0, moisture)), 1)
+
+
+class PiCamera(CameraBackend):
+    def __init__(self):
+        from picamera2 import Picamera2
+        self._camera = Picamera2()
+        # libcamera's "BGR888" is the layout NumPy (and Pillow) see as RGB
+        config = self._camera.create_still_configuration(main={"format": "BGR888"})
+        self._camera.configure(config)
+        self._camera.start()
+        self.frame_size = tuple(config["main"]["size"])
+
+    def capture_file(self, path):
+        self._camera.capture_file(path)
+
+    def capture_array(self, out):
+        frame = self._camera.capture_array("main")
+        out[...] = frame[:out.shape[0], :out.shape[1], :3]
+
+    def close(self):
+        self._camera.close()
+
+
+class RPiGpioLeds(LedBackend):
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        self._gpio = GPIO
+
+    def setup(self, pins):
+        self._gpio.setmode(self._gpio.BCM)
+        for pin in pins:
+            self._gpio.setup(pin, self._gpio.OUT)
+
+    def output(self, pin, high):
+        self._gpio.output(pin, self._gpio.HIGH if high else self._gpio.LOW)
+
+    def cleanup(self):
+        self._gpio.cleanup()
+
+
+# ----------------------------------------------------------------------
+# Simulated hardware
+# ----------------------------------------------------------------------
+class SimulatedSensor(SensorBackend):
+    """
+    Synthetic DHT22: a daily temperature/humidity cycle plus noise, quantized
+    to the DHT22's 0.1 resolution. A configurable fraction of reads raise
+    RuntimeError with the same messages adafruit_dht produces.
+    """
+
+    ERRORS = (
+        "Checksum did not validate. Try again.",
+        "A full buffer was not returned. Try again.",
+        "DHT sensor not found, check wiring",
+    )
+
+    def __init__(self, error_rate=0.1, read_delay=0.0, seed=None, init_delay=0.0):
+        if init_delay:
+            time.sleep(init_delay)
+        self.error_rate = error_rate
+        self.read_delay = read_delay
+        self._random = random.Random(seed)
+
+    def read(self):
+        if self.read_delay:
+            time.sleep(self.read_delay)
+        if self._random.random() < self.error_rate:
+            raise RuntimeError(self._random.choice(self.ERRORS))
+        phase = (time.time() % 86400) / 86400 * 2 * math.pi
+        temperature_c = 28 + 5 * math.sin(phase) + self._random.gauss(0, 0.2)
+        humidity = 70 - 10 * math.sin(phase) + self._random.gauss(0, 0.5)
+        return round(temperature_c, 1), round(min(100.0, max(0.0, humidity)), 1)
+
+
+# 64x48 solid green JPEG, used when Pillow is not installed
+_FALLBACK_JPEG = base64.b64decode(
+    "/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDABALDA4MChAODQ4SERATGCgaGBYWGDEjJR0oOjM9PDkzODdASFxOQERXRTc4UG1RV19iZ2hnPk1xeXBkeFxlZ2P/2wBDARESEhgVGC8aGi9jQjhCY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2P/wAARCAAwAEADASIAAhEBAxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEGE1FhByJxFDKBkaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWGh4iJipKTlJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEBAQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREAAgECBAQDBAcFBAQAAQJ3AAECAxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRomJygpKjU2Nzg5OkNERUZHSElKU1RVVldYWVpjZGVmZ2hpanN0dXZ3eHl6goOEhYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0tba3uLm6wsPExcbHyMnK0tPU1dbX2Nna4uPk5ebn6Onq8vP09fb3+Pn6/9oADAMBAAIRAxEAPwDPooorzzygooooAKKKKACiiigAooooAKKKKACiiigAooooAKKKKACiiigAooooAKKKKAP/2Q=="
+)
+
+
+class SimulatedSoilSensor(SimulatedSensor):
+    """
+    Synthetic soil probe: moisture that dries out over a day and jumps back
+    up when "watered", and a soil temperature that lags the air.
+    """
+
+    FIELDS = ("temperature_c", "moisture")
+
+    def read(self):
+        if self.read_delay:
+            time.sleep(self.read_delay)
+        if self._random.random() < self.error_rate:
+            raise RuntimeError("Soil probe read failed: [Errno 121] Remote I/O error")
+        now = time.time()
+        phase = ((now - 3 * 3600) % 86400) / 86400 * 2 * math.pi
+        temperature_c = 24 + 2 * math.sin(phase) + self._random.gauss(0, 0.1)
+        moisture = 60 - 25 * ((now % 86400) / 86400) + self._random.gauss(0, 0.3)
+        return round(temperature_c, 1), round(min(100.0, max(0.0, moisture)), 1)
+
+
+class SimulatedCamera(CameraBackend):
+    """Writes generated JPEG frames: a moving gradient with a timestamp if
+    Pillow is available, otherwise a fixed tiny frame."""
+
+    def __init__(self, width=1280, height=960, capture_delay=0.0, init_delay=0.0):
+        if init_delay:
+            time.sleep(init_delay)
+        self.width = width
+        self.height = height
+        self.frame_size = (width, height)
+        self.capture_delay = capture_delay
+        self._frame = 0
+        self._background = None
+        try:
+            from PIL import Image, ImageDraw
+            self._image, self._draw = Image, ImageDraw
+        except ImportError:
+            self._image = self._draw = None
+
+    def frame_bytes(self):
+        """Return the next generated frame as JPEG bytes."""
+        self._frame += 1
+        if self._image is None:
+            return _FALLBACK_JPEG
+        shade = (self._frame * 7) % 256
+        img = self._image.new("RGB", (self.width, self.height), (34, 100 + shade // 4, 34))
+        draw = self._draw.Draw(img)
+        draw.rectangle([0, 0, self.width * shade // 255, self.height // 8], fill=(shade, 80, 20))
+        draw.text((10, self.height - 20), datetime.now().strftime("%Y-%m-%d %H:%M:%S"), fill=(255, 255, 255))
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=85)
+        return buf.getvalue()
+
+    def capture_file(self, path):
+        if self.capture_delay:
+            time.sleep(self.capture_delay)
+        data = self.frame_bytes()
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def capture_array(self, out):
+        """The same moving bar as frame_bytes, drawn straight into ``out``."""
+        if self.capture_delay:
+            time.sleep(self.capture_delay)
+        self._frame += 1
+        if self._background is None:
+            import numpy as np
+            # A vertical green gradient, built once
+            rows = np.linspace(60, 160, self.height, dtype=np.uint8)
+            self._background = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+            self._background[:, :, 0] = 34
+            self._background[:, :, 1] = rows[:, None]
+            self._background[:, :, 2] = 34
+        shade = (self._frame * 7) % 256
+        out[...] = self._background
+        out[:self.height // 8, :self.width * shade // 255] = (shade, 80, 20)
+
+
+class SimulatedLeds(LedBackend):
+    """Keeps pin states in memory so they can be inspected."""
+
+    def __init__(self):
+        self.states = {}
+        self._lock = threading.Lock()
+
+    def setup(self, pins):
+        with self._lock:
+            for pin in pins:
+                self.states.setdefault(pin, False)
+
+    def output(self, pin, high):
+        with self._lock:
+            self.states[pin] = bool(high)
+
+    def cleanup(self):
+        with self._lock:
+            self.states.clear()
+
+
+# ----------------------------------------------------------------------
+# Selection
+# ----------------------------------------------------------------------
+def _choice(kind, hardware_default):
+    default = "sim" if os.environ.get("AGROX_BACKEND", "hardware") == "sim" else hardware_default
+    return os.environ.get(f"AGROX_{kind}_BACKEND", default)
+
+
+# Simulated stand-in for each hardware sensor type
+SIMULATED_TYPES = {"dht22": "sim", "soil": "sim_soil"}
+SENSOR_TYPES = ("dht22", "soil", "sim", "sim_soil")
+
+
+def create_sensor(config):
+    """
+    Build a sensor from one sensors.json entry, e.g.
+    ``{"type": "dht22", "pin": "D17"}`` or ``{"type": "soil", "address": "0x37"}``.
+
+    When sensors are simulated (AGROX_SENSOR_BACKEND=sim or AGROX_BACKEND=sim)
+    hardware types are replaced by their simulated counterparts, so a rig's
+    config file can be run off the Pi unchanged.
+    """
+    kind = config.get("type", "dht22")
+    if _choice("SENSOR", "dht22") == "sim":
+        kind = SIMULATED_TYPES.get(kind, kind)
+    if kind in ("sim", "sim_soil"):
+        cls = SimulatedSensor if kind == "sim" else SimulatedSoilSensor
+        return cls(
+            error_rate=float(config.get("error_rate", os.environ.get("AGROX_SIM_ERROR_RATE", 0.1))),
+            read_delay=float(config.get("read_delay", os.environ.get("AGROX_SIM_READ_DELAY", 0.0))),
+            seed=config.get("seed"),
+            init_delay=float(config.get("init_delay", os.environ.get("AGROX_SIM_INIT_DELAY", 0.0))),
+        )
+    if kind == "dht22":
+        return DHT22Sensor(config.get("pin", "D4"))
+    if kind == "soil":
+        return SoilMoistureSensor(int(str(config.get("address", "0x36")), 0))
+    raise ValueError(f"Unknown sensor type: {kind}")
+
+
+def sensor_fields(kind):
+    """The ``FIELDS`` of a sensor type, without constructing (or importing) its driver."""
+    return SoilMoistureSensor.FIELDS if kind in ("soil", "sim_soil") else SensorBackend.FIELDS
+
+
+def create_sensor_backend():
+    """The single sensor used when there is no sensors.json."""
+    name = _choice("SENSOR", "dht22")
+    if name not in ("dht22", "sim"):
+        raise ValueError(f"Unknown sensor backend: {name}")
+    return create_sensor({"type": name, "pin": os.environ.get("AGROX_DHT_PIN", "D4")})
+
+
+def create_camera_backend():
+    """Return a camera backend, or None if AGROX_CAMERA_BACKEND=none."""
+    name = _choice("CAMERA", "picamera2")
+    if name == "sim":
+        return SimulatedCamera(capture_delay=float(os.environ.get("AGROX_SIM_CAPTURE_DELAY", 0.0)),
+                               init_delay=float(os.environ.get("AGROX_SIM_INIT_DELAY", 0.0)))
+    if name == "picamera2":
+        return PiCamera()
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown camera backend: {name}")
+
+
+def create_led_backend():
+    name = _choice("GPIO", "rpi")
+    if name == "sim":
+        return SimulatedLeds()
+    if name == "rpi":
+        return RPiGpioLeds()
+    raise ValueError(f"Unknown GPIO backend: {name}")
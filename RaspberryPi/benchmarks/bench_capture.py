@@ -0,0 +1,103 @@
+"""
+Benchmark the capture pipeline against encoding on the camera thread.
+
+Grabs a burst of frames from the simulated camera at a target frame rate.
+In the "inline" configuration each frame is encoded to JPEG and written on
+the capturing thread, which is what capture_file() does. The other
+configurations hand frames to CapturePipeline with a growing number of
+encoder workers. For each one the benchmark reports how long the camera
+thread is blocked per frame, the latency until a frame is on disk, frames
+dropped for lack of a free buffer, and the end-to-end throughput.
+
+Usage:
+    python3 benchmarks/bench_capture.py [--frames 40] [--fps 10] [--width 2028] [--height 1520]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import SimulatedCamera
+from capture import CapturePipeline, Image
+
+
+def run_inline(camera, paths, spacing, quality):
+    buf = np.empty((camera.height, camera.width, 3), dtype=np.uint8)
+    blocked = []
+    started = time.perf_counter()
+    for i, path in enumerate(paths):
+        if i:
+            time.sleep(max(0.0, started + i * spacing - time.perf_counter()))
+        t0 = time.perf_counter()
+        camera.capture_array(buf)
+        Image.fromarray(buf, "RGB").save(path, "JPEG", quality=quality)
+        blocked.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    return {"blocked": blocked, "saved_latency": blocked, "dropped": 0, "saved": len(paths), "elapsed": elapsed}
+
+
+def run_pipeline(camera, paths, spacing, quality, workers, buffers):
+    latencies = []
+    pipeline = CapturePipeline(camera, workers=workers, buffers=buffers, quality=quality,
+                               on_saved=lambda path, latency: latencies.append(latency),
+                               log=lambda message, error=False: None)
+    pipeline.start()
+    blocked = []
+    started = time.perf_counter()
+    for i, path in enumerate(paths):
+        if i:
+            time.sleep(max(0.0, started + i * spacing - time.perf_counter()))
+        t0 = time.perf_counter()
+        pipeline.capture(path)
+        blocked.append(time.perf_counter() - t0)
+    pipeline.stop()
+    elapsed = time.perf_counter() - started
+    return {"blocked": blocked, "saved_latency": latencies, "dropped": pipeline.dropped,
+            "saved": pipeline.saved, "elapsed": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=40)
+    parser.add_argument("--fps", type=float, default=10, help="Target grab rate (0 = as fast as possible)")
+    parser.add_argument("--width", type=int, default=2028)
+    parser.add_argument("--height", type=int, default=1520)
+    parser.add_argument("--buffers", type=int, default=4)
+    parser.add_argument("--quality", type=int, default=85)
+    args = parser.parse_args()
+    if Image is None:
+        sys.exit("Pillow is required for this benchmark")
+
+    spacing = 1 / args.fps if args.fps > 0 else 0.0
+    print(f"{args.frames} frames of {args.width}x{args.height} at "
+          f"{f'{args.fps:g} fps' if spacing else 'full speed'}, {args.buffers} buffers\n")
+    print(f"{'':12}{'blocked p50':>12}{'p95':>8}{'saved p50':>11}{'p95':>8}{'dropped':>9}{'frames/s':>10}")
+    configs = [("inline", None)] + [(f"{n} worker{'s' if n > 1 else ''}", n) for n in (1, 2, 4)]
+    for label, workers in configs:
+        camera = SimulatedCamera(args.width, args.height)
+        out_dir = tempfile.mkdtemp(prefix="agrox-bench-capture-")
+        try:
+            paths = [os.path.join(out_dir, f"frame_{i:04d}.jpg") for i in range(args.frames)]
+            if workers is None:
+                r = run_inline(camera, paths, spacing, args.quality)
+            else:
+                r = run_pipeline(camera, paths, spacing, args.quality, workers, args.buffers)
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+        blocked = np.array(r["blocked"]) * 1000
+        saved = np.array(r["saved_latency"]) * 1000
+        print(f"{label:12}{np.percentile(blocked, 50):>9.1f} ms{np.percentile(blocked, 95):>5.1f} ms"
+              f"{np.percentile(saved, 50):>8.1f} ms{np.percentile(saved, 95):>5.1f} ms"
+              f"{r['dropped']:>9}{r['saved'] / r['elapsed']:>10.1f}")
+    print("\n'blocked' is time the capturing thread spends per frame; 'saved' is grab start to JPEG on disk.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark change-based recording and adaptive sampling on a recorded day.
+
+Replays a sensor log CSV (by default logs/sensor_log_20250513.csv, or a
+synthetic day if it is missing) through each RECORD_MODE and reports how
+many readings are stored, the compression ratio and the worst error when
+the dropped readings are reconstructed by linear interpolation between the
+stored ones. With --adaptive it also replays the day at the interval
+AdaptiveInterval would have chosen, to show how many sensor reads it saves.
+
+Usage:
+    python3 benchmarks/bench_compression.py [--csv PATH] [--temp-dev 0.2] [--hum-dev 1.0]
+"""
+
+import argparse
+import csv
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import MODES, AdaptiveInterval, ReadingCompressor
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "logs", "sensor_log_20250513.csv")
+ROW_BYTES = 16  # timestamp.i64 + temperature.f32 + humidity.f32 in the store
+
+
+def load(path):
+    """Readings from a sensor log CSV, one per second at most, in time order."""
+    readings = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            ts = datetime.strptime(row["timestamp"], "%Y-%m-%d %H:%M:%S").timestamp()
+            readings.setdefault(ts, (float(row["temperature_c"]), float(row["humidity"])))
+    ts = np.array(sorted(readings))
+    return ts, np.array([readings[t] for t in ts])
+
+
+def synthetic(hours=12, interval=3.0):
+    rng = random.Random(1)
+    ts = np.arange(0, hours * 3600, interval) + 1.7e9
+    phase = (ts % 86400) / 86400 * 2 * math.pi
+    temp = np.round(28 + 5 * np.sin(phase) + [rng.gauss(0, 0.04) for _ in ts], 1)
+    hum = np.round(70 - 10 * np.sin(phase) + [rng.gauss(0, 0.2) for _ in ts], 1)
+    return ts, np.column_stack([temp, hum])
+
+
+def max_error(ts, values, kept):
+    kept_ts = np.array([k[0] for k in kept])
+    return [float(np.max(np.abs(np.interp(ts, kept_ts, [k[1][i] for k in kept]) - values[:, i])))
+            for i in range(values.shape[1])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--temp-dev", type=float, default=0.2)
+    parser.add_argument("--hum-dev", type=float, default=1.0)
+    parser.add_argument("--max-interval", type=float, default=300)
+    parser.add_argument("--max-sample-interval", type=float, default=30)
+    args = parser.parse_args()
+
+    if os.path.exists(args.csv):
+        ts, values = load(args.csv)
+        source = os.path.basename(args.csv)
+    else:
+        ts, values = synthetic()
+        source = "synthetic day"
+    deviations = (args.temp_dev, args.hum_dev)
+    print(f"{source}: {len(ts)} readings over {(ts[-1] - ts[0]) / 3600:.1f} h, "
+          f"deviation ±{args.temp_dev} °C / ±{args.hum_dev} %RH, heartbeat {args.max_interval:.0f} s")
+    print(f"{'mode':15}{'stored':>8}{'ratio':>8}{'bytes':>9}{'max err °C':>12}{'max err %RH':>13}{'us/reading':>12}")
+
+    for mode in MODES:
+        compressor = ReadingCompressor(mode, deviations, args.max_interval)
+        started = time.perf_counter()
+        kept = []
+        for t, row in zip(ts.tolist(), values.tolist()):
+            kept.extend(compressor.offer(t, row))
+        kept.extend(compressor.flush())
+        elapsed = time.perf_counter() - started
+        temp_err, hum_err = max_error(ts, values, kept)
+        print(f"{mode:15}{len(kept):8d}{len(ts) / len(kept):7.1f}x{len(kept) * ROW_BYTES:9d}"
+              f"{temp_err:12.2f}{hum_err:13.2f}{elapsed / len(ts) * 1e6:12.1f}")
+
+    # Adaptive sampling: read the recorded day back at the interval
+    # AdaptiveInterval would have asked the scheduler for
+    base_interval = float(np.median(np.diff(ts)))
+    sampling = AdaptiveInterval(base_interval, args.max_sample_interval, deviations)
+    compressor = ReadingCompressor("swinging_door", deviations, args.max_interval)
+    kept, reads, t = [], 0, ts[0]
+    while t <= ts[-1]:
+        i = min(int(np.searchsorted(ts, t)), len(ts) - 1)
+        reads += 1
+        kept.extend(compressor.offer(ts[i], values[i].tolist()))
+        t = max(t + sampling.update(values[i]), ts[i] + 1e-3)
+    kept.extend(compressor.flush())
+    temp_err, hum_err = max_error(ts, values, kept)
+    print(f"\nadaptive sampling ({base_interval:.0f}-{args.max_sample_interval:.0f} s) + swinging_door: "
+          f"{reads} sensor reads instead of {len(ts)}, {len(kept)} stored "
+          f"({len(ts) / len(kept):.1f}x), max err {temp_err:.2f} °C / {hum_err:.2f} %RH")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark the derived-metrics engine: streaming updates and the backfill.
+
+Part 1 feeds two days of 3-second readings through DerivedMetrics and
+times one update and one /api/sensor/derived summary. For comparison it
+times what answering the same request costs without the engine: reading
+the last 24 h back from the store and computing the metrics and windows
+from scratch, and checks that both give the same degree days.
+
+Part 2 writes days of readings to a store and backfills their derived
+metrics, one vectorized pass per day, against a loop that computes them
+reading by reading, and reports the largest difference between the two.
+
+Usage:
+    python3 benchmarks/bench_derived.py [--days 30] [--interval 3]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import derived
+from sensor_store import SensorStore, day_bounds
+
+
+def readings(start, days, interval, rng):
+    ts = np.arange(start, start + days * 86400, interval, dtype=np.int64)
+    phase = 2 * np.pi * (ts - start) / 86400
+    temp_c = (20 + 8 * np.sin(phase) + rng.normal(0, 0.3, len(ts))).astype(np.float32)
+    humidity = np.clip(65 - 20 * np.sin(phase) + rng.normal(0, 1, len(ts)), 5, 100).astype(np.float32)
+    return ts, temp_c, humidity
+
+
+def from_scratch(store, now):
+    """What a request costs without the engine: re-read 24 h and recompute everything."""
+    ts, temp_c, humidity = store.query(now - 86400, now + 1)
+    values = [temp_c, humidity, derived.vapor_pressure_deficit(temp_c, humidity),
+              derived.dew_point(temp_c, humidity), derived.heat_index(temp_c, humidity)]
+    summary = {}
+    for name, (seconds, _) in derived.WINDOWS.items():
+        i = int(np.searchsorted(ts, now - seconds))
+        summary[name] = [(float(v[i:].min()), float(v[i:].max()), float(v[i:].mean())) for v in values]
+    start = int(np.searchsorted(ts, day_bounds(time.strftime("%Y%m%d", time.localtime(now)))[0]))
+    summary["gdd"] = float(derived.degree_days(ts[start:], temp_c[start:])[-1])
+    return summary
+
+
+def per_reading(ts, temp_c, humidity):
+    """The backfill as a loop over readings."""
+    columns = [[], [], [], []]
+    gdd, last = 0.0, None
+    for t, c, h in zip(ts.tolist(), temp_c.tolist(), humidity.tolist()):
+        effective = min(max(c, derived.GDD_BASE_C), derived.GDD_CAP_C) - derived.GDD_BASE_C
+        if last is not None and 0 < t - last[0] <= derived.MAX_GAP:
+            gdd += (last[1] + effective) / 2 * (t - last[0]) / 86400
+        last = (t, effective)
+        for column, value in zip(columns, (derived.vapor_pressure_deficit(c, h), derived.dew_point(c, h),
+                                           derived.heat_index(c, h), gdd)):
+            column.append(float(value))
+    return columns
+
+
+def bench_streaming(root, interval, rng):
+    store = SensorStore(os.path.join(root, "stream"), batch_size=1000)
+    start = day_bounds((date.today() - timedelta(days=2)).strftime("%Y%m%d"))[0]
+    ts, temp_c, humidity = readings(start, 2, interval, rng)
+    engine = derived.DerivedMetrics()
+    started = time.perf_counter()
+    for t, c, h in zip(ts.tolist(), temp_c.tolist(), humidity.tolist()):
+        engine.update(t, c, h)
+    update = (time.perf_counter() - started) / len(ts)
+    for row in zip(ts.tolist(), temp_c.tolist(), humidity.tolist()):
+        store.append(*row)
+    store.flush()
+
+    now = int(ts[-1])
+    n = 1000
+    started = time.perf_counter()
+    for _ in range(n):
+        summary = engine.summary(now)
+    cached = (time.perf_counter() - started) / n
+    started = time.perf_counter()
+    for _ in range(20):
+        scratch = from_scratch(store, now)
+    scratch_time = (time.perf_counter() - started) / 20
+
+    print(f"{len(ts):,} readings, one every {interval} s\n")
+    print(f"  {'update() per reading':40}{update * 1e6:>9.1f} µs")
+    print(f"  {'/api/sensor/derived summary':40}{cached * 1e6:>9.1f} µs")
+    print(f"  {'re-read 24 h and recompute':40}{scratch_time * 1e6:>9.1f} µs")
+    print(f"  degree days today: streamed {summary['gdd']['today']:.4f}, recomputed {scratch['gdd']:.4f}")
+
+
+def bench_backfill(root, days, interval, rng):
+    raw = SensorStore(os.path.join(root, "store"))
+    first = date.today() - timedelta(days=days)
+    for d in range(days):
+        day = (first + timedelta(days=d)).strftime("%Y%m%d")
+        raw.write_day(day, *readings(day_bounds(day)[0], 1, interval, rng))
+    store = derived.derived_store(raw)
+
+    started = time.perf_counter()
+    summary = derived.backfill(raw, store)
+    vectorized = time.perf_counter() - started
+    started = time.perf_counter()
+    derived.backfill(raw, store)
+    idle = time.perf_counter() - started
+
+    day = first.strftime("%Y%m%d")
+    ts, temp_c, humidity = raw.read_day(day)
+    started = time.perf_counter()
+    looped = per_reading(ts, temp_c, humidity)
+    loop_day = time.perf_counter() - started
+    stored = store.read_day(day)
+    error = max(float(np.abs(np.asarray(a, dtype=np.float32) - b).max()) for a, b in zip(looped, stored[1:]))
+
+    rows = summary["rows"]
+    print(f"\nBackfilling {summary['days']} days ({rows:,} readings)")
+    print(f"  vectorized: {vectorized:.2f} s ({rows / vectorized:,.0f} readings/s), "
+          f"{vectorized / summary['days'] * 1000:.1f} ms per day")
+    print(f"  per-reading loop: {loop_day * 1000:.0f} ms per day "
+          f"(about {loop_day * summary['days']:.0f} s for all of them)")
+    print(f"  second run, nothing to do: {idle * 1000:.1f} ms; max difference from the loop: {error:.2g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--interval", type=int, default=3)
+    args = parser.parse_args()
+    rng = np.random.default_rng(5)
+
+    root = tempfile.mkdtemp(prefix="agrox-bench-derived-")
+    try:
+        bench_streaming(root, args.interval, rng)
+        bench_backfill(root, args.days, args.interval, rng)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark the sensor read filter on a synthetic DHT22 stream.
+
+Generates a day of 2-second reads (a daily cycle, sensor noise quantized to
+0.1) and corrupts it the way a real DHT22 does: failed reads,
+checksum-valid garbage (-3276.8, 0 or 100 %) and single-sample spikes. The
+stream is passed through ReadingFilter with and without oversampling. The
+report gives the error against the true signal, the corrupted reads that
+got through, the average confidence and the filter's cost per read, with
+np.median for comparison.
+
+Usage:
+    python3 benchmarks/bench_filter.py [--hours 24] [--fail-rate 0.1] [--spike-rate 0.01]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filtering import ReadingFilter, _median
+
+FIELDS = ("temperature_c", "humidity")
+
+
+def stream(hours, fail_rate, spike_rate, seed=1):
+    """Yield ``(ts, truth, read)``; ``read`` is None for a failed read."""
+    rng = random.Random(seed)
+    for i in range(int(hours * 3600 / 2)):
+        ts = 1.7e9 + 2 * i
+        phase = (ts % 86400) / 86400 * 2 * math.pi
+        truth = (28 + 5 * math.sin(phase), 70 - 10 * math.sin(phase))
+        r = rng.random()
+        if r < fail_rate:
+            read = None
+        elif r < fail_rate + spike_rate / 2:
+            read = rng.choice([(-3276.8, truth[1]), (truth[0], 0.0), (truth[0], 100.0)])
+        elif r < fail_rate + spike_rate:
+            read = (truth[0] + rng.choice([-1, 1]) * rng.uniform(1.5, 4), truth[1] + rng.uniform(-8, 8))
+        else:
+            read = (round(truth[0] + rng.gauss(0, 0.2), 1), round(truth[1] + rng.gauss(0, 0.5), 1))
+        yield ts, truth, read
+
+
+def run(readings, oversample, raw=False):
+    f = ReadingFilter(FIELDS, oversample=oversample)
+    errors, confidences, bad = [], [], 0
+    elapsed = 0.0
+    for i, (ts, truth, read) in enumerate(readings):
+        started = time.perf_counter()
+        if raw:
+            result = (read, 1.0) if read is not None else None
+        else:
+            if read is None:
+                f.fail()
+            else:
+                f.add(ts, read)
+            result = f.output() if (i + 1) % oversample == 0 else None
+        elapsed += time.perf_counter() - started
+        if result is None:
+            continue
+        values, confidence = result
+        error = [abs(v - t) for v, t in zip(values, truth)]
+        errors.append(error)
+        confidences.append(confidence)
+        bad += error[0] > 1.0 or error[1] > 3.0
+    errors = np.array(errors)
+    return {
+        "published": len(errors),
+        "rmse": np.sqrt(np.mean(errors ** 2, axis=0)),
+        "max": errors.max(axis=0),
+        "bad": bad,
+        "confidence": float(np.mean(confidences)),
+        "us": elapsed / len(readings) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="Fraction of reads that fail")
+    parser.add_argument("--spike-rate", type=float, default=0.01, help="Fraction of reads that are garbage or spikes")
+    args = parser.parse_args()
+
+    readings = list(stream(args.hours, args.fail_rate, args.spike_rate))
+    print(f"{len(readings)} reads, {args.fail_rate:.0%} failed, {args.spike_rate:.0%} corrupted\n")
+    print(f"{'':18}{'published':>10}{'RMSE °C':>9}{'RMSE %RH':>9}{'max °C':>9}{'max %RH':>9}"
+          f"{'bad':>6}{'confidence':>11}{'µs/read':>9}")
+    for label, oversample, raw in [("unfiltered", 1, True), ("filter", 1, False),
+                                   ("filter, 2x over", 2, False), ("filter, 3x over", 3, False)]:
+        r = run(readings, oversample, raw)
+        print(f"{label:18}{r['published']:>10}{r['rmse'][0]:>9.2f}{r['rmse'][1]:>9.2f}{r['max'][0]:>9.1f}"
+              f"{r['max'][1]:>9.1f}{r['bad']:>6}{r['confidence']:>11.2f}{r['us']:>9.1f}")
+
+    window = np.random.default_rng(1).normal(size=(7, 2))
+    n = 20000
+    print()
+    for label, func in [("window median, sort", lambda: _median(window)),
+                        ("window median, np.median", lambda: np.median(window, axis=0))]:
+        started = time.perf_counter()
+        for _ in range(n):
+            func()
+        print(f"{label:26}{(time.perf_counter() - started) / n * 1e6:6.1f} µs")
+    print("\n'bad' counts published readings more than 1 °C or 3 %RH off the true value.")
+
+
+if __name__ == "__main__":
+    main()
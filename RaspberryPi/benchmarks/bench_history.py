@@ -0,0 +1,65 @@
+"""
+Benchmark /api/sensor/history aggregation over the sensor store.
+
+Fills a temporary store with a week of 3-second readings and times the
+query + aggregation + JSON serialization for each bucket size.
+
+Usage:
+    python3 benchmarks/bench_history.py [--days 7]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import history
+from sensor_store import SensorStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--interval", type=float, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    start = int(datetime(2025, 5, 13).timestamp())
+    end = start + int(args.days * 86400)
+    ts = np.arange(start, end, args.interval).astype(np.int64)
+    rng = np.random.default_rng(0)
+
+    work = tempfile.mkdtemp(prefix="agrox-bench-")
+    try:
+        store = SensorStore(work, batch_size=len(ts) + 1)
+        for t, c, h in zip(ts.tolist(), rng.normal(30, 2, len(ts)).tolist(),
+                           rng.normal(75, 5, len(ts)).tolist()):
+            store.append(t, c, h)
+        store.flush()
+        print(f"readings: {len(ts)} over {args.days} days")
+        print(f"{'bucket':8}{'points':>8}{'p50 ms':>10}{'max ms':>10}{'bytes':>10}")
+        for bucket, seconds in history.BUCKETS.items():
+            times = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                result = history.query_history(store, start, end, seconds)
+                body = "".join(history.stream_history(
+                    {"from": start, "to": end, "bucket": bucket}, *result, history.AGGREGATES))
+                times.append(time.perf_counter() - t0)
+            times.sort()
+            print(f"{bucket:8}{len(result[0]):8d}{times[len(times) // 2] * 1000:10.2f}"
+                  f"{times[-1] * 1000:10.2f}{len(body):10d}")
+        store.close()
+    finally:
+        shutil.rmtree(work)
+
+
+if __name__ == "__main__":
+    main()
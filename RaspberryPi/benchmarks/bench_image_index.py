@@ -0,0 +1,75 @@
+"""
+Benchmark the image index against glob + sort of the images directory.
+
+Creates N empty image files (default 100,000, roughly 70 days at one
+capture a minute) in a temporary directory and times latest-image lookups
+and paginated, time-filtered listings both ways.
+
+Usage:
+    python3 benchmarks/bench_image_index.py [--files 100000]
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_index import ImageIndex, name_for_time
+
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    start = datetime(2025, 5, 13).timestamp()
+    work = tempfile.mkdtemp(prefix="agrox-bench-")
+    try:
+        for i in range(args.files):
+            open(os.path.join(work, name_for_time(start + i * 60)), 'w').close()
+
+        index = ImageIndex(work)
+        seed = timed(index.rebuild, 1)
+
+        # A one-day window a week in, first page of 100
+        lo, hi = start + 7 * 86400, start + 8 * 86400
+        lo_name, hi_name = name_for_time(lo), name_for_time(hi)
+
+        def glob_latest():
+            return sorted(glob.glob(f"{work}/*.jpg"))[-1]
+
+        def glob_page():
+            names = [os.path.basename(p) for p in sorted(glob.glob(f"{work}/*.jpg"))]
+            return [n for n in names if lo_name <= n < hi_name][:100]
+
+        rows = [
+            ("latest", timed(glob_latest, args.repeat), timed(index.latest_path, 1000)),
+            ("list 1 day, limit 100", timed(glob_page, args.repeat),
+             timed(lambda: index.list(lo, hi, limit=100), 1000)),
+        ]
+        assert glob_page() == index.list(lo, hi, limit=100)[0]
+
+        print(f"images: {args.files}, index seed (one scandir): {seed * 1000:.1f} ms")
+        print(f"{'':24}{'glob+sort ms':>14}{'index ms':>12}{'speedup':>10}")
+        for label, g, i in rows:
+            print(f"{label:24}{g * 1000:14.2f}{i * 1000:12.4f}{g / i:9.0f}x")
+    finally:
+        shutil.rmtree(work)
+
+
+if __name__ == "__main__":
+    main()
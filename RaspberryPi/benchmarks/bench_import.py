@@ -0,0 +1,141 @@
+"""
+Benchmark the bulk CSV import (csv_import.py).
+
+Writes ``--days`` sensor_log CSVs of 3-second readings in the two schemas
+seen in the field: the first ``--drifted`` days have the old
+``sensor_active,camera_active`` columns in their header and first rows
+and ``CSV_HEADER`` rows after that, like 20250513. Every file also repeats
+a few minutes of readings, as a restart did, and ends in a truncated line.
+
+Times parsing one file with ``csv.reader`` and ``datetime.strptime``
+against the vectorized parser, checking they agree, then imports every
+file into an empty store with one worker and with one per core, and runs
+the import again with ``--incremental``'s bookkeeping after touching one
+file.
+
+Usage:
+    python3 benchmarks/bench_import.py [--days 60] [--drifted 10]
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csv_import
+from sensor_store import CSV_HEADER, SensorStore, day_bounds
+
+
+def write_log(path, day, drifted, rng):
+    start = day_bounds(day)[0]
+    ts = np.arange(start, start + 86400, 3)
+    # A restart logged the same few minutes twice
+    repeat = int(rng.integers(0, len(ts) - 100))
+    ts = np.concatenate([ts[:repeat + 100], ts[repeat:]])
+    phase = 2 * np.pi * (ts - start) / 86400
+    temp_c = np.round(20 + 8 * np.sin(phase) + rng.normal(0, 0.3, len(ts)), 1)
+    humidity = np.round(np.clip(65 - 20 * np.sin(phase) + rng.normal(0, 1, len(ts)), 5, 100), 1)
+    drift_rows = len(ts) // 3 if drifted else 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER + (["sensor_active", "camera_active"] if drifted else []))
+        for i, (t, c, h) in enumerate(zip(ts.tolist(), temp_c.tolist(), humidity.tolist())):
+            row = [datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S"), c, c * 9 / 5 + 32, h]
+            writer.writerow(row + ([True, True] if i < drift_rows else []))
+        f.write(datetime.fromtimestamp(int(ts[-1]) + 3).strftime("%Y-%m-%d %H:%M"))
+    return len(ts)
+
+
+def with_csv_reader(path):
+    """The straightforward parser: a Python loop over csv.reader rows."""
+    ts, temp_c, humidity = [], [], []
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        for row in reader:
+            names = header if len(row) == len(header) else CSV_HEADER
+            if len(row) != len(names):
+                continue
+            try:
+                t = datetime.strptime(row[names.index("timestamp")], "%Y-%m-%d %H:%M:%S").timestamp()
+                c, h = float(row[names.index("temperature_c")]), float(row[names.index("humidity")])
+            except ValueError:
+                continue
+            ts.append(int(t))
+            temp_c.append(c)
+            humidity.append(h)
+    return np.array(ts), np.array(temp_c, dtype=np.float32), np.array(humidity, dtype=np.float32)
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--drifted", type=int, default=10)
+    args = parser.parse_args()
+    rng = np.random.default_rng(3)
+
+    root = tempfile.mkdtemp(prefix="agrox-bench-import-")
+    try:
+        log_dir = os.path.join(root, "logs")
+        os.makedirs(log_dir)
+        first = date.today() - timedelta(days=args.days + 1)
+        rows = 0
+        for d in range(args.days):
+            day = (first + timedelta(days=d)).strftime("%Y%m%d")
+            rows += write_log(os.path.join(log_dir, f"sensor_log_{day}.csv"), day, d < args.drifted, rng)
+        paths = csv_import.scan_logs(log_dir)
+        size = sum(os.path.getsize(p) for p in paths)
+        print(f"{len(paths)} files, {rows:,} rows, {size / 1e6:.0f} MB "
+              f"({args.drifted} with the sensor_active,camera_active columns)\n")
+
+        reference, slow = timed(with_csv_reader, paths[0])
+        parsed, fast = timed(csv_import.parse_file, paths[0])
+        same = all(np.array_equal(a, b) for a, b in zip(reference, parsed[:3]))
+        n = len(reference[0])
+        print("Parsing one file")
+        print(f"  {'csv.reader + strptime':28}{slow * 1000:>8.0f} ms ({n / slow:>10,.0f} rows/s)")
+        print(f"  {'vectorized':28}{fast * 1000:>8.0f} ms ({n / fast:>10,.0f} rows/s, {slow / fast:.0f}x)")
+        print(f"  same readings: {'yes' if same else 'NO'}\n")
+
+        print("Importing every file into an empty store")
+        cores = os.cpu_count() or 1
+        for workers in sorted({1, cores}):
+            store_dir = os.path.join(root, f"store-{workers}")
+            summary = csv_import.import_logs(paths, SensorStore(store_dir), workers=workers,
+                                             log=lambda message, error=False: None)
+            seconds = summary["seconds"]
+            print(f"  {workers} worker{'s' if workers > 1 else ' '}{'':18}{seconds:>8.2f} s "
+                  f"({summary['rows'] / seconds:>10,.0f} rows/s)")
+        print(f"  {summary['written']:,} readings on {summary['days']} days, {summary['duplicates']:,} duplicates "
+              f"and {summary['skipped']:,} malformed rows dropped")
+
+        state = {os.path.basename(p): csv_import.file_signature(p) for p in paths}
+        os.utime(paths[-1])
+        started = time.perf_counter()
+        changed = [p for p in csv_import.scan_logs(log_dir)
+                   if state.get(os.path.basename(p)) != csv_import.file_signature(p)]
+        summary = csv_import.import_logs(changed, SensorStore(store_dir), workers=cores,
+                                         log=lambda message, error=False: None)
+        incremental = time.perf_counter() - started
+        print(f"\nIncremental run after touching one file: {len(changed)} file read, "
+              f"{summary['written']} new readings, {incremental * 1000:.0f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark compressed and incremental delivery of sensor log CSVs.
+
+For one day's log, compares the bytes sent and the server time per request
+for: the raw CSV, gzip compressed on every request (how today's log is
+served), the compress-once cached copy (how past days are served), and a
+``?since=`` tail that only fetches the rows added since the last poll.
+
+Usage:
+    python3 benchmarks/bench_log_files.py [--csv PATH] [--requests 50]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_files
+from log_files import CompressedLogCache
+from sensor_store import SensorStore
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "logs", "sensor_log_20250513.csv")
+
+
+def drain(chunks):
+    return sum(len(c) for c in chunks)
+
+
+def timed(func, requests):
+    started = time.perf_counter()
+    for _ in range(requests):
+        sent = func()
+    return sent, (time.perf_counter() - started) / requests * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--tail-rows", type=int, default=20, help="Rows added between tail polls")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="agrox-bench-logs-")
+    try:
+        if os.path.exists(args.csv):
+            csv_path = args.csv
+        else:
+            # A full day at 3 s intervals, exported from the store
+            store = SensorStore(os.path.join(workdir, "store"))
+            start = time.time() - 86400
+            for i in range(28800):
+                store.append(start + i * 3, 28 + (i % 97) / 10, 70 + (i % 53) / 10)
+            csv_path = store.csv_for_day(store.days()[0], os.path.join(workdir, "export"))
+            store.close()
+        cache = CompressedLogCache(os.path.join(workdir, "cache"))
+
+        def raw():
+            f, size = log_files.open_log(csv_path)
+            return drain(log_files.iter_file(f, 0, size))
+
+        def on_the_fly():
+            f, size = log_files.open_log(csv_path)
+            return drain(log_files.iter_compressed(log_files.iter_file(f, 0, size), "gzip"))
+
+        def cached():
+            with open(cache.get(csv_path, "gzip"), "rb") as f:
+                return len(f.read())
+
+        size = os.path.getsize(csv_path)
+        with open(csv_path, "rb") as f:
+            lines = f.read().splitlines(keepends=True)
+        tail_bytes = sum(len(line) for line in lines[-args.tail_rows:])
+
+        def tail():
+            f, end = log_files.open_log(csv_path)
+            return drain(log_files.iter_compressed(log_files.iter_file(f, end - tail_bytes, end), "gzip"))
+
+        first_started = time.perf_counter()
+        cache.get(csv_path, "gzip")
+        first_ms = (time.perf_counter() - first_started) * 1000
+
+        print(f"{os.path.basename(csv_path)}: {size} bytes, {len(lines)} lines; {args.requests} requests each")
+        print(f"{'':34}{'bytes sent':>12}{'ms/request':>12}")
+        for label, func in [("raw CSV", raw),
+                            ("gzip per request (today)", on_the_fly),
+                            ("cached .csv.gz (past days)", cached),
+                            (f"?since tail, {args.tail_rows} new rows, gzip", tail)]:
+            sent, ms = timed(func, args.requests)
+            print(f"{label:34}{sent:12d}{ms:12.3f}")
+        print(f"cached .csv.gz is built once on first request: {first_ms:.1f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
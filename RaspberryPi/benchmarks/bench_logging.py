@@ -0,0 +1,86 @@
+"""
+Benchmark the logging overhead of one monitoring-loop iteration.
+
+Compares the original log_message (datetime.now().strftime + print on the
+calling thread) with the queue-backed logger, using the messages a sensor
+tick typically emits: the repeated status line, the reading, the store write
+and an LED message. Output goes to a line-buffered file, as it would to the
+journal under systemd with PYTHONUNBUFFERED=1.
+
+Usage:
+    python3 benchmarks/bench_logging.py [--iterations 20000]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger as agrox_logger
+
+
+def print_log_message(message, error=False):
+    """The original implementation."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    log_type = "ERROR" if error else "INFO"
+    print(f"{timestamp} - {log_type} - {message}")
+
+
+def iteration(log, i, debug_level):
+    t = 30 + (i % 7) / 10
+    log("Status: Sensor ACTIVE, Camera ACTIVE")
+    log(f"Temp={t:0.1f}ºC, Temp={t * 1.8 + 32:0.1f}ºF, Humidity=75.4%", level=debug_level)
+    log(f"Data logged to store: {t}°C, {t * 1.8 + 32}°F, 75.4%", level=debug_level)
+    log("Status LEDs: GREEN ON (System active)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    out_path = tempfile.mktemp(prefix="agrox-bench-", suffix=".log")
+    real_stdout = sys.stdout
+    results = {}
+    try:
+        # Original: every message formatted and written on the calling thread
+        sys.stdout = open(out_path, "w", buffering=1)
+        t0 = time.perf_counter()
+        for i in range(args.iterations):
+            iteration(lambda m, level=None: print_log_message(m), i, None)
+        results["print (original)"] = time.perf_counter() - t0
+        sys.stdout.close()
+        lines_print = sum(1 for _ in open(out_path))
+
+        # Queue-backed logger at INFO with rate limiting (the new default)
+        for label, kwargs in [("async, INFO + rate limit", {"rate_limit": 60}),
+                              ("async, INFO, no rate limit", {"rate_limit": 0})]:
+            sys.stdout = open(out_path, "w", buffering=1)
+            log = agrox_logger.setup_logging(level="INFO", **kwargs)
+            t0 = time.perf_counter()
+            for i in range(args.iterations):
+                iteration(lambda m, level=None: log.log(level or logging.INFO, m), i, logging.DEBUG)
+            results[label] = time.perf_counter() - t0
+            agrox_logger.shutdown_logging(timeout=30)
+            sys.stdout.close()
+            results[label + " lines"] = sum(1 for _ in open(out_path))
+    finally:
+        sys.stdout = real_stdout
+        os.remove(out_path)
+
+    base = results["print (original)"]
+    print(f"iterations: {args.iterations} (4 messages each)")
+    print(f"{'':30}{'us/iteration':>14}{'lines written':>15}{'vs original':>13}")
+    print(f"{'print (original)':30}{base / args.iterations * 1e6:14.1f}{lines_print:15d}{'1.0x':>13}")
+    for label in ("async, INFO + rate limit", "async, INFO, no rate limit"):
+        t = results[label]
+        print(f"{label:30}{t / args.iterations * 1e6:14.1f}{results[label + ' lines']:15d}{base / t:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark the cost of the /metrics instrumentation.
+
+Measures what a hot path pays per recorded value: a bound histogram
+observe(), a bound counter inc(), a labels() lookup plus inc() as done per
+request, and the perf_counter() pair used to time a block. Observations are
+spread over several threads, so the locks are exercised as they are under
+waitress. Also times one /metrics render.
+
+Usage:
+    python3 benchmarks/bench_metrics.py [--ops 1000000] [--threads 4]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+
+def per_op(func, ops, threads):
+    per_thread = ops // threads
+    workers = [threading.Thread(target=func, args=(per_thread,)) for _ in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return (time.perf_counter() - started) / (per_thread * threads) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ops", type=int, default=1000000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    registry = metrics.Registry()
+    hist = metrics.histogram("bench_seconds", "bench", registry=registry)
+    count = metrics.counter("bench_total", "bench", ("route", "method", "status"), registry=registry)
+    bound = count.labels("/api/sensor", "GET", "200")
+    routes = [f"/api/route{i}" for i in range(20)]
+    for route in routes:
+        metrics.histogram(f"bench_route{routes.index(route)}_seconds", "bench", ("route",),
+                          registry=registry).labels(route).observe(0.01)
+
+    def loop(n):
+        for _ in range(n):
+            pass
+
+    def observe(n):
+        for i in range(n):
+            hist.observe(0.003)
+
+    def inc(n):
+        for _ in range(n):
+            bound.inc()
+
+    def labelled_inc(n):
+        for _ in range(n):
+            count.labels("/api/sensor", "GET", "200").inc()
+
+    def timed_block(n):
+        clock = time.perf_counter
+        for _ in range(n):
+            started = clock()
+            hist.observe(clock() - started)
+
+    base = per_op(loop, args.ops, args.threads)
+    print(f"{args.ops} ops over {args.threads} threads; loop overhead {base:.0f} ns subtracted")
+    for label, func in [("histogram observe()", observe),
+                        ("counter inc() (bound child)", inc),
+                        ("labels(...).inc() per request", labelled_inc),
+                        ("perf_counter pair + observe()", timed_block)]:
+        print(f"  {label:32} {per_op(func, args.ops, args.threads) - base:8.0f} ns")
+
+    started = time.perf_counter()
+    text = registry.render()
+    print(f"render: {(time.perf_counter() - started) * 1000:.2f} ms for {len(text.splitlines())} lines")
+    assert f"bench_seconds_count {args.ops // args.threads * args.threads * 2}" in text
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark change detection: per-frame cost and how many stills it saves.
+
+Part 1 times ChangeDetector.check() on full frames at common Pi camera
+resolutions. A straightforward NumPy version is timed for comparison: it
+converts the whole frame to grayscale and diffs it against the reference.
+Run it on the Pi itself to get Pi numbers.
+
+Part 2 replays a synthetic day of a static crop bed, one still per minute.
+The scene has sensor noise, daylight that rises and falls, and a few short
+events (a person walking through, a watering spray). It reports how many
+stills are kept and how many JPEG bytes that saves on disk and upload.
+
+Usage:
+    python3 benchmarks/bench_motion.py [--threshold 0.02] [--keyframe 900]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motion import ChangeDetector
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+RESOLUTIONS = [(640, 480), (2028, 1520), (4056, 3040)]
+
+
+def naive_check(frame, reference, pixel_delta=12, threshold=0.02):
+    gray = frame.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return np.count_nonzero(np.abs(gray - reference) > pixel_delta) / gray.size >= threshold
+
+
+def time_per_frame(func, n):
+    started = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - started) / n * 1000
+
+
+def crop_bed(width, height, rng):
+    """A static, textured scene: soil with rows of green plants."""
+    y, x = np.mgrid[0:height, 0:width]
+    plants = (np.sin(x / width * 40) > 0.3) & (np.sin(y / height * 12) > -0.2)
+    scene = np.empty((height, width, 3), dtype=np.float32)
+    scene[:] = (110, 80, 50)
+    scene[plants] = (50, 140, 40)
+    return scene + rng.normal(0, 12, (height, width, 1))
+
+
+def day_frames(width, height, events, rng):
+    """Yield (minute, frame) for one day; ``events`` are (start minute, length, kind)."""
+    scene = crop_bed(width, height, rng)
+    noise = [rng.normal(0, 3, (height, width, 3)).astype(np.float32) for _ in range(8)]
+    active = {}
+    for start, length, kind in events:
+        for m in range(start, start + length):
+            active[m] = (kind, m - start)
+    for minute in range(1440):
+        # Daylight between 06:00 and 20:00, dim infrared-ish night otherwise
+        light = max(0.15, np.sin(np.pi * (minute - 360) / 840)) if 360 <= minute <= 1200 else 0.15
+        frame = scene * light + noise[minute % len(noise)]
+        if minute in active:
+            kind, step = active[minute]
+            if kind == "person":
+                x0 = int(width * (0.1 + 0.25 * step))
+                frame[height // 4:, x0:x0 + width // 8] = (40, 40, 60)
+            else:
+                frame[:, : width // 2] *= 0.7  # wet soil and spray
+        yield minute, np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threshold", type=float, default=0.02)
+    parser.add_argument("--pixel-delta", type=float, default=12)
+    parser.add_argument("--keyframe", type=float, default=900, help="Keyframe interval in seconds")
+    args = parser.parse_args()
+    rng = np.random.default_rng(1)
+
+    print("Per-frame cost")
+    print(f"{'resolution':>12}{'ChangeDetector':>16}{'full-frame diff':>17}")
+    for width, height in RESOLUTIONS:
+        frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        detector = ChangeDetector()
+        detector.check(frame, 0)
+        fast = time_per_frame(lambda: detector.check(frame, 1), 100)
+        reference = frame.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        slow = time_per_frame(lambda: naive_check(frame, reference), 5)
+        print(f"{f'{width}x{height}':>12}{fast:>13.2f} ms{slow:>14.1f} ms")
+
+    width, height = 1014, 760
+    events = [(480, 3, "person"), (600, 2, "water"), (790, 4, "person"), (1000, 2, "water")]
+    detector = ChangeDetector(args.threshold, args.pixel_delta, args.keyframe)
+    sizes, kept_sizes = [], []
+    for minute, frame in day_frames(width, height, events, rng):
+        kept = detector.check(frame, minute * 60.0)
+        # Encode the kept stills and a sample of the rest for their JPEG size
+        if Image is not None and (kept or minute % 30 == 0):
+            buf = io.BytesIO()
+            Image.fromarray(frame, "RGB").save(buf, "JPEG", quality=85)
+            if minute % 30 == 0:
+                sizes.append(buf.tell())
+            if kept:
+                kept_sizes.append(buf.tell())
+    stats = detector.stats()
+    print(f"\nA day of {width}x{height} stills, one per minute "
+          f"(threshold {args.threshold:g}, keyframe every {args.keyframe:g} s)")
+    print(f"  kept {stats['kept']} of {stats['checked']} "
+          f"({stats['kept'] / stats['checked']:.1%}), {stats['keyframes']} of them keyframes")
+    if Image is not None:
+        print(f"  JPEG bytes: {np.mean(sizes) * stats['checked'] / 1e6:.1f} MB without detection, "
+              f"{sum(kept_sizes) / 1e6:.1f} MB kept")
+
+
+if __name__ == "__main__":
+    main()
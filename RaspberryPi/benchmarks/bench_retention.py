@@ -0,0 +1,166 @@
+"""
+Benchmark the retention manager on a large image directory and sensor store.
+
+Part 1 fills a directory with one image a minute (100,000 files by default,
+about 70 days; the files are small placeholders) and times what a
+retention run costs: the one-off scan that seeds the per-day counts, the
+first run that thins every day past IMAGE_FULL_DAYS, and a run with
+nothing to do. For comparison it times a glob + stat of the whole
+directory, which is what working out its size on every run would cost.
+
+Part 2 times shrinking full-resolution stills to the archive width and
+reports the bytes saved. It needs Pillow.
+
+Part 3 writes days of 3-second readings, rolls the older ones up into
+hourly rows and compares the bytes on disk and the time of a 1h-bucket
+history query over the whole range before and after.
+
+Usage:
+    python3 benchmarks/bench_retention.py [--images 100000] [--days 60]
+"""
+
+import argparse
+import glob
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import history
+from backends import SimulatedCamera
+from image_index import ImageIndex, name_for_time
+from retention import RetentionManager, Image, _tree_size
+from sensor_store import COLUMNS, SensorStore, day_bounds
+
+QUIET = lambda message, error=False: None  # noqa: E731
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+def large_directory(image_dir, count, now):
+    os.makedirs(image_dir)
+    placeholder = b"\xff\xd8" + b"\0" * 2046
+    for i in range(count):
+        with open(os.path.join(image_dir, name_for_time(now - (count - i) * 60)), "wb") as f:
+            f.write(placeholder)
+
+
+def bench_directory(root, count, now):
+    image_dir = os.path.join(root, "images")
+    large_directory(image_dir, count, now)
+    index = ImageIndex(image_dir)
+    index.rebuild()
+    manager = RetentionManager(index, [], os.path.join(root, "logs"), os.path.join(root, "retention.json"),
+                               thin_interval=600, log=QUIET)
+
+    scan, _ = timed(manager.scan)
+    naive, _ = timed(lambda: sum(os.path.getsize(p) for p in sorted(glob.glob(f"{image_dir}/*.jpg"))))
+    first, summary = timed(manager.run, now)
+    idle, _ = timed(manager.run, now)
+    path = os.path.join(image_dir, index.latest())
+    note = min(timed(manager.note_image, path)[0] for _ in range(1000))
+    manager.image_quota = manager.image_usage()[1] // 2
+    quota, quota_summary = timed(manager.run, now)
+
+    print(f"{count:,} images over {count // 1440} days\n")
+    print(f"  {'seed scan (first run, then daily)':38}{scan * 1000:>9.1f} ms")
+    print(f"  {'glob + stat of the directory':38}{naive * 1000:>9.1f} ms")
+    print(f"  {'first run, thinning':38}{first * 1000:>9.1f} ms  ({summary['thinned']:,} images removed)")
+    print(f"  {'run with nothing to do':38}{idle * 1000:>9.2f} ms")
+    print(f"  {'note_image() per capture':38}{note * 1e6:>9.1f} µs")
+    print(f"  {'quota run, halving images/':38}{quota * 1000:>9.1f} ms  "
+          f"({quota_summary['deleted']:,} oldest removed)")
+
+
+def bench_archive(root, count, width, height):
+    image_dir = os.path.join(root, "archive")
+    os.makedirs(image_dir)
+    camera = SimulatedCamera(width, height)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    camera.capture_array(frame)
+    buf = io.BytesIO()
+    Image.fromarray(frame, "RGB").save(buf, "JPEG", quality=85)
+    start = time.time() - 30 * 86400
+    for i in range(count):
+        with open(os.path.join(image_dir, name_for_time(start + i * 600)), "wb") as f:
+            f.write(buf.getvalue())
+    index = ImageIndex(image_dir)
+    index.rebuild()
+    manager = RetentionManager(index, [], os.path.join(root, "logs"), os.path.join(root, "archive.json"),
+                               thin_interval=600, archive_width=640, log=QUIET)
+    manager.scan()
+    before = manager.image_usage()[1]
+    elapsed, summary = timed(manager.run)
+    after = manager.image_usage()[1]
+    print(f"\nShrinking {summary['archived']} {width}x{height} stills to {manager.archive_width} px")
+    print(f"  {elapsed / max(1, summary['archived']) * 1000:.1f} ms per image, "
+          f"{before / count / 1e3:.0f} KB -> {after / count / 1e3:.0f} KB each")
+
+
+def bench_rollup(root, days, interval):
+    store = SensorStore(os.path.join(root, "store"))
+    today = date.today()
+    rng = np.random.default_rng(3)
+    # Write straight into the day segments; appends are covered by bench_store.py
+    for d in range(days, 0, -1):
+        day = (today - timedelta(days=d)).strftime("%Y%m%d")
+        ts = np.arange(*day_bounds(day), interval, dtype=np.int64)
+        os.makedirs(store.segment_path(day))
+        columns = (ts, 25 + rng.normal(0, 1, len(ts)), 60 + rng.normal(0, 3, len(ts)))
+        for (name, dtype), values in zip(COLUMNS, columns):
+            np.asarray(values, dtype=dtype).tofile(os.path.join(store.segment_path(day), name))
+
+    end = day_bounds(today.strftime("%Y%m%d"))[0]
+    start = end - days * 86400
+    raw_bytes = _tree_size(store.root)
+    raw_query, raw = timed(history.query_history, store, start, end, 3600)
+
+    manager = RetentionManager(ImageIndex(os.path.join(root, "none")), [store], root,
+                               os.path.join(root, "rollup.json"), raw_days=days // 2, log=QUIET)
+    elapsed, summary = timed(manager.run)
+    rolled_query, rolled = timed(history.query_history, store, start, end, 3600)
+    same = np.array_equal(raw[1], rolled[1]) and all(
+        np.allclose(raw[2][k], rolled[2][k], atol=1e-4) for k in raw[2])
+
+    print(f"\n{days} days of {interval}-second readings, the older {summary['rolled_up']} rolled up hourly")
+    print(f"  rollup: {elapsed / max(1, summary['rolled_up']) * 1000:.1f} ms per day")
+    print(f"  on disk: {raw_bytes / 1e6:.1f} MB -> {_tree_size(store.root) / 1e6:.2f} MB")
+    print(f"  1h history over all days: {raw_query * 1000:.1f} ms -> {rolled_query * 1000:.1f} ms "
+          f"(same buckets: {'yes' if same else 'NO'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=100000)
+    parser.add_argument("--archive", type=int, default=20, help="Stills to shrink in part 2")
+    parser.add_argument("--width", type=int, default=2028)
+    parser.add_argument("--height", type=int, default=1520)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--interval", type=int, default=3)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="agrox-bench-retention-")
+    try:
+        bench_directory(root, args.images, time.time())
+        if Image is not None:
+            bench_archive(root, args.archive, args.width, args.height)
+        else:
+            print("\nPillow is not installed; skipping the archive benchmark")
+        bench_rollup(root, args.days, args.interval)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark polling many sensors with one scheduler job per sensor.
+
+Runs 16 simulated sensors for a few seconds: most answer in ~0.25 s like a
+DHT22, some are slow (a struggling sensor on a long cable) and some fail
+every read. Each reading goes through the keyed SharedState and its
+sensor's SensorStore, as in main.py. The per-sensor jobs are compared with
+one loop that reads every sensor in turn, which is what extending the
+original single-sensor loop would give. Reports, per class of sensor, the
+readings achieved against the target and the worst age of the latest value.
+
+Usage:
+    python3 benchmarks/bench_sensors.py [--sensors 16] [--interval 2] [--duration 12]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import SimulatedSensor
+from scheduler import Scheduler
+from sensor_store import SensorStore
+from state import SharedState
+
+
+def build(count, slow, failing, read_delay, slow_delay, root):
+    sensors = []
+    for i in range(count):
+        kind = "slow" if i < slow else "failing" if i < slow + failing else "ok"
+        backend = SimulatedSensor(error_rate=1.0 if kind == "failing" else 0.0,
+                                  read_delay=slow_delay if kind == "slow" else read_delay, seed=i)
+        store = SensorStore(os.path.join(root, f"s{i:02d}"), batch_size=50)
+        sensors.append({"id": f"s{i:02d}", "kind": kind, "backend": backend, "store": store,
+                        "reads": 0, "errors": 0, "max_age": 0.0, "last": None})
+    return sensors
+
+
+def poll(sensor, state):
+    now = time.time()
+    if sensor["last"] is not None:
+        sensor["max_age"] = max(sensor["max_age"], now - sensor["last"])
+    try:
+        temp_c, humidity = sensor["backend"].read()
+    except RuntimeError:
+        sensor["errors"] += 1
+        return
+    sensor["reads"] += 1
+    sensor["last"] = time.time()
+    state.set_sensor_data({"temperature_c": temp_c, "humidity": humidity, "timestamp": sensor["last"]},
+                          only_if_active=False, sensor_id=sensor["id"], primary=False)
+    sensor["store"].append(sensor["last"], temp_c, humidity)
+
+
+def run_jobs(sensors, state, interval, duration):
+    scheduler = Scheduler(log=lambda message, error=False: None)
+    for sensor in sensors:
+        scheduler.add(sensor["id"], interval, lambda s=sensor: poll(s, state))
+    scheduler.start()
+    time.sleep(duration)
+    scheduler.stop()
+
+
+def run_loop(sensors, state, interval, duration):
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            started = time.monotonic()
+            for sensor in sensors:
+                poll(sensor, state)
+            stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    time.sleep(duration)
+    stop.set()
+    thread.join()
+
+
+def report(label, sensors, interval, duration):
+    target = duration / interval
+    print(label)
+    for kind in ("ok", "slow", "failing"):
+        group = [s for s in sensors if s["kind"] == kind]
+        if not group:
+            continue
+        reads = sum(s["reads"] + s["errors"] for s in group) / len(group)
+        ages = [s["max_age"] for s in group if s["last"] is not None]
+        age = f"{max(ages):6.2f} s" if ages else "     -  "
+        print(f"  {kind:8}{len(group):3d} sensors  {reads:5.1f}/{target:.0f} reads each  "
+              f"worst latest-value age {age}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sensors", type=int, default=16)
+    parser.add_argument("--slow", type=int, default=2, help="Sensors that take --slow-delay per read")
+    parser.add_argument("--failing", type=int, default=2, help="Sensors whose every read fails")
+    parser.add_argument("--read-delay", type=float, default=0.25)
+    parser.add_argument("--slow-delay", type=float, default=1.5)
+    parser.add_argument("--interval", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=12.0)
+    args = parser.parse_args()
+
+    for label, runner in [("one loop over all sensors", run_loop),
+                          ("one scheduler job per sensor", run_jobs)]:
+        root = tempfile.mkdtemp(prefix="agrox-bench-sensors-")
+        try:
+            sensors = build(args.sensors, args.slow, args.failing, args.read_delay, args.slow_delay, root)
+            state = SharedState()
+            runner(sensors, state, args.interval, args.duration)
+            for sensor in sensors:
+                sensor["store"].close()
+            report(label, sensors, args.interval, args.duration)
+            print(f"  {len(state.snapshot.sensors)} sensors in the latest-value cache, "
+                  f"{sum(len(s['store'].query()[0]) for s in sensors)} readings stored")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Run the full Flask + monitoring stack headless and measure API throughput.
+
+Starts main.py in a subprocess with the simulated sensor, camera and GPIO
+backends (AGROX_BACKEND=sim) in a temporary working directory, turns the
+system on, then drives each endpoint with concurrent clients and reports
+requests/sec and latency percentiles. By default it runs once with Flask's
+development server and once with the production (waitress) server so the
+two can be compared.
+
+Usage:
+    python3 benchmarks/bench_service.py [--clients 8] [--duration 5]
+    python3 benchmarks/bench_service.py --endpoint /api/sensor --server production
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+RASPBERRY_PI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ENDPOINTS = [
+    "/api/sensor",
+    "/api/control/status",
+    "/api/images/list?limit=50",
+    "/api/sensor/history?bucket=5m",
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service(workdir, port, extra_env=None):
+    env = dict(os.environ, AGROX_BACKEND="sim", PORT=str(port))
+    env.update(extra_env or {})
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(RASPBERRY_PI_DIR, "main.py")],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Service exited with code {proc.returncode}")
+        try:
+            requests.get(f"{base_url}/", timeout=1)
+            return proc, base_url
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Service did not start within 30s")
+
+
+def load(url, clients, duration):
+    """Hit ``url`` from ``clients`` threads for ``duration`` seconds."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker():
+        session = requests.Session()
+        local, local_errors = [], 0
+        while time.monotonic() < stop_at:
+            t0 = time.perf_counter()
+            try:
+                r = session.get(url, timeout=10)
+                if r.status_code >= 500:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+        "errors": errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--endpoint", action="append", help="Endpoint to load (repeatable)")
+    parser.add_argument("--server", action="append", choices=["dev", "production"],
+                        help="SERVER_MODE to run (repeatable, default: both)")
+    args = parser.parse_args()
+
+    print(f"clients: {args.clients}, {args.duration}s per endpoint")
+    print(f"{'server':12}{'endpoint':36}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for mode in args.server or ["dev", "production"]:
+        workdir = tempfile.mkdtemp(prefix="agrox-bench-")
+        proc = None
+        try:
+            proc, base_url = start_service(workdir, free_port(), {"SERVER_MODE": mode})
+            requests.get(f"{base_url}/api/control/on", timeout=5)
+            # Wait for the first simulated reading so /api/sensor returns 200
+            deadline = time.monotonic() + 30
+            while requests.get(f"{base_url}/api/sensor", timeout=5).status_code != 200:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("No sensor reading within 30s")
+                time.sleep(0.2)
+
+            for endpoint in args.endpoint or DEFAULT_ENDPOINTS:
+                r = load(f"{base_url}{endpoint}", args.clients, args.duration)
+                print(f"{mode:12}{endpoint:36}{r['rps']:10.0f}{r['p50']:10.2f}{r['p99']:10.2f}{r['errors']:8d}")
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(10)
+            shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark service startup: time to the first API response and first reading.
+
+Starts main.py with simulated hardware in a scratch directory and polls it.
+``AGROX_SIM_INIT_DELAY`` makes the simulated camera and sensor take as long
+to initialize as real drivers do on a Pi (opening Picamera2 and importing
+the DHT library can take a few seconds each). For each delay it reports:
+
+  first response   first answer from /api/control/status
+  healthy          /api/health reports every subsystem ready
+  first reading    /api/sensor has a reading, with monitoring switched on
+                   as soon as the API answers
+
+Times are from process start and include the interpreter and imports. Use
+--service-dir to time another copy of the service (e.g. an older checkout)
+with the same settings; /api/health is skipped if it doesn't have one.
+
+Usage:
+    python3 benchmarks/bench_startup.py [--delays 0 2 5] [--runs 3] [--service-dir DIR]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLL = 0.01
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get(port, path):
+    """Return (status, JSON body), or None if the server isn't answering yet."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (OSError, ValueError):
+        return None
+
+
+def run_once(service_dir, delay, timeout):
+    port = free_port()
+    cwd = tempfile.mkdtemp(prefix="agrox-bench-startup-")
+    env = dict(os.environ, AGROX_BACKEND="sim", AGROX_SIM_ERROR_RATE="0", AGROX_SIM_INIT_DELAY=str(delay),
+               PORT=str(port), AUTO_UPLOAD_INTERVAL="0", RETENTION_INTERVAL="0")
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(service_dir, "main.py")], cwd=cwd, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    times = {}
+    has_health = True
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline and len(times) < 3:
+            if process.poll() is not None:
+                raise RuntimeError(f"main.py exited with status {process.returncode}")
+            if "response" not in times:
+                if get(port, "/api/control/status") is not None:
+                    times["response"] = time.perf_counter() - started
+                    get(port, "/api/control/on")
+            else:
+                if "reading" not in times:
+                    reply = get(port, "/api/sensor")
+                    if reply is not None and reply[1] and reply[1].get("timestamp"):
+                        times["reading"] = time.perf_counter() - started
+                if "healthy" not in times:
+                    reply = get(port, "/api/health") if has_health else (404, None)
+                    if reply is not None and reply[0] == 404:
+                        has_health = False
+                        times["healthy"] = None
+                    elif reply is not None and reply[0] == 200:
+                        times["healthy"] = time.perf_counter() - started
+            time.sleep(POLL)
+    finally:
+        process.terminate()
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        shutil.rmtree(cwd, ignore_errors=True)
+    return times
+
+
+def fmt(values):
+    values = [v for v in values if v is not None]
+    return f"{statistics.median(values) * 1000:>10.0f} ms" if values else f"{'-':>13}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--delays", type=float, nargs="+", default=[0, 2, 5],
+                        help="Simulated camera/sensor init time in seconds")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--service-dir", default=SERVICE_DIR, help="Directory with the main.py to time")
+    args = parser.parse_args()
+
+    print(f"Median of {args.runs} runs of {os.path.join(args.service_dir, 'main.py')}")
+    print(f"{'init delay':>10}{'first response':>17}{'healthy':>13}{'first reading':>16}")
+    for delay in args.delays:
+        runs = [run_once(args.service_dir, delay, args.timeout) for _ in range(args.runs)]
+        print(f"{delay:>8g} s   {fmt([r.get('response') for r in runs])}"
+              f"{fmt([r.get('healthy') for r in runs])}{fmt([r.get('reading') for r in runs])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark the columnar sensor store against the legacy per-reading CSV path.
+
+Measures append throughput (writes/sec) and time-range query latency for a
+synthetic week of 3-second DHT22 readings.
+
+Usage:
+    python3 benchmarks/bench_store.py [--days 7] [--interval 3]
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from sensor_store import SensorStore, CSV_HEADER
+
+
+def synthetic_readings(start, days, interval):
+    n = int(days * 86400 / interval)
+    ts = start + np.arange(n, dtype=np.int64) * interval
+    rng = np.random.default_rng(42)
+    temp = 28 + 5 * np.sin(ts / 86400 * 2 * np.pi) + rng.normal(0, 0.2, n)
+    hum = 70 + 10 * np.cos(ts / 86400 * 2 * np.pi) + rng.normal(0, 0.5, n)
+    return ts, np.round(temp, 1), np.round(hum, 1)
+
+
+def csv_append(log_dir, ts, temp, hum):
+    """The original log_to_csv pattern: open, append one row, close."""
+    for t, c, h in zip(ts.tolist(), temp.tolist(), hum.tolist()):
+        path = os.path.join(log_dir, f"sensor_log_{datetime.fromtimestamp(t).strftime('%Y%m%d')}.csv")
+        new = not os.path.exists(path)
+        with open(path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(CSV_HEADER)
+            writer.writerow([datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S"), c, c * (9 / 5) + 32, h])
+
+
+def csv_query(log_dir, start, end):
+    """Range query over the CSV logs: parse every row of every file."""
+    rows = []
+    for name in sorted(os.listdir(log_dir)):
+        with open(os.path.join(log_dir, name), newline='') as f:
+            reader = csv.reader(f)
+            next(reader)
+            for row in reader:
+                t = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S").timestamp()
+                if start <= t < end:
+                    rows.append((t, float(row[1]), float(row[3])))
+    return rows
+
+
+def timed(fn, *args, repeat=1):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--interval", type=float, default=3)
+    parser.add_argument("--batch-size", type=int, default=20)
+    args = parser.parse_args()
+
+    start = int(datetime(2025, 5, 13).timestamp())
+    ts, temp, hum = synthetic_readings(start, args.days, args.interval)
+    n = len(ts)
+    work = tempfile.mkdtemp(prefix="agrox-bench-")
+    try:
+        csv_dir = os.path.join(work, "csv")
+        os.makedirs(csv_dir)
+        csv_write, _ = timed(csv_append, csv_dir, ts, temp, hum)
+
+        store = SensorStore(os.path.join(work, "store"), batch_size=args.batch_size)
+        t0 = time.perf_counter()
+        for t, c, h in zip(ts.tolist(), temp.tolist(), hum.tolist()):
+            store.append(t, c, h)
+        store.flush()
+        store_write = time.perf_counter() - t0
+
+        # One-hour window in the middle of the range, and the whole range
+        mid = start + int(args.days * 86400 / 2)
+        windows = [("1 hour", mid, mid + 3600), ("full range", start, start + int(args.days * 86400))]
+
+        print(f"readings: {n} ({args.days} days @ {args.interval}s)")
+        print(f"{'':24}{'csv':>14}{'store':>14}{'speedup':>10}")
+        print(f"{'writes/sec':24}{n / csv_write:14.0f}{n / store_write:14.0f}{csv_write / store_write:9.1f}x")
+        for label, lo, hi in windows:
+            csv_t, csv_rows = timed(csv_query, csv_dir, lo, hi)
+            store_t, store_cols = timed(store.query, lo, hi, repeat=5)
+            assert len(csv_rows) == len(store_cols[0]), (len(csv_rows), len(store_cols[0]))
+            print(f"{'query ' + label + ' (ms)':24}{csv_t * 1000:14.2f}{store_t * 1000:14.3f}{csv_t / store_t:9.0f}x")
+
+        csv_bytes = sum(os.path.getsize(os.path.join(csv_dir, f)) for f in os.listdir(csv_dir))
+        store_bytes = sum(os.path.getsize(os.path.join(dp, f))
+                          for dp, _, files in os.walk(store.root) for f in files)
+        print(f"{'bytes on disk':24}{csv_bytes:14d}{store_bytes:14d}{csv_bytes / store_bytes:9.1f}x")
+        store.close()
+    finally:
+        shutil.rmtree(work)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Load-test /api/stream with many concurrent SSE subscribers.
+
+Starts the service with simulated backends and a fast sensor interval,
+opens N subscriber connections from a single selector-driven client thread,
+and reports per-subscriber event counts, delivery latency (publish time to
+receipt) and how many events slow subscribers dropped.
+
+Usage:
+    python3 benchmarks/bench_stream.py [--subscribers 300] [--duration 10]
+"""
+
+import argparse
+import json
+import selectors
+import shutil
+import socket
+import tempfile
+import time
+
+import requests
+
+from bench_service import free_port, start_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=300)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--sensor-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="agrox-bench-")
+    port = free_port()
+    proc = None
+    sel = selectors.DefaultSelector()
+    try:
+        proc, base_url = start_service(workdir, port, {
+            "SENSOR_INTERVAL": str(args.sensor_interval),
+            "AGROX_SIM_ERROR_RATE": "0",
+            "STREAM_MAX_SUBSCRIBERS": str(args.subscribers + 10),
+            "STREAM_THREADS": str(args.subscribers + 10),
+        })
+
+        clients = []
+        for _ in range(args.subscribers):
+            sock = socket.create_connection(("127.0.0.1", port))
+            sock.sendall(b"GET /api/stream HTTP/1.0\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n")
+            sock.setblocking(False)
+            client = {"buf": b"", "events": 0, "dropped": 0, "latencies": []}
+            sel.register(sock, selectors.EVENT_READ, client)
+            clients.append(client)
+
+        t_connect = time.monotonic()
+        requests.get(f"{base_url}/api/control/on", timeout=5)
+        stats_mid = None
+        deadline = t_connect + args.duration
+        while time.monotonic() < deadline:
+            for key, _ in sel.select(timeout=0.5):
+                data = key.fileobj.recv(65536)
+                if not data:
+                    sel.unregister(key.fileobj)
+                    continue
+                client = key.data
+                client["buf"] += data
+                *messages, client["buf"] = client["buf"].split(b"\n\n")
+                now = time.time()
+                for message in messages:
+                    fields = dict(line.split(b": ", 1) for line in message.split(b"\n") if b": " in line)
+                    if fields.get(b"event") == b"sensor":
+                        client["events"] += 1
+                        client["latencies"].append(now - json.loads(fields[b"data"])["timestamp"])
+                    elif fields.get(b"event") == b"dropped":
+                        client["dropped"] += json.loads(fields[b"data"])["missed"]
+            if stats_mid is None and time.monotonic() > t_connect + args.duration / 2:
+                stats_mid = requests.get(f"{base_url}/api/stream/stats", timeout=5).json()
+
+        counts = sorted(c["events"] for c in clients)
+        latencies = sorted(l for c in clients for l in c["latencies"])
+        print(f"subscribers: {args.subscribers} (server saw {stats_mid['subscribers']}), "
+              f"sensor interval {args.sensor_interval}s, {args.duration}s")
+        print(f"events/subscriber: min {counts[0]}, median {counts[len(counts) // 2]}, max {counts[-1]}")
+        if latencies:
+            print(f"delivery latency: p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, "
+                  f"max {latencies[-1] * 1000:.1f} ms")
+        print(f"dropped events (slow subscribers): {sum(c['dropped'] for c in clients)}")
+    finally:
+        for key in list(sel.get_map().values()):
+            key.fileobj.close()
+        if proc is not None:
+            proc.terminate()
+            proc.wait(10)
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark the compact encodings of wire.py against JSON.
+
+For three payloads it reports the body size, raw and gzipped, and the time
+to encode and decode it:
+
+    /api/sensor          the latest-reading document, with the float
+                         reprs it used to have and rounded as it is now
+    history              a week of 5-minute buckets from /api/sensor/history
+    upload               --readings readings sent to the server: one JSON
+                         upload per reading (what send_to_server posts),
+                         one JSON batch, or one columns batch
+
+MessagePack is included when the optional ``msgpack`` package is installed.
+
+Usage:
+    python3 benchmarks/bench_wire.py [--readings 500]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import history
+import wire
+
+
+def timed(func, arg, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func(arg)
+    return result, (time.perf_counter() - started) / repeat
+
+
+def report(title, rows, repeat):
+    """
+    ``rows``: ``(label, document, encode, decode)``; sizes relative to the
+    first. ``encode`` may return a list of bodies, one per request.
+    """
+    print(f"\n{title}")
+    print(f"  {'':26}{'bytes':>9}{'gzipped':>9}{'encode':>11}{'decode':>11}")
+    baseline = None
+    for label, document, encode, decode in rows:
+        body, encode_time = timed(encode, document, repeat)
+        _, decode_time = timed(decode, body, repeat)
+        bodies = body if isinstance(body, list) else [body]
+        size = sum(len(b) for b in bodies)
+        gzipped = sum(len(gzip.compress(b)) for b in bodies)
+        baseline = baseline or size
+        print(f"  {label:26}{size:>9,}{gzipped:>9,}"
+              f"{encode_time * 1e6:>9.1f}µs{decode_time * 1e6:>9.1f}µs  ({size / baseline:.0%})")
+
+
+def json_encode(document):
+    return json.dumps(document).encode()
+
+
+def formats(label, document, columns=None):
+    rows = [(f"{label} JSON", document, json_encode, json.loads)]
+    if wire.msgpack is not None:
+        rows.append((f"{label} MessagePack", document, wire.pack, wire.unpack))
+    if columns is not None:
+        rows.append((f"{label} columns", columns, lambda c: wire.encode_columns(*c), wire.decode_columns))
+    return rows
+
+
+def readings(n, rng):
+    ts = np.arange(1747164784, 1747164784 + 3 * n, 3, dtype=np.int64)
+    temp_c = np.round(22 + np.cumsum(rng.normal(0, 0.05, n)), 1)
+    humidity = np.round(np.clip(60 + np.cumsum(rng.normal(0, 0.2, n)), 0, 100), 1)
+    return ts, temp_c, humidity
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readings", type=int, default=500)
+    args = parser.parse_args()
+    rng = np.random.default_rng(7)
+    if wire.msgpack is None:
+        print("msgpack is not installed; MessagePack rows are left out")
+
+    # /api/sensor, before and after rounding
+    reading = {"temperature_c": 33.1, "temperature_f": 33.1 * (9 / 5) + 32, "humidity": 76.4,
+               "confidence": 0.83, "timestamp": 1747164784.2731886}
+    old = dict(reading, sensor_id="main", sensors={"main": reading})
+    rounded = {key: round(value, 3) for key, value in reading.items()}
+    new = dict(rounded, sensor_id="main", sensors={"main": rounded})
+    report("/api/sensor", [("before (float reprs)", old, json_encode, json.loads)]
+           + formats("rounded", new), 2000)
+
+    # A week of history at 5-minute buckets
+    ts, temp_c, humidity = readings(7 * 86400 // 3, rng)
+    result = history.aggregate(ts, {"temperature_c": temp_c, "humidity": humidity}, 300)
+    meta = {"from": float(ts[0]), "to": float(ts[-1]), "bucket": "5m", "sensor_id": "main"}
+    table = history.columns(*result, history.AGGREGATES)
+    document = history.document(meta, table)
+    report(f"/api/sensor/history, a week at 5m ({len(result[0]):,} buckets)",
+           formats("history", document, (table, None, meta)), 20)
+
+    # Uploading readings
+    n = args.readings
+    ts, temp_c, humidity = readings(n, rng)
+    singles = [{"temperature": t, "humidity": h} for t, h in zip(temp_c.tolist(), humidity.tolist())]
+    batch = {"items": [{"timestamp": int(s), "temperature_c": t, "humidity": h}
+                       for s, t, h in zip(ts.tolist(), temp_c.tolist(), humidity.tolist())]}
+    columns = ({"timestamp": ts, "temperature_c": temp_c, "humidity": humidity}, None,
+               {"machine_id": "AgroX-37", "sensor_id": "main"})
+    report(f"Uploading {n} readings", [
+        (f"{n} JSON uploads", singles,
+         lambda docs: [json_encode(d) for d in docs],
+         lambda bodies: [json.loads(b) for b in bodies]),
+    ] + formats("one batch", batch, columns), 50)
+    print(f"  (the {n} single uploads are also {n} requests, each with its own HTTP headers)")
+
+
+if __name__ == "__main__":
+    main()
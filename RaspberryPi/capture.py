@@ -0,0 +1,239 @@
+"""
+Image capture pipeline: grab on the camera thread, encode on workers.
+
+``camera.capture_file()`` grabs a frame, encodes it to JPEG and writes it,
+all on the monitoring thread. For a full-resolution still most of that time
+is the encode. Here the camera job only grabs: the frame is copied into one
+of ``buffers`` preallocated RGB arrays and handed to a pool of ``workers``
+threads. They encode it with Pillow, which releases the GIL while it
+encodes, and write it atomically (tmp file + rename), so a reader never
+sees half an image. A frame is dropped, and counted, when every buffer is
+still waiting for a worker. The camera thread never waits on the disk.
+
+The buffer is released as soon as Pillow has taken its own copy of the
+pixels, before encoding, so ``buffers`` only bounds frames not yet picked
+up by a worker.
+
+With a ``detector`` (``motion.ChangeDetector``), each grabbed frame is
+checked on the camera thread, and a frame that has not changed since the
+last kept one is skipped: it is never encoded, written or uploaded. A burst
+is kept or skipped as a whole, on its first frame.
+
+Without Pillow, or with a camera backend that can't grab raw frames, the
+pipeline falls back to ``capture_file()`` on the calling thread. That is
+the original behaviour, with the same stats.
+"""
+
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; the camera then encodes in capture_file
+    Image = None
+
+MODES = ("interval", "burst", "timelapse")
+
+# What became of a grabbed frame
+QUEUED, DROPPED, SKIPPED = "queued", "dropped", "skipped"
+
+# Latency samples kept for the stats percentiles
+LATENCY_SAMPLES = 256
+
+
+def _percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+
+class CapturePipeline:
+    """Preallocated frame buffers and a pool of JPEG encoder threads."""
+
+    def __init__(self, camera, workers=2, buffers=4, quality=85, on_saved=None, detector=None, log=print):
+        """
+        Args:
+            camera: A ``CameraBackend``
+            workers (int): Encoder/writer threads
+            buffers (int): Preallocated frame buffers
+            quality (int): JPEG quality
+            on_saved (callable): ``on_saved(path, latency)`` after a frame is
+                on disk; ``latency`` is seconds from the start of the grab.
+                Called from a worker thread.
+            detector: Optional ``ChangeDetector`` deciding which frames to keep
+            log (callable): ``log(message, error=False)``
+        """
+        self.camera = camera
+        self.workers = max(1, int(workers))
+        self.quality = quality
+        self.on_saved = on_saved
+        self.detector = detector
+        self.log = log
+
+        self.grabbed = 0
+        self.saved = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.errors = 0
+        self._stats_lock = threading.Lock()
+        self._grab_seconds = deque(maxlen=LATENCY_SAMPLES)
+        self._save_seconds = deque(maxlen=LATENCY_SAMPLES)
+
+        self._free = queue.Queue()
+        self._work = queue.Queue()
+        self._threads = []
+        if self.available:
+            width, height = camera.frame_size
+            for _ in range(max(1, int(buffers))):
+                self._free.put(np.empty((height, width, 3), dtype=np.uint8))
+        self.buffers = self._free.qsize()
+
+    @property
+    def available(self):
+        """True if frames are encoded on the workers rather than by the camera."""
+        return Image is not None and getattr(self.camera, "frame_size", None) is not None
+
+    def start(self):
+        if not self.available or self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"capture-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        """Finish the frames already grabbed, then stop the workers."""
+        for _ in self._threads:
+            self._work.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def capture(self, path, detect=True):
+        """
+        Grab a frame to be saved as ``path``.
+
+        Args:
+            path (str): Where the JPEG goes
+            detect (bool): Let the detector skip the frame if it is unchanged
+
+        Returns:
+            str: ``QUEUED``, ``DROPPED`` (no buffer was free) or ``SKIPPED``
+            (unchanged)
+
+        Raises:
+            Exception: Whatever the camera raises on a failed grab
+        """
+        started = time.perf_counter()
+        if not self.available:
+            self.camera.capture_file(path)
+            elapsed = time.perf_counter() - started
+            self._record(grab=elapsed, save=elapsed)
+            if self.on_saved is not None:
+                self.on_saved(path, elapsed)
+            return QUEUED
+
+        try:
+            buf = self._free.get_nowait()
+        except queue.Empty:
+            with self._stats_lock:
+                self.dropped += 1
+            self.log(f"Capture buffers full, dropped frame {os.path.basename(path)}", error=True)
+            return DROPPED
+        try:
+            self.camera.capture_array(buf)
+            keep = not detect or self.detector is None or self.detector.check(buf, time.time())
+        except Exception:
+            self._free.put(buf)
+            raise
+        self._record(grab=time.perf_counter() - started)
+        if not keep:
+            self._free.put(buf)
+            with self._stats_lock:
+                self.skipped += 1
+            return SKIPPED
+        self._work.put((buf, path, started))
+        return QUEUED
+
+    def burst(self, paths, spacing):
+        """
+        Grab one frame per path, ``spacing`` seconds apart. If the first
+        frame is skipped as unchanged, so is the rest of the burst.
+
+        Returns:
+            int: Frames queued
+        """
+        queued = 0
+        for i, path in enumerate(paths):
+            if i:
+                time.sleep(spacing)
+            result = self.capture(path, detect=i == 0)
+            if result == SKIPPED:
+                break
+            queued += result == QUEUED
+        return queued
+
+    def _run(self):
+        while True:
+            item = self._work.get()
+            if item is None:
+                return
+            buf, path, started = item
+            try:
+                # fromarray copies the pixels into Pillow's own image, so the
+                # buffer can go back to the camera before the encode
+                img = Image.fromarray(buf, "RGB")
+            finally:
+                self._free.put(buf)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                img.save(tmp_path, "JPEG", quality=self.quality)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                with self._stats_lock:
+                    self.errors += 1
+                self.log(f"Failed to save {path}: {str(e)}", error=True)
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                continue
+            latency = time.perf_counter() - started
+            self._record(save=latency)
+            if self.on_saved is not None:
+                try:
+                    self.on_saved(path, latency)
+                except Exception as e:
+                    self.log(f"Capture callback failed for {path}: {str(e)}", error=True)
+
+    def _record(self, grab=None, save=None):
+        with self._stats_lock:
+            if grab is not None:
+                self.grabbed += 1
+                self._grab_seconds.append(grab)
+            if save is not None:
+                self.saved += 1
+                self._save_seconds.append(save)
+
+    def stats(self):
+        with self._stats_lock:
+            grab, save = list(self._grab_seconds), list(self._save_seconds)
+            counts = {"grabbed": self.grabbed, "saved": self.saved, "dropped": self.dropped,
+                      "skipped": self.skipped, "errors": self.errors}
+        return dict(
+            counts,
+            pipelined=self.available,
+            workers=self.workers if self.available else 0,
+            buffers=self.buffers,
+            buffers_free=self._free.qsize(),
+            queued=self._work.qsize(),
+            grab_seconds={"p50": _percentile(grab, 0.5), "p95": _percentile(grab, 0.95)},
+            save_seconds={"p50": _percentile(save, 0.5), "p95": _percentile(save, 0.95)},
+        )
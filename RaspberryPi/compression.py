@@ -0,0 +1,159 @@
+"""
+Change-based recording of sensor readings and adaptive sampling.
+
+``ReadingCompressor`` decides which readings are worth persisting and
+uploading. Readings are rows of values (temperature, humidity) and a row is
+kept when any of its values needs it. Modes:
+
+    all             every reading is recorded (the original behaviour)
+    deadband        a reading is recorded when a value has moved more than
+                    its deviation from the last recorded reading
+    swinging_door   swinging-door trending: a reading is recorded only when
+                    the straight line from the last recorded reading can no
+                    longer pass within the deviation of every reading since.
+                    Linear interpolation between the recorded readings
+                    reproduces every dropped reading to within the deviation.
+
+In both compressed modes a heartbeat records a reading at least every
+``max_interval`` seconds, so a flat line still shows the sensor is alive.
+Swinging door decides one reading late: when the door closes, the reading
+*before* the current one is recorded, with its own timestamp.
+
+``AdaptiveInterval`` stretches the sampling interval while readings are
+steady and snaps back to the minimum as soon as they move.
+"""
+
+import math
+
+MODES = ("all", "deadband", "swinging_door")
+
+
+class ReadingCompressor:
+    """Filters a stream of ``(timestamp, values)`` readings down to the ones to record."""
+
+    def __init__(self, mode="all", deviations=(0.2, 1.0), max_interval=300.0):
+        """
+        Args:
+            mode (str): One of ``MODES``
+            deviations (tuple): Allowed error per value, in the value's units
+            max_interval (float): Heartbeat; record at least this often (seconds)
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown recording mode '{mode}', expected one of {', '.join(MODES)}")
+        self.mode = mode
+        self.deviations = tuple(float(d) for d in deviations)
+        self.max_interval = max_interval
+        self.offered = 0
+        self.recorded = 0
+        self._archived = None   # last recorded (ts, values)
+        self._held = None       # latest reading not yet recorded
+        self._upper = None      # per-value steepest slope from the upper pivots
+        self._lower = None      # per-value shallowest slope from the lower pivots
+
+    def offer(self, ts, values):
+        """
+        Add a reading and return the readings to record now, oldest first
+        (usually none or one).
+        """
+        self.offered += 1
+        values = tuple(values)
+        if self.mode == "all" or self._archived is None:
+            return self._record((ts, values))
+        if ts - self._archived[0] >= self.max_interval:
+            if self._held is not None:
+                # Keep the interpolation guarantee for the readings the
+                # doors already covered, then continue from the held one
+                return self._record(self._held) + self._swinging_door(ts, values)
+            return self._record((ts, values))
+        if self.mode == "deadband":
+            last = self._archived[1]
+            if any(abs(v - a) > d for v, a, d in zip(values, last, self.deviations)):
+                return self._record((ts, values))
+            return []
+        return self._swinging_door(ts, values)
+
+    def _swinging_door(self, ts, values):
+        t0, base = self._archived
+        dt = ts - t0
+        if dt <= 0:
+            return []
+        slopes = [(v - b) / dt for v, b in zip(values, base)]
+        if all(u <= s <= l for s, u, l in zip(slopes, self._upper, self._lower)):
+            # The line to this reading stays within the deviation of every
+            # reading since the last recorded one: hold it as the candidate
+            # and narrow the doors with its own deviation band
+            self._upper = [max(u, (v - b - d) / dt)
+                           for u, v, b, d in zip(self._upper, values, base, self.deviations)]
+            self._lower = [min(l, (v - b + d) / dt)
+                           for l, v, b, d in zip(self._lower, values, base, self.deviations)]
+            self._held = (ts, values)
+            return []
+        # A door closed: record the held candidate (always set here, as the
+        # first reading after a record fits the wide-open doors) and restart
+        # the doors from it
+        return self._record(self._held) + self._swinging_door(ts, values)
+
+    def _record(self, reading):
+        self.recorded += 1
+        self._archived = reading
+        self._held = None
+        self._upper = [-math.inf] * len(reading[1])
+        self._lower = [math.inf] * len(reading[1])
+        return [reading]
+
+    def flush(self):
+        """Return the held reading, if any, so nothing is lost at shutdown."""
+        if self._held is None:
+            return []
+        return self._record(self._held)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "deviations": list(self.deviations),
+            "max_interval": self.max_interval,
+            "offered": self.offered,
+            "recorded": self.recorded,
+            "ratio": round(self.offered / self.recorded, 2) if self.recorded else None,
+        }
+
+
+class AdaptiveInterval:
+    """
+    Multiplicative back-off of the sampling interval while readings are calm.
+
+    A reading is "calm" when every value moved less than ``calm_fraction``
+    of its deviation since the previous reading. After ``calm_samples``
+    calm readings in a row the interval grows by ``growth`` (up to
+    ``max_interval``); any non-calm reading resets it to ``min_interval``.
+    """
+
+    def __init__(self, min_interval, max_interval, deviations=(0.2, 1.0),
+                 growth=1.5, calm_samples=3, calm_fraction=0.5):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.deviations = tuple(float(d) for d in deviations)
+        self.growth = growth
+        self.calm_samples = calm_samples
+        self.calm_fraction = calm_fraction
+        self.interval = min_interval
+        self._previous = None
+        self._calm = 0
+
+    def update(self, values):
+        """Feed the latest reading and return the interval to sample at next."""
+        values = tuple(values)
+        previous, self._previous = self._previous, values
+        if previous is None:
+            return self.interval
+        calm = all(abs(v - p) < d * self.calm_fraction
+                   for v, p, d in zip(values, previous, self.deviations))
+        if not calm:
+            self._calm = 0
+            self.interval = self.min_interval
+        else:
+            self._calm += 1
+            if self._calm >= self.calm_samples:
+                self._calm = 0
+                self.interval = min(self.max_interval, self.interval * self.growth)
+        return self.interval
@@ -0,0 +1,345 @@
+"""
+Bulk import of legacy ``logs/sensor_log_YYYYMMDD.csv`` files into the
+sensor store.
+
+Older versions logged every reading straight to a CSV per day, and the
+schema drifted: rows used to have ``sensor_active,camera_active`` columns
+after the ``CSV_HEADER`` ones. A file keeps the header it was created
+with, so e.g. 20250513's header has the extra columns but most of its
+rows don't. Each row is read with the layout that matches its number of
+fields, the header's or ``CSV_HEADER``'s.
+
+Files are parsed in parallel, one per worker process, without
+``csv.reader``: a file is split into fields with a few bytes operations,
+each number column is converted by NumPy in one call, and the fixed-width
+timestamps are decoded from their digits as arrays. Malformed rows (a
+truncated last line, a wrong field count, an unparsable value) are
+skipped and counted. The readings are then grouped by day, merged with
+what the store already holds for the day, deduplicated by timestamp (a
+stored reading wins over an imported one) and written with
+``write_day``. Today and days already rolled up by retention are left
+alone.
+
+Each run saves the size and mtime of the files it imported to a state
+file; with ``--incremental`` only files that changed since are read.
+Derived metrics (derived.py) for the imported days are backfilled at the
+next startup, or by ``python3 derived.py``.
+
+Usage:
+    python3 csv_import.py [--logs logs] [--store logs/store] [--incremental] [--workers N]
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sensor_store import CSV_HEADER, SensorStore, day_bounds, day_key
+
+LOG_PATTERN = re.compile(r"^sensor_log_(\d{8})\.csv$")
+STATE_PATH = os.path.join("cache", "csv_import.json")
+
+# "YYYY-MM-DD HH:MM:SS" (or with a "T"): the offsets of each part
+TIMESTAMP_WIDTH = 19
+TIMESTAMP_DIGITS = (0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18)
+TIMESTAMP_SEPARATORS = {4: b"-", 7: b"-", 13: b":", 16: b":"}
+
+
+def scan_logs(log_dir):
+    """Paths of the ``sensor_log_YYYYMMDD.csv`` files in ``log_dir``, oldest day first."""
+    try:
+        names = os.listdir(log_dir)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(log_dir, name) for name in sorted(names) if LOG_PATTERN.match(name)]
+
+
+def parse_csv(data, value_name="humidity"):
+    """
+    Parse the bytes of a sensor_log CSV.
+
+    Returns:
+        tuple: ``(timestamps, temperature_c, values, skipped)``: int64 epoch
+        seconds and float32 columns in file order, and the number of
+        malformed rows left out
+
+    Raises:
+        ValueError: If the header lacks one of the needed columns
+    """
+    data = data.replace(b"\r", b"")
+    header, _, body = data.partition(b"\n")
+    names = header.decode("utf-8", "replace").lstrip("\ufeff").strip().split(",")
+    needed = ("timestamp", "temperature_c", value_name)
+    if not all(name in names for name in needed):
+        raise ValueError(f"header has no {', '.join(needed)} columns: {header[:200]!r}")
+    # A file is only given a header when it is created, so after a schema
+    # change the rest of the day's rows follow CSV_HEADER under the old
+    # header. Each row's layout is picked by its number of fields.
+    layouts = {len(names): names}
+    layouts.setdefault(len(CSV_HEADER), CSV_HEADER[:3] + [value_name])
+
+    # Line boundaries and per-line field counts straight from the bytes
+    buf = np.frombuffer(body, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord("\n"))
+    if len(buf) and buf[-1] != ord("\n"):
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate(([0], ends[:-1] + 1)).astype(np.int64)
+    commas = np.concatenate(([0], np.cumsum(buf == ord(","))))
+    widths = commas[ends] - commas[starts] + 1
+    # Blank lines are not rows, so they don't count as skipped
+    rows = int(np.count_nonzero(ends > starts))
+
+    parts = []
+    for width, layout in layouts.items():
+        lines = np.flatnonzero((widths == width) & (ends > starts))
+        if not len(lines):
+            continue
+        fields = _lines(body, starts, ends, lines).replace(b"\n", b",").split(b",")
+        ts, ok = _timestamps(np.array(fields[layout.index("timestamp")::width]))
+        temp_c = _floats(fields[layout.index("temperature_c")::width])
+        values = _floats(fields[layout.index(value_name)::width])
+        ok &= ~(np.isnan(temp_c) | np.isnan(values))
+        parts.append((lines[ok], ts[ok], temp_c[ok], values[ok]))
+    if not parts:
+        return _empty() + (rows,)
+
+    lines, ts, temp_c, values = (np.concatenate(columns) for columns in zip(*parts))
+    order = np.argsort(lines, kind="stable")
+    return ts[order], temp_c[order].astype(np.float32), values[order].astype(np.float32), rows - len(ts)
+
+
+def _lines(body, starts, ends, lines):
+    """The given lines of ``body`` joined by newlines, slicing out each run of adjacent lines whole."""
+    breaks = np.flatnonzero(np.diff(lines) != 1)
+    first = lines[np.concatenate(([0], breaks + 1))]
+    last = lines[np.concatenate((breaks, [len(lines) - 1]))]
+    return b"\n".join(body[starts[a]:ends[b]] for a, b in zip(first.tolist(), last.tolist()))
+
+
+def parse_file(path, value_name="humidity"):
+    """``parse_csv`` of one file; runs in the worker processes."""
+    with open(path, "rb") as f:
+        return parse_csv(f.read(), value_name)
+
+
+def _empty():
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+
+
+def _floats(fields):
+    try:
+        return np.array(fields).astype(np.float64)
+    except ValueError:
+        # A bad value somewhere; convert one by one and drop the bad rows
+        return np.array([_float(field) for field in fields], dtype=np.float64)
+
+
+def _float(field):
+    try:
+        return float(field)
+    except ValueError:
+        return np.nan
+
+
+def _timestamps(column):
+    """
+    Decode ``YYYY-MM-DD HH:MM:SS`` local times to epoch seconds.
+
+    Returns:
+        tuple: ``(timestamps, ok)`` where ``ok`` marks the well-formed ones
+    """
+    ok = np.ones(len(column), dtype=bool)
+    if column.dtype.itemsize != TIMESTAMP_WIDTH:
+        ok &= np.char.str_len(column) == TIMESTAMP_WIDTH
+        column = column.astype(f"S{TIMESTAMP_WIDTH}")
+    chars = np.frombuffer(column.tobytes(), dtype=np.uint8).reshape(-1, TIMESTAMP_WIDTH)
+    for offset, separator in TIMESTAMP_SEPARATORS.items():
+        ok &= chars[:, offset] == ord(separator)
+    ok &= (chars[:, 10] == ord(" ")) | (chars[:, 10] == ord("T"))
+    digits = chars[:, TIMESTAMP_DIGITS].astype(np.int64) - ord("0")
+    ok &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+
+    def number(first, count):
+        value = np.zeros(len(digits), dtype=np.int64)
+        for i in range(first, first + count):
+            value = value * 10 + digits[:, i]
+        return value
+
+    year, month, day = number(0, 4), number(4, 2), number(6, 2)
+    hour, minute, second = number(8, 2), number(10, 2), number(12, 2)
+    ok &= ((year >= 1970) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+           & (hour <= 23) & (minute <= 59) & (second <= 59))
+    # Zero the parts of bad rows so they can't overflow the date arithmetic
+    year, month, day, hour, minute, second = (np.where(ok, part, fallback) for part, fallback in (
+        (year, 1970), (month, 1), (day, 1), (hour, 0), (minute, 0), (second, 0)))
+    months = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+    dates = months.astype("datetime64[D]") + (day - 1)
+    ok &= dates.astype("datetime64[M]") == months  # e.g. February 30th
+    naive = dates.astype(np.int64) * 86400 + hour * 3600 + minute * 60 + second
+    return _local_to_epoch(naive), ok
+
+
+def _local_to_epoch(naive):
+    """Epoch seconds of local times given as seconds since local 1970-01-01 00:00."""
+    if not len(naive):
+        return naive
+    # The UTC offset only changes on the hour, so look it up once per hour
+    hours, inverse = np.unique(naive // 3600, return_inverse=True)
+    offsets = np.array([int(time.mktime(time.gmtime(h * 3600)[:8] + (-1,))) - h * 3600
+                        for h in hours.tolist()], dtype=np.int64)
+    return naive + offsets[inverse.reshape(-1)]
+
+
+def import_logs(paths, store, workers=None, today=None, log=print):
+    """
+    Parse ``paths`` in parallel and merge their readings into ``store``.
+
+    Args:
+        paths (list): sensor_log CSV files
+        store (SensorStore): Destination store
+        workers (int, optional): Worker processes (default: one per core)
+        today (str, optional): ``YYYYMMDD`` of the day the running app appends to
+        log (callable): ``log(message, error=False)``
+
+    Returns:
+        dict: ``{"files", "failed", "imported", "rows", "skipped", "duplicates",
+        "written", "days", "seconds"}``; ``imported`` lists the files done
+        with, i.e. all but those that failed or have readings from today
+    """
+    today = day_key(time.time()) if today is None else today
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths) or 1))
+    started = time.perf_counter()
+    summary = {"files": len(paths), "failed": 0, "imported": [], "rows": 0, "skipped": 0,
+               "duplicates": 0, "written": 0, "days": 0}
+
+    parsed = []
+    if workers == 1:
+        results = [(path, _call(parse_file, path, store.value_name)) for path in paths]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [(path, executor.submit(parse_file, path, store.value_name)) for path in paths]
+            results = [(path, _call(future.result)) for path, future in futures]
+    for path, (result, error) in results:
+        if error is not None:
+            summary["failed"] += 1
+            log(f"Can't import {path}: {error}", error=True)
+            continue
+        ts, temp_c, values, skipped = result
+        summary["rows"] += len(ts)
+        summary["skipped"] += skipped
+        parsed.append((path, ts, temp_c, values))
+    if not parsed:
+        summary["seconds"] = round(time.perf_counter() - started, 4)
+        return summary
+
+    ts, temp_c, values = (np.concatenate(columns) for columns in zip(*[p[1:] for p in parsed]))
+    order = np.argsort(ts, kind="stable")
+    ts, temp_c, values = ts[order], temp_c[order], values[order]
+
+    left_out = []
+    rolled_up = set(store.rollup_days())
+    i = 0
+    while i < len(ts):
+        day = day_key(int(ts[i]))
+        j = int(np.searchsorted(ts, day_bounds(day)[1], side="left"))
+        if day == today or day in rolled_up:
+            left_out.append(day)
+        else:
+            summary["duplicates"] += _merge_day(store, day, ts[i:j], temp_c[i:j], values[i:j], summary)
+        i = j
+    if left_out:
+        log(f"Not imported: readings from {', '.join(left_out)} (today, or already rolled up by retention)")
+
+    # Today's readings can be imported tomorrow, so files with some aren't done yet
+    lo, hi = day_bounds(today)
+    summary["imported"] = [path for path, file_ts, _, _ in parsed
+                           if not np.any((file_ts >= lo) & (file_ts < hi))]
+    summary["seconds"] = round(time.perf_counter() - started, 4)
+    return summary
+
+
+def _call(func, *args):
+    try:
+        return func(*args), None
+    except (OSError, ValueError) as e:
+        return None, str(e)
+
+
+def _merge_day(store, day, ts, temp_c, values, summary):
+    """Merge one day's imported readings into the store; returns the duplicates dropped."""
+    stored = [np.array(column) for column in store.read_day(day)]
+    merged = [np.concatenate(pair) for pair in zip(stored, (ts, temp_c, values))]
+    # Stored readings come first, so the stable sort keeps them over imported ones
+    order = np.argsort(merged[0], kind="stable")
+    merged = [column[order] for column in merged]
+    keep = np.concatenate(([True], np.diff(merged[0]) != 0))
+    new = int(np.count_nonzero(keep)) - len(stored[0])
+    if new > 0:
+        store.write_day(day, *(column[keep] for column in merged))
+        summary["written"] += new
+        summary["days"] += 1
+    return len(ts) - max(new, 0)
+
+
+def load_state(path):
+    """File name -> ``[size, mtime_ns]`` as of the last import."""
+    try:
+        with open(path) as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, files):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"files": files}, f)
+    os.replace(tmp_path, path)
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import legacy sensor_log CSV files into the sensor store.")
+    parser.add_argument("--logs", default="logs", help="Directory with the sensor_log_YYYYMMDD.csv files")
+    parser.add_argument("--store", default=os.path.join("logs", "store"), help="Sensor store directory")
+    parser.add_argument("--state", default=STATE_PATH, help="Where to remember the files already imported")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only import files added or changed since the last run")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: one per core)")
+    args = parser.parse_args()
+
+    paths = scan_logs(args.logs)
+    state = load_state(args.state)
+    if args.incremental:
+        unchanged = [p for p in paths if state.get(os.path.basename(p)) == file_signature(p)]
+        paths = [p for p in paths if p not in set(unchanged)]
+        print(f"{len(unchanged)} files unchanged since the last import")
+
+    store = SensorStore(args.store)
+    signatures = {path: file_signature(path) for path in paths}
+    summary = import_logs(paths, store, workers=args.workers,
+                          log=lambda message, error=False: print(message))
+    for path in summary["imported"]:
+        state[os.path.basename(path)] = signatures[path]
+    save_state(args.state, state)
+
+    seconds = summary["seconds"]
+    rate = summary["rows"] / seconds if seconds else 0
+    print(f"{summary['files']} files, {summary['rows']:,} rows in {seconds:.2f} s ({rate:,.0f} rows/s)")
+    print(f"  {summary['written']:,} new readings on {summary['days']} days, "
+          f"{summary['duplicates']:,} duplicates, {summary['skipped']:,} malformed rows skipped"
+          + (f", {summary['failed']} files failed" if summary["failed"] else ""))
+
+
+if __name__ == "__main__":
+    main()
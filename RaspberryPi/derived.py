@@ -0,0 +1,322 @@
+"""
+Derived agronomic metrics: VPD, dew point, heat index and growing degree days.
+
+The formulas are NumPy expressions that work on single readings and whole
+columns alike, so the streaming engine and the batch backfill share them:
+
+    vpd_kpa       vapour pressure deficit of the air (Tetens), kPa
+    dew_point_c   dew point (Magnus, Sonntag 1990 constants), °C
+    heat_index_c  NWS heat index (Rothfusz regression with adjustments), °C
+    gdd           growing degree days so far today: the time integral of
+                  ``min(T, cap) - base`` above ``base``, trapezoid rule
+
+``DerivedMetrics`` updates these for each published reading in O(1), along
+with rolling 1 h and 24 h min/max/mean of temperature, humidity and the
+derived values. Each window is a ring buffer of per-bucket accumulators (60
+one-minute buckets for 1 h, 288 five-minute buckets for 24 h), so a reading
+touches one bucket and memory stays fixed however often the sensor is read.
+A window ends now and starts within one bucket of its nominal length.
+
+Recorded readings also get their derived values stored in a ``SensorStore``
+with one column per metric, next to the raw store. ``backfill()`` computes
+them for past days of the raw store in one vectorized pass per day.
+
+Usage:
+    python3 derived.py [--store logs/store] [--force]
+"""
+
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+from sensor_store import SensorStore, day_bounds, day_key
+
+FIELDS = ("vpd_kpa", "dew_point_c", "heat_index_c", "gdd")
+# Values with rolling windows: the raw reading and the instantaneous metrics
+WINDOW_FIELDS = ("temperature_c", "humidity", "vpd_kpa", "dew_point_c", "heat_index_c")
+# name -> (seconds, buckets)
+WINDOWS = {"1h": (3600, 60), "24h": (86400, 288)}
+
+GDD_BASE_C = 10.0
+GDD_CAP_C = 30.0
+# Gaps between readings longer than this (sensor off, Pi down) add no degree days
+MAX_GAP = 900
+DERIVED_DIR = "derived"
+
+
+def vapor_pressure_deficit(temp_c, humidity):
+    """Air VPD in kPa: saturation vapour pressure (Tetens) times the unsaturated fraction."""
+    temp_c = np.asarray(temp_c, dtype=np.float64)
+    saturation = 0.61078 * np.exp(17.27 * temp_c / (temp_c + 237.3))
+    return saturation * (1 - np.clip(humidity, 0, 100) / 100)
+
+
+def dew_point(temp_c, humidity):
+    """Dew point in °C (Magnus formula)."""
+    temp_c = np.asarray(temp_c, dtype=np.float64)
+    gamma = np.log(np.clip(humidity, 0.1, 100) / 100) + 17.62 * temp_c / (243.12 + temp_c)
+    return 243.12 * gamma / (17.62 - gamma)
+
+
+def heat_index(temp_c, humidity):
+    """NWS heat index in °C; the simple Steadman estimate below about 27 °C."""
+    t = np.asarray(temp_c, dtype=np.float64) * 9 / 5 + 32
+    rh = np.clip(humidity, 0, 100)
+    simple = 0.5 * (t + 61.0 + (t - 68.0) * 1.2 + rh * 0.094)
+    full = (-42.379 + 2.04901523 * t + 10.14333127 * rh - 0.22475541 * t * rh
+            - 0.00683783 * t * t - 0.05481717 * rh * rh + 0.00122874 * t * t * rh
+            + 0.00085282 * t * rh * rh - 0.00000199 * t * t * rh * rh)
+    dry = (rh < 13) & (t >= 80) & (t <= 112)
+    full = np.where(dry, full - (13 - rh) / 4 * np.sqrt(np.maximum(0, 17 - np.abs(t - 95)) / 17), full)
+    humid = (rh > 85) & (t >= 80) & (t <= 87)
+    full = np.where(humid, full + (rh - 85) / 10 * (87 - t) / 5, full)
+    hi_f = np.where((simple + t) / 2 >= 80, full, simple)
+    return (hi_f - 32) * 5 / 9
+
+
+def degree_days(ts, temp_c, base=GDD_BASE_C, cap=GDD_CAP_C, max_gap=MAX_GAP):
+    """
+    Cumulative growing degree days at each reading of one day (sorted ``ts``),
+    starting from 0 at the first reading.
+    """
+    effective = np.clip(np.asarray(temp_c, dtype=np.float64), base, cap) - base
+    dt = np.diff(np.asarray(ts, dtype=np.float64))
+    dt[dt > max_gap] = 0
+    steps = (effective[1:] + effective[:-1]) / 2 * dt / 86400
+    return np.concatenate(([0.0], np.cumsum(steps)))
+
+
+def compute(ts, temp_c, humidity, base=GDD_BASE_C, cap=GDD_CAP_C, max_gap=MAX_GAP):
+    """All ``FIELDS`` for one day of sorted readings, as float32 columns."""
+    columns = (vapor_pressure_deficit(temp_c, humidity), dew_point(temp_c, humidity),
+               heat_index(temp_c, humidity), degree_days(ts, temp_c, base, cap, max_gap))
+    return tuple(np.asarray(c, dtype=np.float32) for c in columns)
+
+
+class RollingWindow:
+    """min/max/mean of several values over a sliding window, in fixed-size buckets."""
+
+    def __init__(self, seconds, buckets, width):
+        self.seconds = seconds
+        self.buckets = buckets
+        self.bucket_seconds = seconds // buckets
+        self._ids = np.full(buckets, -1, dtype=np.int64)
+        self._counts = np.zeros(buckets, dtype=np.int64)
+        self._sums = np.zeros((buckets, width))
+        self._mins = np.zeros((buckets, width))
+        self._maxs = np.zeros((buckets, width))
+
+    def add(self, timestamp, values):
+        """Add one reading: O(width)."""
+        values = np.asarray(values, dtype=np.float64)
+        self._merge(int(timestamp // self.bucket_seconds), 1, values, values, values)
+
+    def extend(self, ts, values):
+        """Add sorted readings at once (``values`` has a row per reading), e.g. from stored history."""
+        if len(ts) == 0:
+            return
+        ids = np.asarray(ts, dtype=np.int64) // self.bucket_seconds
+        keep = ids > ids[-1] - self.buckets
+        ids, values = ids[keep], np.asarray(values, dtype=np.float64)[keep]
+        starts = np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1])))
+        counts = np.diff(np.append(starts, len(ids)))
+        sums = np.add.reduceat(values, starts)
+        mins = np.minimum.reduceat(values, starts)
+        maxs = np.maximum.reduceat(values, starts)
+        for k, bucket in enumerate(ids[starts].tolist()):
+            self._merge(bucket, int(counts[k]), sums[k], mins[k], maxs[k])
+
+    def _merge(self, bucket, count, sums, mins, maxs):
+        slot = bucket % self.buckets
+        if self._ids[slot] != bucket:
+            if self._ids[slot] > bucket:
+                return  # older than the window
+            self._ids[slot] = bucket
+            self._counts[slot] = count
+            self._sums[slot] = sums
+            self._mins[slot] = mins
+            self._maxs[slot] = maxs
+            return
+        self._counts[slot] += count
+        self._sums[slot] += sums
+        np.minimum(self._mins[slot], mins, out=self._mins[slot])
+        np.maximum(self._maxs[slot], maxs, out=self._maxs[slot])
+
+    def summary(self, now, fields):
+        """``{"count", <field>: {"min", "max", "mean"}}`` over the window ending at ``now``."""
+        current = int(now // self.bucket_seconds)
+        valid = (self._ids > current - self.buckets) & (self._ids <= current)
+        count = int(self._counts[valid].sum())
+        result = {"count": count}
+        if count == 0:
+            return result
+        mins = self._mins[valid].min(axis=0)
+        maxs = self._maxs[valid].max(axis=0)
+        means = self._sums[valid].sum(axis=0) / count
+        for i, field in enumerate(fields):
+            result[field] = {"min": round(float(mins[i]), 2), "max": round(float(maxs[i]), 2),
+                             "mean": round(float(means[i]), 2)}
+        return result
+
+
+class DerivedMetrics:
+    """Streaming derived metrics and rolling windows for one temperature/humidity sensor."""
+
+    def __init__(self, store=None, gdd_base=GDD_BASE_C, gdd_cap=GDD_CAP_C, max_gap=MAX_GAP):
+        """
+        Args:
+            store (SensorStore, optional): Store with ``FIELDS`` columns for recorded readings
+            gdd_base (float): Base temperature of the degree-day sum, °C
+            gdd_cap (float): Temperatures above this count as this, °C
+            max_gap (float): Longest gap between readings that adds degree days, seconds
+        """
+        self.store = store
+        self.gdd_base = gdd_base
+        self.gdd_cap = gdd_cap
+        self.max_gap = max_gap
+        self.windows = {name: RollingWindow(seconds, buckets, len(WINDOW_FIELDS))
+                        for name, (seconds, buckets) in WINDOWS.items()}
+        self.latest = None
+        self.updates = 0
+        self._lock = threading.Lock()
+        # Degree days so far on _gdd_day, and the effective temperature and time of the last reading
+        self._gdd_day = None
+        self._gdd = 0.0
+        self._previous_gdd = 0.0
+        self._last = None
+
+    def seed(self, ts, temp_c, humidity, now=None):
+        """
+        Fill the windows and today's degree days from stored readings (the
+        last 24 h of the raw store), e.g. after a restart. Does nothing once
+        ``update()`` has been called.
+        """
+        now = time.time() if now is None else now
+        ts = np.asarray(ts, dtype=np.int64)
+        if len(ts) == 0:
+            return
+        vpd, dew, hi = (vapor_pressure_deficit(temp_c, humidity), dew_point(temp_c, humidity),
+                        heat_index(temp_c, humidity))
+        values = np.column_stack((temp_c, humidity, vpd, dew, hi))
+        today = day_key(now)
+        with self._lock:
+            if self.updates:
+                return
+            for window in self.windows.values():
+                window.extend(ts, values)
+            start = int(np.searchsorted(ts, day_bounds(today)[0]))
+            if start < len(ts):
+                gdd = degree_days(ts[start:], temp_c[start:], self.gdd_base, self.gdd_cap, self.max_gap)
+                self._gdd_day, self._gdd = today, float(gdd[-1])
+            self._last = (int(ts[-1]), self._effective(float(temp_c[-1])))
+            self.latest = self._reading(int(ts[-1]), float(temp_c[-1]), float(humidity[-1]),
+                                        float(vpd[-1]), float(dew[-1]), float(hi[-1]))
+
+    def update(self, timestamp, temp_c, humidity):
+        """Fold in one published reading. Returns the derived values, with today's degree days as ``gdd``."""
+        vpd = float(vapor_pressure_deficit(temp_c, humidity))
+        dew = float(dew_point(temp_c, humidity))
+        hi = float(heat_index(temp_c, humidity))
+        effective = self._effective(temp_c)
+        day = day_key(timestamp)
+        with self._lock:
+            if day != self._gdd_day:
+                self._previous_gdd = self._gdd if self._gdd_day is not None else 0.0
+                self._gdd_day, self._gdd = day, 0.0
+            elif self._last is not None and 0 < timestamp - self._last[0] <= self.max_gap:
+                self._gdd += (self._last[1] + effective) / 2 * (timestamp - self._last[0]) / 86400
+            self._last = (timestamp, effective)
+            for window in self.windows.values():
+                window.add(timestamp, (temp_c, humidity, vpd, dew, hi))
+            self.latest = self._reading(timestamp, temp_c, humidity, vpd, dew, hi)
+            self.updates += 1
+            return dict(self.latest, gdd=self._gdd)
+
+    def record(self, timestamp, temp_c, humidity):
+        """Store the derived values of a recorded reading (one the recorder kept)."""
+        if self.store is None:
+            return
+        with self._lock:
+            # The recorder can pass a reading on after the next day has begun
+            gdd = self._gdd if day_key(timestamp) == self._gdd_day else self._previous_gdd
+        self.store.append(timestamp, float(vapor_pressure_deficit(temp_c, humidity)),
+                          float(dew_point(temp_c, humidity)), float(heat_index(temp_c, humidity)), gdd)
+
+    def summary(self, now=None):
+        """Latest derived values, today's degree days and the rolling windows, or None before any reading."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.latest is None:
+                return None
+            return dict(
+                self.latest,
+                gdd={"today": round(self._gdd if self._gdd_day == day_key(now) else 0.0, 4),
+                     "base_c": self.gdd_base, "cap_c": self.gdd_cap},
+                windows={name: window.summary(now, WINDOW_FIELDS) for name, window in self.windows.items()},
+            )
+
+    def _effective(self, temp_c):
+        return min(max(temp_c, self.gdd_base), self.gdd_cap) - self.gdd_base
+
+    @staticmethod
+    def _reading(timestamp, temp_c, humidity, vpd, dew, hi):
+        return {
+            "timestamp": timestamp,
+            "temperature_c": temp_c,
+            "humidity": humidity,
+            "vpd_kpa": round(vpd, 3),
+            "dew_point_c": round(dew, 2),
+            "heat_index_c": round(hi, 2),
+        }
+
+
+def derived_store(store, **kwargs):
+    """The ``SensorStore`` of derived metrics kept next to a raw store."""
+    return SensorStore(os.path.join(store.root, DERIVED_DIR), fields=FIELDS,
+                       csv_prefix=f"derived_{store.csv_prefix}", **kwargs)
+
+
+def backfill(raw, derived, today=None, force=False, base=GDD_BASE_C, cap=GDD_CAP_C, max_gap=MAX_GAP):
+    """
+    Compute and store the derived metrics of every finished day in ``raw``
+    whose derived segment is missing or incomplete (every day with ``force``).
+
+    Returns:
+        dict: ``{"days", "rows", "seconds"}``
+    """
+    today = day_key(time.time()) if today is None else today
+    started = time.perf_counter()
+    days = rows = 0
+    rolled_up = set(derived.rollup_days())
+    for day in raw.days():
+        if day >= today:
+            break
+        if day in rolled_up:
+            continue
+        ts, temp_c, humidity = raw.read_day(day)
+        if not force and len(derived.read_day(day)[0]) == len(ts):
+            continue
+        derived.write_day(day, ts, *compute(ts, temp_c, humidity, base, cap, max_gap))
+        days += 1
+        rows += len(ts)
+    return {"days": days, "rows": rows, "seconds": round(time.perf_counter() - started, 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill derived metrics for past days of a sensor store.")
+    parser.add_argument("--store", default=os.path.join("logs", "store"), help="Raw sensor store directory")
+    parser.add_argument("--force", action="store_true", help="Recompute days that already have derived metrics")
+    parser.add_argument("--gdd-base", type=float, default=GDD_BASE_C)
+    parser.add_argument("--gdd-cap", type=float, default=GDD_CAP_C)
+    args = parser.parse_args()
+
+    raw = SensorStore(args.store)
+    summary = backfill(raw, derived_store(raw), force=args.force, base=args.gdd_base, cap=args.gdd_cap)
+    print(f"{summary['days']} days, {summary['rows']:,} readings in {summary['seconds']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
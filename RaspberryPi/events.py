@@ -0,0 +1,123 @@
+"""
+Fan-out of live events to Server-Sent Events subscribers.
+
+Every published event is encoded to its SSE wire form once and appended to a
+shared ring buffer. Subscribers don't get their own queues; each one keeps a
+cursor (the id of the last event it sent) into the ring. So publishing costs
+the same whether there are 0 or 500 subscribers, and a slow client never
+makes the publisher block or buffer more memory.
+
+A subscriber that falls so far behind that its next event has been
+overwritten skips ahead to the oldest event still in the ring and is sent a
+``dropped`` event with the number of events it missed. Clients reconnecting
+with ``Last-Event-ID`` resume from where they left off if the ring still
+has those events.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+
+def encode_event(event_id, event_type, data):
+    """Return the SSE wire form of one event as bytes."""
+    payload = json.dumps(data, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode()
+
+
+class EventBroadcaster:
+    """Shared ring buffer of encoded events with blocking subscriber reads."""
+
+    def __init__(self, buffer_size=256, max_subscribers=500, keepalive=15.0):
+        """
+        Args:
+            buffer_size (int): Events kept for slow or reconnecting clients
+            max_subscribers (int): Concurrent subscriber limit
+            keepalive (float): Seconds of silence before a keep-alive comment
+        """
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.keepalive = keepalive
+        self._ring = deque(maxlen=buffer_size)  # (event_id, encoded bytes)
+        self._next_id = 1
+        self._cond = threading.Condition()
+        self._subscribers = 0
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, event_type, data):
+        """Append an event and wake all subscribers. Never blocks on clients."""
+        with self._cond:
+            event_id = self._next_id
+            self._next_id += 1
+            self._ring.append((event_id, encode_event(event_id, event_type, data)))
+            self.published += 1
+            self._cond.notify_all()
+        return event_id
+
+    @property
+    def subscribers(self):
+        return self._subscribers
+
+    def stats(self):
+        with self._cond:
+            return {
+                "subscribers": self._subscribers,
+                "max_subscribers": self.max_subscribers,
+                "published": self.published,
+                "dropped": self.dropped,
+                "buffered": len(self._ring),
+                "last_event_id": self._next_id - 1,
+            }
+
+    def subscribe(self, last_event_id=None):
+        """
+        Return a generator of SSE byte chunks for one client, or None if the
+        subscriber limit has been reached.
+
+        Args:
+            last_event_id (int, optional): Resume after this event id
+        """
+        with self._cond:
+            if self._subscribers >= self.max_subscribers:
+                return None
+            self._subscribers += 1
+            # New clients start with the next event; resuming clients pick up
+            # after the last one they saw
+            cursor = self._next_id - 1
+            if last_event_id is not None and last_event_id < cursor:
+                cursor = max(0, last_event_id)
+        return self._stream(cursor)
+
+    def _stream(self, cursor):
+        try:
+            yield "retry: 3000\n: connected\n\n".encode()
+            while True:
+                with self._cond:
+                    if self._next_id - 1 <= cursor:
+                        self._cond.wait(self.keepalive)
+                    if self._next_id - 1 <= cursor:
+                        chunk = b": keep-alive\n\n"
+                    else:
+                        chunk, cursor = self._collect(cursor)
+                # Write outside the lock so a slow socket only stalls this client
+                yield chunk
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+    def _collect(self, cursor):
+        """Return every event after ``cursor`` as one chunk (lock held)."""
+        oldest = self._ring[0][0]
+        parts = []
+        if cursor + 1 < oldest:
+            missed = oldest - cursor - 1
+            self.dropped += missed
+            parts.append(encode_event(oldest - 1, "dropped", {"missed": missed, "timestamp": time.time()}))
+            cursor = oldest - 1
+        # Event ids in the ring are contiguous, so the start index is direct
+        start = cursor + 1 - oldest
+        for i in range(start, len(self._ring)):
+            parts.append(self._ring[i][1])
+        return b"".join(parts), self._ring[-1][0]
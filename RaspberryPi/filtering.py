@@ -0,0 +1,222 @@
+"""
+Robust filtering of raw sensor reads.
+
+Most DHT22 reads are good. Some fail outright (checksum errors). Now and
+then one passes the checksum with a value that is simply wrong, such as a
+30 % humidity spike or a temperature of -3276.8. ``ReadingFilter`` sits
+between a sensor driver and everything that consumes its readings:
+
+    1. Plausibility: a value outside the quantity's physical range
+       (``LIMITS``) is rejected. So is one that moved faster since the
+       last accepted sample than the quantity can (``MAX_RATES``, per
+       second). If several samples in a row are rejected only for their
+       rate, the level really changed and the filter starts over from it.
+    2. Hampel test: a value further than ``threshold`` scaled MADs from the
+       median of the last ``window`` samples is replaced by that median.
+       The raw value still enters the window, so a real step change is
+       followed once it holds for about half the window. Samples older
+       than ``max_gap`` seconds before a new one are forgotten, so after
+       a pause the window starts over instead of pulling fresh readings
+       towards the level from before it.
+    3. Oversampling: the sensor is read ``oversample`` times per reporting
+       interval (no faster than the DHT22's 2 s), and the samples of one
+       interval are reduced to their median.
+
+Each reading that is published carries a ``confidence`` between 0 and 1.
+It is the mean score of the last ``window`` read attempts: a good sample
+scores 1, a replaced outlier 0.5, and a failed or rejected read 0. While
+the window is still filling after a start, the confidence is scaled down.
+
+Samples live in a preallocated NumPy ring buffer of shape (window, fields).
+The median and MAD are computed for all fields at once with one sort of
+the window each, so a sample costs microseconds.
+"""
+
+import math
+
+import numpy as np
+
+# Physical range of each field; anything outside is a garbled read
+LIMITS = {
+    "temperature_c": (-40.0, 80.0),   # DHT22 operating range
+    "humidity": (0.0, 100.0),
+    "moisture": (0.0, 100.0),
+}
+# Fastest plausible change per second
+MAX_RATES = {"temperature_c": 2.0, "humidity": 10.0, "moisture": 5.0}
+# Floor of the Hampel scale, so after a run of identical 0.1-quantized
+# readings (MAD 0) the next 0.1 step is not flagged as an outlier
+MIN_SCALES = {"temperature_c": 0.2, "humidity": 0.5, "moisture": 0.5}
+
+# Scaled MAD estimates the standard deviation of normally distributed noise
+MAD_TO_SIGMA = 1.4826
+
+# Score of one read attempt in the confidence average
+ACCEPTED, REPLACED, REJECTED = 1.0, 0.5, 0.0
+
+
+def _median(samples):
+    """
+    Column medians of a small 2-D array. For a handful of rows one sort is
+    several times cheaper than ``np.median``'s general machinery.
+    """
+    n = len(samples)
+    ordered = np.sort(samples, axis=0)
+    k = n // 2
+    if n % 2:
+        return ordered[k]
+    return (ordered[k - 1] + ordered[k]) / 2
+
+
+class ReadingFilter:
+    """Plausibility check, Hampel filter and oversampling for one sensor."""
+
+    def __init__(self, fields, window=7, threshold=3.0, oversample=1, min_samples=3, max_rejects=3,
+                 max_gap=None):
+        """
+        Args:
+            fields (tuple): Names of the values in each reading, e.g.
+                ``("temperature_c", "humidity")``; they select the limits
+            window (int): Samples in the Hampel window (and attempts in the
+                confidence average)
+            threshold (float): Outlier threshold, in scaled MADs
+            oversample (int): Samples reduced into each published reading
+            min_samples (int): Samples needed before the Hampel test applies
+            max_rejects (int): Rate rejections in a row after which the new
+                level is accepted
+            max_gap (float, optional): Seconds without an accepted sample
+                after which the window is cleared; None keeps it forever
+        """
+        self.fields = tuple(fields)
+        self.window = int(window)
+        self.threshold = float(threshold)
+        self.oversample = max(1, int(oversample))
+        self.min_samples = max(1, min(int(min_samples), self.window))
+        self.max_rejects = int(max_rejects)
+        self.max_gap = max_gap
+        limits = np.array([LIMITS.get(f, (-math.inf, math.inf)) for f in self.fields], dtype=np.float64)
+        self._low, self._high = limits[:, 0], limits[:, 1]
+        self._max_rate = np.array([MAX_RATES.get(f, math.inf) for f in self.fields])
+        self._min_scale = np.array([MIN_SCALES.get(f, 0.0) for f in self.fields])
+
+        self._samples = np.empty((self.window, len(self.fields)))
+        self._scores = np.zeros(self.window)
+        self._pending = np.empty((self.oversample, len(self.fields)))
+        self.reset()
+
+        self.accepted = 0
+        self.replaced = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def reset(self):
+        """Forget every sample and score, e.g. when sensing is turned back on."""
+        self._count = 0         # samples in the ring, up to window
+        self._next = 0          # ring slot for the next sample
+        self._scores[:] = 0
+        self._score_sum = 0.0   # kept in step with _scores; the scores are exact in binary
+        self._attempts = 0
+        self._pending_count = 0
+        self._last_ts = None    # last accepted raw sample
+        self._last = None
+        self._rate_rejects = 0
+
+    def add(self, ts, values):
+        """
+        Feed one raw sample.
+
+        Returns:
+            str: ``"accepted"``, ``"replaced"`` (an outlier, replaced by the
+            window median) or ``"rejected"`` (implausible, dropped)
+        """
+        x = np.array(values, dtype=np.float64)
+        if self.max_gap is not None and self._last_ts is not None and ts - self._last_ts > self.max_gap:
+            # The window describes readings from before a pause; start over
+            self._count = self._next = 0
+            self._last_ts = self._last = None
+            self._rate_rejects = 0
+        if np.count_nonzero((x >= self._low) & (x <= self._high)) != len(x):
+            return self._reject()
+        if self._last is not None:
+            dt = max(ts - self._last_ts, 1.0)
+            if np.count_nonzero(np.abs(x - self._last) > self._max_rate * dt):
+                self._rate_rejects += 1
+                if self._rate_rejects <= self.max_rejects:
+                    return self._reject()
+                # Several implausible jumps to the same new level: believe
+                # it and forget the old window
+                self._count = self._next = 0
+        self._rate_rejects = 0
+
+        value, score = x, ACCEPTED
+        if self._count >= self.min_samples:
+            window = self._samples[:self._count]
+            median = _median(window)
+            scale = np.maximum(MAD_TO_SIGMA * _median(np.abs(window - median)), self._min_scale)
+            outliers = np.abs(x - median) > self.threshold * scale
+            if np.count_nonzero(outliers):
+                value, score = np.where(outliers, median, x), REPLACED
+
+        self._samples[self._next] = x
+        self._next = (self._next + 1) % self.window
+        self._count = min(self._count + 1, self.window)
+        self._last_ts, self._last = ts, x
+        self._pending[self._pending_count % self.oversample] = value
+        self._pending_count += 1
+        self._score(score)
+        if score == REPLACED:
+            self.replaced += 1
+            return "replaced"
+        self.accepted += 1
+        return "accepted"
+
+    def fail(self):
+        """Record a read attempt that produced no sample."""
+        self.failed += 1
+        self._score(REJECTED)
+
+    def _reject(self):
+        self.rejected += 1
+        self._score(REJECTED)
+        return "rejected"
+
+    def _score(self, score):
+        slot = self._attempts % self.window
+        self._score_sum += score - self._scores[slot]
+        self._scores[slot] = score
+        self._attempts += 1
+
+    def confidence(self):
+        """Confidence in the current readings, between 0 and 1."""
+        attempts = min(self._attempts, self.window)
+        if not attempts:
+            return 0.0
+        warmup = min(1.0, self._count / self.min_samples)
+        return round(float(self._score_sum) / attempts * warmup, 2)
+
+    def output(self):
+        """
+        Reduce the samples since the last call to one reading.
+
+        Returns:
+            tuple: ``(values, confidence)``, or None if there were no good
+            samples
+        """
+        n = min(self._pending_count, self.oversample)
+        if not n:
+            return None
+        self._pending_count = 0
+        values = self._pending[0] if n == 1 else _median(self._pending[:n])
+        return tuple(round(float(v), 1) for v in values), self.confidence()
+
+    def stats(self):
+        return {
+            "window": self.window,
+            "threshold": self.threshold,
+            "oversample": self.oversample,
+            "accepted": self.accepted,
+            "replaced": self.replaced,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "confidence": self.confidence(),
+        }
@@ -0,0 +1,83 @@
+"""
+Per-subsystem readiness, reported by ``/api/health``.
+
+The HTTP server comes up before the hardware: opening the camera or
+importing the DHT driver can take seconds on a Pi, and the API should
+answer meanwhile. Each slow subsystem is started on its own thread with
+``Readiness.start()`` and moves from ``starting`` to ``ready`` (or
+``failed``/``disabled``), recording how long it took since process start.
+"""
+
+import threading
+import time
+
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+DISABLED = "disabled"
+
+
+class Readiness:
+    """Thread-safe map of subsystem name to startup status."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._subsystems = {}
+
+    def set(self, name, status, error=None, required=None):
+        """Record a subsystem's status; ``required`` is kept from the previous call if None."""
+        with self._lock:
+            entry = self._subsystems.setdefault(name, {"required": False})
+            if required is not None:
+                entry["required"] = required
+            entry["status"] = status
+            entry["error"] = error
+            entry["seconds"] = round(time.monotonic() - self.started, 3)
+
+    def start(self, name, func, required=False):
+        """
+        Run ``func`` on a background thread. The subsystem is ready when it
+        returns, disabled if it returns False and failed if it raises.
+        """
+        self.set(name, STARTING, required=required)
+
+        def run():
+            try:
+                result = func()
+            except Exception as e:
+                self.set(name, FAILED, str(e))
+            else:
+                self.set(name, DISABLED if result is False else READY)
+
+        thread = threading.Thread(target=run, name=f"start-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def get(self, name):
+        with self._lock:
+            entry = self._subsystems.get(name)
+            return entry["status"] if entry else None
+
+    def status(self):
+        """
+        Overall status plus each subsystem: ``failed`` if a required subsystem
+        failed, ``starting`` while any is still starting, ``degraded`` if an
+        optional one failed, otherwise ``ready``.
+        """
+        with self._lock:
+            subsystems = {name: dict(entry) for name, entry in self._subsystems.items()}
+        statuses = [(e["status"], e["required"]) for e in subsystems.values()]
+        if (FAILED, True) in statuses:
+            overall = FAILED
+        elif any(status == STARTING for status, _ in statuses):
+            overall = STARTING
+        elif any(status == FAILED for status, _ in statuses):
+            overall = "degraded"
+        else:
+            overall = READY
+        return {
+            "status": overall,
+            "uptime": round(time.monotonic() - self.started, 3),
+            "subsystems": subsystems,
+        }
@@ -0,0 +1,170 @@
+"""
+Bucketed aggregation over stored sensor history.
+
+Used by ``/api/sensor/history`` to downsample readings from the sensor store
+into fixed time buckets (1m, 5m, 1h) with min/max/mean per bucket. All of the
+work is done with NumPy reductions over the memory-mapped columns, so a
+week-long range is a handful of vector operations rather than a Python loop
+over every reading.
+"""
+
+import json
+from datetime import datetime
+
+import numpy as np
+
+BUCKETS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "1d": 86400,
+}
+AGGREGATES = ("min", "max", "mean")
+FIELDS = ("temperature_c", "humidity")
+
+# Rows serialized per chunk of the streamed response
+CHUNK_ROWS = 500
+
+
+def parse_time(value):
+    """
+    Parse a ``from``/``to`` query parameter.
+
+    Accepts epoch seconds (``1747136000``) or an ISO 8601 local datetime
+    (``2025-05-13T19:30:00``, ``2025-05-13``).
+
+    Raises:
+        ValueError: If the value is neither
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def parse_aggregates(value):
+    """Parse ``agg=min,max,mean`` into a tuple, preserving AGGREGATES order."""
+    requested = {a.strip() for a in value.split(",") if a.strip()}
+    unknown = requested - set(AGGREGATES)
+    if unknown:
+        raise ValueError(f"Unknown aggregate(s): {', '.join(sorted(unknown))}")
+    if not requested:
+        raise ValueError("At least one aggregate is required")
+    return tuple(a for a in AGGREGATES if a in requested)
+
+
+def aggregate(ts, columns, bucket_seconds, aggs=AGGREGATES):
+    """
+    Aggregate sorted readings into fixed-width time buckets.
+
+    Args:
+        ts (np.ndarray): Sorted int64 epoch timestamps
+        columns (dict): Field name -> value array aligned with ``ts``
+        bucket_seconds (int): Bucket width in seconds
+        aggs (tuple): Aggregates to compute ("min", "max", "mean")
+
+    Returns:
+        tuple: ``(bucket_starts, counts, results)`` where ``results`` maps
+        ``(field, agg)`` to an array with one value per non-empty bucket
+    """
+    if len(ts) == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                {(f, a): empty for f in columns for a in aggs})
+
+    buckets = ts // bucket_seconds
+    # Readings are sorted, so each bucket is a contiguous run; reduceat works
+    # on the run boundaries directly without a per-bucket loop
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    counts = np.diff(np.append(starts, len(ts)))
+
+    results = {}
+    for field, values in columns.items():
+        values = np.asarray(values, dtype=np.float64)
+        if "min" in aggs:
+            results[(field, "min")] = np.minimum.reduceat(values, starts)
+        if "max" in aggs:
+            results[(field, "max")] = np.maximum.reduceat(values, starts)
+        if "mean" in aggs:
+            results[(field, "mean")] = np.add.reduceat(values, starts) / counts
+    return buckets[starts] * bucket_seconds, counts, results
+
+
+def combine(bucket_starts, counts, results, bucket_seconds):
+    """
+    Merge already aggregated rows (sorted by ``bucket_starts``) into
+    ``bucket_seconds`` buckets: min of the mins, max of the maxes and the
+    count-weighted mean of the means.
+    """
+    if len(bucket_starts) == 0:
+        return bucket_starts, counts, results
+    buckets = bucket_starts // bucket_seconds
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    merged_counts = np.add.reduceat(counts, starts)
+    merged = {}
+    for (field, agg), values in results.items():
+        if agg == "min":
+            merged[(field, agg)] = np.minimum.reduceat(values, starts)
+        elif agg == "max":
+            merged[(field, agg)] = np.maximum.reduceat(values, starts)
+        else:
+            merged[(field, agg)] = np.add.reduceat(values * counts, starts) / merged_counts
+    return buckets[starts] * bucket_seconds, merged_counts, merged
+
+
+def query_history(store, start, end, bucket_seconds, aggs=AGGREGATES):
+    """
+    Query the store for ``[start, end)`` and aggregate it into buckets.
+
+    Days that have been rolled up only have hourly rows left, which are
+    merged in; buckets under an hour get one point per hour on those days.
+    """
+    ts, *values = store.query(start, end)
+    raw = aggregate(ts, dict(zip(store.fields, values)), bucket_seconds, aggs)
+    rows = store.query_rollups(start, end)
+    if len(rows) == 0:
+        return raw
+
+    # A bucket can span a rolled-up day and a raw one, so both go through combine
+    bucket_starts = np.concatenate([rows["timestamp"], raw[0]])
+    order = np.argsort(bucket_starts, kind='stable')
+    counts = np.concatenate([rows["count"].astype(np.int64), raw[1]])[order]
+    results = {key: np.concatenate([rows[f"{key[0]}_{key[1]}"].astype(np.float64), values])[order]
+               for key, values in raw[2].items()}
+    return combine(bucket_starts[order], counts, results, bucket_seconds)
+
+
+def columns(bucket_starts, counts, results, aggs, fields=FIELDS):
+    """The history as ``{"timestamp", "count", "<field>_<agg>"...}`` arrays, in response column order."""
+    table = {"timestamp": bucket_starts, "count": counts}
+    table.update((f"{field}_{agg}", results[(field, agg)]) for field in fields for agg in aggs)
+    return table
+
+
+def document(meta, table):
+    """
+    The history response as a dict: ``meta`` plus ``columns``, ``count``
+    and ``points``, rows of the ``columns`` values with floats rounded.
+    """
+    values = [column.tolist() if i < 2 else np.round(column, 2).tolist()
+              for i, column in enumerate(table.values())]
+    return dict(meta, columns=list(table), count=len(values[0]), points=list(zip(*values)))
+
+
+def stream_history(meta, bucket_starts, counts, results, aggs, fields=FIELDS):
+    """
+    Yield the history response as JSON text in chunks.
+
+    Each point is a row ``[bucket_start, count, <field>_<agg>...]`` whose
+    layout is described by the ``columns`` key, which keeps the payload
+    compact and lets the body be serialized a chunk at a time.
+    """
+    response = document(meta, columns(bucket_starts, counts, results, aggs, fields))
+    rows = response.pop("points")
+    yield json.dumps(response)[:-1] + ', "points": ['
+
+    for i in range(0, len(rows), CHUNK_ROWS):
+        chunk = json.dumps(rows[i:i + CHUNK_ROWS], separators=(",", ":"))[1:-1]
+        yield ("," if i else "") + chunk
+    yield "]}"
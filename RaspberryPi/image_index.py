@@ -0,0 +1,158 @@
+"""
+In-memory index of captured images.
+
+Image names embed their capture time (``image_YYYYMMDD_HHMMSS.jpg``, and
+``image_YYYYMMDD_HHMMSS_NN.jpg`` for the frames of a burst), so sorting by
+name is sorting by time. The index keeps that sorted list in
+memory: it is seeded with a single directory scan at startup and updated by
+the capture path, so the latest image is ``names[-1]`` and time-filtered,
+paginated listings are binary searches instead of a glob and sort of the
+whole directory on every request. Only capture names are indexed; any
+other ``.jpg`` in the directory (e.g. one copied in by hand) is ignored,
+as it has no place in that order.
+"""
+
+import bisect
+import os
+import re
+import threading
+from datetime import datetime
+
+IMAGE_PREFIX = "image_"
+IMAGE_SUFFIX = ".jpg"
+NAME_TIME_FORMAT = "%Y%m%d_%H%M%S"
+CAPTURE_NAME = re.compile(rf"^{IMAGE_PREFIX}\d{{8}}_\d{{6}}(?:_\d+)?{re.escape(IMAGE_SUFFIX)}$")
+
+
+def name_for_time(timestamp):
+    """Return the image name a capture at ``timestamp`` would get."""
+    return f"{IMAGE_PREFIX}{datetime.fromtimestamp(timestamp).strftime(NAME_TIME_FORMAT)}{IMAGE_SUFFIX}"
+
+
+def burst_name(timestamp, seq):
+    """Name of frame ``seq`` (from 1) of a burst started at ``timestamp``; sorts after name_for_time."""
+    return f"{name_for_time(timestamp)[:-len(IMAGE_SUFFIX)]}_{seq:02d}{IMAGE_SUFFIX}"
+
+
+def is_capture_name(name):
+    """Whether ``name`` is one the capture path gives an image (see name_for_time, burst_name)."""
+    return CAPTURE_NAME.match(name) is not None
+
+
+def time_for_name(name):
+    """Return the capture time encoded in an image name, or None."""
+    if not (name.startswith(IMAGE_PREFIX) and name.endswith(IMAGE_SUFFIX)):
+        return None
+    try:
+        stamp = name[len(IMAGE_PREFIX):-len(IMAGE_SUFFIX)]
+        # Burst frames add a sequence number: image_YYYYMMDD_HHMMSS_NN.jpg
+        if len(stamp) > 15 and stamp[15] == "_" and stamp[16:].isdigit():
+            stamp = stamp[:15]
+        return datetime.strptime(stamp, NAME_TIME_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+
+class ImageIndex:
+    """Sorted, thread-safe index of the captured images in one directory."""
+
+    def __init__(self, image_dir):
+        self.image_dir = image_dir
+        self._lock = threading.Lock()
+        self._names = []
+        # Names added while a rebuild() scan is running, merged in when it ends
+        self._added = None
+
+    def rebuild(self):
+        """
+        Rescan the directory. Returns the number of images indexed. Safe to
+        run in the background while captures are being added.
+        """
+        with self._lock:
+            self._added = []
+        names = []
+        try:
+            if os.path.isdir(self.image_dir):
+                with os.scandir(self.image_dir) as entries:
+                    names = [e.name for e in entries if is_capture_name(e.name) and e.is_file()]
+        finally:
+            with self._lock:
+                names = sorted(set(names).union(self._added))
+                self._names, self._added = names, None
+        return len(names)
+
+    def add(self, path):
+        """Add a newly written image (path or bare name); other names are ignored."""
+        name = os.path.basename(path)
+        if not is_capture_name(name):
+            return
+        with self._lock:
+            if self._added is not None:
+                self._added.append(name)
+            # Captures arrive in time order, so this is almost always an append
+            if not self._names or name > self._names[-1]:
+                self._names.append(name)
+            else:
+                i = bisect.bisect_left(self._names, name)
+                if i == len(self._names) or self._names[i] != name:
+                    self._names.insert(i, name)
+
+    def remove(self, path):
+        """Drop an image from the index (e.g. after it has been deleted)."""
+        name = os.path.basename(path)
+        with self._lock:
+            i = bisect.bisect_left(self._names, name)
+            if i < len(self._names) and self._names[i] == name:
+                del self._names[i]
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, path):
+        name = os.path.basename(path)
+        with self._lock:
+            i = bisect.bisect_left(self._names, name)
+            return i < len(self._names) and self._names[i] == name
+
+    def latest(self):
+        """Return the newest image name, or None."""
+        names = self._names
+        return names[-1] if names else None
+
+    def latest_path(self):
+        """
+        Return the path of the newest image that still exists on disk,
+        pruning entries for files removed behind the index's back.
+        """
+        while True:
+            name = self.latest()
+            if name is None:
+                return None
+            path = os.path.join(self.image_dir, name)
+            if os.path.exists(path):
+                return path
+            self.remove(name)
+
+    def list(self, start=None, end=None, limit=None, cursor=None):
+        """
+        List image names in time order.
+
+        Args:
+            start (float, optional): Only images captured at or after this epoch time
+            end (float, optional): Only images captured before this epoch time
+            limit (int, optional): Max names to return
+            cursor (str, optional): Continue after this name (from a previous page)
+
+        Returns:
+            tuple: ``(names, next_cursor)``; ``next_cursor`` is None on the last page
+        """
+        with self._lock:
+            names = self._names
+            lo = 0 if start is None else bisect.bisect_left(names, name_for_time(start))
+            hi = len(names) if end is None else bisect.bisect_left(names, name_for_time(end))
+            if cursor:
+                lo = max(lo, bisect.bisect_right(names, cursor))
+            if limit is not None and hi - lo > limit:
+                page = names[lo:lo + limit]
+                return page, page[-1]
+            return names[lo:hi], None
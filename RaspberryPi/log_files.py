@@ -0,0 +1,127 @@
+"""
+Compressed delivery of the sensor log CSVs.
+
+``/api/logs/*`` responses are compressed with the best encoding the client
+accepts: zstd when the optional ``zstandard`` package is installed, else
+gzip. Logs for past days no longer change, so each one is compressed once
+into ``<cache_dir>`` (``sensor_log_YYYYMMDD.csv.gz`` / ``.csv.zst``) and
+then served as a static file. Today's log changes with every export, so it
+is compressed on the fly in fixed-size chunks while it is sent.
+
+For tailing, ``open_log`` opens a log together with its size at that moment.
+Exports replace the CSV atomically, so an open file never changes under a
+reader, and the size can be returned to the client as the offset for its
+next ``?since=`` request.
+"""
+
+import os
+import uuid
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+CHUNK_SIZE = 64 * 1024
+SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+
+
+def supported_encodings():
+    """Encodings we can produce, most preferred first."""
+    return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def choose_encoding(accept_encodings):
+    """
+    Pick the response encoding from a parsed Accept-Encoding header
+    (``request.accept_encodings``). Returns None for an uncompressed response.
+    """
+    best, best_quality = None, 0
+    for encoding in supported_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _compressor(encoding, level):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    # wbits=31 writes a gzip container; the header mtime is 0, so the
+    # output (and the ETag of a cached file) only depends on the input
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+def open_log(path):
+    """Open a log file for reading; returns ``(file, size)``."""
+    f = open(path, "rb")
+    return f, os.fstat(f.fileno()).st_size
+
+
+def iter_file(f, start, end, chunk_size=CHUNK_SIZE):
+    """Yield ``f[start:end]`` in chunks and close ``f``."""
+    try:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def iter_compressed(chunks, encoding, level=6):
+    """Compress an iterable of byte chunks on the fly."""
+    compressor = _compressor(encoding, level)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressedLogCache:
+    """Compress-once cache of finished log files."""
+
+    def __init__(self, cache_dir, gzip_level=9, zstd_level=19):
+        """
+        Args:
+            cache_dir (str): Directory for the compressed copies
+            gzip_level (int): gzip level for cached files (paid once per day)
+            zstd_level (int): zstd level for cached files
+        """
+        self.cache_dir = cache_dir
+        self.levels = {"gzip": gzip_level, "zstd": zstd_level}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, csv_path, encoding):
+        """
+        Return the path of a compressed copy of ``csv_path``, creating it if
+        it is missing or older than the CSV.
+        """
+        path = os.path.join(self.cache_dir, os.path.basename(csv_path) + SUFFIXES[encoding])
+        try:
+            if os.path.getmtime(path) >= os.path.getmtime(csv_path):
+                return path
+        except OSError:
+            pass
+
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        f, size = open_log(csv_path)
+        with open(tmp_path, "wb") as out:
+            for data in iter_compressed(iter_file(f, 0, size), encoding, self.levels[encoding]):
+                out.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def discard(self, log_name):
+        """Remove the compressed copies of a log (e.g. when it is deleted)."""
+        for suffix in SUFFIXES.values():
+            try:
+                os.remove(os.path.join(self.cache_dir, os.path.basename(log_name) + suffix))
+            except OSError:
+                pass
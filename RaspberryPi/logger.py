@@ -0,0 +1,212 @@
+"""
+Asynchronous, structured logging for the AgroX service.
+
+``log_message`` used to format a timestamp and ``print`` synchronously on the
+calling thread. Here records are put on an in-memory queue and a single
+listener thread formats and writes them, so the monitoring jobs and request
+threads only pay for creating a LogRecord.
+
+On top of the standard logging module this adds:
+    - JSON output (LOG_FORMAT=json) for journald / log shippers
+    - rate limiting of repeated identical messages, which are collapsed into
+      one line with a repeat count
+    - size-rotated log files (LOG_FILE, LOG_MAX_BYTES, LOG_BACKUPS)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+LOGGER_NAME = "agrox"
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        repeated = getattr(record, "repeated", 0)
+        if repeated:
+            entry["repeated"] = repeated
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """The original ``timestamp - LEVEL - message`` format, plus repeat counts."""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT, DATE_FORMAT)
+
+    def format(self, record):
+        text = super().format(record)
+        repeated = getattr(record, "repeated", 0)
+        if repeated:
+            text += f" ({repeated} identical messages suppressed)"
+        return text
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let an identical message through at most once per ``window`` seconds.
+
+    Suppressed repeats are counted, and the next time the message is let
+    through it carries ``record.repeated`` so the formatters can say how
+    many were collapsed. Only the most recent ``max_keys`` distinct messages
+    are tracked, so messages with changing text (readings) don't grow it.
+    """
+
+    def __init__(self, window=60.0, max_keys=256):
+        super().__init__()
+        self.window = window
+        self.max_keys = max_keys
+        self._seen = OrderedDict()  # (level, msg) -> [window_start, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.levelno, record.msg)
+        now = record.created
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is not None and now - entry[0] < self.window:
+                entry[1] += 1
+                return False
+            record.repeated = entry[1] if entry is not None else 0
+            self._seen[key] = [now, 0]
+            self._seen.move_to_end(key)
+            if len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the record as-is.
+
+    The stock prepare() formats the message on the calling thread so the
+    record can be pickled; records here never leave the process, so that
+    work is left to the listener thread.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _DropQueue(queue.Queue):
+    """Bounded queue that drops (and counts) records rather than blocking."""
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put_nowait(self, item):
+        if item is None:
+            # QueueListener's stop sentinel must always get through
+            return super().put(item)
+        try:
+            super().put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_queue = None
+
+
+def setup_logging(level="INFO", fmt="text", log_file=None, max_bytes=5 * 1024 * 1024,
+                  backups=3, rate_limit=60.0, queue_size=10000):
+    """
+    Configure the ``agrox`` logger. Safe to call more than once; later calls
+    replace the previous configuration.
+
+    Args:
+        level (str): Minimum level (DEBUG, INFO, WARNING, ERROR)
+        fmt (str): "text" or "json"
+        log_file (str, optional): Also write to this size-rotated file
+        max_bytes (int): Rotate the log file at this size
+        backups (int): Rotated files to keep
+        rate_limit (float): Seconds to suppress identical repeats (0 disables)
+        queue_size (int): Records buffered before new ones are dropped
+
+    Returns:
+        logging.Logger: The configured logger
+    """
+    global _listener, _queue
+    shutdown_logging()
+
+    formatter = JsonFormatter() if fmt == "json" else TextFormatter()
+    handlers = []
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(formatter)
+    handlers.append(stream)
+    if log_file:
+        directory = os.path.dirname(log_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        rotating = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups)
+        rotating.setFormatter(formatter)
+        handlers.append(rotating)
+
+    _queue = _DropQueue(queue_size)
+    queue_handler = _QueueHandler(_queue)
+    if rate_limit > 0:
+        # Filter before enqueueing so suppressed repeats cost almost nothing
+        queue_handler.addFilter(RateLimitFilter(rate_limit))
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers[:] = [queue_handler]
+    logger.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(_queue, *handlers, respect_handler_level=False)
+    _listener.start()
+    return logger
+
+
+def setup_from_env():
+    """Configure logging from LOG_LEVEL, LOG_FORMAT, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUPS and LOG_RATE_LIMIT."""
+    return setup_logging(
+        level=os.environ.get("LOG_LEVEL", "INFO"),
+        fmt=os.environ.get("LOG_FORMAT", "text"),
+        log_file=os.environ.get("LOG_FILE") or None,
+        max_bytes=int(os.environ.get("LOG_MAX_BYTES", 5 * 1024 * 1024)),
+        backups=int(os.environ.get("LOG_BACKUPS", 3)),
+        rate_limit=float(os.environ.get("LOG_RATE_LIMIT", 60)),
+    )
+
+
+def dropped_records():
+    """Records dropped because the queue was full."""
+    return _queue.dropped if _queue is not None else 0
+
+
+def shutdown_logging(timeout=2.0):
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is None:
+        return
+    deadline = time.monotonic() + timeout
+    while _queue is not None and not _queue.empty() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    _listener.stop()
+    _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -1,63 +1,110 @@
 import time
-import board
-import adafruit_dht
 import os
-import csv
+import functools
+import logging
 import signal
 import sys
 import glob
 import threading
-import RPi.GPIO as GPIO
-import requests
 import json
+import base64
 from datetime import datetime
-from picamera2 import Picamera2
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Response, g, jsonify, request, send_file
 from flask_cors import CORS  # Import CORS
+from sensor_store import SensorStore, CSV_HEADER
+from upload_queue import UploadQueue
+from upload_cache import UploadCache
+from image_index import ImageIndex, burst_name, name_for_time
+from thumbnails import ThumbnailCache
+import capture
+from capture import CapturePipeline
+from motion import ChangeDetector
+import timelapse
+import log_files
+from log_files import CompressedLogCache
+from backends import create_sensor, create_sensor_backend, create_camera_backend, create_led_backend
+from sensors import SensorEntry, SensorRegistry, sensor_configs
+from scheduler import Scheduler
+from health import Readiness
+from events import EventBroadcaster
+from state import SharedState
+from compression import ReadingCompressor, AdaptiveInterval
+from filtering import ReadingFilter
+from retention import RetentionManager
+import derived
+from derived import DerivedMetrics
+from rules import RuleEngine, load_rules
+from webhooks import WebhookDispatcher
+from logger import setup_from_env, dropped_records
+import history
+import metrics
+import wire
+
+# Structured, asynchronous logging (LOG_LEVEL, LOG_FORMAT, LOG_FILE, ...)
+logger = setup_from_env()
 
 # Create directories for storing images and logs if they don't exist
 IMAGE_DIR = "images"
 LOG_DIR = "logs"
+QUEUE_DIR = "queue"
+THUMBNAIL_DIR = os.path.join("cache", "thumbnails")
+LOG_CACHE_DIR = os.path.join("cache", "logs")
+TIMELAPSE_DIR = "timelapse"
+RETENTION_STATE = os.path.join("cache", "retention.json")
 
 # GPIO setup for LEDs
 CAMERA_PIN = 17
 RED_LED_PIN = 27    # LED to indicate system is OFF
 GREEN_LED_PIN = 22  # LED to indicate system is ON
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(CAMERA_PIN, GPIO.OUT)
-GPIO.setup(RED_LED_PIN, GPIO.OUT)
-GPIO.setup(GREEN_LED_PIN, GPIO.OUT)
+# Hardware backends are chosen by environment variable (see backends.py);
+# AGROX_BACKEND=sim runs the whole service without a Pi
+leds = create_led_backend()
+leds.setup([CAMERA_PIN, RED_LED_PIN, GREEN_LED_PIN])
 
-GPIO.output(CAMERA_PIN, GPIO.LOW)
-GPIO.output(RED_LED_PIN, GPIO.HIGH)  # System starts OFF, so turn on red LED
-GPIO.output(GREEN_LED_PIN, GPIO.LOW)
+leds.output(CAMERA_PIN, False)
+leds.output(RED_LED_PIN, True)  # System starts OFF, so turn on red LED
+leds.output(GREEN_LED_PIN, False)
 
 if not os.path.exists(IMAGE_DIR):
     os.makedirs(IMAGE_DIR)
 
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
+
+if not os.path.exists(QUEUE_DIR):
+    os.makedirs(QUEUE_DIR)
+
+# Index of captured images, seeded by a background scan at startup and
+# updated on every capture
+image_index = ImageIndex(IMAGE_DIR)
+
+# Resized variants served by /api/images/<name>?w=&q=. THUMBNAIL_EAGER_WIDTHS
+# (e.g. "320,640") are generated in the background right after each capture.
+thumbnail_cache = ThumbnailCache(
+    THUMBNAIL_DIR,
+    max_bytes=int(os.environ.get("THUMBNAIL_CACHE_MB", 200)) * 1024 * 1024,
+    eager_widths=[int(w) for w in os.environ.get("THUMBNAIL_EAGER_WIDTHS", "320").split(",") if w.strip()],
+    log=lambda message, error=False: log_message(message, error)
+)
+
+# Captured images never change once written, so browsers may cache them
+IMAGE_MAX_AGE = 86400
 machine_id = "AgroX-37"
-# Initialize CSV log file
-csv_log_file = os.path.join(LOG_DIR, f"sensor_log_{datetime.now().strftime('%Y%m%d')}.csv")
-csv_header = ['timestamp', 'temperature_c', 'temperature_f', 'humidity']
-
-# Create/prepare the CSV file with headers if it doesn't exist
-if not os.path.exists(csv_log_file):
-    with open(csv_log_file, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(csv_header)
-
-# Control flags and data storage
-sensor_active = False
-camera_active = False
-latest_sensor_data = {
-    "temperature_c": None,
-    "temperature_f": None,
-    "humidity": None,
-    "timestamp": None
-}
+# Initialize the sensor data store. Readings go to day-partitioned binary
+# segments; CSV files are exported from them on demand for the log endpoints.
+STORE_DIR = os.path.join(LOG_DIR, "store")
+EXPORT_DIR = os.path.join(STORE_DIR, "export")
+csv_header = CSV_HEADER
+STORE_BATCH_SIZE = int(os.environ.get("STORE_BATCH_SIZE", 20))
+STORE_FLUSH_INTERVAL = float(os.environ.get("STORE_FLUSH_INTERVAL", 60))
+sensor_store = SensorStore(STORE_DIR, batch_size=STORE_BATCH_SIZE, flush_interval=STORE_FLUSH_INTERVAL)
+# Compressed copies of past days' logs, made once on first request
+log_cache = CompressedLogCache(LOG_CACHE_DIR)
+
+# Control flags and data storage. Read with `state.snapshot` (never blocks);
+# change through state.set_active() / state.set_sensor_data().
+state = SharedState()
 
 # Server settings
 SERVER_URL = "https://server.hrzhkm.xyz"  # Change this to your server URL
@@ -66,18 +113,329 @@ SERVER_URL = "https://server.hrzhkm.xyz"  # Change this to your server URL
 if os.environ.get("SERVER_URL"):
     SERVER_URL = os.environ.get("SERVER_URL")
 
-# Debug state tracking
-state_change_count = 0
+# Port for this device's HTTP API
+API_PORT = int(os.environ.get("PORT", 8000))
+
+# Production serving (waitress). All state - latest readings, the image index,
+# the event feed and the monitoring jobs - lives in this one process, so the
+# API is served by a single process with a thread pool rather than forked
+# workers. Each /api/stream subscriber holds a thread for as long as it is
+# connected, so streams get their own thread budget on top of API_THREADS.
+SERVER_MODE = os.environ.get("SERVER_MODE", "production")  # "production" or "dev"
+API_THREADS = int(os.environ.get("API_THREADS", 8))
+STREAM_THREADS = int(os.environ.get("STREAM_THREADS", 32))
+API_CONNECTION_LIMIT = int(os.environ.get("API_CONNECTION_LIMIT", 200))
+API_KEEPALIVE_TIMEOUT = int(os.environ.get("API_KEEPALIVE_TIMEOUT", 120))
+
+# Monitoring schedule (seconds); each job keeps its own cadence
+SENSOR_INTERVAL = float(os.environ.get("SENSOR_INTERVAL", 3.0))
+CAPTURE_INTERVAL = float(os.environ.get("CAPTURE_INTERVAL", 60))  # Capture every 60 seconds (1 minute)
+LED_INTERVAL = 0.2
+STATUS_INTERVAL = float(os.environ.get("STATUS_INTERVAL", 5.0))
+AUTO_UPLOAD_INTERVAL = float(os.environ.get("AUTO_UPLOAD_INTERVAL", 0))  # 0 disables automatic uploads
+
+# Capture pipeline (see capture.py): the camera job only grabs frames into
+# CAPTURE_BUFFERS preallocated buffers; CAPTURE_WORKERS threads encode and
+# write them. CAPTURE_MODE is "interval" (one still per CAPTURE_INTERVAL),
+# "burst" (BURST_COUNT stills BURST_SPACING seconds apart per
+# CAPTURE_INTERVAL) or "timelapse" (one still per TIMELAPSE_INTERVAL, each
+# finished day assembled into a video under TIMELAPSE_DIR)
+CAPTURE_MODE = os.environ.get("CAPTURE_MODE", "interval")
+if CAPTURE_MODE not in capture.MODES:
+    raise ValueError(f"Unknown CAPTURE_MODE '{CAPTURE_MODE}', expected one of {', '.join(capture.MODES)}")
+CAPTURE_WORKERS = int(os.environ.get("CAPTURE_WORKERS", 2))
+CAPTURE_BUFFERS = int(os.environ.get("CAPTURE_BUFFERS", 4))
+CAPTURE_QUALITY = int(os.environ.get("CAPTURE_QUALITY", 85))
+BURST_COUNT = int(os.environ.get("BURST_COUNT", 5))
+BURST_SPACING = float(os.environ.get("BURST_SPACING", 0.5))
+TIMELAPSE_INTERVAL = float(os.environ.get("TIMELAPSE_INTERVAL", 10))
+TIMELAPSE_FPS = int(os.environ.get("TIMELAPSE_FPS", 24))
+
+# Change detection (see motion.py): with CHANGE_DETECTION=1 a still is only
+# kept (and uploaded) if at least CHANGE_THRESHOLD of a downscaled grayscale
+# copy moved by more than CHANGE_PIXEL_DELTA brightness levels since the
+# last kept one, or if the last kept one is KEYFRAME_INTERVAL seconds old
+CHANGE_DETECTION = os.environ.get("CHANGE_DETECTION", "0").lower() in ("1", "true", "yes")
+change_detector = ChangeDetector(
+    threshold=float(os.environ.get("CHANGE_THRESHOLD", 0.02)),
+    pixel_delta=float(os.environ.get("CHANGE_PIXEL_DELTA", 12)),
+    keyframe_interval=float(os.environ.get("KEYFRAME_INTERVAL", 900)),
+) if CHANGE_DETECTION else None
+
+# Change-based recording: "all" stores every reading, "deadband" and
+# "swinging_door" only store (and auto-upload) readings that carry new
+# information, with a heartbeat at least every RECORD_MAX_INTERVAL seconds
+RECORD_MODE = os.environ.get("RECORD_MODE", "all")
+RECORD_DEVIATIONS = (
+    float(os.environ.get("RECORD_TEMP_DEVIATION", 0.2)),      # °C
+    float(os.environ.get("RECORD_HUMIDITY_DEVIATION", 1.0)),  # %RH
+)
+RECORD_MAX_INTERVAL = float(os.environ.get("RECORD_MAX_INTERVAL", 300))
+recorder = ReadingCompressor(RECORD_MODE, RECORD_DEVIATIONS, RECORD_MAX_INTERVAL)
+last_uploaded_record = 0
+last_uploaded_image = None
+
+# Adaptive sampling: the sensor interval grows towards SENSOR_MAX_INTERVAL
+# while readings are steady and drops back to SENSOR_INTERVAL when they move.
+# The DHT22 can't be read more often than every 2 seconds.
+ADAPTIVE_SAMPLING = os.environ.get("ADAPTIVE_SAMPLING", "0").lower() in ("1", "true", "yes")
+SENSOR_INTERVAL = max(2.0, SENSOR_INTERVAL)
+SENSOR_MAX_INTERVAL = float(os.environ.get("SENSOR_MAX_INTERVAL", 30))
+
+# Read filtering (see filtering.py): implausible reads are dropped, outliers
+# are replaced by the median of the last FILTER_WINDOW samples (forgotten
+# after a pause longer than FILTER_WINDOW reads), and each published reading
+# is the median of SENSOR_OVERSAMPLE reads taken within its interval (as
+# many as fit at one read per 2 seconds)
+FILTER_WINDOW = int(os.environ.get("FILTER_WINDOW", 7))
+FILTER_THRESHOLD = float(os.environ.get("FILTER_THRESHOLD", 3.0))
+SENSOR_OVERSAMPLE = int(os.environ.get("SENSOR_OVERSAMPLE", 1))
+
+# Derived metrics (see derived.py): VPD, dew point, heat index and growing
+# degree days above GDD_BASE_C (temperatures capped at GDD_CAP_C) for every
+# temperature/humidity sensor, with rolling 1h/24h min/max/mean. Stored
+# next to the raw readings for every recorded reading.
+DERIVED_METRICS = os.environ.get("DERIVED_METRICS", "1").lower() in ("1", "true", "yes")
+GDD_BASE_C = float(os.environ.get("GDD_BASE_C", derived.GDD_BASE_C))
+GDD_CAP_C = float(os.environ.get("GDD_CAP_C", derived.GDD_CAP_C))
+
+# Sensors polled by this Pi, from SENSORS_CONFIG (see sensors.py). Each one
+# gets its own job, store and recorder; the primary sensor uses the original
+# store and recorder above. Without a config file it is the only sensor.
+SENSORS_CONFIG = os.environ.get("SENSORS_CONFIG", "sensors.json")
+
+def build_sensor_registry():
+    registry = SensorRegistry()
+    for config in sensor_configs(SENSORS_CONFIG, SENSOR_INTERVAL):
+        config.setdefault("oversample", SENSOR_OVERSAMPLE)
+        if config["primary"]:
+            entry = registry.add(SensorEntry(config, sensor_store, recorder))
+        else:
+            entry = registry.add(SensorEntry(config, None, ReadingCompressor(
+                RECORD_MODE, config.get("deviations", RECORD_DEVIATIONS), RECORD_MAX_INTERVAL)))
+            entry.store = SensorStore(
+                os.path.join(STORE_DIR, "sensors", entry.id),
+                batch_size=STORE_BATCH_SIZE, flush_interval=STORE_FLUSH_INTERVAL,
+                value_name=entry.fields[1], csv_prefix=f"sensor_log_{entry.id}_")
+        # A window is stale once it spans more reads than it holds, at the
+        # slowest interval the sensor is read at
+        window = config.get("filter_window", FILTER_WINDOW)
+        slowest = SENSOR_MAX_INTERVAL if ADAPTIVE_SAMPLING and entry.primary else entry.interval
+        entry.filter = ReadingFilter(entry.fields, window=window, threshold=FILTER_THRESHOLD,
+                                     oversample=entry.oversample,
+                                     max_gap=window * max(slowest, entry.interval) / entry.oversample)
+        if DERIVED_METRICS and entry.fields[1] == "humidity":
+            entry.derived = DerivedMetrics(
+                derived.derived_store(entry.store, batch_size=STORE_BATCH_SIZE, flush_interval=STORE_FLUSH_INTERVAL),
+                gdd_base=GDD_BASE_C, gdd_cap=GDD_CAP_C)
+    return registry
+
+sensors = build_sensor_registry()
+
+# Alert rules (see rules.py) from RULES_CONFIG, evaluated on every published
+# reading: e.g. "humidity > 85 for 10m" takes a still and POSTs a webhook.
+# Webhooks are sent by WEBHOOK_WORKERS background threads, so a slow
+# receiver never delays the sensor jobs. No config file means no rules.
+RULES_CONFIG = os.environ.get("RULES_CONFIG", "rules.json")
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 2))
+WEBHOOK_TIMEOUT = float(os.environ.get("WEBHOOK_TIMEOUT", 5))
+
+def build_rule_engine():
+    rules = load_rules(RULES_CONFIG, sensors.primary.id) if os.path.exists(RULES_CONFIG) else []
+    engine = RuleEngine(rules, {
+        entry.id: ("temperature_c", "temperature_f", entry.fields[1])
+        + (derived.FIELDS if entry.derived is not None else ()) for entry in sensors})
+    pins = sorted({action["pin"] for rule in rules for action in rule.actions if action["type"] == "gpio"})
+    reserved = [pin for pin in pins if pin in (CAMERA_PIN, RED_LED_PIN, GREEN_LED_PIN)]
+    if reserved:
+        raise ValueError(f"{RULES_CONFIG}: GPIO {reserved[0]} is used by the status LEDs")
+    if pins:
+        leds.setup(pins)
+        for pin in pins:
+            leds.output(pin, False)
+    return engine
+
+rule_engine = build_rule_engine()
+# Active rules per GPIO pin; a pin several rules drive stays high while any is
+rule_pins_lock = threading.Lock()
+rule_pins_active = {}
+webhooks = WebhookDispatcher(workers=WEBHOOK_WORKERS, timeout=WEBHOOK_TIMEOUT,
+                             log=lambda message, error=False: log_message(message, error))
+
+# Retention (see retention.py): images are kept as captured for
+# IMAGE_FULL_DAYS, then thinned to one per IMAGE_THIN_INTERVAL seconds and
+# shrunk to IMAGE_ARCHIVE_WIDTH pixels, and deleted after IMAGE_MAX_DAYS.
+# Readings are kept raw for READINGS_RAW_DAYS, then rolled up into hourly
+# aggregates. IMAGE_QUOTA_MB, LOG_QUOTA_MB (for logs/store/) and MIN_FREE_MB
+# bound the disk space used. Every policy is off (0) unless set, so nothing
+# is deleted or rewritten by default. Runs every RETENTION_INTERVAL seconds
+# (0 disables it).
+RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", 3600))
+retention = RetentionManager(
+    image_index, [entry.store for entry in sensors] + [e.derived.store for e in sensors if e.derived is not None],
+    STORE_DIR, RETENTION_STATE,
+    full_days=int(os.environ.get("IMAGE_FULL_DAYS", 14)),
+    thin_interval=float(os.environ.get("IMAGE_THIN_INTERVAL", 0)),
+    archive_width=int(os.environ.get("IMAGE_ARCHIVE_WIDTH", 0)),
+    max_days=int(os.environ.get("IMAGE_MAX_DAYS", 0)),
+    image_quota=int(os.environ.get("IMAGE_QUOTA_MB", 0)) * 1024 * 1024,
+    min_free=int(os.environ.get("MIN_FREE_MB", 0)) * 1024 * 1024,
+    raw_days=int(os.environ.get("READINGS_RAW_DAYS", 0)),
+    log_quota=int(os.environ.get("LOG_QUOTA_MB", 0)) * 1024 * 1024,
+    on_image_changed=thumbnail_cache.discard,
+    on_log_removed=log_cache.discard,
+    log=lambda message, error=False: log_message(message, error)
+)
+sampling = AdaptiveInterval(sensors.primary.interval, SENSOR_MAX_INTERVAL, RECORD_DEVIATIONS)
+
+scheduler = Scheduler(log=lambda message, error=False: log_message(message, error))
+monitoring_lock = threading.Lock()
+monitoring_started = False
+picam2 = None
+camera_available = False
+capture_pipeline = None
+# Set by a rule's capture action; the camera job takes one still even if capture is off
+capture_requested = False
+# Startup status of the camera, sensors and image index, for /api/health
+readiness = Readiness()
+
+# Camera LED blink state, advanced by led_job
+led_lock = threading.Lock()
+led_toggles_pending = 0
+led_state = False
+
+# Live event feed for /api/stream (sensor readings, captures, state changes)
+event_broadcaster = EventBroadcaster(
+    buffer_size=int(os.environ.get("STREAM_BUFFER_SIZE", 256)),
+    max_subscribers=int(os.environ.get("STREAM_MAX_SUBSCRIBERS", 500))
+)
+
+# Monitor state tracking for status_job
+previous_monitor_state = (False, False)
+monitor_state_changes = 0
+
+# Images already uploaded, by SHA-256, so a repeat upload of the same image
+# is answered locally (see upload_cache.py). UPLOAD_CACHE_SIZE=0 disables it.
+UPLOAD_CACHE_SIZE = int(os.environ.get("UPLOAD_CACHE_SIZE", 10000))
+upload_cache = UploadCache(os.path.join(QUEUE_DIR, "upload_cache.db"),
+                           max_entries=UPLOAD_CACHE_SIZE) if UPLOAD_CACHE_SIZE > 0 else None
+
+# Outbound upload queue, drained by a background worker started in main()
+upload_queue = UploadQueue(
+    os.path.join(QUEUE_DIR, "uploads.db"),
+    server_url=lambda: SERVER_URL,
+    batch_size=int(os.environ.get("UPLOAD_BATCH_SIZE", 10)),
+    max_attempts=int(os.environ.get("UPLOAD_MAX_ATTEMPTS", 8)),
+    cache=upload_cache,
+    log=lambda message, error=False: log_message(message, error)
+)
+
+# Reading batches: with UPLOAD_READINGS=1, each automatic upload also queues
+# the readings every sensor recorded since the last one, as delta-encoded
+# columns (see wire.py) of up to UPLOAD_BATCH_READINGS readings, for the
+# server's /api/upload-readings. Readings from before startup aren't sent.
+UPLOAD_READINGS = os.environ.get("UPLOAD_READINGS", "0").lower() in ("1", "true", "yes")
+UPLOAD_BATCH_READINGS = max(1, int(os.environ.get("UPLOAD_BATCH_READINGS", 500)))
+readings_uploaded_through = {entry.id: int(time.time()) for entry in sensors}
+
+# Metrics for /metrics. Labelled children used on hot paths are bound once
+# here so recording a value is a lookup-free observe()/inc()
+SENSOR_READ_SECONDS = metrics.histogram(
+    "agrox_sensor_read_seconds", "Duration of sensor read attempts", ("sensor",))
+SENSOR_READS = metrics.counter(
+    "agrox_sensor_reads_total", "Sensor read attempts by result (ok, error)", ("sensor", "result"))
+# sensor_id -> (read duration, ok count, error count)
+sensor_metrics = {entry.id: (SENSOR_READ_SECONDS.labels(entry.id),
+                             SENSOR_READS.labels(entry.id, "ok"),
+                             SENSOR_READS.labels(entry.id, "error"))
+                  for entry in sensors}
+STORE_APPEND_SECONDS = metrics.histogram(
+    "agrox_store_append_seconds", "Time to append one reading to the sensor store")
+CAPTURE_SECONDS = metrics.histogram(
+    "agrox_capture_seconds", "Time the camera job spends grabbing a frame")
+FRAME_SAVE_SECONDS = metrics.histogram(
+    "agrox_frame_save_seconds", "Time from the start of a grab until its JPEG is on disk")
+CAPTURES = metrics.counter(
+    "agrox_captures_total", "Camera capture attempts by result (ok, error)", ("result",))
+captures_ok = CAPTURES.labels("ok")
+captures_error = CAPTURES.labels("error")
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "agrox_http_request_seconds", "Flask handler latency by route", ("route",))
+HTTP_REQUESTS = metrics.counter(
+    "agrox_http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status"))
+
+metrics.gauge("agrox_sensor_active", "1 if sensor monitoring is on", lambda: int(state.snapshot.sensor_active))
+metrics.gauge("agrox_camera_active", "1 if camera capture is on", lambda: int(state.snapshot.camera_active))
+metrics.gauge("agrox_subsystem_ready", "1 once a subsystem (camera, sensor, image index) has started",
+              lambda: {(name,): int(s["status"] == "ready") for name, s in readiness.status()["subsystems"].items()},
+              ("subsystem",))
+metrics.gauge("agrox_upload_queue_jobs", "Upload queue jobs by status",
+              lambda: {(status,): n for status, n in upload_queue.stats().items()}, ("status",))
+metrics.gauge("agrox_upload_cache_hits_total", "Uploads answered from the upload cache",
+              lambda: upload_cache.hits if upload_cache is not None else None, kind="counter")
+metrics.gauge("agrox_stream_subscribers", "Connected /api/stream clients",
+              lambda: event_broadcaster.subscribers)
+metrics.gauge("agrox_job_skipped_ticks_total", "Scheduler ticks skipped because a run overran",
+              lambda: {(name,): s["skipped"] for name, s in scheduler.stats().items()}, ("job",), kind="counter")
+metrics.gauge("agrox_job_errors_total", "Scheduler job runs that raised",
+              lambda: {(name,): s["errors"] for name, s in scheduler.stats().items()}, ("job",), kind="counter")
+metrics.gauge("agrox_readings_offered_total", "Sensor readings passed to the recorder",
+              lambda: {(e.id,): e.recorder.offered for e in sensors}, ("sensor",), kind="counter")
+metrics.gauge("agrox_readings_recorded_total", "Sensor readings stored after deadband/compression",
+              lambda: {(e.id,): e.recorder.recorded for e in sensors}, ("sensor",), kind="counter")
+metrics.gauge("agrox_sensor_interval_seconds", "Current sensor sampling interval",
+              lambda: {(e.id,): scheduler.jobs[e.job_name].interval
+                       for e in sensors if e.job_name in scheduler.jobs}, ("sensor",))
+metrics.gauge("agrox_frames_dropped_total", "Frames dropped because every capture buffer was in use",
+              lambda: capture_pipeline.dropped if capture_pipeline is not None else None, kind="counter")
+metrics.gauge("agrox_frames_skipped_total", "Frames not kept because they had not changed",
+              lambda: capture_pipeline.skipped if capture_pipeline is not None else None, kind="counter")
+metrics.gauge("agrox_capture_queue_frames", "Grabbed frames waiting for an encoder",
+              lambda: capture_pipeline.stats()["queued"] if capture_pipeline is not None else None)
+def storage_bytes():
+    usage = retention.image_usage()
+    values = {("images",): usage[1] if usage else None, ("logs",): retention.log_bytes}
+    return {labels: n for labels, n in values.items() if n is not None}
+
+metrics.gauge("agrox_storage_bytes", "Bytes used by images and logs, as last counted by retention",
+              storage_bytes, ("dir",))
+metrics.gauge("agrox_retention_removed_total", "Images and log files removed or rolled up by retention",
+              lambda: {(kind,): retention.totals[kind] for kind in
+                       ("deleted", "thinned", "archived", "rolled_up", "exports_deleted", "rollups_deleted")},
+              ("kind",), kind="counter")
+metrics.gauge("agrox_rule_events_total", "Alert rules fired and cleared",
+              lambda: {(event,): n for event, n in rule_engine.events.items()}, ("event",), kind="counter")
+metrics.gauge("agrox_rules_active", "Alert rules currently active", lambda: rule_engine.active)
+metrics.gauge("agrox_webhooks_total", "Alert webhooks by outcome",
+              lambda: {(result,): webhooks.stats()[result] for result in ("sent", "failed", "dropped")},
+              ("result",), kind="counter")
+metrics.gauge("agrox_log_records_dropped_total", "Log records dropped because the log queue was full",
+              dropped_records, kind="counter")
 
 # Function to log messages with timestamp
-def log_message(message, error=False):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_type = "ERROR" if error else "INFO"
-    print(f"{timestamp} - {log_type} - {message}")
+def log_message(message, error=False, level=None):
+    """
+    Queue a message for the background log writer. Returns immediately;
+    formatting and output happen on the logger's listener thread.
+    
+    Args:
+        message (str): Message text
+        error (bool): Log at ERROR instead of INFO
+        level (int, optional): Explicit level, e.g. logging.DEBUG
+    """
+    if level is None:
+        level = logging.ERROR if error else logging.INFO
+    logger.log(level, message)
 
-# Function to log sensor data to CSV
-def log_to_csv(temp_c, temp_f, humidity):
+# Function to log sensor data to the store (exported as CSV for /api/logs)
+def log_to_csv(temp_c, temp_f, humidity, entry=None):
+    """
+    Record a reading in its sensor's store (the primary sensor's by default).
+    ``humidity`` is the sensor's second value, e.g. moisture for soil probes.
+    """
+    entry = entry or sensors.primary
     # Only log if we have actual data and sensor is active
+    sensor_active = state.snapshot.sensor_active
     if not sensor_active:
         log_message(f"Skipping CSV log: sensor_active={sensor_active}")
         return
@@ -86,28 +444,76 @@ def log_to_csv(temp_c, temp_f, humidity):
         log_message("Skipping CSV log: missing data values")
         return
         
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(csv_log_file, 'a', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([timestamp, temp_c, temp_f, humidity])
-    log_message(f"Data logged to CSV: {temp_c}°C, {temp_f}°F, {humidity}%")
+    # The recorder passes on only the readings that carry new information
+    # (every reading in RECORD_MODE=all), possibly one reading late
+    for ts, (t_c, rh) in entry.recorder.offer(time.time(), (temp_c, humidity)):
+        # Fahrenheit is derived from Celsius on export, so only C and RH are stored
+        started = time.perf_counter()
+        entry.store.append(ts, t_c, rh)
+        STORE_APPEND_SECONDS.observe(time.perf_counter() - started)
+        if entry.derived is not None:
+            entry.derived.record(ts, t_c, rh)
+        log_message(f"Data logged to store ({entry.id}): {t_c}°C, {t_c * (9 / 5) + 32}°F, {rh}%", level=logging.DEBUG)
 
 # Function to update the latest sensor data
-def update_sensor_data(temp_c, temp_f, humidity):
-    global latest_sensor_data
-    # Only update data if sensor is active
-    if sensor_active:
-        latest_sensor_data = {
-            "temperature_c": temp_c,
-            "temperature_f": temp_f,
-            "humidity": humidity,
-            "timestamp": time.time()
-        }
+def update_sensor_data(temp_c, temp_f, humidity, entry=None, confidence=None):
+    entry = entry or sensors.primary
+    # Rounded to what the sensor resolves, so the JSON has no long float reprs.
+    # set_sensor_data() discards the reading if the sensor is inactive
+    snapshot = state.set_sensor_data({
+        "temperature_c": round(temp_c, 2),
+        "temperature_f": round(temp_f, 2),
+        entry.fields[1]: round(humidity, 2),
+        "confidence": confidence,
+        "timestamp": round(time.time(), 3)
+    }, sensor_id=entry.id, primary=entry.primary)
+    if snapshot is None:
+        return
+    # The primary sensor keeps its original "sensor" event; the others are
+    # "reading" events tagged with their sensor_id
+    if entry.primary:
+        event_broadcaster.publish("sensor", snapshot.sensor_data)
+    else:
+        event_broadcaster.publish("reading", dict(snapshot.sensors[entry.id], sensor_id=entry.id))
+
+# Function to publish the current control state to stream subscribers
+def publish_state(snapshot):
+    event_broadcaster.publish("state", {
+        "sensor_active": snapshot.sensor_active,
+        "camera_active": snapshot.camera_active,
+        "state_change_count": snapshot.state_change_count,
+        "timestamp": time.time()
+    })
+
+# Function to answer conditional GETs from a snapshot's version ETag
+def conditional_json(etag, build):
+    """
+    Return 304 if the client's If-None-Match matches ``etag``, otherwise
+    the JSON from ``build()`` with the ETag attached, or MessagePack if the
+    client prefers it (see wire.py). The body is only built when it is
+    actually sent.
+    """
+    mimetype = wire.choose_type(request.accept_mimetypes)
+    if mimetype != wire.JSON_TYPE:
+        etag = f"{etag}-msgpack"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif mimetype == wire.MSGPACK_TYPE:
+        response = Response(wire.pack(build()), mimetype=mimetype)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.vary.add("Accept")
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
-# Function to send data to the server
+# Function to queue data for upload to the server
 def send_to_server(temp_c, humidity, image_path=None):
     """
-    Send sensor data to the server.
+    Queue sensor data for upload to the server.
+    
+    The upload is persisted to the on-disk queue and sent by the background
+    worker, so this returns immediately.
     
     Args:
         temp_c (float): Temperature in Celsius
@@ -115,13 +521,13 @@ def send_to_server(temp_c, humidity, image_path=None):
         image_path (str, optional): Path to the image file to upload
     
     Returns:
-        dict: Response from the server
+        str: Upload job id, or None if the data was incomplete
     """
     if not temp_c or not humidity:
         log_message("Missing temperature or humidity data, skipping data upload", error=True)
         return None
         
-    log_message(f"Sending data to server: Temp={temp_c}°C, Humidity={humidity}%")
+    log_message(f"Queueing data for server: Temp={temp_c}°C, Humidity={humidity}%")
     
     # Prepare the simplified payload - only temperature and humidity
     payload = {
@@ -134,68 +540,79 @@ def send_to_server(temp_c, humidity, image_path=None):
         payload["imagePath"] = image_path
         log_message(f"Including image in data: {image_path}")
     
-    try:
-        # Send the data to our server
-        response = requests.post(
-            f"{SERVER_URL}/api/upload-image",
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=30  # Longer timeout as image upload may take time
-        )
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            response_data = response.json()
-            log_message(f"Data successfully sent: {response_data['message']}")
-            return response_data
-        else:
-            log_message(f"Error from server: {response.status_code} - {response.text}", error=True)
-            return {
-                "success": False,
-                "error": f"Server error: {response.status_code}"
-            }
-    except requests.RequestException as e:
-        log_message(f"Failed to send data to server: {str(e)}", error=True)
-        return {
-            "success": False,
-            "error": str(e)
-        }
+    return upload_queue.enqueue(payload)
 
 # Function to update status LEDs
 def update_status_leds(is_on=False):
     """Update status LEDs based on system state"""
     if is_on:
-        GPIO.output(GREEN_LED_PIN, GPIO.HIGH)
-        GPIO.output(RED_LED_PIN, GPIO.LOW)
+        leds.output(GREEN_LED_PIN, True)
+        leds.output(RED_LED_PIN, False)
         log_message("Status LEDs: GREEN ON (System active)")
     else:
-        GPIO.output(GREEN_LED_PIN, GPIO.LOW)
-        GPIO.output(RED_LED_PIN, GPIO.HIGH)
+        leds.output(GREEN_LED_PIN, False)
+        leds.output(RED_LED_PIN, True)
         log_message("Status LEDs: RED ON (System inactive)")
 
 # Function to blink LED
-def blink_led(count=3, delay=0.2):
-    """Blink LED the specified number of times with the given delay."""
-    for _ in range(count):
-        GPIO.output(CAMERA_PIN, GPIO.HIGH)
-        time.sleep(delay)
-        GPIO.output(CAMERA_PIN, GPIO.LOW)
-        time.sleep(delay)
+def request_blink(count=3):
+    """
+    Blink the camera LED the specified number of times. Returns immediately;
+    the LED job toggles the pin every LED_INTERVAL seconds.
+    """
+    global led_toggles_pending
+    with led_lock:
+        led_toggles_pending = count * 2 - (1 if led_state else 0)
 
 # Function to clean up resources
 def cleanup_resources():
     try:
-        if 'sensor' in globals():
-            sensor.exit()
-    except:
+        scheduler.stop()
+    except Exception:
+        pass
+    for entry in sensors:
+        try:
+            for ts, (t_c, rh) in entry.recorder.flush():
+                entry.store.append(ts, t_c, rh)
+                if entry.derived is not None:
+                    entry.derived.record(ts, t_c, rh)
+            entry.store.close()
+            if entry.derived is not None:
+                entry.derived.store.close()
+        except Exception as e:
+            log_message(f"Failed to flush sensor store for {entry.id}: {str(e)}", error=True)
+    try:
+        upload_queue.stop()
+    except Exception:
         pass
     try:
-        if 'picam2' in globals() and 'camera_available' in locals() and camera_available:
+        webhooks.stop()
+    except Exception:
+        pass
+    for entry in sensors:
+        try:
+            if entry.backend is not None:
+                entry.backend.close()
+        except:
+            pass
+    try:
+        # Save the frames already grabbed before the camera goes away
+        if capture_pipeline is not None:
+            capture_pipeline.stop()
+    except Exception:
+        pass
+    try:
+        # After the capture pipeline, which queues variants for the frames it saves
+        thumbnail_cache.stop()
+    except Exception:
+        pass
+    try:
+        if 'picam2' in globals() and picam2 is not None:
             picam2.close()
     except:
         pass
     # Clean up GPIO
-    GPIO.cleanup()
+    leds.cleanup()
     log_message("Resources cleaned up")
 
 # Setup signal handler for graceful shutdown
@@ -211,6 +628,22 @@ signal.signal(signal.SIGTERM, signal_handler)
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Request timing for /metrics. Routes are labelled by their rule (e.g.
+# /api/images/<image_name>) so per-image URLs don't create new series.
+# Streaming responses are timed to the handler's return, not the last byte.
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        HTTP_REQUEST_SECONDS.labels(route).observe(time.perf_counter() - started)
+        HTTP_REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+    return response
+
 # API routes
 @app.route("/")
 def root():
@@ -218,79 +651,374 @@ def root():
 
 @app.route("/api/control/on")
 def turn_on_system():
-    global sensor_active, camera_active, state_change_count
-    
-    state_change_count += 1
-    log_message(f"STATE CHANGE #{state_change_count}: Turning ON all systems")
-    log_message(f"Previous state: Sensor={sensor_active}, Camera={camera_active}")
-    
-    sensor_active = True
-    camera_active = True
+    previous, current = state.set_active(sensor=True, camera=True, count=True)
+    log_message(f"STATE CHANGE #{current.state_change_count}: Turning ON all systems")
+    log_message(f"Previous state: Sensor={previous.sensor_active}, Camera={previous.camera_active}")
     
     # Update status LEDs
     update_status_leds(True)
+    publish_state(current)
+    if not previous.sensor_active:
+        read_sensors_now()
     
-    log_message(f"New state: Sensor={sensor_active}, Camera={camera_active}")
+    log_message(f"New state: Sensor={current.sensor_active}, Camera={current.camera_active}")
     return jsonify({
-        "sensor_active": sensor_active,
-        "camera_active": camera_active,
+        "sensor_active": current.sensor_active,
+        "camera_active": current.camera_active,
         "message": "All systems turned on"
     })
 
 @app.route("/api/control/off")
 def turn_off_system():
-    global sensor_active, camera_active, state_change_count
-    
-    state_change_count += 1
-    log_message(f"STATE CHANGE #{state_change_count}: Turning OFF all systems")
-    log_message(f"Previous state: Sensor={sensor_active}, Camera={camera_active}")
-    
-    sensor_active = False
-    camera_active = False
+    previous, current = state.set_active(sensor=False, camera=False, count=True)
+    log_message(f"STATE CHANGE #{current.state_change_count}: Turning OFF all systems")
+    log_message(f"Previous state: Sensor={previous.sensor_active}, Camera={previous.camera_active}")
     
     # Update status LEDs
     update_status_leds(False)
+    publish_state(current)
     
-    log_message(f"New state: Sensor={sensor_active}, Camera={camera_active}")
+    log_message(f"New state: Sensor={current.sensor_active}, Camera={current.camera_active}")
     return jsonify({
-        "sensor_active": sensor_active,
-        "camera_active": camera_active,
+        "sensor_active": current.sensor_active,
+        "camera_active": current.camera_active,
         "message": "All systems turned off"
     })
 
+@app.route("/metrics")
+def get_metrics():
+    """Prometheus text exposition of counters, histograms and gauges."""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route("/api/sensor")
 def get_sensor_data():
-    if latest_sensor_data["timestamp"] is None:
+    """
+    Latest primary reading (the original single-sensor fields), plus the
+    latest reading of every sensor keyed by sensor_id under "sensors".
+    """
+    snapshot = state.snapshot
+    if snapshot.sensor_data["timestamp"] is None:
+        return jsonify({"detail": "Sensor data not yet available"}), 503
+    return conditional_json(snapshot.sensor_etag(), lambda: dict(
+        snapshot.sensor_data, sensor_id=sensors.primary.id, sensors=snapshot.sensors))
+
+@app.route("/api/sensors")
+def list_sensors():
+    """Configured sensors with their type, fields, interval, read counts and latest reading."""
+    snapshot = state.snapshot
+    return jsonify({"sensors": [dict(entry.describe(), latest=snapshot.sensors.get(entry.id))
+                                for entry in sensors]})
+
+@app.route("/api/sensors/<sensor_id>")
+def get_sensor_by_id(sensor_id):
+    """Latest reading of one sensor."""
+    if sensor_id not in sensors:
+        return jsonify({"detail": f"Unknown sensor '{sensor_id}'"}), 404
+    snapshot = state.snapshot
+    reading = snapshot.sensors.get(sensor_id)
+    if reading is None:
+        return jsonify({"detail": "Sensor data not yet available"}), 503
+    return conditional_json(snapshot.sensor_etag(), lambda: dict(reading, sensor_id=sensor_id))
+
+@app.route("/api/stream")
+def stream_events():
+    """
+    Server-Sent Events feed of sensor readings ("sensor"), image captures
+    ("capture") and control state changes ("state"). Slow clients that fall
+    behind the buffer get a "dropped" event with the number they missed.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    stream = event_broadcaster.subscribe(last_event_id)
+    if stream is None:
+        return jsonify({"detail": "Too many stream subscribers"}), 503
+    return Response(stream, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route("/api/stream/stats")
+def get_stream_stats():
+    return jsonify(event_broadcaster.stats())
+
+@app.route("/api/sensor/history")
+def get_sensor_history():
+    """
+    Bucketed sensor history across daily segments.
+
+    Query parameters:
+        from (str): Start, epoch seconds or ISO datetime (default: 24h before `to`)
+        to (str): End, epoch seconds or ISO datetime (default: now)
+        bucket (str): 1m, 5m, 15m, 1h or 1d (default: 5m)
+        agg (str): Comma-separated min, max, mean (default: all)
+        sensor (str): Sensor id (default: the primary sensor)
+    """
+    entry = sensors.get(request.args["sensor"]) if "sensor" in request.args else sensors.primary
+    if entry is None:
+        return jsonify({"detail": f"Unknown sensor '{request.args['sensor']}'"}), 404
+    return history_response(entry, entry.store)
+
+def history_response(entry, store):
+    """Stream the bucketed history of ``store`` for the request's from/to/bucket/agg."""
+    try:
+        end = history.parse_time(request.args["to"]) if "to" in request.args else time.time()
+        start = history.parse_time(request.args["from"]) if "from" in request.args else end - 86400
+        bucket = request.args.get("bucket", "5m")
+        aggs = history.parse_aggregates(request.args.get("agg", "min,max,mean"))
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), 400
+
+    if bucket not in history.BUCKETS:
+        return jsonify({"detail": f"Unsupported bucket '{bucket}'. Use one of: {', '.join(history.BUCKETS)}"}), 400
+    if end <= start:
+        return jsonify({"detail": "'to' must be after 'from'"}), 400
+
+    try:
+        bucket_starts, counts, results = history.query_history(
+            store, start, end, history.BUCKETS[bucket], aggs)
+    except Exception as e:
+        log_message(f"Error querying sensor history: {str(e)}", error=True)
+        return jsonify({"detail": str(e)}), 500
+
+    meta = {"from": start, "to": end, "bucket": bucket, "sensor_id": entry.id}
+    # Delta-encoded columns or MessagePack for clients that ask (see wire.py)
+    mimetype = wire.choose_type(request.accept_mimetypes, columns=True)
+    if mimetype == wire.COLUMNS_TYPE:
+        table = history.columns(bucket_starts, counts, results, aggs, store.fields)
+        response = Response(wire.encode_columns(table, meta=meta), mimetype=mimetype)
+    elif mimetype == wire.MSGPACK_TYPE:
+        table = history.columns(bucket_starts, counts, results, aggs, store.fields)
+        response = Response(wire.pack(history.document(meta, table)), mimetype=mimetype)
+    else:
+        response = Response(history.stream_history(meta, bucket_starts, counts, results, aggs, store.fields),
+                            mimetype="application/json")
+    response.vary.add("Accept")
+    return response
+
+def derived_entry():
+    """The sensor a derived-metrics request is for, or an error response."""
+    entry = sensors.get(request.args["sensor"]) if "sensor" in request.args else sensors.primary
+    if entry is None:
+        return None, (jsonify({"detail": f"Unknown sensor '{request.args['sensor']}'"}), 404)
+    if entry.derived is None:
+        reason = "are disabled" if not DERIVED_METRICS else "need a temperature/humidity sensor"
+        return None, (jsonify({"detail": f"Derived metrics {reason} (sensor '{entry.id}')"}), 404)
+    return entry, None
+
+@app.route("/api/sensor/derived")
+def get_derived_metrics():
+    """
+    VPD, dew point, heat index and today's growing degree days for the latest
+    reading, with rolling 1h/24h min/max/mean.
+
+    Query parameters:
+        sensor (str): Sensor id (default: the primary sensor)
+    """
+    entry, error = derived_entry()
+    if error:
+        return error
+    summary = entry.derived.summary()
+    if summary is None:
         return jsonify({"detail": "Sensor data not yet available"}), 503
-    return jsonify(latest_sensor_data)
+    return jsonify(dict(summary, sensor_id=entry.id))
+
+@app.route("/api/sensor/derived/history")
+def get_derived_history():
+    """Bucketed history of the stored derived metrics; same parameters as /api/sensor/history."""
+    entry, error = derived_entry()
+    if error:
+        return error
+    return history_response(entry, entry.derived.store)
+
+@app.route("/api/rules")
+def get_rules():
+    """Configured alert rules with their state and fire counts, and webhook delivery stats."""
+    return jsonify({
+        "rules": rule_engine.describe(),
+        "active": rule_engine.active,
+        "events": rule_engine.events,
+        "webhooks": webhooks.stats(),
+    })
 
 @app.route("/api/images/latest")
 def get_latest_image():
     try:
         # Get the latest image
-        images = sorted(glob.glob(f"{IMAGE_DIR}/*.jpg"))
-        if not images:
+        latest_image = image_index.latest_path()
+        if latest_image is None:
             return jsonify({"detail": "No images found"}), 404
-        latest_image = images[-1]
         return send_file(latest_image)
     except Exception as e:
         return jsonify({"detail": str(e)}), 500
 
+@app.route("/api/images/cache")
+def get_image_cache_stats():
+    return jsonify({"available": thumbnail_cache.available, "cache": thumbnail_cache.stats()})
+
+@app.route("/api/camera/stats")
+def get_camera_stats():
+    """Capture mode, grab/save latency percentiles, dropped frames and change detection."""
+    return jsonify({
+        "mode": CAPTURE_MODE,
+        "interval": TIMELAPSE_INTERVAL if CAPTURE_MODE == "timelapse" else CAPTURE_INTERVAL,
+        "burst": {"count": BURST_COUNT, "spacing": BURST_SPACING} if CAPTURE_MODE == "burst" else None,
+        "camera_available": camera_available,
+        "pipeline": capture_pipeline.stats() if capture_pipeline is not None else None,
+        "change_detection": change_detector.stats() if change_detector is not None else None,
+    })
+
+@app.route("/api/timelapse")
+def list_timelapses():
+    """Assembled timelapse videos, oldest first."""
+    return jsonify({"videos": timelapse.list_videos(TIMELAPSE_DIR)})
+
+@app.route("/api/timelapse/<video_name>")
+def get_timelapse(video_name):
+    """Download one timelapse video."""
+    video_name = os.path.basename(video_name)
+    video_path = os.path.join(TIMELAPSE_DIR, video_name)
+    if not (video_name.startswith(timelapse.PREFIX) and video_name.endswith(timelapse.SUFFIXES)
+            and os.path.exists(video_path)):
+        return jsonify({"detail": "Timelapse not found"}), 404
+    mimetype = "video/mp4" if video_name.endswith(".mp4") else "video/x-motion-jpeg"
+    return send_file(video_path, mimetype=mimetype, conditional=True, max_age=IMAGE_MAX_AGE)
+
+@app.route("/api/storage")
+def get_storage_stats():
+    """Disk usage, retention policies and what retention has removed or rolled up."""
+    return jsonify(retention.stats())
+
 @app.route("/api/images/list")
 def list_images():
+    """
+    List image filenames in capture order.
+
+    Query parameters (all optional):
+        from (str): Captured at or after, epoch seconds or ISO datetime
+        to (str): Captured before, epoch seconds or ISO datetime
+        limit (int): Page size; the response then includes next_cursor
+        cursor (str): next_cursor from the previous page
+    """
+    try:
+        start = history.parse_time(request.args["from"]) if "from" in request.args else None
+        end = history.parse_time(request.args["to"]) if "to" in request.args else None
+        limit = int(request.args["limit"]) if "limit" in request.args else None
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), 400
+    if limit is not None and limit <= 0:
+        return jsonify({"detail": "limit must be positive"}), 400
+
     try:
-        images = sorted(glob.glob(f"{IMAGE_DIR}/*.jpg"))
-        # Return just the filenames, not full paths
-        return jsonify({"images": [os.path.basename(img) for img in images]})
+        images, next_cursor = image_index.list(start, end, limit, request.args.get("cursor"))
+        response = {"images": images}
+        if limit is not None:
+            response["next_cursor"] = next_cursor
+        return jsonify(response)
     except Exception as e:
         return jsonify({"detail": str(e)}), 500
 
 @app.route("/api/images/<image_name>")
 def get_image(image_name):
-    image_path = os.path.join(IMAGE_DIR, image_name)
+    """
+    Serve an image, optionally resized.
+
+    Query parameters (optional):
+        w (int): Width in pixels; the height keeps the aspect ratio
+        q (int): JPEG quality 10-95 (default 75), only used with w
+
+    Responses carry ETag/Last-Modified and honour If-None-Match and
+    If-Modified-Since, so unchanged images are answered with 304.
+    """
+    image_path = os.path.join(IMAGE_DIR, os.path.basename(image_name))
     if not os.path.exists(image_path):
         return jsonify({"detail": "Image not found"}), 404
-    return send_file(image_path)
+
+    if "w" in request.args and thumbnail_cache.available:
+        try:
+            width = int(request.args["w"])
+            quality = int(request.args.get("q", 75))
+        except ValueError:
+            return jsonify({"detail": "w and q must be integers"}), 400
+        try:
+            try:
+                return send_file(thumbnail_cache.get(image_path, width, quality), mimetype="image/jpeg",
+                                 conditional=True, max_age=IMAGE_MAX_AGE)
+            except FileNotFoundError:
+                # Evicted by another request between get() and send_file(); regenerate once
+                return send_file(thumbnail_cache.get(image_path, width, quality), mimetype="image/jpeg",
+                                 conditional=True, max_age=IMAGE_MAX_AGE)
+        except Exception as e:
+            log_message(f"Failed to resize {image_name}: {str(e)}", error=True)
+            return jsonify({"detail": str(e)}), 500
+
+    return send_file(image_path, mimetype="image/jpeg", conditional=True, max_age=IMAGE_MAX_AGE)
+
+# Function to resolve a sensor_log_YYYYMMDD.csv name to a file on disk
+def resolve_log_path(log_name):
+    """
+    Return the path to serve for a log name, exporting it from the sensor
+    store if that day is stored there. Falls back to legacy CSV files
+    written directly to LOG_DIR by older versions.
+    """
+    log_name = os.path.basename(log_name)
+    if log_name.startswith("sensor_log_") and log_name.endswith(".csv"):
+        # sensor_log_YYYYMMDD.csv for the primary sensor,
+        # sensor_log_<sensor_id>_YYYYMMDD.csv for the others
+        sensor_id, _, day = log_name[len("sensor_log_"):-len(".csv")].rpartition("_")
+        entry = sensors.get(sensor_id) if sensor_id else sensors.primary
+        if entry is not None and entry.primary == (not sensor_id) and day in entry.store.days():
+            export_dir = EXPORT_DIR if entry.primary else os.path.join(entry.store.root, "export")
+            return entry.store.csv_for_day(day, export_dir)
+    log_path = os.path.join(LOG_DIR, log_name)
+    if os.path.exists(log_path):
+        return log_path
+    return None
+
+# Function to serve a log file, compressed and/or from an offset
+def send_log(log_path, final):
+    """
+    Send a log CSV with the best Content-Encoding the client accepts.
+    
+    ``final`` logs (past days) are compressed once and cached; today's log
+    is compressed while it streams. ``?since=<offset>`` returns only the
+    bytes from that offset on, for tailing, and every response carries
+    ``X-Next-Offset`` to pass as ``since`` next time. Range requests are
+    served uncompressed by send_file.
+    """
+    encoding = None if request.range is not None else log_files.choose_encoding(request.accept_encodings)
+    since = request.args.get("since", type=int)
+    
+    if since is not None:
+        f, size = log_files.open_log(log_path)
+        # An offset past the end means the client's copy is from an older
+        # export (or another day); start it over from the beginning
+        start = since if 0 <= since <= size else 0
+        body = log_files.iter_file(f, start, size)
+        if encoding:
+            body = log_files.iter_compressed(body, encoding)
+        response = Response(body, mimetype="text/csv")
+        response.headers["X-Log-Offset"] = str(start)
+        response.headers["X-Next-Offset"] = str(size)
+    elif encoding and final:
+        response = send_file(log_cache.get(log_path, encoding), mimetype="text/csv",
+                             download_name=os.path.basename(log_path))
+    elif encoding:
+        f, size = log_files.open_log(log_path)
+        response = Response(log_files.iter_compressed(log_files.iter_file(f, 0, size), encoding),
+                            mimetype="text/csv")
+        response.headers["X-Next-Offset"] = str(size)
+    else:
+        response = send_file(log_path, mimetype="text/csv")
+        response.headers["X-Next-Offset"] = str(os.path.getsize(log_path))
+    
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
 
 @app.route("/api/logs/list")
 def list_logs():
@@ -298,49 +1026,89 @@ def list_logs():
         if not os.path.exists(LOG_DIR):
             return jsonify({"logs": []})
         
-        logs = sorted(glob.glob(f"{LOG_DIR}/*.csv"))
-        return jsonify({"logs": [os.path.basename(log) for log in logs]})
+        logs = {os.path.basename(log) for log in glob.glob(f"{LOG_DIR}/*.csv")}
+        for entry in sensors:
+            logs.update(f"{entry.store.csv_prefix}{day}.csv" for day in entry.store.days())
+        return jsonify({"logs": sorted(logs)})
     except Exception as e:
         return jsonify({"detail": str(e)}), 500
 
 @app.route("/api/logs/<log_name>")
 def get_log(log_name):
-    log_path = os.path.join(LOG_DIR, log_name)
-    if not os.path.exists(log_path):
+    log_path = resolve_log_path(log_name)
+    if log_path is None:
         return jsonify({"detail": "Log file not found"}), 404
-    return send_file(log_path, mimetype="text/csv")
+    # Every day but today is complete and can be served from the cache
+    today = datetime.now().strftime("%Y%m%d")
+    return send_log(log_path, final=not os.path.basename(log_name).endswith(f"_{today}.csv"))
 
 @app.route("/api/logs/today")
 def get_today_log():
     try:
         today = datetime.now().strftime("%Y%m%d")
         log_name = f"sensor_log_{today}.csv"
-        log_path = os.path.join(LOG_DIR, log_name)
+        log_path = resolve_log_path(log_name)
         
-        if not os.path.exists(log_path):
+        if log_path is None:
             return jsonify({"detail": "Today's log file not found"}), 404
             
-        return send_file(log_path, mimetype="text/csv")
+        return send_log(log_path, final=False)
     except Exception as e:
         return jsonify({"detail": str(e)}), 500
 
-@app.route("/api/manual-upload", methods=["POST"])
-def manual_upload():
+# Function to format an upload job for API responses
+def upload_job_response(job):
+    response = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "status_url": f"/api/uploads/{job['id']}",
+        "temperature": job["payload"].get("temperature"),
+        "humidity": job["payload"].get("humidity"),
+        "imagePath": job["payload"].get("imagePath"),
+        "created_at": datetime.fromtimestamp(job["created_at"]).isoformat()
+    }
+    if job["status"] == "done" and job["result"]:
+        data = job["result"].get("data", {})
+        response["imageUrl"] = data.get("imageUrl")
+        response["shortUrl"] = data.get("shortUrl")
+        response["cached"] = bool(job["result"].get("cached"))
+    elif job["status"] == "pending" and job["attempts"]:
+        response["next_attempt_at"] = datetime.fromtimestamp(job["next_attempt_at"]).isoformat()
+    if job["error"]:
+        response["error"] = job["error"]
+    return response
+
+# Function shared by the manual upload endpoints
+def queue_manual_upload(source):
     """
-    Manually trigger sensor data and image upload to the server
-    and return the IPFS image URI
+    Queue the latest sensor data and image for upload and return the job.
+    
+    By default this returns 202 with a job id straight away. Clients that
+    want the old blocking behaviour can pass ?wait=<seconds> (max 30) to
+    wait for the upload to finish and get the IPFS URLs in the response.
     """
     try:
+        wait = min(float(request.args.get("wait", 0)), 30.0)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "wait must be a number of seconds"
+        }), 400
+
+    try:
+        snapshot = state.snapshot
+        
         # Check if sensor is active
-        if not sensor_active:
+        if not snapshot.sensor_active:
             return jsonify({
                 "success": False,
                 "error": "Sensor is inactive. Please activate the sensor first."
             }), 400
             
         # Get the latest sensor data
-        temperature_c = latest_sensor_data.get("temperature_c")
-        humidity = latest_sensor_data.get("humidity")
+        temperature_c = snapshot.sensor_data.get("temperature_c")
+        humidity = snapshot.sensor_data.get("humidity")
         
         if temperature_c is None or humidity is None:
             return jsonify({
@@ -350,15 +1118,14 @@ def manual_upload():
             
         # Get the latest image if camera is active and available
         image_to_upload = None
-        if camera_active:
+        if snapshot.camera_active:
             # Check if camera hardware is available
             camera_available = 'picam2' in globals() and hasattr(picam2, 'capture_file')
             
             if camera_available:
-                images = sorted(glob.glob(f"{IMAGE_DIR}/*.jpg"))
-                if images:
-                    image_to_upload = images[-1]
-                    log_message(f"Using latest image for manual upload: {image_to_upload}")
+                image_to_upload = image_index.latest_path()
+                if image_to_upload:
+                    log_message(f"Using latest image for {source}: {image_to_upload}")
                 else:
                     log_message("No images available for upload", error=True)
             else:
@@ -366,110 +1133,85 @@ def manual_upload():
         else:
             log_message("Camera is inactive, no image will be uploaded")
             
-        # Send data to server
-        server_result = send_to_server(temperature_c, humidity, image_to_upload)
-        
-        if server_result and "data" in server_result:
-            return jsonify({
-                "success": True,
-                "message": "Data uploaded successfully",
-                "temperature": temperature_c,
-                "humidity": humidity,
-                "imageUrl": server_result["data"].get("imageUrl"),
-                "shortUrl": server_result["data"].get("shortUrl"),
-                "timestamp": datetime.now().isoformat()
-            })
-        else:
+        # Queue data for the upload worker
+        job_id = send_to_server(temperature_c, humidity, image_to_upload)
+        if job_id is None:
             return jsonify({
                 "success": False,
-                "error": "Failed to get response from server",
-                "server_response": server_result
-            }), 500
+                "error": "Missing temperature or humidity data"
+            }), 400
+        
+        job = upload_queue.wait(job_id, wait) if wait > 0 else upload_queue.get(job_id)
+        
+        if job["status"] == "done":
+            return jsonify(dict(upload_job_response(job), success=True,
+                                message="Data uploaded successfully"))
+        if job["status"] == "failed":
+            return jsonify(dict(upload_job_response(job), success=False,
+                                message="Upload failed")), 502
+        return jsonify(dict(upload_job_response(job), success=True,
+                            message="Upload queued")), 202
             
     except Exception as e:
-        log_message(f"Error in manual upload: {str(e)}", error=True)
+        log_message(f"Error in {source}: {str(e)}", error=True)
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
+@app.route("/api/manual-upload", methods=["POST"])
+def manual_upload():
+    """
+    Manually queue sensor data and image upload to the server
+    and return the upload job id
+    """
+    return queue_manual_upload("manual upload")
+
 @app.route("/api/manual-upload/get", methods=["GET"])
 def manual_upload_get():
     """
-    GET endpoint to manually trigger sensor data and image upload to the server
-    and return the IPFS image URI
+    GET endpoint to manually queue sensor data and image upload to the server
+    and return the upload job id
     """
-    try:
-        # Check if sensor is active
-        if not sensor_active:
-            return jsonify({
-                "success": False,
-                "error": "Sensor is inactive. Please activate the sensor first."
-            }), 400
-            
-        # Get the latest sensor data
-        temperature_c = latest_sensor_data.get("temperature_c")
-        humidity = latest_sensor_data.get("humidity")
-        
-        if temperature_c is None or humidity is None:
-            return jsonify({
-                "success": False,
-                "error": "No sensor data available. Please wait for sensor readings."
-            }), 400
-            
-        # Get the latest image if camera is active and available
-        image_to_upload = None
-        if camera_active:
-            # Check if camera hardware is available
-            camera_available = 'picam2' in globals() and hasattr(picam2, 'capture_file')
-            
-            if camera_available:
-                images = sorted(glob.glob(f"{IMAGE_DIR}/*.jpg"))
-                if images:
-                    image_to_upload = images[-1]
-                    log_message(f"Using latest image for GET manual upload: {image_to_upload}")
-                else:
-                    log_message("No images available for upload", error=True)
-            else:
-                log_message("Camera hardware is unavailable, continuing without image")
-        else:
-            log_message("Camera is inactive, no image will be uploaded")
-            
-        # Send data to server
-        server_result = send_to_server(temperature_c, humidity, image_to_upload)
-        
-        if server_result and "data" in server_result:
-            return jsonify({
-                "success": True,
-                "message": "Data uploaded successfully",
-                "temperature": temperature_c,
-                "humidity": humidity,
-                "imageUrl": server_result["data"].get("imageUrl"),
-                "shortUrl": server_result["data"].get("shortUrl"),
-                "timestamp": datetime.now().isoformat()
-            })
-        else:
-            return jsonify({
-                "success": False,
-                "error": "Failed to get response from server",
-                "server_response": server_result
-            }), 500
-            
-    except Exception as e:
-        log_message(f"Error in manual upload GET: {str(e)}", error=True)
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 500
+    return queue_manual_upload("GET manual upload")
+
+@app.route("/api/uploads/<job_id>")
+def get_upload_status(job_id):
+    """Status of a queued upload, including IPFS URLs once it is done"""
+    job = upload_queue.get(job_id)
+    if job is None:
+        return jsonify({"detail": "Upload job not found"}), 404
+    return jsonify(upload_job_response(job))
+
+@app.route("/api/uploads")
+def get_upload_queue_stats():
+    return jsonify({"queue": upload_queue.stats(),
+                    "cache": upload_cache.stats() if upload_cache is not None else None})
 
 @app.route("/api/control/status")
 def get_status():
-    return jsonify({
-        "sensor_active": sensor_active,
-        "camera_active": camera_active,
+    snapshot = state.snapshot
+    return conditional_json(snapshot.control_etag(), lambda: {
+        "sensor_active": snapshot.sensor_active,
+        "camera_active": snapshot.camera_active,
         "message": "Current system status"
     })
 
+@app.route("/api/health")
+def get_health():
+    """
+    Startup status of each subsystem. 200 once everything is ready (or an
+    optional subsystem failed: "degraded"), 503 while starting or if a
+    required one failed.
+    """
+    health = readiness.status()
+    return jsonify(health), 200 if health["status"] in ("ready", "degraded") else 503
+
+@app.route("/api/scheduler")
+def get_scheduler_stats():
+    """Per-job interval, start jitter, run duration, skipped ticks and errors"""
+    return jsonify({"jobs": scheduler.stats(), "recording": recorder.stats()})
+
 @app.route("/api/server/settings", methods=["POST"])
 def update_server_settings():
     global SERVER_URL
@@ -506,39 +1248,33 @@ def update_server_settings():
 
 @app.route("/api/control", methods=["POST"])
 def control_system():
-    global sensor_active, camera_active, state_change_count
-    
     # Parse JSON data from request
     control = request.get_json()
     if not control:
+        snapshot = state.snapshot
         return jsonify({
-            "sensor_active": sensor_active,
-            "camera_active": camera_active,
+            "sensor_active": snapshot.sensor_active,
+            "camera_active": snapshot.camera_active,
             "message": "No data provided"
         }), 400
     
+    # Apply both changes in one atomic update
+    previous, current = state.set_active(sensor=control.get("sensor"), camera=control.get("camera"))
+    state_changed = current is not previous
+    
     # Track what was changed for the response message
     changes = []
-    state_changed = False
-    prev_both_active = sensor_active and camera_active
-    
-    # Update sensor status if provided
-    if "sensor" in control and control["sensor"] != sensor_active:
-        state_change_count += 1
-        state_changed = True
-        log_message(f"STATE CHANGE #{state_change_count}: Sensor {sensor_active} -> {control['sensor']}")
-        sensor_active = control["sensor"]
-        status = "started" if control["sensor"] else "stopped"
+    
+    # Report sensor status change
+    if current.sensor_active != previous.sensor_active:
+        log_message(f"STATE CHANGE #{current.state_change_count}: Sensor {previous.sensor_active} -> {current.sensor_active}")
+        status = "started" if current.sensor_active else "stopped"
         changes.append(f"Sensor data collection {status}")
     
-    # Update camera status if provided
-    if "camera" in control and control["camera"] != camera_active:
-        if not state_changed:
-            state_change_count += 1
-        state_changed = True
-        log_message(f"STATE CHANGE #{state_change_count}: Camera {camera_active} -> {control['camera']}")
-        camera_active = control["camera"]
-        status = "started" if control["camera"] else "stopped"
+    # Report camera status change
+    if current.camera_active != previous.camera_active:
+        log_message(f"STATE CHANGE #{current.state_change_count}: Camera {previous.camera_active} -> {current.camera_active}")
+        status = "started" if current.camera_active else "stopped"
         changes.append(f"Camera capture {status}")
     
     # If nothing was changed, inform the user
@@ -548,8 +1284,8 @@ def control_system():
         message = ". ".join(changes)
     
     # Update LEDs based on current state
-    both_active_now = sensor_active and camera_active
-    both_inactive_now = not sensor_active and not camera_active
+    both_active_now = current.sensor_active and current.camera_active
+    both_inactive_now = not current.sensor_active and not current.camera_active
     
     if both_active_now:
         update_status_leds(True)
@@ -557,145 +1293,345 @@ def control_system():
         update_status_leds(False)
     else:
         # Partial state - blink both LEDs to indicate mixed state
-        GPIO.output(GREEN_LED_PIN, GPIO.HIGH if sensor_active else GPIO.LOW)
-        GPIO.output(RED_LED_PIN, GPIO.HIGH if camera_active else GPIO.LOW)
+        leds.output(GREEN_LED_PIN, current.sensor_active)
+        leds.output(RED_LED_PIN, current.camera_active)
+    
+    if state_changed:
+        publish_state(current)
+    if current.sensor_active and not previous.sensor_active:
+        read_sensors_now()
     
-    log_message(f"Current state: Sensor={sensor_active}, Camera={camera_active}")
+    log_message(f"Current state: Sensor={current.sensor_active}, Camera={current.camera_active}")
     return jsonify({
-        "sensor_active": sensor_active,
-        "camera_active": camera_active,
+        "sensor_active": current.sensor_active,
+        "camera_active": current.camera_active,
         "message": message
     })
 
-# Sensor monitoring function - runs in a separate thread
-def sensor_monitoring_loop():
-    global sensor, picam2
+def read_sensors_now():
+    """
+    Read every started sensor now instead of at its next tick, when sensing
+    is turned back on. The filters start over, as their windows hold
+    samples from before the pause.
+    """
+    for entry in sensors:
+        entry.filter.reset()
+        job = scheduler.jobs.get(entry.job_name)
+        if job is not None:
+            job.run_now()
+
+# Monitoring jobs - each runs on its own scheduler thread and interval
+def sensor_job(sensor_id=None):
+    """
+    Read one sensor (the primary by default) into its filter and, every
+    ``oversample`` reads, publish and record the filtered reading.
+    """
+    if not state.snapshot.sensor_active:
+        return
+    entry = sensors.get(sensor_id) if sensor_id is not None else sensors.primary
+    read_seconds, reads_ok, reads_error = sensor_metrics[entry.id]
+    label = "Sensor" if entry.primary else f"Sensor {entry.id}"
+    entry.ticks += 1
+    started = time.perf_counter()
+    try:
+        # Read sensor data
+        raw = entry.backend.read()
+    except RuntimeError as error:
+        read_seconds.observe(time.perf_counter() - started)
+        reads_error.inc()
+        entry.errors += 1
+        entry.last_error = str(error)
+        entry.filter.fail()
+        # Errors happen fairly often, DHT's are hard to read; the next
+        # scheduled read simply tries again
+        log_message(f"{label} read error: {error.args[0]}", error=True)
+    else:
+        read_seconds.observe(time.perf_counter() - started)
+        reads_ok.inc()
+        entry.reads += 1
+        if entry.filter.add(time.time(), raw) == "rejected":
+            log_message(f"{label} reading rejected as implausible: {raw}", error=True)
+    if entry.ticks % entry.oversample:
+        return
+    result = entry.filter.output()
+    if result is None:
+        return
+    (temperature_c, humidity), confidence = result
+    temperature_f = temperature_c * (9 / 5) + 32
+    
+    # Print data
+    log_message(f"{label}: Temp={temperature_c:0.1f}ºC, Temp={temperature_f:0.1f}ºF, "
+                f"{entry.fields[1].capitalize()}={humidity:0.1f}%, confidence={confidence}", level=logging.DEBUG)
+    
+    # Update latest sensor data
+    update_sensor_data(temperature_c, temperature_f, humidity, entry, confidence)
+    values = entry.derived.update(time.time(), temperature_c, humidity) if entry.derived is not None else {}
+    
+    # Check the alert rules against the reading and its derived metrics
+    if rule_engine.has_rules(entry.id):
+        reading = dict(values, temperature_c=temperature_c, temperature_f=temperature_f)
+        reading[entry.fields[1]] = humidity
+        reading.pop("timestamp", None)
+        now = time.time()
+        for rule, event in rule_engine.evaluate(entry.id, now, reading):
+            run_alert(entry, rule, event, now, reading)
     
-    # Initialize the camera with error handling
-    camera_available = False
+    # Log to CSV
+    log_to_csv(temperature_c, temperature_f, humidity, entry)
+    
+    # Sample less often while the readings are steady
+    if ADAPTIVE_SAMPLING and entry.primary:
+        interval = sampling.update((temperature_c, humidity))
+        scheduler.jobs[entry.job_name].set_interval(interval / entry.oversample)
+
+def run_alert(entry, rule, event, timestamp, reading):
+    """Announce a rule firing or clearing and carry out its actions."""
+    alert = {
+        "rule": rule.id,
+        "event": event,
+        "sensor_id": entry.id,
+        "when": rule.when,
+        "timestamp": timestamp,
+        "reading": reading,
+        "machine_id": machine_id,
+    }
+    log_message(f"Rule '{rule.id}' {event}: {' and '.join(rule.when)}", level=logging.WARNING)
+    event_broadcaster.publish("alert", alert)
+    for action in rule.actions:
+        if action["type"] == "capture":
+            if event == "fired":
+                request_capture()
+        elif action["type"] == "webhook":
+            if not webhooks.send(action["url"], alert):
+                log_message(f"Webhook queue full, dropped {event} alert for rule '{rule.id}'", error=True)
+        elif action["type"] == "gpio":
+            with rule_pins_lock:
+                active = rule_pins_active.setdefault(action["pin"], set())
+                if event == "fired":
+                    active.add((entry.id, rule.id))
+                else:
+                    active.discard((entry.id, rule.id))
+                leds.output(action["pin"], bool(active))
+
+def request_capture():
+    """Have the camera job take a still now, whether or not capture is on."""
+    global capture_requested
+    capture_requested = True
+    job = scheduler.jobs.get("camera")
+    if job is not None:
+        job.run_now()
+
+def image_saved(image_path, latency):
+    """Called by the capture pipeline once an image is on disk."""
+    FRAME_SAVE_SECONDS.observe(latency)
+    captures_ok.inc()
+    image_index.add(image_path)
+    retention.note_image(image_path)
+    thumbnail_cache.submit(image_path)
+    log_message(f"Image captured: {image_path}")
+    event_broadcaster.publish("capture", {
+        "image": os.path.basename(image_path),
+        "timestamp": time.time()
+    })
+
+def camera_job():
+    """Grab a still (or a burst) if the camera is on; the pipeline saves it."""
+    global camera_available, capture_requested
+    requested, capture_requested = capture_requested, False
+    if not (state.snapshot.camera_active or requested) or not camera_available:
+        return
     try:
-        picam2 = Picamera2()
-        camera_config = picam2.create_still_configuration()
-        picam2.configure(camera_config)
-        picam2.start()
-        camera_available = True
-        log_message("Camera initialized successfully")
-    except Exception as e:
-        log_message(f"Camera initialization failed: {str(e)}", error=True)
-        log_message("System will continue without camera functionality")
-        camera_available = False
+        now = time.time()
+        
+        # Blink LED to indicate picture is being taken (runs on the LED job)
+        request_blink()
+        
+        # Grab the frame(s); encoding and writing happen on the capture workers
+        started = time.perf_counter()
+        if CAPTURE_MODE == "burst":
+            paths = [os.path.join(IMAGE_DIR, burst_name(now, i + 1)) for i in range(BURST_COUNT)]
+            capture_pipeline.burst(paths, BURST_SPACING)
+        else:
+            capture_pipeline.capture(os.path.join(IMAGE_DIR, name_for_time(now)))
+        CAPTURE_SECONDS.observe(time.perf_counter() - started)
+    except Exception as error:
+        captures_error.inc()
+        log_message(f"Camera error: {str(error)}", error=True)
+        camera_available = False  # Mark camera as unavailable after error
+        log_message("Camera marked as unavailable due to error")
+
+def timelapse_job():
+    """Assemble the timelapse of every recent finished day that lacks one."""
+    today = datetime.now().strftime("%Y%m%d")
+    for day in timelapse.pending_days(image_index, TIMELAPSE_DIR, today):
+        result = timelapse.assemble_day(image_index, day, TIMELAPSE_DIR, TIMELAPSE_FPS,
+                                        log=lambda message, error=False: log_message(message, error))
+        if result is not None:
+            log_message(f"Timelapse for {day} assembled from {result['frames']} images")
+
+def retention_job():
+    """Apply the image and reading retention policies and quotas."""
+    summary = retention.run()
+    removed = {key: n for key, n in summary.items() if n and key not in ("bytes_freed", "errors")}
+    if removed:
+        log_message(f"Retention: {', '.join(f'{n} {key}' for key, n in removed.items())}, "
+                    f"{summary['bytes_freed'] / 1e6:.1f} MB freed")
 
-    # Initialize DHT22 sensor
-    sensor = adafruit_dht.DHT22(board.D4)
+def led_job():
+    """Advance any pending camera LED blink by one step."""
+    global led_toggles_pending, led_state
+    with led_lock:
+        if led_toggles_pending <= 0:
+            return
+        led_toggles_pending -= 1
+        led_state = not led_state
+        on = led_state
+    leds.output(CAMERA_PIN, on)
 
-    # Time tracking for camera
-    last_capture_time = 0
-    CAPTURE_INTERVAL = 60  # Capture every 60 seconds (1 minute)
+def queue_readings():
+    """Queue the readings recorded since the last batch as columns batches, per sensor."""
+    for entry in sensors:
+        ts, temp_c, values = entry.store.query(readings_uploaded_through[entry.id])
+        # Only move past what was sent: a reading the recorder held back is
+        # stored later, but never before one already stored
+        if len(ts):
+            readings_uploaded_through[entry.id] = int(ts[-1]) + 1
+        for i in range(0, len(ts), UPLOAD_BATCH_READINGS):
+            j = i + UPLOAD_BATCH_READINGS
+            body = wire.encode_columns(
+                {"timestamp": ts[i:j], "temperature_c": temp_c[i:j], entry.fields[1]: values[i:j]},
+                meta={"machine_id": machine_id, "sensor_id": entry.id})
+            upload_queue.enqueue({"readings": base64.b64encode(body).decode(), "sensor_id": entry.id,
+                                  "count": len(ts[i:j])})
 
-    # Debug state change counter
-    previous_sensor_state = sensor_active
-    previous_camera_state = camera_active
-    state_changes = 0
+def upload_job():
+    """Queue the latest reading and image for upload (AUTO_UPLOAD_INTERVAL)."""
+    global last_uploaded_record, last_uploaded_image
+    if UPLOAD_READINGS:
+        queue_readings()
+    snapshot = state.snapshot
+    if not snapshot.sensor_active or snapshot.sensor_data["timestamp"] is None:
+        return
+    # Nothing recorded since the last upload means nothing new to send
+    if recorder.recorded == last_uploaded_record:
+        return
+    last_uploaded_record = recorder.recorded
+    image_path = image_index.latest_path() if snapshot.camera_active and camera_available else None
+    # An image already sent (nothing new was kept since) isn't sent again
+    if image_path == last_uploaded_image:
+        image_path = None
+    elif image_path is not None:
+        last_uploaded_image = image_path
+    send_to_server(snapshot.sensor_data["temperature_c"], snapshot.sensor_data["humidity"], image_path)
 
-    log_message("Sensor monitoring thread started")
+def status_job():
+    """Log state changes and the current status."""
+    global previous_monitor_state, monitor_state_changes
+    snapshot = state.snapshot
+    sensor_status = snapshot.sensor_active
+    camera_status = snapshot.camera_active and camera_available
     
-    running = True
-    while running:
-        try:
-            # Get current status
-            sensor_status = sensor_active
-            camera_status = camera_active and camera_available
-            
-            # Track state changes for debugging
-            if (previous_sensor_state != sensor_status) or (previous_camera_state != camera_status):
-                state_changes += 1
-                log_message(f"MONITOR: STATE CHANGE #{state_changes}: Sensor {previous_sensor_state}->{sensor_status}, Camera {previous_camera_state}->{camera_status}")
-                previous_sensor_state = sensor_status
-                previous_camera_state = camera_status
-            
-            # Log current status periodically
-            status_text = f"Status: Sensor {'ACTIVE' if sensor_status else 'INACTIVE'}, Camera {'ACTIVE' if camera_status else 'INACTIVE'}"
-            if camera_active and not camera_available:
-                status_text += " (Camera hardware unavailable)"
-            log_message(status_text)
-            
-            # If both sensor and camera are inactive, just sleep and continue the loop
-            if not sensor_status and not camera_status:
-                log_message("Both sensor and camera are inactive. Monitoring paused.")
-                time.sleep(5)  # Check every 5 seconds
-                continue
-            
-            current_time = time.time()
-            temperature_c = None
-            temperature_f = None
-            humidity = None
-            latest_image_path = None
-            
-            # Only read from sensor if sensor is active
-            if sensor_status:
-                try:
-                    # Read sensor data
-                    temperature_c = sensor.temperature
-                    temperature_f = temperature_c * (9 / 5) + 32
-                    humidity = sensor.humidity
-                    
-                    # Print data
-                    log_message(f"Temp={temperature_c:0.1f}ºC, Temp={temperature_f:0.1f}ºF, Humidity={humidity:0.1f}%")
-                    
-                    # Update latest sensor data
-                    update_sensor_data(temperature_c, temperature_f, humidity)
-                    
-                    # Log to CSV
-                    log_to_csv(temperature_c, temperature_f, humidity)
-                except RuntimeError as error:
-                    # Errors happen fairly often, DHT's are hard to read, just keep going
-                    log_message(f"Sensor read error: {error.args[0]}", error=True)
-                    time.sleep(2.0)
-                    continue
-                except Exception as error:
-                    log_message(f"Critical error: {str(error)}", error=True)
-                    cleanup_resources()
-                    sys.exit(1)
-            else:
-                log_message("Sensor is inactive, skipping sensor reading")
-            
-            # Check if camera is active and available, and it's time to capture an image
-            if camera_status and camera_available and current_time - last_capture_time >= CAPTURE_INTERVAL:
-                try:
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    image_path = f"{IMAGE_DIR}/image_{timestamp}.jpg"
-                    
-                    # Double-check camera is still active
-                    if camera_active:
-                        # Blink LED to indicate picture is being taken
-                        blink_led()
-                        
-                        # Capture image
-                        picam2.capture_file(image_path)
-                        log_message(f"Image captured: {image_path}")
-                        latest_image_path = image_path
-                        
-                        # Update last capture time
-                        last_capture_time = current_time
-                        
-                        # Calculate time until next capture
-                        next_capture = last_capture_time + CAPTURE_INTERVAL
-                        next_capture_time = datetime.fromtimestamp(next_capture).strftime("%H:%M:%S")
-                        log_message(f"Next image scheduled for: {next_capture_time}")
-                    else:
-                        log_message("Camera was deactivated during capture preparation, skipping")
-                except Exception as error:
-                    log_message(f"Camera error: {str(error)}", error=True)
-                    camera_available = False  # Mark camera as unavailable after error
-                    log_message("Camera marked as unavailable due to error")
-            elif camera_status and not camera_available:
-                log_message("Camera is active but hardware is unavailable, skipping image capture")
-            
-            # Short sleep between readings
-            time.sleep(3.0)
-        except Exception as e:
-            log_message(f"Unexpected error in monitoring loop: {str(e)}", error=True)
-            time.sleep(5)  # Wait a bit before retrying
+    # Track state changes for debugging
+    if previous_monitor_state != (sensor_status, camera_status):
+        monitor_state_changes += 1
+        previous_sensor_state, previous_camera_state = previous_monitor_state
+        log_message(f"MONITOR: STATE CHANGE #{monitor_state_changes}: Sensor {previous_sensor_state}->{sensor_status}, Camera {previous_camera_state}->{camera_status}")
+        previous_monitor_state = (sensor_status, camera_status)
+    
+    # Log current status periodically
+    status_text = f"Status: Sensor {'ACTIVE' if sensor_status else 'INACTIVE'}, Camera {'ACTIVE' if camera_status else 'INACTIVE'}"
+    if snapshot.camera_active and not camera_available:
+        status_text += " (Camera hardware unavailable)"
+    log_message(status_text)
+    
+    if not sensor_status and not camera_status:
+        log_message("Both sensor and camera are inactive. Monitoring paused.")
+
+# Start monitoring - starts the scheduler jobs and brings up the hardware in
+# the background. Opening the camera or a DHT driver can take seconds on a
+# Pi; the HTTP API answers meanwhile and /api/health shows the progress.
+def start_monitoring():
+    global monitoring_started
+    
+    # Only ever one set of monitoring jobs per process
+    with monitoring_lock:
+        if monitoring_started:
+            log_message("Sensor monitoring already running")
+            return
+        monitoring_started = True
+    
+    # The camera and each sensor initialize in parallel and add their jobs
+    # when ready. The primary sensor is required; any other that fails to
+    # initialize is skipped.
+    readiness.start("camera", start_camera)
+    for entry in sensors:
+        readiness.start(f"sensor:{entry.id}", functools.partial(start_sensor, entry), required=entry.primary)
+
+    if CAPTURE_MODE == "timelapse":
+        scheduler.add("timelapse", 3600, timelapse_job, initial_delay=60)
+    if RETENTION_INTERVAL > 0:
+        scheduler.add("retention", RETENTION_INTERVAL, retention_job, initial_delay=120)
+    scheduler.add("led", LED_INTERVAL, led_job)
+    scheduler.add("status", STATUS_INTERVAL, status_job)
+    if AUTO_UPLOAD_INTERVAL > 0:
+        scheduler.add("upload", AUTO_UPLOAD_INTERVAL, upload_job, initial_delay=AUTO_UPLOAD_INTERVAL)
+    scheduler.start()
+    log_message("Sensor monitoring started")
+
+def start_camera():
+    """Initialize the camera and capture pipeline; returns False if the camera is disabled."""
+    global picam2, camera_available, capture_pipeline
+    
+    try:
+        camera = create_camera_backend()
+    except Exception as e:
+        log_message(f"Camera initialization failed: {str(e)}", error=True)
+        log_message("System will continue without camera functionality")
+        raise
+    if camera is None:
+        log_message("Camera disabled by AGROX_CAMERA_BACKEND=none")
+        return False
+    picam2 = camera
+    log_message(f"Camera initialized successfully ({type(picam2).__name__})")
+    capture_pipeline = CapturePipeline(
+        picam2, workers=CAPTURE_WORKERS, buffers=CAPTURE_BUFFERS, quality=CAPTURE_QUALITY,
+        on_saved=image_saved, detector=change_detector,
+        log=lambda message, error=False: log_message(message, error))
+    capture_pipeline.start()
+    if not capture_pipeline.available:
+        log_message("Capture pipeline unavailable (needs Pillow and a camera that grabs frames); "
+                    "the camera encodes on the monitoring thread"
+                    + (" and change detection is off" if CHANGE_DETECTION else ""))
+    camera_available = True
+    scheduler.add("camera", TIMELAPSE_INTERVAL if CAPTURE_MODE == "timelapse" else CAPTURE_INTERVAL, camera_job)
+
+def start_sensor(entry):
+    """Initialize one sensor and start its polling job."""
+    try:
+        entry.backend = create_sensor_backend() if entry.config.get("from_env") else create_sensor(entry.config)
+    except Exception as e:
+        entry.last_error = str(e)
+        if entry.primary:
+            log_message(f"Sensor initialization failed: {str(e)}", error=True)
+        else:
+            log_message(f"Sensor {entry.id} initialization failed, skipping it: {str(e)}", error=True)
+        raise
+    log_message(f"Sensor {entry.id} initialized ({type(entry.backend).__name__}, every {entry.interval}s"
+                + (f", {entry.oversample} reads each)" if entry.oversample > 1 else ")"))
+    scheduler.add(entry.job_name, entry.read_interval, functools.partial(sensor_job, entry.id))
+
+def start_derived():
+    """Seed the derived-metric windows from the last 24h and backfill past days; False if disabled."""
+    entries = [entry for entry in sensors if entry.derived is not None]
+    if not entries:
+        return False
+    now = time.time()
+    for entry in entries:
+        entry.derived.seed(*entry.store.query(now - 86400), now=now)
+        summary = derived.backfill(entry.store, entry.derived.store, base=GDD_BASE_C, cap=GDD_CAP_C)
+        if summary["days"]:
+            log_message(f"Derived metrics backfilled for {entry.id}: {summary['days']} days, "
+                        f"{summary['rows']} readings in {summary['seconds']:.2f}s")
 
 def main():
     """Main function to start both the API server and sensor monitoring."""
@@ -704,20 +1640,58 @@ def main():
     # Initial LED state - start with system off
     update_status_leds(False)
     
-    # Start sensor monitoring thread
-    sensor_thread = threading.Thread(target=sensor_monitoring_loop, daemon=True)
-    sensor_thread.start()
-    log_message("Sensor monitoring thread started")
+    # Index existing images and start the upload queue and thumbnail
+    # workers in the background
+    readiness.start("images", image_index.rebuild)
+    readiness.start("derived", start_derived)
+    upload_queue.start()
+    thumbnail_cache.start()
+    webhooks.start()
+    
+    # Start sensor monitoring jobs; the hardware comes up in the background
+    start_monitoring()
     
     # Start Flask API server
-    log_message("Starting API server on http://0.0.0.0:8000")
+    log_message(f"Starting API server on http://0.0.0.0:{API_PORT}")
     log_message("Control your system using the following endpoints:")
-    log_message("- Turn ON: http://[ip]:8000/api/control/on")
-    log_message("- Turn OFF: http://[ip]:8000/api/control/off")
-    log_message("- Check status: http://[ip]:8000/api/control/status")
-    log_message("- Manual upload (POST): POST http://[ip]:8000/api/manual-upload (returns IPFS image URL)")
-    log_message("- Manual upload (GET): http://[ip]:8000/api/manual-upload/get (returns IPFS image URL)")
-    app.run(host="0.0.0.0", port=8000, debug=False, use_reloader=False)
+    log_message(f"- Turn ON: http://[ip]:{API_PORT}/api/control/on")
+    log_message(f"- Turn OFF: http://[ip]:{API_PORT}/api/control/off")
+    log_message(f"- Check status: http://[ip]:{API_PORT}/api/control/status")
+    log_message(f"- Health: http://[ip]:{API_PORT}/api/health (per-subsystem startup status)")
+    log_message(f"- Manual upload (POST): POST http://[ip]:{API_PORT}/api/manual-upload (returns upload job id)")
+    log_message(f"- Manual upload (GET): http://[ip]:{API_PORT}/api/manual-upload/get (returns upload job id)")
+    log_message(f"- Upload status: http://[ip]:{API_PORT}/api/uploads/<job_id> (returns IPFS image URL when done)")
+    run_server()
+
+# Function to run the HTTP server
+def run_server():
+    """
+    Serve the API with waitress (SERVER_MODE=production, the default) or
+    Flask's development server (SERVER_MODE=dev). Falls back to the
+    development server if waitress is not installed.
+    """
+    if SERVER_MODE == "production":
+        try:
+            from waitress import serve
+        except ImportError:
+            log_message("waitress is not installed, falling back to the development server", error=True)
+        else:
+            # Streams beyond their thread budget get a 503 instead of
+            # starving regular API requests of worker threads
+            event_broadcaster.max_subscribers = min(event_broadcaster.max_subscribers, STREAM_THREADS)
+            log_message(f"Serving with waitress: {API_THREADS} API threads + {STREAM_THREADS} stream threads, "
+                        f"{API_CONNECTION_LIMIT} connections, {API_KEEPALIVE_TIMEOUT}s keep-alive")
+            serve(
+                app,
+                host="0.0.0.0",
+                port=API_PORT,
+                threads=API_THREADS + STREAM_THREADS,
+                connection_limit=API_CONNECTION_LIMIT + STREAM_THREADS,
+                channel_timeout=API_KEEPALIVE_TIMEOUT,
+                ident="AgroX-IoT"
+            )
+            return
+    app.run(host="0.0.0.0", port=API_PORT, debug=False, use_reloader=False, threaded=True)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
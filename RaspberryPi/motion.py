@@ -0,0 +1,114 @@
+"""
+Change detection between captured frames.
+
+A static crop bed gives nearly identical stills minute after minute.
+``ChangeDetector`` looks at each raw frame before it is encoded and decides
+whether it is worth keeping. It compares the frame with the last kept frame,
+not the previous one, so a slow change adds up until it is kept.
+
+The frame is reduced to a small grayscale image (64x48 by default). Each
+small pixel is the mean of a 4x4 grid of samples spread over its block of
+the full frame. The grid is read as 16 strided views of the frame, which
+are summed. Only about 50,000 of the frame's millions of pixels are read,
+and nothing the size of the frame is copied. Averaging the samples also
+smooths out sensor noise.
+
+The change score is the fraction of small pixels whose brightness moved by
+more than ``pixel_delta`` (0-255). A frame is kept when the score reaches
+``threshold``, or when the last kept frame is older than
+``keyframe_interval``.
+"""
+
+import numpy as np
+
+# Samples per block along each axis
+SAMPLES = 4
+# ITU-R BT.601 luma weights, divided by the samples summed per block
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32) / (SAMPLES * SAMPLES)
+
+
+class ChangeDetector:
+    """Keeps frames that differ enough from the last kept one, plus keyframes."""
+
+    def __init__(self, threshold=0.02, pixel_delta=12, keyframe_interval=900.0, size=(64, 48)):
+        """
+        Args:
+            threshold (float): Fraction of changed pixels that makes a frame worth keeping
+            pixel_delta (int): Brightness change (0-255) for a pixel to count as changed
+            keyframe_interval (float): Keep a frame at least this often (seconds)
+            size (tuple): (width, height) of the comparison image
+        """
+        self.threshold = float(threshold)
+        self.pixel_delta = pixel_delta
+        self.keyframe_interval = keyframe_interval
+        self.size = size
+        self.checked = 0
+        self.kept = 0
+        self.keyframes = 0
+        self.last_score = None
+        self._reference = None     # small image of the last kept frame
+        self._kept_at = None
+        self._grids = {}           # frame shape -> sample slices
+
+    def _sample_grid(self, shape):
+        """
+        One ``(rows, cols)`` slice pair per sample position in a block; each
+        picks that sample from every block.
+        """
+        grid = self._grids.get(shape)
+        if grid is None:
+            width, height = self.size
+            block_y, block_x = shape[0] // height, shape[1] // width
+            step_y, step_x = max(1, block_y // SAMPLES), max(1, block_x // SAMPLES)
+            grid = []
+            for dy in range(SAMPLES):
+                y = min(step_y // 2 + dy * step_y, block_y - 1)
+                for dx in range(SAMPLES):
+                    x = min(step_x // 2 + dx * step_x, block_x - 1)
+                    grid.append((slice(y, y + block_y * height, block_y),
+                                 slice(x, x + block_x * width, block_x)))
+            self._grids[shape] = grid
+        return grid
+
+    def downscale(self, frame):
+        """The small grayscale image of a (height, width, 3) uint8 RGB frame."""
+        width, height = self.size
+        total = np.zeros((height, width, 3), dtype=np.uint16)
+        for rows, cols in self._sample_grid(frame.shape[:2]):
+            total += frame[rows, cols]
+        return total.astype(np.float32) @ LUMA
+
+    def check(self, frame, now):
+        """
+        Decide whether to keep ``frame``, captured at ``now`` (epoch seconds).
+        A kept frame becomes the new reference.
+        """
+        self.checked += 1
+        small = self.downscale(frame)
+        if self._reference is None:
+            score = 1.0
+        else:
+            changed = np.count_nonzero(np.abs(small - self._reference) > self.pixel_delta)
+            score = changed / small.size
+        self.last_score = round(score, 4)
+        keyframe = self._kept_at is None or now - self._kept_at >= self.keyframe_interval
+        if score < self.threshold and not keyframe:
+            return False
+        if score < self.threshold:
+            self.keyframes += 1
+        self.kept += 1
+        self._reference = small
+        self._kept_at = now
+        return True
+
+    def stats(self):
+        return {
+            "threshold": self.threshold,
+            "pixel_delta": self.pixel_delta,
+            "keyframe_interval": self.keyframe_interval,
+            "checked": self.checked,
+            "kept": self.kept,
+            "skipped": self.checked - self.kept,
+            "keyframes": self.keyframes,
+            "last_score": self.last_score,
+        }
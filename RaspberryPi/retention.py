@@ -0,0 +1,486 @@
+"""
+Retention, hourly rollups and disk quotas for images/ and logs/.
+
+Nothing else ever deletes anything, and at one still a minute an SD card
+fills within weeks. ``RetentionManager.run()`` is called by the
+``retention`` job and applies these policies. Each one is off unless
+configured, so by default nothing is deleted or rewritten.
+
+Images, by capture day (read off the name):
+    * they are kept as captured for ``full_days`` days;
+    * after that a day is thinned to at most one image per
+      ``thin_interval`` seconds, and each image left is replaced by a copy
+      ``archive_width`` pixels wide (re-encoding needs Pillow; without it
+      days are only thinned);
+    * images older than ``max_days`` are deleted;
+    * while images/ is over ``image_quota`` bytes, or the filesystem has
+      less than ``min_free`` bytes free, the oldest images are deleted.
+      Today's images are never deleted.
+
+Only captures (names from image_index.name_for_time and burst_name) are
+counted, thinned or deleted. Any other file in images/ is left alone and
+does not count toward ``image_quota``; victims come from the ImageIndex,
+which holds capture names only.
+
+Readings, in each sensor store:
+    * days older than ``raw_days`` are rolled up into hourly rows (count and
+      min/max/mean of each field, see ``SensorStore.write_rollup``), then
+      the raw segment and its CSV export are deleted. /api/sensor/history
+      still covers those days, at hourly resolution;
+    * while the stores' directory (logs/store/) is over ``log_quota``
+      bytes, past days' CSV exports are deleted first (they are
+      re-exported on request), then the oldest raw days are rolled up
+      early, then the oldest rollups are deleted. Legacy CSVs directly in
+      logs/ are not counted, as retention never deletes them.
+
+A run has to stay cheap however many images there are, so images/ is not
+scanned on every run. Image count and bytes are kept per day. They are
+seeded by one directory scan (on the first run, and again once a day to
+correct any drift) and kept current by ``note_image()`` for every capture
+and by the manager's own deletions. Days are thinned and archived in order
+and the last finished day is saved to ``state_path``, so each day is only
+processed once. At most ``batch`` images are re-encoded per run; an
+unfinished day is picked up again on the next run, skipping the images
+already shrunk.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+import history
+from image_index import IMAGE_PREFIX, is_capture_name, time_for_name
+from sensor_store import day_bounds, day_key
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; old images are then thinned but not shrunk
+    Image = None
+
+DAY_SECONDS = 86400
+ROLLUP_SECONDS = 3600
+
+# image_YYYYMMDD_HHMMSS.jpg -> YYYYMMDD
+DAY_SLICE = slice(len(IMAGE_PREFIX), len(IMAGE_PREFIX) + 8)
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _tree_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        total += sum(_size(os.path.join(dirpath, name)) for name in filenames)
+    return total
+
+
+def hourly_rows(store, day):
+    """The hourly rollup rows (``store.rollup_dtype``) of one stored day."""
+    ts, *values = store.read_day(day)
+    starts, counts, results = history.aggregate(ts, dict(zip(store.fields, values)), ROLLUP_SECONDS)
+    rows = np.empty(len(starts), dtype=store.rollup_dtype)
+    rows["timestamp"] = starts
+    rows["count"] = counts
+    for (field, agg), values in results.items():
+        rows[f"{field}_{agg}"] = values
+    return rows
+
+
+class RetentionManager:
+    """Age policies and quotas for images/ and the sensor stores under logs/."""
+
+    def __init__(self, image_index, stores, log_dir, state_path, full_days=14, thin_interval=0,
+                 archive_width=0, archive_quality=70, max_days=0, image_quota=0, min_free=0,
+                 raw_days=0, log_quota=0, batch=500, on_image_changed=None, on_log_removed=None,
+                 log=print):
+        """
+        Args:
+            image_index: The ``ImageIndex`` of the image directory
+            stores (list): ``SensorStore`` of every sensor
+            log_dir (str): Directory counted against ``log_quota``
+            state_path (str): JSON file remembering the last archived day
+            full_days (int): Days images are kept as captured
+            thin_interval (float): Seconds between the images kept after that (0 keeps all)
+            archive_width (int): Width images are shrunk to after ``full_days`` (0 keeps them)
+            archive_quality (int): JPEG quality of the shrunk copies
+            max_days (int): Delete images older than this (0 = no age limit)
+            image_quota (int): Max bytes in the image directory (0 = no quota)
+            min_free (int): Delete old images while the filesystem has less free
+                (0 = no limit)
+            raw_days (int): Days readings are kept raw before the hourly rollup
+                (0 = forever)
+            log_quota (int): Max bytes in ``log_dir`` (0 = no quota)
+            batch (int): Max images re-encoded, or listed for deletion, at a time
+            on_image_changed (callable): ``on_image_changed(name)`` after an
+                image is deleted or shrunk
+            on_log_removed (callable): ``on_log_removed(csv_name)`` after a
+                CSV export is deleted
+            log (callable): ``log(message, error=False)``
+        """
+        self.image_index = image_index
+        self.image_dir = image_index.image_dir
+        self.stores = list(stores)
+        self.log_dir = log_dir
+        self.state_path = state_path
+        self.full_days = full_days
+        self.thin_interval = thin_interval
+        self.archive_width = archive_width
+        self.archive_quality = archive_quality
+        self.max_days = max_days
+        self.image_quota = image_quota
+        self.min_free = min_free
+        self.raw_days = raw_days
+        self.log_quota = log_quota
+        self.batch = max(1, int(batch))
+        self.on_image_changed = on_image_changed
+        self.on_log_removed = on_log_removed
+        self.log = log
+
+        self._lock = threading.Lock()
+        self._days = None          # "YYYYMMDD" -> [images, bytes]; None until scanned
+        self._scanned_on = None
+        self.log_bytes = None
+        self.archived_through = self._load_state()
+        self.totals = dict.fromkeys(("deleted", "thinned", "archived", "rolled_up", "exports_deleted",
+                                     "rollups_deleted", "bytes_freed", "errors"), 0)
+        self.last_run = None
+
+    # ------------------------------------------------------------------
+    # Image accounting
+    # ------------------------------------------------------------------
+    def scan(self):
+        """Count the images in the image directory by day. Returns the number counted."""
+        days = {}
+        if os.path.isdir(self.image_dir):
+            with os.scandir(self.image_dir) as entries:
+                for e in entries:
+                    if not is_capture_name(e.name):
+                        continue
+                    try:
+                        size = e.stat().st_size
+                    except OSError:
+                        continue
+                    counts = days.setdefault(e.name[DAY_SLICE], [0, 0])
+                    counts[0] += 1
+                    counts[1] += size
+        with self._lock:
+            self._days = days
+        return sum(c[0] for c in days.values())
+
+    def note_image(self, path):
+        """Count a newly saved image."""
+        size = _size(path)
+        with self._lock:
+            if self._days is None:
+                return  # the first scan will count it
+            counts = self._days.setdefault(os.path.basename(path)[DAY_SLICE], [0, 0])
+            counts[0] += 1
+            counts[1] += size
+
+    def _account(self, name, files, size):
+        with self._lock:
+            if self._days is None:
+                return
+            day = name[DAY_SLICE]
+            counts = self._days.get(day)
+            if counts is not None:
+                counts[0] += files
+                counts[1] += size
+                if counts[0] <= 0:
+                    del self._days[day]
+
+    def image_usage(self):
+        """``(images, bytes)`` in the image directory, or None before the first scan."""
+        with self._lock:
+            if self._days is None:
+                return None
+            return sum(c[0] for c in self._days.values()), sum(c[1] for c in self._days.values())
+
+    def _remove_image(self, name):
+        """
+        Delete one image everywhere it is tracked. Returns the bytes freed,
+        or None if it could not be deleted (it then stays indexed).
+        """
+        path = os.path.join(self.image_dir, name)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            size = 0
+        except OSError as e:
+            self.totals["errors"] += 1
+            self.log(f"Retention could not delete {name}: {str(e)}", error=True)
+            return None
+        self.image_index.remove(name)
+        self._account(name, -1, -size)
+        if self.on_image_changed is not None:
+            self.on_image_changed(name)
+        return size
+
+    def _shrink_image(self, name):
+        """Replace an image with a copy ``archive_width`` wide. Returns the bytes freed, or None."""
+        path = os.path.join(self.image_dir, name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with Image.open(path) as img:
+                if img.width <= self.archive_width:
+                    return None
+                width = self.archive_width
+                height = max(1, round(img.height * width / img.width))
+                # Decode at 1/2, 1/4 or 1/8 scale straight from the JPEG
+                img.draft("RGB", (width, height))
+                small = img.convert("RGB").resize((width, height), Image.BILINEAR)
+            small.save(tmp_path, "JPEG", quality=self.archive_quality)
+            before = os.path.getsize(path)
+            os.replace(tmp_path, path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.totals["errors"] += 1
+            self.log(f"Retention could not shrink {name}: {str(e)}", error=True)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return None
+        freed = before - _size(path)
+        self._account(name, 0, -freed)
+        if self.on_image_changed is not None:
+            self.on_image_changed(name)
+        return freed
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f).get("archived_through")
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = f"{self.state_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"archived_through": self.archived_through}, f)
+        os.replace(tmp_path, self.state_path)
+
+    # ------------------------------------------------------------------
+    # Policies
+    # ------------------------------------------------------------------
+    def run(self, now=None):
+        """Apply every policy once. Returns a summary of what was done."""
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        today = day_key(now)
+        summary = dict.fromkeys(self.totals, 0)
+        if self._days is None or self._scanned_on != today:
+            self.scan()
+            self._scanned_on = today
+
+        if self.max_days > 0:
+            self._expire_images(day_key(now - self.max_days * DAY_SECONDS), summary)
+        if self.thin_interval > 0 or (self.archive_width > 0 and Image is not None):
+            self._archive_images(day_key(now - self.full_days * DAY_SECONDS), summary)
+        self._enforce_image_quota(today, summary)
+        if self.raw_days > 0:
+            cutoff = day_key(now - self.raw_days * DAY_SECONDS)
+            for store in self.stores:
+                for day in store.days():
+                    if day >= cutoff:
+                        break
+                    summary["bytes_freed"] += self._roll_up(store, day)
+                    summary["rolled_up"] += 1
+        self._enforce_log_quota(today, summary)
+
+        for key, value in summary.items():
+            self.totals[key] += value
+        self.last_run = dict(summary, at=now, seconds=round(time.perf_counter() - started, 4))
+        return summary
+
+    def _delete_oldest(self, end, summary, key, excess=None):
+        """Delete images captured before ``end``, oldest first, until ``excess`` bytes are freed."""
+        cursor = None
+        while excess is None or excess > 0:
+            # Page on past the images that could not be deleted, which stay
+            # in the index, rather than listing them again
+            names, cursor = self.image_index.list(end=end, limit=self.batch, cursor=cursor)
+            for name in names:
+                freed = self._remove_image(name)
+                if freed is None:
+                    continue
+                summary[key] += 1
+                summary["bytes_freed"] += freed
+                if excess is not None:
+                    excess -= freed
+                    if excess <= 0:
+                        break
+            if cursor is None:
+                break
+        return excess
+
+    def _expire_images(self, cutoff_day, summary):
+        self._delete_oldest(day_bounds(cutoff_day)[0], summary, "deleted")
+
+    def _archive_images(self, cutoff_day, summary):
+        """Thin and shrink the days before ``cutoff_day`` not yet archived."""
+        with self._lock:
+            days = sorted(self._days)
+        for day in days:
+            if day >= cutoff_day:
+                break
+            if self.archived_through is not None and day <= self.archived_through:
+                continue
+            if not self._archive_day(day, summary):
+                return  # out of budget; carry on next run
+            self.archived_through = day
+            self._save_state()
+
+    def _archive_day(self, day, summary):
+        names, _ = self.image_index.list(*day_bounds(day))
+        if self.thin_interval > 0:
+            kept, last_slot = [], None
+            for name in names:
+                t = time_for_name(name)
+                slot = None if t is None else int(t // self.thin_interval)
+                if slot is not None and slot == last_slot:
+                    freed = self._remove_image(name)
+                    if freed is not None:
+                        summary["bytes_freed"] += freed
+                        summary["thinned"] += 1
+                else:
+                    kept.append(name)
+                    last_slot = slot
+            names = kept
+        if self.archive_width > 0 and Image is not None:
+            for name in names:
+                if summary["archived"] >= self.batch:
+                    return False
+                freed = self._shrink_image(name)
+                if freed is not None:
+                    summary["bytes_freed"] += freed
+                    summary["archived"] += 1
+        return True
+
+    def _enforce_image_quota(self, today, summary):
+        excess = 0
+        if self.image_quota > 0:
+            excess = self.image_usage()[1] - self.image_quota
+        if self.min_free > 0:
+            excess = max(excess, self.min_free - shutil.disk_usage(self.image_dir).free)
+        if excess > 0 and self._delete_oldest(day_bounds(today)[0], summary, "deleted", excess) > 0:
+            self.log("Image quota still exceeded with only today's images left", error=True)
+
+    def _export_path(self, store, day):
+        # Where main.py exports a store's CSVs (EXPORT_DIR for the primary sensor)
+        return os.path.join(store.root, "export", f"{store.csv_prefix}{day}.csv")
+
+    def _remove_export(self, store, day):
+        path = self._export_path(store, day)
+        size = _size(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            self.totals["errors"] += 1
+            self.log(f"Retention could not delete {path}: {str(e)}", error=True)
+            return 0
+        if self.on_log_removed is not None:
+            self.on_log_removed(os.path.basename(path))
+        return size
+
+    def _roll_up(self, store, day):
+        """Replace a raw day by its hourly rows. Returns the bytes freed."""
+        rows = hourly_rows(store, day)
+        freed = _tree_size(store.segment_path(day))
+        if len(rows):
+            store.write_rollup(day, rows)
+            freed -= _size(store.rollup_path(day))
+        store.drop_day(day)
+        return freed + self._remove_export(store, day)
+
+    def _enforce_log_quota(self, today, summary):
+        self.log_bytes = _tree_size(self.log_dir)
+        if self.log_quota <= 0:
+            return
+        excess = self.log_bytes - self.log_quota
+        steps = (
+            # CSV exports of past days; re-exported when requested again
+            ("exports_deleted", lambda: sorted(
+                (day, i) for i, s in enumerate(self.stores) for day in s.days()
+                if day < today and os.path.exists(self._export_path(s, day))),
+             lambda store, day: self._remove_export(store, day)),
+            # Raw days before their time, oldest first
+            ("rolled_up", lambda: sorted(
+                (day, i) for i, s in enumerate(self.stores) for day in s.days() if day < today),
+             self._roll_up),
+            # Finally the hourly rollups themselves
+            ("rollups_deleted", lambda: sorted(
+                (day, i) for i, s in enumerate(self.stores) for day in s.rollup_days()),
+             self._remove_rollup),
+        )
+        for key, candidates, remove in steps:
+            if excess <= 0:
+                break
+            for day, i in candidates():
+                freed = remove(self.stores[i], day)
+                summary[key] += 1
+                summary["bytes_freed"] += freed
+                excess -= freed
+                if excess <= 0:
+                    break
+        if excess > 0:
+            self.log(f"Log quota still exceeded by {excess} bytes", error=True)
+        self.log_bytes = excess + self.log_quota
+
+    def _remove_rollup(self, store, day):
+        size = _size(store.rollup_path(day))
+        store.remove_rollup(day)
+        return size
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+    def stats(self):
+        """Usage, policies and what was removed; only cheap lookups, no scans."""
+        usage = self.image_usage()
+        with self._lock:
+            oldest = min(self._days) if self._days else None
+        try:
+            disk = shutil.disk_usage(self.image_dir)
+            disk = {"total": disk.total, "free": disk.free, "min_free": self.min_free}
+        except OSError:
+            disk = None
+        return {
+            "images": {
+                "files": usage[0] if usage else None,
+                "bytes": usage[1] if usage else None,
+                "quota": self.image_quota or None,
+                "oldest_day": oldest,
+                "full_days": self.full_days,
+                "thin_interval": self.thin_interval or None,
+                "archive_width": self.archive_width if self.archive_width and Image is not None else None,
+                "max_days": self.max_days or None,
+                "archived_through": self.archived_through,
+            },
+            "readings": {
+                "raw_days": self.raw_days or None,
+                "stores": [{"root": s.root, "raw_days": len(s.days()), "hourly_days": len(s.rollup_days())}
+                           for s in self.stores],
+            },
+            "logs": {"bytes": self.log_bytes, "quota": self.log_quota or None},
+            "disk": disk,
+            "totals": dict(self.totals),
+            "last_run": self.last_run,
+        }
@@ -0,0 +1,300 @@
+"""
+Declarative alert rules, evaluated on every published reading.
+
+Rules are listed in a JSON file (``RULES_CONFIG``, default ``rules.json``):
+
+    {
+        "rules": [
+            {"id": "wet-canopy", "when": "humidity > 85", "for": "10m", "hysteresis": 3,
+             "actions": ["capture", {"webhook": "https://example.com/hooks/agrox"}]},
+            {"id": "heat-stress", "sensor": "air", "when": ["heat_index_c >= 32", "vpd_kpa > 2"],
+             "cooldown": "1h", "actions": [{"gpio": 23}]}
+        ]
+    }
+
+``when`` is a condition ``<field> <op> <number>`` (op is ``>``, ``>=``,
+``<`` or ``<=``) or a list of them that must all hold. Fields are those of
+the sensor's readings (``temperature_c``, ``temperature_f``, ``humidity``
+or ``moisture``) and, for temperature/humidity sensors, the derived metrics
+of derived.py. ``sensor`` defaults to the primary sensor.
+
+A rule fires once its conditions have held for ``for`` (seconds, or a
+number with ``s``/``m``/``h``/``d``; default 0) and stays active until they
+stop holding. With ``hysteresis``, a condition that holds keeps holding
+until the value is that far back past its threshold, so a reading hovering
+at the threshold neither restarts ``for`` nor flaps the alert.
+``cooldown`` is the shortest time between two fires of one rule.
+
+Actions when a rule fires:
+    "capture"          take a still now, even if scheduled capture is off
+    {"webhook": url}   POST the alert as JSON; again when it clears
+    {"gpio": pin}      drive a pin high while the rule is active
+
+Each sensor's rules are compiled into NumPy arrays, one entry per
+condition and per rule, so evaluating every rule on a reading is a handful
+of vector operations. Python-level work is only done for the rules that
+fire or clear.
+"""
+
+import json
+import re
+import threading
+
+import numpy as np
+
+ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+CONDITION_PATTERN = re.compile(r"^\s*([A-Za-z_][A-Za-z0-9_]*)\s*(>=|<=|>|<)\s*(-?\d+(?:\.\d*)?)\s*$")
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value):
+    """Seconds from a number or a string like ``"90"``, ``"10m"`` or ``"1.5h"``."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = float(value)
+    else:
+        text = str(value).strip()
+        unit = DURATION_UNITS.get(text[-1:])
+        try:
+            seconds = float(text[:-1]) * unit if unit else float(text)
+        except ValueError:
+            raise ValueError(f"invalid duration '{value}'") from None
+    if seconds < 0:
+        raise ValueError(f"invalid duration '{value}'")
+    return seconds
+
+
+class Rule:
+    """One configured rule: conditions, timing, actions and fire counts."""
+
+    def __init__(self, config, default_sensor):
+        self.id = config["id"]
+        self.sensor = str(config.get("sensor", default_sensor))
+        when = config.get("when")
+        self.when = [when] if isinstance(when, str) else list(when or [])
+        if not self.when:
+            raise ValueError(f"rule '{self.id}' has no \"when\" condition")
+        self.conditions = []
+        for text in self.when:
+            match = CONDITION_PATTERN.match(str(text))
+            if match is None:
+                raise ValueError(f"rule '{self.id}': can't parse condition '{text}' "
+                                 "(expected e.g. \"humidity > 85\")")
+            self.conditions.append((match.group(1), match.group(2), float(match.group(3))))
+        self.duration = parse_duration(config.get("for", 0))
+        self.hysteresis = float(config.get("hysteresis", 0))
+        if self.hysteresis < 0:
+            raise ValueError(f"rule '{self.id}': hysteresis must not be negative")
+        self.cooldown = parse_duration(config.get("cooldown", 0))
+        self.actions = [self._action(action) for action in config.get("actions", [])]
+        self.fired = 0
+        self.last_fired = None
+        self.last_cleared = None
+
+    def _action(self, action):
+        if action == "capture":
+            return {"type": "capture"}
+        if isinstance(action, dict) and len(action) == 1:
+            (kind, value), = action.items()
+            if kind == "webhook" and isinstance(value, str) and value.startswith(("http://", "https://")):
+                return {"type": "webhook", "url": value}
+            if kind == "gpio" and isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 27:
+                return {"type": "gpio", "pin": value}
+        raise ValueError(f"rule '{self.id}': invalid action {json.dumps(action)} "
+                         f"(use \"capture\", {{\"webhook\": url}} or {{\"gpio\": pin}})")
+
+    def describe(self):
+        return {
+            "id": self.id,
+            "sensor": self.sensor,
+            "when": self.when,
+            "for": self.duration,
+            "hysteresis": self.hysteresis,
+            "cooldown": self.cooldown,
+            "actions": self.actions,
+            "fired": self.fired,
+            "last_fired": self.last_fired,
+            "last_cleared": self.last_cleared,
+        }
+
+
+def load_rules(path, default_sensor):
+    """
+    Read and validate a rules config file.
+
+    Returns:
+        list: ``Rule`` objects in file order
+
+    Raises:
+        ValueError: If the file is malformed
+    """
+    with open(path) as f:
+        data = json.load(f)
+    entries = data.get("rules") if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        raise ValueError(f"{path}: expected a \"rules\" list")
+    rules, seen = [], set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError(f"{path}: every rule must be an object")
+        rule_id = str(entry.get("id", ""))
+        if not ID_PATTERN.match(rule_id):
+            raise ValueError(f"{path}: invalid rule id '{rule_id}' "
+                             "(letters, digits, '-', '_' and '.', at most 64)")
+        if rule_id in seen:
+            raise ValueError(f"{path}: duplicate rule id '{rule_id}'")
+        seen.add(rule_id)
+        try:
+            rules.append(Rule(dict(entry, id=rule_id), default_sensor))
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}") from None
+    return rules
+
+
+class CompiledRules:
+    """The rules of one sensor as condition and state arrays."""
+
+    def __init__(self, rules, fields):
+        """
+        Args:
+            rules (list): ``Rule`` objects, all for the same sensor
+            fields (tuple): Fields the sensor's readings have
+
+        Raises:
+            ValueError: If a condition names a field the sensor doesn't have
+        """
+        self.rules = list(rules)
+        self.fields = tuple(fields)
+        index = {field: i for i, field in enumerate(self.fields)}
+        cond_rule, cond_field, sign, threshold, strict, slack = [], [], [], [], [], []
+        for r, rule in enumerate(self.rules):
+            for field, op, value in rule.conditions:
+                if field not in index:
+                    raise ValueError(f"rule '{rule.id}': sensor '{rule.sensor}' has no field '{field}' "
+                                     f"(available: {', '.join(self.fields)})")
+                # Every comparison becomes "sign * value > or >= sign * threshold"
+                s = 1.0 if op in (">", ">=") else -1.0
+                cond_rule.append(r)
+                cond_field.append(index[field])
+                sign.append(s)
+                threshold.append(s * value)
+                strict.append(op in (">", "<"))
+                slack.append(rule.hysteresis)
+        self._cond_rule = np.array(cond_rule, dtype=np.intp)
+        self._cond_field = np.array(cond_field, dtype=np.intp)
+        self._sign = np.array(sign)
+        self._threshold = np.array(threshold)
+        self._strict = np.array(strict, dtype=bool)
+        self._slack = np.array(slack)
+        # Conditions are grouped by rule, so a rule holds if its run of conditions all hold
+        self._starts = np.flatnonzero(np.concatenate(([True], self._cond_rule[1:] != self._cond_rule[:-1])))
+
+        n = len(self.rules)
+        self._duration = np.array([rule.duration for rule in self.rules])
+        self._cooldown = np.array([rule.cooldown for rule in self.rules])
+        self._holding = np.zeros(n, dtype=bool)
+        self._active = np.zeros(n, dtype=bool)
+        self._since = np.zeros(n)
+        self._last_fired = np.full(n, -np.inf)
+        self._lock = threading.Lock()
+
+    def evaluate(self, timestamp, reading):
+        """
+        Update every rule with a reading (a dict of field values; missing
+        or None values hold no condition).
+
+        Returns:
+            list: ``(rule, "fired" | "cleared")`` for the rules that changed state
+        """
+        values = np.array([reading.get(field) for field in self.fields], dtype=np.float64)
+        with self._lock:
+            if not len(self.rules):
+                return []
+            v = self._sign * values[self._cond_field]
+            # A holding rule's conditions are loosened by its hysteresis
+            threshold = self._threshold - np.where(self._holding[self._cond_rule], self._slack, 0.0)
+            ok = np.where(self._strict, v > threshold, v >= threshold)
+            holds = np.logical_and.reduceat(ok, self._starts)
+
+            self._since[holds & ~self._holding] = timestamp
+            self._holding = holds
+            fire = (holds & ~self._active & (timestamp - self._since >= self._duration)
+                    & (timestamp - self._last_fired >= self._cooldown))
+            clear = self._active & ~holds
+            self._active = (self._active | fire) & ~clear
+            self._last_fired[fire] = timestamp
+            fired, cleared = np.flatnonzero(fire), np.flatnonzero(clear)
+
+        events = []
+        for i in fired.tolist():
+            rule = self.rules[i]
+            rule.fired += 1
+            rule.last_fired = timestamp
+            events.append((rule, "fired"))
+        for i in cleared.tolist():
+            rule = self.rules[i]
+            rule.last_cleared = timestamp
+            events.append((rule, "cleared"))
+        return events
+
+    def states(self):
+        """Rule id -> ``{"state", "since"}``: idle, pending (holding, not fired yet) or active."""
+        with self._lock:
+            holding, active, since = self._holding.copy(), self._active.copy(), self._since.copy()
+        states = {}
+        for i, rule in enumerate(self.rules):
+            state = "active" if active[i] else "pending" if holding[i] else "idle"
+            states[rule.id] = {"state": state, "since": float(since[i]) if holding[i] else None}
+        return states
+
+    @property
+    def active(self):
+        return int(self._active.sum())
+
+
+class RuleEngine:
+    """Rules of every sensor, compiled per sensor."""
+
+    def __init__(self, rules, sensor_fields):
+        """
+        Args:
+            rules (list): ``Rule`` objects
+            sensor_fields (dict): Sensor id -> fields its readings have
+
+        Raises:
+            ValueError: If a rule names an unknown sensor or field
+        """
+        self.rules = list(rules)
+        by_sensor = {}
+        for rule in self.rules:
+            if rule.sensor not in sensor_fields:
+                raise ValueError(f"rule '{rule.id}': unknown sensor '{rule.sensor}'")
+            by_sensor.setdefault(rule.sensor, []).append(rule)
+        self._compiled = {sensor: CompiledRules(rules, sensor_fields[sensor])
+                          for sensor, rules in by_sensor.items()}
+        self.events = {"fired": 0, "cleared": 0}
+
+    def __len__(self):
+        return len(self.rules)
+
+    def has_rules(self, sensor_id):
+        return sensor_id in self._compiled
+
+    def evaluate(self, sensor_id, timestamp, reading):
+        """``CompiledRules.evaluate`` for the rules of one sensor."""
+        compiled = self._compiled.get(sensor_id)
+        if compiled is None:
+            return []
+        events = compiled.evaluate(timestamp, reading)
+        for _, event in events:
+            self.events[event] += 1
+        return events
+
+    @property
+    def active(self):
+        return sum(compiled.active for compiled in self._compiled.values())
+
+    def describe(self):
+        states = {}
+        for compiled in self._compiled.values():
+            states.update(compiled.states())
+        return [dict(rule.describe(), **states[rule.id]) for rule in self.rules]
@@ -0,0 +1,183 @@
+"""
+Periodic job scheduler.
+
+Each job runs on its own thread with its own interval, so a slow camera
+capture or a DHT retry can never shift the sensor cadence. Timing is
+drift-corrected: run ``k`` is scheduled at ``start + k * interval`` rather
+than "interval seconds after the previous run finished", and runs that
+would start late because the previous one overran are skipped and counted
+instead of piling up. ``run_now()`` pulls the next run forward, e.g. so a
+reading is taken as soon as monitoring is switched on.
+
+Per-job stats (start jitter, run duration, skipped ticks, errors) are
+available from ``Scheduler.stats()``.
+"""
+
+import threading
+import time
+
+
+class RunningStats:
+    """Count, mean, max and last value of a stream, in O(1) per sample."""
+
+    __slots__ = ("count", "mean", "max", "last")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.mean += (value - self.mean) / self.count
+        if value > self.max:
+            self.max = value
+        self.last = value
+
+    def as_dict(self, scale=1000.0):
+        """Values in milliseconds by default."""
+        return {
+            "count": self.count,
+            "mean_ms": round(self.mean * scale, 3),
+            "max_ms": round(self.max * scale, 3),
+            "last_ms": round(self.last * scale, 3),
+        }
+
+
+class PeriodicJob:
+    """A function called every ``interval`` seconds on a dedicated thread."""
+
+    def __init__(self, name, interval, func, initial_delay=0.0, log=print):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.initial_delay = initial_delay
+        self.log = log
+        self.jitter = RunningStats()
+        self.duration = RunningStats()
+        self.skipped = 0
+        self.errors = 0
+        self.last_error = None
+        self._new_interval = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"job-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run_now(self):
+        """Run as soon as possible instead of at the next tick; the grid is unchanged."""
+        self._wake.set()
+
+    def set_interval(self, interval):
+        """
+        Change the interval from the next run on. The grid is re-based at the
+        run that picks up the change, so ``skipped`` and jitter stay meaningful.
+        """
+        if interval <= 0:
+            raise ValueError(f"Job '{self.name}' interval must be positive")
+        if interval != self.interval:
+            self._new_interval = interval
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        origin = time.monotonic() + self.initial_delay
+        tick = 0
+        while True:
+            scheduled = origin + tick * self.interval
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                self._wake.wait(delay)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+
+            started = time.monotonic()
+            if started >= scheduled:
+                self.jitter.add(started - scheduled)
+            try:
+                self.func()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                self.log(f"Job '{self.name}' failed: {str(e)}", error=True)
+            finished = time.monotonic()
+            self.duration.add(finished - started)
+
+            if self._new_interval is not None:
+                # Re-base the grid on this run's slot with the new interval
+                self.interval, self._new_interval = self._new_interval, None
+                origin, tick = scheduled, 0
+
+            # Next tick on the original grid; skip any ticks we overran
+            next_tick = int((finished - origin) // self.interval) + 1
+            self.skipped += max(0, next_tick - tick - 1)
+            tick = max(tick + 1, next_tick)
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "jitter": self.jitter.as_dict(),
+            "duration": self.duration.as_dict(),
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """A set of independent periodic jobs."""
+
+    def __init__(self, log=print):
+        self.log = log
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def add(self, name, interval, func, initial_delay=0.0):
+        """
+        Register a job. Jobs added after ``start()`` start immediately, so
+        subsystems that come up in the background can add theirs when ready.
+        """
+        if interval <= 0:
+            raise ValueError(f"Job '{name}' interval must be positive")
+        job = PeriodicJob(name, interval, func, initial_delay, self.log)
+        with self._lock:
+            self.jobs[name] = job
+            if self._started:
+                job.start()
+        return job
+
+    def start(self):
+        with self._lock:
+            self._started = True
+            jobs = list(self.jobs.values())
+            for job in jobs:
+                job.start()
+        self.log(f"Scheduler started: {', '.join(f'{j.name}={j.interval}s' for j in jobs)}")
+
+    def stop(self, timeout=5):
+        with self._lock:
+            self._started = False
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.stop()
+        for job in jobs:
+            job.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self.jobs.items())
+        return {name: job.stats() for name, job in jobs}
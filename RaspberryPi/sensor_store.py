@@ -0,0 +1,366 @@
+"""
+Columnar time-series store for DHT22 readings.
+
+Readings are kept in day-partitioned segments under ``<root>/YYYYMMDD/``.
+Each segment holds three fixed-width column files:
+
+    timestamp.i64    int64 epoch seconds
+    temperature.f32  float32 degrees Celsius
+    humidity.f32     float32 relative humidity (%), or the second value of
+                     other sensor types (e.g. soil moisture), see ``value_name``
+
+Rows are only ever appended, in time order, so the timestamp column is also
+the time index: a range lookup is a binary search over the memory-mapped
+column instead of a scan of the whole day. Writes are buffered in memory and
+appended in batches so the SD card sees one write per column per batch
+instead of an open/append/close for every reading.
+
+A store can also hold other float32 series, e.g. the derived metrics of
+derived.py: with ``fields`` given, each field gets a ``<field>.f32`` column
+next to the timestamps.
+
+Days past their raw retention are rolled up (see retention.py) into one
+structured array per day, ``<root>/hourly/YYYYMMDD.npy``, with a row per
+hour: its start, the reading count and min/max/mean of each field.
+"""
+
+import csv
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+TIMESTAMP_FILE = "timestamp.i64"
+TEMPERATURE_FILE = "temperature.f32"
+HUMIDITY_FILE = "humidity.f32"
+UNSORTED_MARKER = "unsorted"
+ROLLUP_DIR = "hourly"
+ROLLUP_AGGREGATES = ("min", "max", "mean")
+
+CSV_HEADER = ['timestamp', 'temperature_c', 'temperature_f', 'humidity']
+
+COLUMNS = (
+    (TIMESTAMP_FILE, np.int64),
+    (TEMPERATURE_FILE, np.float32),
+    (HUMIDITY_FILE, np.float32),
+)
+
+
+def day_key(timestamp):
+    """Return the local-time ``YYYYMMDD`` partition key for an epoch timestamp."""
+    return datetime.fromtimestamp(timestamp).strftime("%Y%m%d")
+
+
+def day_bounds(day):
+    """Return the ``[start, end)`` epoch seconds covered by a ``YYYYMMDD`` key."""
+    start = datetime.strptime(day, "%Y%m%d")
+    end = datetime.fromordinal(start.toordinal() + 1)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+class SensorStore:
+    """Append-only, day-partitioned columnar store for sensor readings."""
+
+    def __init__(self, root, batch_size=20, flush_interval=60.0,
+                 value_name="humidity", csv_prefix="sensor_log_", fields=None):
+        """
+        Args:
+            root (str): Directory holding the day segments
+            batch_size (int): Buffered readings that trigger a flush
+            flush_interval (float): Max seconds a reading stays buffered
+            value_name (str): What the second value column holds
+            csv_prefix (str): File name prefix of exported CSVs
+            fields (tuple, optional): Names of float32 value columns to
+                store instead of temperature and ``value_name``
+        """
+        self.root = root
+        self.value_name = value_name
+        self.csv_prefix = csv_prefix
+        if fields is None:
+            self.fields = ("temperature_c", value_name)
+            self.columns = COLUMNS
+        else:
+            self.fields = tuple(fields)
+            self.columns = ((TIMESTAMP_FILE, np.int64),) + tuple((f"{f}.f32", np.float32) for f in self.fields)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._last_ts = {}
+        self._maps = {}
+        self._rollups = {}
+        self.rollup_dtype = np.dtype(
+            [("timestamp", np.int64), ("count", np.int32)] +
+            [(f"{field}_{agg}", np.float32) for field in self.fields for agg in ROLLUP_AGGREGATES])
+        os.makedirs(self.root, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def append(self, timestamp, *values):
+        """Buffer one reading (a value per field); flushes when the batch is full or stale."""
+        with self._lock:
+            self._pending.append((int(timestamp),) + values)
+            due = (len(self._pending) >= self.batch_size or
+                   time.monotonic() - self._last_flush >= self.flush_interval)
+            if due:
+                self._flush_locked()
+
+    def flush(self):
+        """Write all buffered readings to their day segments."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+
+        # Group by day so a batch spanning midnight lands in both segments
+        by_day = {}
+        for row in pending:
+            by_day.setdefault(day_key(row[0]), []).append(row)
+
+        for day, rows in by_day.items():
+            seg = self.segment_path(day)
+            os.makedirs(seg, exist_ok=True)
+            columns = [np.fromiter((r[i] for r in rows), dtype=dtype, count=len(rows))
+                       for i, (_, dtype) in enumerate(self.columns)]
+            ts = columns[0]
+
+            # The clock can step backwards (e.g. NTP sync after boot); remember
+            # that so readers sort the segment instead of trusting the index
+            last = self._last_ts.get(day)
+            if last is None:
+                last = self._segment_last_ts(day)
+            if (last is not None and ts[0] < last) or np.any(np.diff(ts) < 0):
+                open(os.path.join(seg, UNSORTED_MARKER), 'a').close()
+            self._last_ts[day] = int(ts.max() if last is None else max(last, ts.max()))
+
+            for (name, _), column in zip(self.columns, columns):
+                with open(os.path.join(seg, name), 'ab') as f:
+                    f.write(column.tobytes())
+
+    def write_day(self, day, ts, *values):
+        """
+        Replace a whole day segment with sorted ``ts`` and one array per
+        field, e.g. when backfilling. Not for days still being appended to.
+        """
+        seg = self.segment_path(day)
+        tmp_seg = f"{seg}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_seg)
+        for (name, dtype), column in zip(self.columns, (ts,) + values):
+            np.asarray(column, dtype=dtype).tofile(os.path.join(tmp_seg, name))
+        with self._lock:
+            for key in [k for k in self._maps if k[0] == day]:
+                del self._maps[key]
+            self._last_ts.pop(day, None)
+            shutil.rmtree(seg, ignore_errors=True)
+            os.replace(tmp_seg, seg)
+
+    def _segment_last_ts(self, day):
+        ts = self._map(day, TIMESTAMP_FILE, np.int64)
+        return int(ts[-1]) if len(ts) else None
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def segment_path(self, day):
+        return os.path.join(self.root, day)
+
+    def days(self):
+        """Return the sorted list of ``YYYYMMDD`` keys with stored data."""
+        with self._lock:
+            pending_days = {day_key(r[0]) for r in self._pending}
+        stored = {
+            d for d in os.listdir(self.root)
+            if len(d) == 8 and d.isdigit() and
+            os.path.exists(os.path.join(self.root, d, TIMESTAMP_FILE))
+        }
+        return sorted(stored | pending_days)
+
+    def segment_mtime(self, day):
+        """Return the last modification time of a day segment, or None."""
+        try:
+            return os.path.getmtime(os.path.join(self.segment_path(day), TIMESTAMP_FILE))
+        except OSError:
+            return None
+
+    def _map(self, day, name, dtype):
+        """Memory-map one column file, reusing the map while its size is unchanged."""
+        path = os.path.join(self.segment_path(day), name)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.empty(0, dtype=dtype)
+        count = size // np.dtype(dtype).itemsize
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        key = (day, name)
+        cached = self._maps.get(key)
+        if cached is not None and cached[0] == count:
+            return cached[1]
+        mapped = np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+        self._maps[key] = (count, mapped)
+        return mapped
+
+    def read_day(self, day):
+        """
+        Return ``(timestamps, temperature_c, humidity)`` for one day, or
+        ``(timestamps, *fields)`` for a store with ``fields``.
+
+        Includes readings that are still buffered, so callers always see the
+        latest data without forcing a flush.
+        """
+        columns = [self._map(day, name, dtype) for name, dtype in self.columns]
+        # A crash between column writes can leave one column longer than the
+        # others; only rows present in every column are valid
+        n = min(len(c) for c in columns)
+        columns = [c[:n] for c in columns]
+
+        with self._lock:
+            pending = [r for r in self._pending if day_key(r[0]) == day]
+        if pending:
+            columns = [np.concatenate([c, np.array([r[i] for r in pending], dtype=dtype)])
+                       for i, (c, (_, dtype)) in enumerate(zip(columns, self.columns))]
+
+        if os.path.exists(os.path.join(self.segment_path(day), UNSORTED_MARKER)):
+            order = np.argsort(columns[0], kind='stable')
+            columns = [c[order] for c in columns]
+        return tuple(columns)
+
+    def query(self, start=None, end=None):
+        """
+        Return ``read_day()``'s columns with ``start <= timestamp < end``,
+        concatenated across day segments.
+
+        Args:
+            start (float, optional): Inclusive lower bound in epoch seconds
+            end (float, optional): Exclusive upper bound in epoch seconds
+        """
+        parts = []
+        for day in self.days():
+            lo, hi = day_bounds(day)
+            if (end is not None and lo >= end) or (start is not None and hi <= start):
+                continue
+            columns = self.read_day(day)
+            ts = columns[0]
+            i = 0 if start is None else int(np.searchsorted(ts, start, side='left'))
+            j = len(ts) if end is None else int(np.searchsorted(ts, end, side='left'))
+            if j > i:
+                parts.append(tuple(c[i:j] for c in columns))
+
+        if not parts:
+            return tuple(np.empty(0, dtype=dtype) for _, dtype in self.columns)
+        if len(parts) == 1:
+            return parts[0]
+        return tuple(np.concatenate(cols) for cols in zip(*parts))
+
+    def drop_day(self, day):
+        """Delete a day's raw segment, e.g. once it has been rolled up."""
+        with self._lock:
+            for key in [k for k in self._maps if k[0] == day]:
+                del self._maps[key]
+            self._last_ts.pop(day, None)
+        shutil.rmtree(self.segment_path(day), ignore_errors=True)
+
+    # ------------------------------------------------------------------
+    # Hourly rollups
+    # ------------------------------------------------------------------
+    def rollup_path(self, day):
+        return os.path.join(self.root, ROLLUP_DIR, f"{day}.npy")
+
+    def write_rollup(self, day, rows):
+        """Store the hourly rows (``rollup_dtype``) of a day, replacing any earlier ones."""
+        path = self.rollup_path(day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, rows.astype(self.rollup_dtype, copy=False))
+        os.replace(tmp_path, path)
+        self._rollups.pop(day, None)
+
+    def remove_rollup(self, day):
+        self._rollups.pop(day, None)
+        try:
+            os.remove(self.rollup_path(day))
+        except OSError:
+            pass
+
+    def rollup_days(self):
+        """Return the sorted ``YYYYMMDD`` keys that have hourly rollups."""
+        try:
+            names = os.listdir(os.path.join(self.root, ROLLUP_DIR))
+        except FileNotFoundError:
+            return []
+        return sorted(n[:8] for n in names if len(n) == 12 and n.endswith(".npy") and n[:8].isdigit())
+
+    def query_rollups(self, start=None, end=None):
+        """Hourly rows with ``start <= timestamp < end``, across rolled-up days."""
+        parts = []
+        for day in self.rollup_days():
+            lo, hi = day_bounds(day)
+            # An hour can start before local midnight with a half-hour UTC offset
+            if (end is not None and lo - 3600 >= end) or (start is not None and hi <= start):
+                continue
+            rows = self._rollups.get(day)
+            if rows is None:
+                try:
+                    rows = self._rollups[day] = np.load(self.rollup_path(day))
+                except (OSError, ValueError):
+                    continue
+            i = 0 if start is None else int(np.searchsorted(rows["timestamp"], start, side='left'))
+            j = len(rows) if end is None else int(np.searchsorted(rows["timestamp"], end, side='left'))
+            if j > i:
+                parts.append(rows[i:j])
+        if not parts:
+            return np.empty(0, dtype=self.rollup_dtype)
+        return np.concatenate(parts)
+
+    # ------------------------------------------------------------------
+    # CSV export
+    # ------------------------------------------------------------------
+    def export_csv(self, day, path):
+        """Write one day's readings to ``path`` in the legacy sensor_log CSV format."""
+        ts, tc, rh = self.read_day(day)
+        tf = tc.astype(np.float64) * (9 / 5) + 32
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER[:3] + [self.value_name])
+            for t, c, fahr, h in zip(ts.tolist(), tc.tolist(), tf.tolist(), rh.tolist()):
+                writer.writerow([
+                    datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S"),
+                    f"{c:.1f}", f"{fahr:.2f}", f"{h:.1f}",
+                ])
+        os.replace(tmp_path, path)
+        return path
+
+    def csv_for_day(self, day, export_dir):
+        """
+        Return the path of an up-to-date CSV export of ``day``, re-exporting
+        only when the segment has changed since the last export.
+        """
+        os.makedirs(export_dir, exist_ok=True)
+        path = os.path.join(export_dir, f"{self.csv_prefix}{day}.csv")
+        self.flush()
+        seg_mtime = self.segment_mtime(day)
+        if seg_mtime is None:
+            return None
+        try:
+            if os.path.getmtime(path) >= seg_mtime:
+                return path
+        except OSError:
+            pass
+        return self.export_csv(day, path)
+
+    def close(self):
+        """Flush buffered readings and drop cached memory maps."""
+        self.flush()
+        self._maps.clear()
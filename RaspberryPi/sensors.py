@@ -0,0 +1,165 @@
+"""
+Registry of the sensors this Pi polls.
+
+Sensors are listed in a JSON file (``SENSORS_CONFIG``, default
+``sensors.json``):
+
+    {
+        "sensors": [
+            {"id": "air", "type": "dht22", "pin": "D4", "interval": 3, "primary": true},
+            {"id": "bench-2", "type": "dht22", "pin": "D17", "interval": 5, "oversample": 2},
+            {"id": "soil-1", "type": "soil", "address": "0x36", "interval": 60}
+        ]
+    }
+
+Types are those of ``backends.create_sensor``; any other keys are passed to
+it as driver options. ``oversample`` and ``filter_window`` override
+SENSOR_OVERSAMPLE and FILTER_WINDOW for one sensor (see filtering.py).
+Every sensor is polled by its own scheduler job at its own ``interval``
+and has its own store, so a slow or failing sensor never delays the
+others.
+
+The primary sensor (``"primary": true``, else the first one listed) is the
+one behind the original single-sensor API: the top-level ``/api/sensor``
+fields, uploads, ``/api/logs/today`` and the default history. It must be a
+temperature/humidity sensor. Without a config file there is a single
+primary sensor built from the AGROX_* environment variables.
+"""
+
+import json
+import os
+import re
+
+from backends import SENSOR_TYPES, sensor_fields
+
+DEFAULT_SENSOR_ID = "main"
+ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,31}$")
+# The DHT22 can't be read more often than every 2 seconds
+MIN_INTERVAL = 2.0
+
+
+def load_sensor_config(path, default_interval=3.0):
+    """
+    Read and validate a sensors config file.
+
+    Returns:
+        list: One dict per sensor with at least ``id``, ``type``,
+        ``interval`` and ``primary``, the primary one first
+
+    Raises:
+        ValueError: If the file is malformed
+    """
+    with open(path) as f:
+        data = json.load(f)
+    entries = data.get("sensors") if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path}: expected a non-empty \"sensors\" list")
+
+    configs, seen = [], set()
+    for entry in entries:
+        config = dict(entry)
+        sensor_id = str(config.get("id", ""))
+        if not ID_PATTERN.match(sensor_id):
+            raise ValueError(f"{path}: invalid sensor id '{sensor_id}' "
+                             "(letters, digits, '-' and '_', at most 32)")
+        if sensor_id in seen:
+            raise ValueError(f"{path}: duplicate sensor id '{sensor_id}'")
+        seen.add(sensor_id)
+        config["id"] = sensor_id
+        config.setdefault("type", "dht22")
+        if config["type"] not in SENSOR_TYPES:
+            raise ValueError(f"{path}: sensor '{sensor_id}' has unknown type '{config['type']}'")
+        config["interval"] = max(MIN_INTERVAL, float(config.get("interval", default_interval)))
+        config["primary"] = bool(config.get("primary", False))
+        configs.append(config)
+
+    primaries = [c for c in configs if c["primary"]]
+    if len(primaries) > 1:
+        raise ValueError(f"{path}: more than one primary sensor")
+    primary = primaries[0] if primaries else configs[0]
+    primary["primary"] = True
+    if sensor_fields(primary["type"])[1] != "humidity":
+        raise ValueError(f"{path}: the primary sensor '{primary['id']}' must be a temperature/humidity sensor")
+    configs.remove(primary)
+    return [primary] + configs
+
+
+class SensorEntry:
+    """One configured sensor: its config, store, recorder and read counters."""
+
+    def __init__(self, config, store, recorder):
+        self.config = config
+        self.id = config["id"]
+        self.type = config["type"]
+        self.interval = config["interval"]
+        self.primary = config["primary"]
+        # Reads per published reading, each at least MIN_INTERVAL apart
+        self.oversample = max(1, min(int(config.get("oversample", 1)), int(self.interval // MIN_INTERVAL)))
+        self.read_interval = self.interval / self.oversample
+        self.fields = sensor_fields(self.type)
+        self.job_name = "sensor" if self.primary else f"sensor:{self.id}"
+        self.store = store
+        self.recorder = recorder
+        self.backend = None  # created by start_monitoring
+        self.filter = None   # ReadingFilter, created with the registry
+        self.derived = None  # DerivedMetrics, for temperature/humidity sensors
+        self.ticks = 0
+        self.reads = 0
+        self.errors = 0
+        self.last_error = None
+
+    def describe(self):
+        return {
+            "id": self.id,
+            "type": self.type,
+            "primary": self.primary,
+            "fields": list(self.fields),
+            "interval": self.interval,
+            "oversample": self.oversample,
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "reads": self.reads,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "recording": self.recorder.stats(),
+            "filter": self.filter.stats() if self.filter is not None else None,
+        }
+
+
+class SensorRegistry:
+    """The configured sensors by id, primary first."""
+
+    def __init__(self):
+        self._entries = {}
+
+    def add(self, entry):
+        if entry.id in self._entries:
+            raise ValueError(f"Sensor '{entry.id}' is already registered")
+        self._entries[entry.id] = entry
+        return entry
+
+    def get(self, sensor_id):
+        return self._entries.get(sensor_id)
+
+    def __contains__(self, sensor_id):
+        return sensor_id in self._entries
+
+    def __iter__(self):
+        return iter(list(self._entries.values()))
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def primary(self):
+        return next(iter(self._entries.values()))
+
+
+def sensor_configs(path, default_interval):
+    """
+    The sensor configs to use: from ``path`` if it exists, else a single
+    primary DHT22 configured from the environment (``from_env``).
+    """
+    if path and os.path.exists(path):
+        return load_sensor_config(path, default_interval)
+    return [{"id": DEFAULT_SENSOR_ID, "type": "dht22", "interval": max(MIN_INTERVAL, default_interval),
+             "primary": True, "from_env": True}]
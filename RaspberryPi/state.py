@@ -0,0 +1,141 @@
+"""
+Shared system state with lock-free reads.
+
+The control flags, the latest reading of every sensor and the state-change
+counter are written from Flask request threads and the monitoring jobs, and read
+from everywhere. They live in one immutable ``Snapshot``. Writers build a
+new snapshot under a lock and publish it with a single attribute
+assignment. Readers just take ``state.snapshot``, never lock, and see a
+consistent set of values for as long as they hold it.
+
+Each snapshot carries version counters that clients use for conditional
+GETs: ``sensor_version`` changes with every new reading and
+``control_version`` with every change to the control flags.
+"""
+
+import threading
+import uuid
+
+EMPTY_SENSOR_DATA = {
+    "temperature_c": None,
+    "temperature_f": None,
+    "humidity": None,
+    "confidence": None,
+    "timestamp": None
+}
+
+# Versions restart at 0 when the process does, so ETags include a per-boot
+# token to stop a client's old tag matching a different post-restart value
+BOOT_ID = uuid.uuid4().hex[:8]
+
+
+class Snapshot:
+    """Immutable view of the system state at one point in time."""
+
+    __slots__ = ("version", "sensor_version", "control_version",
+                 "sensor_active", "camera_active", "state_change_count",
+                 "sensor_data", "sensors")
+
+    def __init__(self, version=0, sensor_version=0, control_version=0,
+                 sensor_active=False, camera_active=False, state_change_count=0,
+                 sensor_data=EMPTY_SENSOR_DATA, sensors=None):
+        setter = object.__setattr__
+        setter(self, "version", version)
+        setter(self, "sensor_version", sensor_version)
+        setter(self, "control_version", control_version)
+        setter(self, "sensor_active", sensor_active)
+        setter(self, "camera_active", camera_active)
+        setter(self, "state_change_count", state_change_count)
+        # Treated as read-only: writers always replace them with new dicts.
+        # sensor_data is the primary sensor's reading (the original
+        # single-sensor API); sensors maps every sensor_id to its latest one.
+        setter(self, "sensor_data", sensor_data)
+        setter(self, "sensors", {} if sensors is None else sensors)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshot is immutable; use SharedState to publish changes")
+
+    def replace(self, **changes):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return Snapshot(**values)
+
+    def sensor_etag(self):
+        """Unquoted ETag value for the latest reading."""
+        return f"{BOOT_ID}-s{self.sensor_version}"
+
+    def control_etag(self):
+        """Unquoted ETag value for the control flags."""
+        return f"{BOOT_ID}-c{self.control_version}"
+
+
+class SharedState:
+    """Copy-on-write holder of the current ``Snapshot``."""
+
+    __slots__ = ("_snapshot", "_write_lock")
+
+    def __init__(self):
+        self._snapshot = Snapshot()
+        self._write_lock = threading.Lock()
+
+    @property
+    def snapshot(self):
+        """The current snapshot. Reading it never blocks."""
+        return self._snapshot
+
+    def set_sensor_data(self, sensor_data, only_if_active=True, sensor_id=None, primary=True):
+        """
+        Publish a new reading.
+
+        Args:
+            sensor_data (dict): The reading
+            only_if_active (bool): Discard it if the sensor is switched off
+            sensor_id (str, optional): Also store it under this id in ``sensors``
+            primary (bool): It is the primary sensor's reading (``sensor_data``)
+
+        Returns:
+            Snapshot: The new snapshot, or None if the sensor was inactive
+            and ``only_if_active`` is set (the reading is then discarded)
+        """
+        with self._write_lock:
+            current = self._snapshot
+            if only_if_active and not current.sensor_active:
+                return None
+            data = dict(sensor_data)
+            changes = {}
+            if primary:
+                changes["sensor_data"] = data
+            if sensor_id is not None:
+                changes["sensors"] = {**current.sensors, sensor_id: data}
+            new = current.replace(version=current.version + 1,
+                                  sensor_version=current.sensor_version + 1,
+                                  **changes)
+            self._snapshot = new
+            return new
+
+    def set_active(self, sensor=None, camera=None, count=False):
+        """
+        Change the control flags. ``None`` leaves a flag unchanged.
+
+        The state-change counter is bumped once if either flag actually
+        changed, or unconditionally when ``count`` is set (the on/off
+        endpoints count every call).
+
+        Returns:
+            tuple: ``(previous, current)`` snapshots
+        """
+        with self._write_lock:
+            previous = self._snapshot
+            sensor_active = previous.sensor_active if sensor is None else sensor
+            camera_active = previous.camera_active if camera is None else camera
+            changed = (sensor_active, camera_active) != (previous.sensor_active, previous.camera_active)
+            if not changed and not count:
+                return previous, previous
+            current = previous.replace(
+                version=previous.version + 1,
+                control_version=previous.control_version + 1,
+                sensor_active=sensor_active,
+                camera_active=camera_active,
+                state_change_count=previous.state_change_count + 1)
+            self._snapshot = current
+            return previous, current
@@ -0,0 +1,189 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import capture
+from backends import CameraBackend, SimulatedCamera
+from capture import DROPPED, QUEUED, SKIPPED, CapturePipeline
+
+pytestmark = pytest.mark.skipif(capture.Image is None, reason="needs Pillow")
+
+Image = capture.Image
+WIDTH, HEIGHT = 64, 48
+
+
+def quiet(message, error=False):
+    pass
+
+
+class RecordingCamera(SimulatedCamera):
+    """A simulated camera that remembers which buffer each frame went to, and its pixels."""
+
+    def __init__(self):
+        super().__init__(WIDTH, HEIGHT)
+        self.buffers = []
+        self.frames = []
+
+    def capture_array(self, out):
+        super().capture_array(out)
+        self.buffers.append(id(out))
+        self.frames.append(out.copy())
+
+
+class SolidCamera(RecordingCamera):
+    """Every frame one flat colour, a different one each time."""
+
+    COLOURS = [(200, 40, 40), (40, 40, 200)]
+
+    def capture_array(self, out):
+        out[...] = self.COLOURS[len(self.frames) % len(self.COLOURS)]
+        self.buffers.append(id(out))
+        self.frames.append(out.copy())
+
+
+class FileOnlyCamera(CameraBackend):
+    def __init__(self):
+        self.paths = []
+
+    def capture_file(self, path):
+        self.paths.append(path)
+        with open(path, "wb") as f:
+            f.write(b"jpeg")
+
+
+class Detector:
+    """Keeps the frames listed in ``keep``, by the order they are checked."""
+
+    def __init__(self, *keep):
+        self.keep = list(keep)
+        self.checked = 0
+
+    def check(self, frame, ts):
+        self.checked += 1
+        return self.keep.pop(0)
+
+
+def pipeline(camera, **kwargs):
+    saved = []
+    kwargs.setdefault("on_saved", lambda path, latency: saved.append(path))
+    p = CapturePipeline(camera, log=quiet, **kwargs)
+    p.saved_paths = saved
+    return p
+
+
+def paths(tmp_path, count):
+    return [str(tmp_path / f"frame_{i}.jpg") for i in range(count)]
+
+
+def test_buffers_are_preallocated_and_reused(tmp_path):
+    camera = RecordingCamera()
+    p = pipeline(camera, workers=2, buffers=3)
+    p.start()
+    for path in paths(tmp_path, 12):
+        while p.capture(path) == DROPPED:
+            pass
+    p.stop()
+
+    assert len(camera.buffers) == 12
+    assert len(set(camera.buffers)) <= 3
+    assert sorted(p.saved_paths) == sorted(paths(tmp_path, 12))
+    assert p.stats()["buffers_free"] == 3
+    with Image.open(p.saved_paths[0]) as img:
+        assert img.size == (WIDTH, HEIGHT)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_frames_are_dropped_when_every_buffer_is_waiting(tmp_path):
+    camera = RecordingCamera()
+    p = pipeline(camera, buffers=2)
+    first, second, third = paths(tmp_path, 3)
+
+    # No workers yet, so nothing hands a buffer back
+    assert [p.capture(first), p.capture(second), p.capture(third)] == [QUEUED, QUEUED, DROPPED]
+    assert len(camera.buffers) == 2
+    stats = p.stats()
+    assert (stats["grabbed"], stats["dropped"], stats["queued"], stats["buffers_free"]) == (2, 1, 2, 0)
+
+    p.start()
+    p.stop()
+    assert sorted(p.saved_paths) == [first, second]
+    assert not os.path.exists(third)
+
+
+def test_a_skipped_frame_goes_back_to_the_free_buffers(tmp_path):
+    p = pipeline(RecordingCamera(), buffers=1, detector=Detector(False, True))
+    first, second = paths(tmp_path, 2)
+    assert p.capture(first) == SKIPPED
+    assert p.capture(second) == QUEUED
+    assert (p.skipped, p.dropped) == (1, 0)
+
+
+def test_a_burst_is_kept_or_skipped_on_its_first_frame(tmp_path):
+    camera = RecordingCamera()
+    detector = Detector(False)
+    p = pipeline(camera, buffers=4, detector=detector)
+    assert p.burst(paths(tmp_path, 3), spacing=0) == 0
+    assert (len(camera.buffers), detector.checked, p.skipped) == (1, 1, 1)
+
+    # Kept: the rest of the burst is not checked, even if it looks unchanged
+    detector.keep = [True]
+    assert p.burst(paths(tmp_path, 3), spacing=0) == 3
+    assert detector.checked == 2
+
+
+def test_falls_back_to_capture_file(tmp_path, monkeypatch):
+    camera = FileOnlyCamera()
+    p = pipeline(camera)
+    assert not p.available
+    p.start()
+    path, = paths(tmp_path, 1)
+    assert p.capture(path) == QUEUED
+    assert camera.paths == [path]
+    assert p.saved_paths == [path]
+    stats = p.stats()
+    assert (stats["pipelined"], stats["grabbed"], stats["saved"], stats["buffers"]) == (False, 1, 1, 0)
+
+    # The same without Pillow, even for a camera that can grab frames
+    monkeypatch.setattr(capture, "Image", None)
+    simulated = pipeline(SimulatedCamera(WIDTH, HEIGHT))
+    assert not simulated.available
+    assert simulated.capture(path) == QUEUED
+    with open(path, "rb") as f:
+        assert f.read(2) == b"\xff\xd8"
+
+
+def test_a_frame_being_encoded_is_not_overwritten_by_the_next_grab(tmp_path, monkeypatch):
+    encoding, release = threading.Event(), threading.Event()
+    fromarray = Image.fromarray
+
+    def slow_fromarray(buf, mode):
+        img = fromarray(buf, mode)
+        save = img.save
+
+        def blocked_save(*args, **kwargs):
+            encoding.set()
+            release.wait(5)
+            return save(*args, **kwargs)
+        img.save = blocked_save
+        return img
+
+    monkeypatch.setattr(capture.Image, "fromarray", slow_fromarray)
+    camera = SolidCamera()
+    p = pipeline(camera, workers=1, buffers=1)
+    p.start()
+    first, second = paths(tmp_path, 2)
+
+    assert p.capture(first) == QUEUED
+    assert encoding.wait(5)
+    # The only buffer is free again while the first frame is still encoding
+    assert p.capture(second) == QUEUED
+    assert camera.buffers[0] == camera.buffers[1]
+    assert not np.array_equal(camera.frames[0], camera.frames[1])
+    release.set()
+    p.stop()
+
+    with Image.open(first) as img:
+        pixels = np.asarray(img.convert("RGB"), dtype=np.int16)
+    assert np.abs(pixels - camera.frames[0]).max() < 8
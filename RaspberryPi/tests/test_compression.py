@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from compression import AdaptiveInterval, ReadingCompressor
+
+
+def feed(compressor, readings):
+    recorded = []
+    for ts, values in readings:
+        recorded += compressor.offer(ts, values)
+    return recorded
+
+
+def test_all_records_every_reading():
+    compressor = ReadingCompressor("all")
+    readings = [(t, (20.0, 50.0)) for t in range(0, 30, 3)]
+    assert feed(compressor, readings) == readings
+    assert compressor.offered == compressor.recorded == len(readings)
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        ReadingCompressor("lossy")
+
+
+def test_deadband_records_moves_beyond_the_deviation():
+    compressor = ReadingCompressor("deadband", (0.2, 1.0), max_interval=1000)
+    readings = [(0, (20.0, 50.0)), (3, (20.1, 50.5)), (6, (20.3, 50.5)),
+                (9, (20.4, 50.9)), (12, (20.4, 49.0))]
+    # 20.3 is 0.3 from the recorded 20.0; 49.0 is 1.5 %RH from the recorded 50.5
+    assert feed(compressor, readings) == [readings[0], readings[2], readings[4]]
+
+
+def test_deadband_heartbeat():
+    compressor = ReadingCompressor("deadband", (0.2, 1.0), max_interval=10)
+    readings = [(t, (20.0, 50.0)) for t in range(0, 25, 3)]
+    assert [ts for ts, _ in feed(compressor, readings)] == [0, 12, 24]
+
+
+def test_swinging_door_drops_a_straight_line():
+    compressor = ReadingCompressor("swinging_door", (0.2, 1.0), max_interval=1000)
+    readings = [(t, (20.0 + 0.01 * t, 50.0)) for t in range(0, 300, 3)]
+    assert feed(compressor, readings) == [readings[0]]
+    # The last reading was held, and flushing records it
+    assert compressor.flush() == [readings[-1]]
+    assert compressor.flush() == []
+
+
+def test_swinging_door_records_the_held_reading_late():
+    compressor = ReadingCompressor("swinging_door", (0.2, 1.0), max_interval=1000)
+    readings = [(0, (20.0, 50.0)), (3, (20.0, 50.0)), (6, (20.0, 50.0)), (9, (25.0, 50.0))]
+    recorded = feed(compressor, readings[:3])
+    assert recorded == [readings[0]]
+    # The step at t=9 closes the door: the reading before it, held since
+    # t=6, is recorded with its own timestamp
+    assert compressor.offer(*readings[3]) == [readings[2]]
+    assert compressor.flush() == [readings[3]]
+
+
+def test_swinging_door_interpolation_stays_within_the_deviation():
+    rng = np.random.default_rng(1)
+    ts = np.arange(0, 3 * 2000, 3)
+    temp_c = 20 + np.cumsum(rng.normal(0, 0.05, len(ts)))
+    humidity = 60 + np.cumsum(rng.normal(0, 0.2, len(ts)))
+    compressor = ReadingCompressor("swinging_door", (0.2, 1.0), max_interval=300)
+    recorded = feed(compressor, zip(ts.tolist(), zip(temp_c.tolist(), humidity.tolist())))
+    recorded += compressor.flush()
+
+    kept_ts = [t for t, _ in recorded]
+    assert kept_ts == sorted(kept_ts) and kept_ts[-1] == ts[-1]
+    assert len(recorded) < len(ts) / 4
+    assert np.max(np.diff(kept_ts)) <= 300
+    for i, (deviation, values) in enumerate(((0.2, temp_c), (1.0, humidity))):
+        line = np.interp(ts, kept_ts, [v[i] for _, v in recorded])
+        assert np.max(np.abs(line - values)) <= deviation + 1e-9
+
+
+def test_adaptive_interval_backs_off_and_snaps_back():
+    sampling = AdaptiveInterval(2.0, 30.0, (0.2, 1.0), growth=2, calm_samples=2)
+    intervals = [sampling.update((20.0, 50.0)) for _ in range(9)]
+    assert intervals == [2.0, 2.0, 4.0, 4.0, 8.0, 8.0, 16.0, 16.0, 30.0]
+    assert sampling.update((21.0, 50.0)) == 2.0
@@ -0,0 +1,126 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import csv_import
+from sensor_store import SensorStore, day_bounds
+
+DAY = "20250513"
+START = day_bounds(DAY)[0]
+
+
+def epoch(text):
+    return int(datetime.strptime(text, "%Y-%m-%d %H:%M:%S").timestamp())
+
+
+MIXED = (
+    b"timestamp,temperature_c,temperature_f,humidity,sensor_active,camera_active\n"
+    b"2025-05-13 10:00:00,30.1,86.18,70.0,True,True\n"
+    b"2025-05-13 10:00:03,30.2,86.36,70.5,True,False\n"
+    b"2025-05-13 10:00:06,30.3,86.54,71.0\n"
+    b"2025-05-13 10:00:09,30.4,86.72,71.5\n"
+    b"\n"
+    b"2025-05-13 10:00:12,30.5,86.90,72.0,True,True\n"
+    b"2025-05-13 10:00:15,oops,86.90,72.0\n"
+    b"2025-05-13 10:00:18,30.6,87.08\n"
+    b"2025-05-13 10:0"
+)
+
+
+def test_parse_csv_reads_each_row_with_its_own_layout():
+    ts, temp_c, humidity, skipped = csv_import.parse_csv(MIXED)
+    assert ts.tolist() == [epoch(f"2025-05-13 10:00:{s:02d}") for s in (0, 3, 6, 9, 12)]
+    assert np.allclose(temp_c, [30.1, 30.2, 30.3, 30.4, 30.5])
+    assert np.allclose(humidity, [70.0, 70.5, 71.0, 71.5, 72.0])
+    assert temp_c.dtype == humidity.dtype == np.float32
+    # The unparsable value, the short row and the truncated last line
+    assert skipped == 3
+
+
+def test_parse_csv_handles_crlf_and_a_bom():
+    data = ("\ufefftimestamp,temperature_c,temperature_f,humidity\r\n"
+            "2025-05-13 00:00:03,20.0,68.0,55.0\r\n").encode()
+    ts, temp_c, humidity, skipped = csv_import.parse_csv(data)
+    assert (ts.tolist(), skipped) == ([START + 3], 0)
+
+
+def test_parse_csv_other_value_columns():
+    data = b"timestamp,temperature_c,temperature_f,moisture\n2025-05-13 00:00:03,20.0,68.0,33.5\n"
+    assert csv_import.parse_csv(data, "moisture")[2].tolist() == [33.5]
+    with pytest.raises(ValueError):
+        csv_import.parse_csv(data)
+
+
+def test_parse_csv_of_a_header_only():
+    ts, _, _, skipped = csv_import.parse_csv(b"timestamp,temperature_c,temperature_f,humidity\n")
+    assert (len(ts), skipped) == (0, 0)
+
+
+def quiet(message, error=False):
+    pass
+
+
+def write_log(path, rows):
+    with open(path, "w") as f:
+        f.write("timestamp,temperature_c,temperature_f,humidity\n")
+        for ts, temp_c, humidity in rows:
+            stamp = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+            f.write(f"{stamp},{temp_c},{temp_c * 9 / 5 + 32:.2f},{humidity}\n")
+
+
+def test_import_merges_into_the_store(tmp_path):
+    store = SensorStore(str(tmp_path / "store"), batch_size=1)
+    # Already stored readings win over imported ones at the same second
+    store.append(START + 3, 25.0, 40.0)
+    path = tmp_path / f"sensor_log_{DAY}.csv"
+    write_log(path, [(START + 3, 20.0, 50.0), (START + 6, 20.5, 51.0), (START + 6, 20.5, 51.0)])
+
+    summary = csv_import.import_logs([str(path)], store, workers=1, today="20990101", log=quiet)
+
+    ts, temp_c, humidity = store.read_day(DAY)
+    assert ts.tolist() == [START + 3, START + 6]
+    assert temp_c.tolist() == [25.0, 20.5]
+    assert (summary["written"], summary["duplicates"], summary["days"]) == (1, 2, 1)
+    assert summary["imported"] == [str(path)]
+
+    # Importing again changes nothing
+    summary = csv_import.import_logs([str(path)], store, workers=1, today="20990101", log=quiet)
+    assert (summary["written"], summary["duplicates"]) == (0, 3)
+
+
+def test_today_and_rolled_up_days_are_left_alone(tmp_path):
+    store = SensorStore(str(tmp_path / "store"), batch_size=1)
+    rolled_up = "20250512"
+    store.write_rollup(rolled_up, np.zeros(1, dtype=store.rollup_dtype))
+    path = tmp_path / f"sensor_log_{DAY}.csv"
+    write_log(path, [(day_bounds(rolled_up)[0] + 60, 20.0, 50.0), (START + 60, 21.0, 51.0)])
+
+    messages = []
+    summary = csv_import.import_logs([str(path)], store, workers=1, today=DAY,
+                                     log=lambda message, error=False: messages.append(message))
+
+    assert store.days() == []
+    assert summary["written"] == 0
+    # It has readings from today, so it is read again next time
+    assert summary["imported"] == []
+    assert DAY in messages[0] and rolled_up in messages[0]
+
+
+def test_unreadable_files_are_reported(tmp_path):
+    path = tmp_path / f"sensor_log_{DAY}.csv"
+    path.write_text("time,temp\n")
+    errors = []
+    summary = csv_import.import_logs([str(path)], SensorStore(str(tmp_path / "store")), workers=1,
+                                     log=lambda message, error=False: errors.append(error))
+    assert summary["failed"] == 1 and errors == [True]
+
+
+def test_scan_logs_lists_days_in_order(tmp_path):
+    for name in ("sensor_log_20250514.csv", "sensor_log_20250513.csv", "sensor_log_air_20250513.csv",
+                 "notes.csv"):
+        (tmp_path / name).write_text("")
+    assert [os.path.basename(p) for p in csv_import.scan_logs(str(tmp_path))] == [
+        "sensor_log_20250513.csv", "sensor_log_20250514.csv"]
+    assert csv_import.scan_logs(str(tmp_path / "missing")) == []
@@ -0,0 +1,175 @@
+import numpy as np
+import pytest
+
+import derived
+from derived import DerivedMetrics, RollingWindow, backfill, derived_store
+from sensor_store import SensorStore, day_bounds, day_key
+
+DAY = "20250513"
+START, NEXT_DAY = day_bounds(DAY)
+
+
+def fahrenheit(temp_c):
+    return temp_c * 9 / 5 + 32
+
+
+def celsius(temp_f):
+    return (temp_f - 32) * 5 / 9
+
+
+def test_pinned_values_at_25c_and_50_percent():
+    assert round(float(derived.vapor_pressure_deficit(25, 50)), 2) == 1.58
+    assert round(float(derived.dew_point(25, 50)), 2) == 13.85
+    # Below about 27 °C the heat index is the simple estimate, close to the air temperature
+    assert round(float(derived.heat_index(25, 50)), 2) == 24.86
+
+
+@pytest.mark.parametrize("temp_f, humidity, heat_index_f", [
+    (90, 70, 105.92),   # NWS table: 106 °F
+    (95, 10, 89.45),    # dry adjustment
+    (85, 90, 101.78),   # humid adjustment; NWS table: 102 °F
+])
+def test_heat_index_matches_the_nws_regression(temp_f, humidity, heat_index_f):
+    assert round(fahrenheit(float(derived.heat_index(celsius(temp_f), humidity))), 2) == heat_index_f
+
+
+def test_formulas_at_the_edges():
+    assert float(derived.vapor_pressure_deficit(20, 100)) == 0.0
+    assert float(derived.dew_point(20, 100)) == pytest.approx(20.0)
+    # Saturation vapour pressure at 0 °C, 0.611 kPa
+    assert float(derived.vapor_pressure_deficit(0, 0)) == pytest.approx(0.61078)
+    # Out of range humidity is clipped rather than producing nan
+    assert float(derived.vapor_pressure_deficit(25, 120)) == 0.0
+    assert np.isfinite(derived.dew_point(25, 0))
+
+
+def test_formulas_work_on_columns():
+    temp_c, humidity = np.array([10.0, 25.0, 32.0]), np.array([80.0, 50.0, 70.0])
+    for formula in (derived.vapor_pressure_deficit, derived.dew_point, derived.heat_index):
+        column = formula(temp_c, humidity)
+        assert column.shape == (3,)
+        assert column.tolist() == pytest.approx([float(formula(t, h)) for t, h in zip(temp_c, humidity)])
+
+
+def test_degree_days_are_the_clipped_integral():
+    ts = START + np.arange(0, 3601, 60)
+    # 20 °C for an hour is 10 degrees above base for 1/24 day
+    assert derived.degree_days(ts, np.full(len(ts), 20.0))[-1] == pytest.approx(10 / 24)
+    # Below base counts nothing, above the cap counts as the cap
+    assert derived.degree_days(ts, np.full(len(ts), 5.0))[-1] == 0.0
+    assert derived.degree_days(ts, np.full(len(ts), 40.0))[-1] == pytest.approx(20 / 24)
+
+
+def test_degree_days_skip_gaps():
+    ts = np.array([START, START + 600, START + 600 + derived.MAX_GAP + 1, START + 600 + derived.MAX_GAP + 601])
+    gdd = derived.degree_days(ts, np.full(4, 20.0))
+    assert gdd.tolist() == pytest.approx([0, 10 * 600 / 86400, 10 * 600 / 86400, 10 * 1200 / 86400])
+
+
+def test_streaming_degree_days_restart_at_midnight():
+    metrics = DerivedMetrics()
+    for ts in range(NEXT_DAY - 3600, NEXT_DAY, 60):
+        today = metrics.update(ts, 20.0, 50.0)["gdd"]
+    assert today == pytest.approx(10 * 3540 / 86400)
+    assert metrics.summary(NEXT_DAY - 1)["gdd"]["today"] == pytest.approx(10 * 3540 / 86400, abs=1e-4)
+
+    # The first reading of a day starts from zero, even if the last one was a minute ago
+    assert metrics.update(NEXT_DAY, 20.0, 50.0)["gdd"] == 0.0
+    assert metrics.update(NEXT_DAY + 60, 20.0, 50.0)["gdd"] == pytest.approx(10 * 60 / 86400)
+    # Before any reading of a new day, today has no degree days yet
+    assert metrics.summary(NEXT_DAY + 86400)["gdd"]["today"] == 0.0
+
+
+def test_streaming_degree_days_skip_gaps():
+    metrics = DerivedMetrics(max_gap=900)
+    metrics.update(START, 20.0, 50.0)
+    metrics.update(START + 600, 20.0, 50.0)
+    assert metrics.update(START + 600 + 3600, 20.0, 50.0)["gdd"] == pytest.approx(10 * 600 / 86400)
+
+
+def test_a_late_recorded_reading_gets_the_previous_days_degree_days(tmp_path):
+    store = SensorStore(str(tmp_path), batch_size=1, fields=derived.FIELDS)
+    metrics = DerivedMetrics(store)
+    metrics.update(NEXT_DAY - 120, 20.0, 50.0)
+    metrics.update(NEXT_DAY - 60, 20.0, 50.0)
+    metrics.update(NEXT_DAY, 20.0, 50.0)
+    metrics.record(NEXT_DAY - 60, 20.0, 50.0)
+
+    ts, *_, gdd = store.read_day(DAY)
+    assert ts.tolist() == [NEXT_DAY - 60]
+    assert gdd.tolist() == pytest.approx([10 * 60 / 86400])
+
+
+def test_rolling_window_buckets_expire():
+    window = RollingWindow(3600, 60, 1)
+    window.add(START, [5.0])
+    window.add(START + 1800, [10.0])
+    window.add(START + 1810, [12.0])
+    assert window.summary(START + 1810, ("v",)) == {"count": 3, "v": {"min": 5.0, "max": 12.0, "mean": 9.0}}
+
+    # The first minute's bucket leaves the window an hour later
+    assert window.summary(START + 3599, ("v",))["count"] == 3
+    assert window.summary(START + 3600, ("v",)) == {"count": 2, "v": {"min": 10.0, "max": 12.0, "mean": 11.0}}
+    assert window.summary(START + 5400, ("v",)) == {"count": 0}
+
+    # A new bucket takes over the expired one's slot; a reading older than the window is ignored
+    window.add(START + 3600, [1.0])
+    window.add(START + 30, [100.0])
+    assert window.summary(START + 3600, ("v",)) == {"count": 3, "v": {"min": 1.0, "max": 12.0, "mean": 7.67}}
+
+
+def test_rolling_window_extend_matches_add():
+    rng = np.random.default_rng(0)
+    ts = np.sort(START + rng.integers(0, 2 * 86400, 5000))
+    values = rng.normal(20, 5, (5000, 2))
+    added, extended = RollingWindow(86400, 288, 2), RollingWindow(86400, 288, 2)
+    for t, row in zip(ts, values):
+        added.add(t, row)
+    extended.extend(ts, values)
+    now = int(ts[-1])
+    assert extended.summary(now, ("a", "b")) == added.summary(now, ("a", "b"))
+
+
+def test_backfill_agrees_with_streaming(tmp_path):
+    rng = np.random.default_rng(1)
+    ts = np.arange(START, NEXT_DAY, 30)
+    ts = ts[(ts < START + 40000) | (ts > START + 43000)]  # the sensor was off for a while
+    temp_c = np.round(18 + 8 * np.sin((ts - START) / 86400 * 2 * np.pi) + rng.normal(0, 0.2, len(ts)), 1)
+    humidity = np.round(np.clip(70 + rng.normal(0, 5, len(ts)), 0, 100), 1)
+
+    raw = SensorStore(str(tmp_path / "raw"), batch_size=1000)
+    streamed = SensorStore(str(tmp_path / "streamed"), batch_size=1000, fields=derived.FIELDS)
+    metrics = DerivedMetrics(streamed)
+    for t, c, h in zip(ts.tolist(), temp_c.tolist(), humidity.tolist()):
+        raw.append(t, c, h)
+        metrics.update(t, c, h)
+        metrics.record(t, c, h)
+    raw.flush()
+    streamed.flush()
+
+    backfilled = derived_store(raw)
+    assert backfill(raw, backfilled, today=day_key(NEXT_DAY))["rows"] == len(ts)
+    for expected, actual in zip(streamed.read_day(DAY), backfilled.read_day(DAY)):
+        np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-4)
+
+    # Complete days are not computed again unless forced
+    assert backfill(raw, backfilled, today=day_key(NEXT_DAY))["days"] == 0
+    assert backfill(raw, backfilled, today=day_key(NEXT_DAY), force=True)["days"] == 1
+    # Today is still being recorded
+    assert backfill(raw, backfilled, today=DAY, force=True)["days"] == 0
+
+
+def test_seed_matches_streaming():
+    ts = np.arange(START, START + 7200, 60)
+    temp_c = np.linspace(15, 25, len(ts))
+    humidity = np.linspace(80, 60, len(ts))
+    streamed, seeded = DerivedMetrics(), DerivedMetrics()
+    for t, c, h in zip(ts.tolist(), temp_c.tolist(), humidity.tolist()):
+        streamed.update(t, c, h)
+    seeded.seed(ts, temp_c, humidity, now=int(ts[-1]))
+
+    now = int(ts[-1])
+    assert seeded.summary(now) == streamed.summary(now)
+    # Seeding is only for a fresh start
+    streamed.seed(ts[:10], temp_c[:10], humidity[:10], now=now)
+    assert streamed.latest["timestamp"] == now
@@ -0,0 +1,86 @@
+import pytest
+
+from filtering import ReadingFilter
+
+FIELDS = ("temperature_c", "humidity")
+
+
+def warm(reading_filter, values=(20.0, 60.0), count=7, start=0.0, interval=3.0):
+    ts = start
+    for _ in range(count):
+        ts += interval
+        assert reading_filter.add(ts, values) == "accepted"
+        reading_filter.output()
+    return ts
+
+
+def test_a_spike_is_replaced_by_the_window_median():
+    reading_filter = ReadingFilter(FIELDS)
+    ts = warm(reading_filter)
+    # Within the rate limit, but far outside the window's spread
+    assert reading_filter.add(ts + 3, (20.0, 85.0)) == "replaced"
+    assert reading_filter.output() == ((20.0, 60.0), pytest.approx(0.93))
+    assert reading_filter.replaced == 1
+
+
+def test_implausible_values_are_rejected():
+    reading_filter = ReadingFilter(FIELDS)
+    ts = warm(reading_filter)
+    assert reading_filter.add(ts + 3, (-3276.8, 60.0)) == "rejected"
+    assert reading_filter.add(ts + 6, (20.0, 101.0)) == "rejected"
+    assert reading_filter.output() is None
+
+
+def test_a_real_step_is_accepted_after_repeated_rate_rejections():
+    reading_filter = ReadingFilter(FIELDS, max_rejects=3)
+    ts = warm(reading_filter)
+    results = [reading_filter.add(ts + 3 * i, (45.0, 60.0)) for i in range(1, 6)]
+    assert results == ["rejected"] * 3 + ["accepted"] * 2
+    assert reading_filter.output()[0] == (45.0, 60.0)
+
+
+def test_the_window_is_forgotten_after_a_gap():
+    reading_filter = ReadingFilter(FIELDS, max_gap=21)
+    ts = warm(reading_filter)
+    ts += 12 * 3600
+    outputs = []
+    for _ in range(4):
+        ts += 3
+        assert reading_filter.add(ts, (30.0, 45.0)) == "accepted"
+        outputs.append(reading_filter.output()[0])
+    assert outputs == [(30.0, 45.0)] * 4
+
+
+def test_without_max_gap_the_old_window_wins():
+    reading_filter = ReadingFilter(FIELDS)
+    ts = warm(reading_filter)
+    assert reading_filter.add(ts + 12 * 3600, (30.0, 45.0)) == "replaced"
+    assert reading_filter.output()[0] == (20.0, 60.0)
+
+
+def test_reset_starts_over():
+    reading_filter = ReadingFilter(FIELDS)
+    ts = warm(reading_filter)
+    reading_filter.reset()
+    assert reading_filter.confidence() == 0.0
+    assert reading_filter.add(ts + 3, (30.0, 45.0)) == "accepted"
+    assert reading_filter.output()[0] == (30.0, 45.0)
+
+
+def test_oversampled_readings_are_reduced_to_their_median():
+    reading_filter = ReadingFilter(FIELDS, oversample=3)
+    for ts, humidity in ((2, 60.0), (4, 61.0), (6, 66.0)):
+        reading_filter.add(ts, (20.0, humidity))
+    assert reading_filter.output()[0] == (20.0, 61.0)
+
+
+def test_confidence_counts_failures_and_warmup():
+    reading_filter = ReadingFilter(FIELDS, window=4, min_samples=2)
+    assert reading_filter.confidence() == 0.0
+    reading_filter.add(3, (20.0, 60.0))
+    # One good sample of the two needed
+    assert reading_filter.confidence() == 0.5
+    reading_filter.add(6, (20.0, 60.0))
+    reading_filter.fail()
+    reading_filter.fail()
+    assert reading_filter.confidence() == 0.5
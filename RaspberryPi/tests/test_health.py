@@ -0,0 +1,70 @@
+import threading
+
+from health import DISABLED, FAILED, READY, STARTING, Readiness
+
+
+def blocked():
+    """A startup function that runs until the returned event is set."""
+    release = threading.Event()
+    return release, lambda: release.wait(5)
+
+
+def test_a_subsystem_is_starting_until_its_function_returns():
+    readiness = Readiness()
+    release, func = blocked()
+    thread = readiness.start("camera", func)
+    assert readiness.get("camera") == STARTING
+    assert readiness.status()["status"] == STARTING
+
+    release.set()
+    thread.join(5)
+    assert readiness.get("camera") == READY
+    status = readiness.status()
+    assert status["status"] == READY
+    assert status["subsystems"]["camera"] == {"required": False, "status": READY, "error": None,
+                                              "seconds": status["subsystems"]["camera"]["seconds"]}
+
+
+def test_returning_false_disables_a_subsystem():
+    readiness = Readiness()
+    readiness.start("derived", lambda: False).join(5)
+    assert readiness.get("derived") == DISABLED
+    assert readiness.status()["status"] == READY
+
+
+def test_an_optional_subsystem_failing_degrades():
+    readiness = Readiness()
+
+    def broken():
+        raise OSError("no camera")
+
+    readiness.start("sensor", lambda: None, required=True).join(5)
+    readiness.start("camera", broken).join(5)
+    status = readiness.status()
+    assert status["status"] == "degraded"
+    assert status["subsystems"]["camera"]["status"] == FAILED
+    assert status["subsystems"]["camera"]["error"] == "no camera"
+
+
+def test_a_required_subsystem_failing_fails():
+    readiness = Readiness()
+    release, func = blocked()
+
+    def broken():
+        raise RuntimeError("DHT driver missing")
+
+    readiness.start("camera", func)
+    readiness.start("sensor", broken, required=True).join(5)
+    # Failed wins over another subsystem still starting
+    assert readiness.status()["status"] == FAILED
+    assert readiness.status()["subsystems"]["sensor"]["error"] == "DHT driver missing"
+    release.set()
+
+
+def test_set_keeps_required_unless_given():
+    readiness = Readiness()
+    readiness.set("sensor", STARTING, required=True)
+    readiness.set("sensor", FAILED, "timeout")
+    assert readiness.status()["subsystems"]["sensor"]["required"] is True
+    assert readiness.status()["status"] == FAILED
+    assert readiness.get("missing") is None
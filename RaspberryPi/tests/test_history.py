@@ -0,0 +1,85 @@
+import json
+
+import numpy as np
+import pytest
+
+import history
+from sensor_store import SensorStore, day_bounds
+
+START = day_bounds("20250513")[0]
+
+
+def test_aggregate_reduces_each_bucket():
+    ts = np.array([0, 10, 59, 60, 200, 230], dtype=np.int64) + START
+    temp_c = np.array([20.0, 22.0, 21.0, 25.0, 18.0, 19.0])
+    starts, counts, results = history.aggregate(ts, {"temperature_c": temp_c}, 60)
+
+    assert starts.tolist() == [START, START + 60, START + 180]
+    assert counts.tolist() == [3, 1, 2]
+    assert results[("temperature_c", "min")].tolist() == [20.0, 25.0, 18.0]
+    assert results[("temperature_c", "max")].tolist() == [22.0, 25.0, 19.0]
+    assert results[("temperature_c", "mean")].tolist() == [21.0, 25.0, 18.5]
+
+
+def test_aggregate_only_computes_requested_aggregates():
+    ts = np.arange(START, START + 600, 3, dtype=np.int64)
+    _, _, results = history.aggregate(ts, {"humidity": np.ones(len(ts))}, 300, aggs=("max",))
+    assert list(results) == [("humidity", "max")]
+
+
+def test_aggregate_of_nothing():
+    starts, counts, results = history.aggregate(np.empty(0, dtype=np.int64), {"humidity": []}, 60)
+    assert len(starts) == len(counts) == 0
+    assert len(results[("humidity", "mean")]) == 0
+
+
+def test_combine_weights_means_by_count():
+    starts, counts, results = history.combine(
+        np.array([0, 60, 120]), np.array([1, 3, 2]),
+        {("t", "min"): np.array([1.0, 0.0, 5.0]), ("t", "mean"): np.array([4.0, 2.0, 6.0])}, 120)
+    assert starts.tolist() == [0, 120]
+    assert counts.tolist() == [4, 2]
+    assert results[("t", "min")].tolist() == [0.0, 5.0]
+    assert results[("t", "mean")].tolist() == [2.5, 6.0]
+
+
+def test_query_history_reads_the_store(tmp_path):
+    store = SensorStore(str(tmp_path), batch_size=1000)
+    for i in range(120):
+        store.append(START + i * 5, 20.0 + i % 2, 50.0)
+    starts, counts, results = history.query_history(store, START, START + 300, 60)
+    assert counts.tolist() == [12] * 5
+    assert results[("temperature_c", "mean")].tolist() == [20.5] * 5
+
+
+@pytest.mark.parametrize("value, expected", [("1747136000", 1747136000.0), ("1747136000.5", 1747136000.5)])
+def test_parse_time_epoch(value, expected):
+    assert history.parse_time(value) == expected
+
+
+def test_parse_time_rejects_garbage():
+    with pytest.raises(ValueError):
+        history.parse_time("yesterday")
+
+
+def test_parse_aggregates():
+    assert history.parse_aggregates("mean, min") == ("min", "mean")
+    with pytest.raises(ValueError):
+        history.parse_aggregates("median")
+    with pytest.raises(ValueError):
+        history.parse_aggregates(",")
+
+
+def test_streamed_history_is_one_json_document(monkeypatch):
+    monkeypatch.setattr(history, "CHUNK_ROWS", 2)
+    ts = np.arange(START, START + 300, 30, dtype=np.int64)
+    result = history.aggregate(ts, {"temperature_c": np.linspace(20, 21, len(ts)),
+                                    "humidity": np.full(len(ts), 60.0)}, 60)
+    body = "".join(history.stream_history({"bucket": "1m"}, *result, history.AGGREGATES))
+
+    document = json.loads(body)
+    assert document["bucket"] == "1m"
+    assert document["count"] == 5
+    assert document["columns"][:3] == ["timestamp", "count", "temperature_c_min"]
+    assert [point[0] for point in document["points"]] == result[0].tolist()
+    assert all(len(point) == len(document["columns"]) for point in document["points"])
@@ -0,0 +1,83 @@
+import os
+
+from image_index import ImageIndex, burst_name, is_capture_name, name_for_time, time_for_name
+from sensor_store import day_bounds
+
+START = day_bounds("20250513")[0]
+
+
+def make_index(tmp_path, count):
+    names = [name_for_time(START + i * 60) for i in range(count)]
+    for name in names:
+        (tmp_path / name).write_bytes(b"jpeg")
+    (tmp_path / "notes.txt").write_text("not an image")
+    index = ImageIndex(str(tmp_path))
+    assert index.rebuild() == count
+    return index, names
+
+
+def test_names_round_trip_their_capture_time():
+    assert time_for_name(name_for_time(START + 61)) == START + 61
+    assert time_for_name(burst_name(START + 61, 3)) == START + 61
+    assert burst_name(START, 1) > name_for_time(START)
+    assert time_for_name("thumbnail.jpg") is None
+
+
+def test_pages_cover_every_image_once(tmp_path):
+    index, names = make_index(tmp_path, 25)
+    listed, cursor, pages = [], None, 0
+    while True:
+        page, cursor = index.list(limit=10, cursor=cursor)
+        listed += page
+        pages += 1
+        if cursor is None:
+            break
+    assert listed == names
+    assert pages == 3
+
+
+def test_time_range_is_half_open(tmp_path):
+    index, names = make_index(tmp_path, 10)
+    page, cursor = index.list(START + 120, START + 300)
+    assert page == names[2:5]
+    assert cursor is None
+
+    page, cursor = index.list(START + 120, START + 300, limit=2)
+    assert (page, cursor) == (names[2:4], names[3])
+    assert index.list(START + 120, START + 300, limit=2, cursor=cursor) == (names[4:5], None)
+
+
+def test_a_cursor_survives_the_removal_of_its_image(tmp_path):
+    index, names = make_index(tmp_path, 6)
+    page, cursor = index.list(limit=3)
+    index.remove(cursor)
+    assert index.list(limit=3, cursor=cursor)[0] == names[3:6]
+
+
+def test_add_and_latest(tmp_path):
+    index, names = make_index(tmp_path, 3)
+    assert index.latest() == names[-1]
+    # A burst frame of an earlier capture lands in time order
+    index.add(str(tmp_path / burst_name(START, 1)))
+    assert index.list(limit=2)[0] == [names[0], burst_name(START, 1)]
+    assert len(index) == 4 and names[1] in index
+
+
+def test_latest_path_skips_images_deleted_behind_its_back(tmp_path):
+    index, names = make_index(tmp_path, 3)
+    os.remove(tmp_path / names[-1])
+    assert index.latest_path() == str(tmp_path / names[-2])
+    assert names[-1] not in index
+
+
+def test_only_capture_names_are_indexed(tmp_path):
+    index, names = make_index(tmp_path, 3)
+    for other in ("IMG_0001.jpg", "webcam_upload.jpg", "image_latest.jpg"):
+        (tmp_path / other).write_bytes(b"jpeg")
+    assert index.rebuild() == 3
+    index.add(str(tmp_path / "webcam_upload.jpg"))
+
+    assert index.list(end=START + 60)[0] == names[:1]
+    assert index.list()[0] == names
+    assert index.latest_path() == str(tmp_path / names[-1])
+    assert is_capture_name(burst_name(START, 12)) and not is_capture_name("IMG_0001.jpg")
@@ -0,0 +1,199 @@
+import io
+import os
+from collections import namedtuple
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+import history
+import retention
+from image_index import ImageIndex, name_for_time
+from retention import RetentionManager
+from sensor_store import SensorStore, day_bounds
+
+TODAY = date(2025, 6, 30)
+NOW = day_bounds(TODAY.strftime("%Y%m%d"))[0] + 12 * 3600
+IMAGE_BYTES = 100
+
+
+def day_start(days_ago):
+    return day_bounds((TODAY - timedelta(days=days_ago)).strftime("%Y%m%d"))[0]
+
+
+def quiet(message, error=False):
+    pass
+
+
+@pytest.fixture
+def images(tmp_path):
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    return ImageIndex(str(image_dir))
+
+
+def add_images(index, days_ago, count, interval=60, data=b"x" * IMAGE_BYTES):
+    names = [name_for_time(day_start(days_ago) + i * interval) for i in range(count)]
+    for name in names:
+        with open(os.path.join(index.image_dir, name), "wb") as f:
+            f.write(data)
+        index.add(name)
+    return names
+
+
+def manager(tmp_path, index, stores=(), **policies):
+    return RetentionManager(index, list(stores), str(tmp_path / "store"), str(tmp_path / "retention.json"),
+                            log=quiet, **policies)
+
+
+def on_disk(index):
+    return sorted(n for n in os.listdir(index.image_dir) if n.endswith(".jpg"))
+
+
+def test_by_default_nothing_is_deleted_or_rewritten(tmp_path, images):
+    names = add_images(images, 400, 30) + add_images(images, 0, 5)
+    store = SensorStore(str(tmp_path / "store"), batch_size=1)
+    store.append(day_start(400) + 60, 20.0, 50.0)
+
+    summary = manager(tmp_path, images, [store]).run(NOW)
+
+    assert on_disk(images) == names
+    assert store.days() == [(TODAY - timedelta(days=400)).strftime("%Y%m%d")]
+    assert summary["bytes_freed"] == 0
+
+
+def test_images_past_max_days_are_deleted(tmp_path, images):
+    old = add_images(images, 10, 3)
+    recent = add_images(images, 2, 3)
+    summary = manager(tmp_path, images, max_days=5).run(NOW)
+    assert on_disk(images) == recent
+    assert summary["deleted"] == len(old)
+    assert summary["bytes_freed"] == len(old) * IMAGE_BYTES
+    assert images.list()[0] == recent
+
+
+def test_old_days_are_thinned_once(tmp_path, images):
+    old = add_images(images, 20, 30, interval=60)
+    recent = add_images(images, 3, 30, interval=60)
+    retention_manager = manager(tmp_path, images, full_days=14, thin_interval=600)
+
+    summary = retention_manager.run(NOW)
+    # One per 10-minute slot is kept on the old day; the recent one is untouched
+    assert on_disk(images) == sorted(old[::10] + recent)
+    assert summary["thinned"] == 27
+    assert retention_manager.archived_through == (TODAY - timedelta(days=20)).strftime("%Y%m%d")
+    assert retention_manager.run(NOW)["thinned"] == 0
+
+
+@pytest.mark.skipif(retention.Image is None, reason="needs Pillow")
+def test_old_images_are_shrunk(tmp_path, images):
+    buf = io.BytesIO()
+    retention.Image.new("RGB", (1280, 960), (40, 120, 40)).save(buf, "JPEG")
+    names = add_images(images, 20, 2, data=buf.getvalue())
+    summary = manager(tmp_path, images, full_days=14, archive_width=320).run(NOW)
+    assert summary["archived"] == 2
+    for name in names:
+        with retention.Image.open(os.path.join(images.image_dir, name)) as img:
+            assert img.size == (320, 240)
+
+
+def test_image_quota_deletes_the_oldest_but_never_today(tmp_path, images):
+    old = add_images(images, 3, 4)
+    older = add_images(images, 4, 4)
+    today = add_images(images, 0, 4)
+    retention_manager = manager(tmp_path, images, image_quota=6 * IMAGE_BYTES)
+
+    retention_manager.run(NOW)
+    assert on_disk(images) == sorted(old[2:] + today)
+
+    retention_manager.image_quota = IMAGE_BYTES
+    retention_manager.run(NOW)
+    assert on_disk(images) == today
+    assert older[0] not in images
+
+
+def test_min_free_deletes_until_there_is_room(tmp_path, images, monkeypatch):
+    names = add_images(images, 5, 10)
+    usage = namedtuple("usage", "total used free")
+    monkeypatch.setattr(retention.shutil, "disk_usage", lambda path: usage(10 ** 9, 0, 1000))
+    summary = manager(tmp_path, images, min_free=1000 + 3 * IMAGE_BYTES).run(NOW)
+    assert summary["deleted"] == 3
+    assert on_disk(images) == names[3:]
+
+
+def test_undeletable_images_are_skipped_not_retried_forever(tmp_path, images, monkeypatch):
+    names = add_images(images, 10, 12)
+    stuck = set(names[:5])
+    remove = os.remove
+
+    def failing_remove(path):
+        if os.path.basename(path) in stuck:
+            raise PermissionError("read-only")
+        remove(path)
+
+    monkeypatch.setattr(retention.os, "remove", failing_remove)
+    retention_manager = manager(tmp_path, images, image_quota=1, batch=3)
+    summary = retention_manager.run(NOW)
+
+    assert on_disk(images) == names[:5]
+    assert summary["deleted"] == 7
+    assert summary["bytes_freed"] == 7 * IMAGE_BYTES
+    assert retention_manager.totals["errors"] == 5
+    assert all(name in images for name in stuck)
+
+
+def test_raw_days_are_rolled_up_hourly(tmp_path, images):
+    store = SensorStore(str(tmp_path / "store"), batch_size=10000)
+    for days_ago in (40, 2):
+        for i in range(0, 7200, 60):
+            store.append(day_start(days_ago) + i, 20.0 + (i // 3600), 50.0)
+    store.flush()
+    old_day = (TODAY - timedelta(days=40)).strftime("%Y%m%d")
+    before = history.query_history(store, day_start(40), day_start(39), 3600)
+
+    summary = manager(tmp_path, images, [store], raw_days=30).run(NOW)
+
+    assert summary["rolled_up"] == 1
+    assert old_day not in store.days() and store.rollup_days() == [old_day]
+    after = history.query_history(store, day_start(40), day_start(39), 3600)
+    assert after[0].tolist() == before[0].tolist()
+    assert after[1].tolist() == [60, 60]
+    assert np.allclose(after[2][("temperature_c", "mean")], before[2][("temperature_c", "mean")])
+
+
+def test_log_quota_drops_exports_before_readings(tmp_path, images):
+    store = SensorStore(str(tmp_path / "store"), batch_size=10000)
+    for days_ago in (3, 2):
+        for i in range(0, 3600, 60):
+            store.append(day_start(days_ago) + i, 20.0, 50.0)
+    store.flush()
+    days = store.days()
+    export_dir = os.path.join(store.root, "export")
+    exports = [store.csv_for_day(day, export_dir) for day in days]
+    # Room for the readings, not for the exports too
+    quota = retention._tree_size(store.root) - 1
+
+    summary = manager(tmp_path, images, [store], log_quota=quota).run(NOW)
+
+    assert summary["exports_deleted"] == 1
+    assert not os.path.exists(exports[0]) and os.path.exists(exports[1])
+    assert store.days() == days
+
+
+def test_files_that_are_not_captures_are_left_alone(tmp_path, images):
+    old = add_images(images, 10, 3)
+    recent = add_images(images, 1, 2)
+    for other in ("IMG_0001.jpg", "webcam_upload.jpg"):
+        with open(os.path.join(images.image_dir, other), "wb") as f:
+            f.write(b"x" * 10 * IMAGE_BYTES)
+    images.rebuild()
+    retention_manager = manager(tmp_path, images, max_days=7)
+
+    summary = retention_manager.run(NOW)
+    assert summary["deleted"] == len(old)
+    assert on_disk(images) == sorted(["IMG_0001.jpg", "webcam_upload.jpg"] + recent)
+    assert retention_manager.image_usage() == (2, 2 * IMAGE_BYTES)
+
+    retention_manager.image_quota = 1
+    retention_manager.run(NOW)
+    assert on_disk(images) == ["IMG_0001.jpg", "webcam_upload.jpg"]
@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from rules import Rule, RuleEngine, load_rules, parse_duration
+
+FIELDS = ("temperature_c", "temperature_f", "humidity")
+
+
+def engine(*configs):
+    return RuleEngine([Rule(config, "main") for config in configs], {"main": FIELDS})
+
+
+def replay(rule_engine, readings, field="humidity"):
+    """Feed ``(ts, value)`` readings; returns ``(ts, rule id, event)`` for every event."""
+    events = []
+    for ts, value in readings:
+        for rule, event in rule_engine.evaluate("main", ts, {field: value}):
+            events.append((ts, rule.id, event))
+    return events
+
+
+@pytest.mark.parametrize("value, seconds", [(90, 90.0), ("90", 90.0), ("90s", 90.0),
+                                            ("10m", 600.0), ("1.5h", 5400.0), ("1d", 86400.0)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+@pytest.mark.parametrize("value", ["soon", "-5", True])
+def test_parse_duration_rejects(value):
+    with pytest.raises(ValueError):
+        parse_duration(value)
+
+
+def test_fires_once_the_condition_has_held_for_its_duration():
+    rule_engine = engine({"id": "wet", "when": "humidity > 85", "for": "10m"})
+    readings = [(0, 86), (300, 87), (599, 90), (600, 88), (900, 89), (1200, 80)]
+    assert replay(rule_engine, readings) == [(600, "wet", "fired"), (1200, "wet", "cleared")]
+    assert rule_engine.events == {"fired": 1, "cleared": 1}
+
+
+def test_a_break_restarts_the_duration():
+    rule_engine = engine({"id": "wet", "when": "humidity > 85", "for": 600})
+    readings = [(0, 86), (500, 85), (600, 86), (1100, 86), (1200, 86)]
+    assert replay(rule_engine, readings) == [(1200, "wet", "fired")]
+
+
+def test_hysteresis_keeps_a_hovering_reading_from_flapping():
+    readings = [(0, 86), (10, 85), (20, 86), (30, 84), (40, 82.9), (50, 86)]
+    flapping = engine({"id": "wet", "when": "humidity > 85"})
+    assert [e for _, _, e in replay(flapping, readings)] == ["fired", "cleared", "fired",
+                                                             "cleared", "fired"]
+    steady = engine({"id": "wet", "when": "humidity > 85", "hysteresis": 2})
+    assert replay(steady, readings) == [(0, "wet", "fired"), (40, "wet", "cleared"), (50, "wet", "fired")]
+
+
+def test_cooldown_spaces_fires_out():
+    rule_engine = engine({"id": "wet", "when": "humidity > 85", "cooldown": "1h"})
+    readings = [(0, 90), (60, 80), (120, 90), (1800, 80), (3000, 90), (3600, 90)]
+    assert replay(rule_engine, readings) == [(0, "wet", "fired"), (60, "wet", "cleared"),
+                                             (3600, "wet", "fired")]
+
+
+def test_every_condition_must_hold():
+    rule_engine = engine({"id": "hot-and-wet", "when": ["humidity >= 80", "temperature_c < 30"]})
+    assert rule_engine.evaluate("main", 0, {"humidity": 85, "temperature_c": 31}) == []
+    assert rule_engine.evaluate("main", 1, {"humidity": 85}) == []
+    [(rule, event)] = rule_engine.evaluate("main", 2, {"humidity": 80, "temperature_c": 29.9})
+    assert (rule.id, event, rule.fired) == ("hot-and-wet", "fired", 1)
+
+
+def test_rules_only_see_their_own_sensor():
+    rule_engine = RuleEngine([Rule({"id": "dry", "sensor": "soil", "when": "moisture < 20"}, "main")],
+                             {"main": FIELDS, "soil": ("temperature_c", "moisture")})
+    assert rule_engine.evaluate("main", 0, {"moisture": 10}) == []
+    assert [event for _, event in rule_engine.evaluate("soil", 0, {"moisture": 10})] == ["fired"]
+    assert rule_engine.active == 1
+
+
+def test_describe_reports_state():
+    rule_engine = engine({"id": "wet", "when": "humidity > 85", "for": 60})
+    rule_engine.evaluate("main", 10, {"humidity": 90})
+    [described] = rule_engine.describe()
+    assert (described["state"], described["since"]) == ("pending", 10.0)
+
+
+@pytest.mark.parametrize("config, message", [
+    ({"id": "x", "when": "humidity ~ 85"}, "can't parse condition"),
+    ({"id": "x", "when": "soil_ph > 7"}, "has no field"),
+    ({"id": "x", "sensor": "roof", "when": "humidity > 85"}, "unknown sensor"),
+    ({"id": "x", "when": "humidity > 85", "actions": [{"gpio": 40}]}, "invalid action"),
+])
+def test_invalid_rules_are_rejected(config, message):
+    with pytest.raises(ValueError, match=message):
+        engine(config)
+
+
+def test_load_rules(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": [
+        {"id": "wet", "when": "humidity > 85", "actions": ["capture", {"gpio": 23}]}]}))
+    [rule] = load_rules(str(path), "main")
+    assert (rule.sensor, rule.actions) == ("main", [{"type": "capture"}, {"type": "gpio", "pin": 23}])
+
+    path.write_text(json.dumps({"rules": [{"id": "a", "when": "humidity > 1"}] * 2}))
+    with pytest.raises(ValueError, match="duplicate rule id"):
+        load_rules(str(path), "main")
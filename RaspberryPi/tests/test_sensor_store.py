@@ -0,0 +1,79 @@
+import numpy as np
+
+from sensor_store import SensorStore, day_bounds, day_key
+
+DAY = "20250513"
+START = day_bounds(DAY)[0]
+
+
+def test_append_is_visible_before_and_after_flush(tmp_path):
+    store = SensorStore(str(tmp_path), batch_size=100)
+    store.append(START + 10, 21.5, 60.0)
+    store.append(START + 13, 21.6, 61.0)
+
+    ts, temp_c, humidity = store.query()
+    assert ts.tolist() == [START + 10, START + 13]
+    assert temp_c.dtype == humidity.dtype == np.float32
+    assert np.allclose(temp_c, [21.5, 21.6]) and np.allclose(humidity, [60.0, 61.0])
+
+    store.flush()
+    assert store.days() == [DAY]
+    assert store.query()[0].tolist() == [START + 10, START + 13]
+
+
+def test_query_bounds_are_half_open_and_span_days(tmp_path):
+    store = SensorStore(str(tmp_path), batch_size=1)
+    next_day_start = day_bounds(DAY)[1]
+    for ts in (START, START + 3, next_day_start - 3, next_day_start, next_day_start + 3):
+        store.append(ts, 20.0, 50.0)
+
+    assert store.days() == [DAY, day_key(next_day_start)]
+    ts = store.query(START + 3, next_day_start + 3)[0]
+    assert ts.tolist() == [START + 3, next_day_start - 3, next_day_start]
+    assert len(store.query(next_day_start + 4)[0]) == 0
+
+
+def test_out_of_order_appends_are_read_sorted(tmp_path):
+    store = SensorStore(str(tmp_path), batch_size=2)
+    store.append(START + 20, 22.0, 50.0)
+    store.append(START + 30, 23.0, 51.0)
+    # The clock stepped back
+    store.append(START + 10, 21.0, 49.0)
+    store.flush()
+
+    ts, temp_c, _ = store.read_day(DAY)
+    assert ts.tolist() == [START + 10, START + 20, START + 30]
+    assert temp_c.tolist() == [21.0, 22.0, 23.0]
+
+
+def test_write_day_replaces_the_segment(tmp_path):
+    store = SensorStore(str(tmp_path), batch_size=1)
+    store.append(START + 5, 20.0, 50.0)
+    assert len(store.read_day(DAY)[0]) == 1
+
+    ts = np.array([START + 1, START + 2, START + 3])
+    store.write_day(DAY, ts, np.array([1.0, 2.0, 3.0]), np.array([4.0, 5.0, 6.0]))
+
+    ts_read, temp_c, humidity = store.read_day(DAY)
+    assert ts_read.tolist() == ts.tolist()
+    assert temp_c.tolist() == [1.0, 2.0, 3.0]
+    assert humidity.tolist() == [4.0, 5.0, 6.0]
+
+
+def test_stores_with_fields(tmp_path):
+    store = SensorStore(str(tmp_path), batch_size=1, fields=("vpd_kpa", "dew_point_c"))
+    store.append(START, 1.25, 12.5)
+    ts, vpd, dew_point = store.query()
+    assert ts.tolist() == [START]
+    assert (vpd.tolist(), dew_point.tolist()) == ([1.25], [12.5])
+
+
+def test_export_csv_writes_the_legacy_format(tmp_path):
+    store = SensorStore(str(tmp_path / "store"), batch_size=1)
+    store.append(START + 60, 20.0, 55.5)
+    path = store.csv_for_day(DAY, str(tmp_path / "export"))
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines == ["timestamp,temperature_c,temperature_f,humidity",
+                     "2025-05-13 00:01:00,20.0,68.00,55.5"]
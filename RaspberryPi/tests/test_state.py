@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+from werkzeug.http import parse_etags
+
+import state
+from state import EMPTY_SENSOR_DATA, SharedState
+
+READING = {"temperature_c": 21.5, "temperature_f": 70.7, "humidity": 55.0, "confidence": 1.0, "timestamp": 1}
+
+
+def not_modified(if_none_match, etag):
+    """Whether a GET with this If-None-Match header is answered 304, as in main.conditional_json."""
+    return parse_etags(if_none_match).contains(etag)
+
+
+def active_state():
+    shared = SharedState()
+    shared.set_active(sensor=True, camera=True)
+    return shared
+
+
+def test_snapshots_are_immutable():
+    snapshot = SharedState().snapshot
+    with pytest.raises(AttributeError):
+        snapshot.sensor_active = True
+    changed = snapshot.replace(sensor_active=True)
+    assert (snapshot.sensor_active, changed.sensor_active) == (False, True)
+
+
+def test_a_held_snapshot_does_not_change_when_state_is_published():
+    shared = active_state()
+    before = shared.snapshot
+    reading = dict(READING)
+    after = shared.set_sensor_data(reading, sensor_id="main")
+    reading["humidity"] = 99.0
+
+    assert shared.snapshot is after
+    assert before.sensor_data is EMPTY_SENSOR_DATA
+    assert before.sensors == {}
+    assert after.sensor_data == READING == after.sensors["main"]
+    assert after.version == before.version + 1
+
+    previous, current = shared.set_active(camera=False)
+    assert previous is after and previous.camera_active
+    assert not current.camera_active
+
+
+def test_readings_are_discarded_while_the_sensor_is_off():
+    shared = SharedState()
+    assert shared.set_sensor_data(READING) is None
+    assert shared.snapshot.sensor_version == 0
+    assert shared.set_sensor_data(READING, only_if_active=False).sensor_data == READING
+
+
+def test_secondary_sensors_leave_the_primary_reading_alone():
+    shared = active_state()
+    primary = shared.set_sensor_data(READING, sensor_id="main")
+    secondary = shared.set_sensor_data(dict(READING, humidity=80.0), sensor_id="soil", primary=False)
+    assert secondary.sensor_data is primary.sensor_data
+    assert secondary.sensors["soil"]["humidity"] == 80.0
+    assert set(primary.sensors) == {"main"}
+
+
+def test_state_changes_are_counted():
+    shared = SharedState()
+    assert shared.set_active(sensor=False) == (shared.snapshot, shared.snapshot)
+    assert shared.snapshot.state_change_count == 0
+    shared.set_active(sensor=True)
+    # The on/off endpoints count every call, changed or not
+    shared.set_active(sensor=True, count=True)
+    snapshot = shared.snapshot
+    assert (snapshot.state_change_count, snapshot.control_version, snapshot.sensor_version) == (2, 2, 0)
+
+
+def test_concurrent_writers_lose_no_updates():
+    shared = active_state()
+
+    def write():
+        for i in range(500):
+            shared.set_sensor_data(dict(READING, timestamp=i))
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert shared.snapshot.sensor_version == 2000
+
+
+def test_etags_follow_their_own_version():
+    shared = active_state()
+    snapshot = shared.snapshot
+    sent = f'"{snapshot.sensor_etag()}"'
+    assert not_modified(sent, shared.snapshot.sensor_etag())
+
+    # Switching the camera off doesn't invalidate the reading, and vice versa
+    shared.set_active(camera=False)
+    assert not_modified(sent, shared.snapshot.sensor_etag())
+    control = f'"{shared.snapshot.control_etag()}"'
+    shared.set_sensor_data(READING)
+    assert not not_modified(sent, shared.snapshot.sensor_etag())
+    assert not_modified(control, shared.snapshot.control_etag())
+    assert shared.snapshot.sensor_etag() != shared.snapshot.control_etag()
+
+
+def test_etags_from_before_a_restart_do_not_match(monkeypatch):
+    shared = active_state()
+    shared.set_sensor_data(READING)
+    sent = f'"{shared.snapshot.sensor_etag()}"'
+
+    # After a restart the versions count from 0 again and reach the same number
+    monkeypatch.setattr(state, "BOOT_ID", "restart1")
+    restarted = active_state()
+    restarted.set_sensor_data(dict(READING, humidity=70.0))
+    assert restarted.snapshot.sensor_version == shared.snapshot.sensor_version
+    assert not not_modified(sent, restarted.snapshot.sensor_etag())
+    assert not_modified(f'"{restarted.snapshot.sensor_etag()}"', restarted.snapshot.sensor_etag())
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import thumbnails
+from thumbnails import ThumbnailCache, variant_name
+
+pytestmark = pytest.mark.skipif(thumbnails.Image is None, reason="needs Pillow")
+
+
+def quiet(message, error=False):
+    pass
+
+
+@pytest.fixture
+def original(tmp_path):
+    path = tmp_path / "plant_20250513_120000.jpg"
+    thumbnails.Image.new("RGB", (400, 300), (30, 120, 30)).save(path)
+    return str(path)
+
+
+def cache(tmp_path, max_bytes=10 * 1024 * 1024):
+    return ThumbnailCache(str(tmp_path / "thumbnails"), max_bytes=max_bytes, log=quiet)
+
+
+def test_variants_are_generated_once(tmp_path, original):
+    thumbs = cache(tmp_path)
+    path = thumbs.get(original, 100, 70)
+    assert os.path.basename(path) == variant_name(original, 100, 70)
+    with thumbnails.Image.open(path) as img:
+        assert img.size == (100, 75)
+    assert thumbs.get(original, 100, 70) == path
+    assert (thumbs.hits, thumbs.misses) == (1, 1)
+
+
+def test_a_new_variant_is_not_evicted_before_it_is_served(tmp_path, original):
+    # A budget smaller than any one variant
+    thumbs = cache(tmp_path, max_bytes=1)
+    small = thumbs.get(original, 50)
+    assert os.path.exists(small)
+
+    large = thumbs.get(original, 200)
+    assert os.path.exists(large)
+    assert not os.path.exists(small)
+    assert thumbs.stats()["files"] == 1
+
+
+def test_a_variant_removed_after_get_is_regenerated(tmp_path, original):
+    thumbs = cache(tmp_path)
+    path = thumbs.get(original, 100)
+    # What another request's eviction looks like to this one
+    os.remove(path)
+    assert thumbs.get(original, 100) == path
+    assert os.path.exists(path)
+    assert thumbs.misses == 2
+
+
+def test_the_budget_evicts_least_recently_used(tmp_path, original):
+    probe = cache(tmp_path / "probe")
+    total = sum(os.path.getsize(probe.get(original, width)) for width in (60, 80, 100))
+
+    thumbs = cache(tmp_path, max_bytes=total - 1)
+    paths = [thumbs.get(original, width) for width in (60, 80)]
+    thumbs.get(original, 60)  # now the most recently used
+    paths.append(thumbs.get(original, 100))
+    assert [os.path.exists(p) for p in paths] == [True, False, True]
+
+
+def test_discard_removes_every_variant(tmp_path, original):
+    thumbs = cache(tmp_path)
+    paths = [thumbs.get(original, width) for width in (60, 80)]
+    thumbs.discard(original)
+    assert not any(os.path.exists(p) for p in paths)
+    assert thumbs.stats()["bytes"] == 0
@@ -0,0 +1,242 @@
+import base64
+import types
+
+import pytest
+
+import upload_queue
+import wire
+from upload_cache import UploadCache
+from upload_queue import UploadQueue
+
+SERVER = "http://server"
+
+
+def quiet(message, error=False):
+    pass
+
+
+class Response:
+    def __init__(self, status_code, data=None, text=""):
+        self.status_code = status_code
+        self._data = data
+        self.text = text
+
+    def json(self):
+        return self._data
+
+
+class Session:
+    """Stands in for ``requests.Session``; ``handler(path, kwargs)`` answers each post."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.posts = []
+
+    def post(self, url, timeout=None, **kwargs):
+        path = url[len(SERVER):]
+        self.posts.append((path, kwargs))
+        return self.handler(path, kwargs)
+
+    def close(self):
+        pass
+
+
+class Timeout(Exception):
+    pass
+
+
+def uploaded(item):
+    return {"id": item["id"], "success": True, "message": "ok",
+            "data": {"imageUrl": f"ipfs://{item['imagePath']}", "shortUrl": "s"}}
+
+
+def server(path, kwargs):
+    """A current server: both endpoints work."""
+    if path == "/api/upload-batch":
+        return Response(200, {"results": [uploaded(item) for item in kwargs["json"]["items"]]})
+    if path == "/api/upload-image":
+        return Response(200, uploaded(kwargs["json"]))
+    return Response(200, {"success": True})
+
+
+@pytest.fixture(autouse=True)
+def no_requests(monkeypatch):
+    monkeypatch.setattr(upload_queue, "requests", types.SimpleNamespace(RequestException=Timeout))
+
+
+def make_queue(tmp_path, handler=server, **kwargs):
+    queue = UploadQueue(str(tmp_path / "uploads.db"), lambda: SERVER, log=quiet, **kwargs)
+    queue._session = Session(handler)
+    return queue
+
+
+def drain(queue):
+    """Send due jobs the way the worker does until none are left."""
+    while True:
+        batch = queue._claim()
+        if not batch:
+            return
+        queue._send(batch)
+
+
+def image(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_jobs_survive_a_restart(tmp_path):
+    queue = make_queue(tmp_path)
+    sent = queue.enqueue({"imagePath": "a.jpg"})
+    interrupted = queue.enqueue({"imagePath": "b.jpg"})
+    queue._send([job for job in queue._claim() if job[0] == sent])
+    assert queue.get(interrupted)["status"] == "sending"
+
+    restarted = make_queue(tmp_path)
+    assert restarted.get(sent)["status"] == "done"
+    assert restarted.get(interrupted)["status"] == "pending"
+    drain(restarted)
+    assert restarted.get(interrupted)["status"] == "done"
+    assert [path for path, _ in restarted._session.posts] == ["/api/upload-image"]
+
+
+def test_failures_back_off_exponentially(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_queue.random, "uniform", lambda a, b: b)
+    queue = make_queue(tmp_path, lambda path, kwargs: Response(503), base_delay=2.0, max_delay=10.0)
+    job_id = queue.enqueue({"imagePath": "a.jpg"})
+
+    delays = []
+    for _ in range(5):
+        queue._send(queue._claim())
+        job = queue.get(job_id)
+        assert job["status"] == "pending"
+        assert job["error"].startswith("Server error: 503")
+        delays.append(round(job["next_attempt_at"] - job["updated_at"], 6))
+        assert queue._claim() == []  # not due yet
+        with queue._lock, queue._db:
+            queue._db.execute("UPDATE uploads SET next_attempt_at=0 WHERE id=?", (job_id,))
+
+    assert delays == [2.0, 4.0, 8.0, 10.0, 10.0]
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, lambda path, kwargs: Response(500, text="boom"),
+                       max_attempts=3, base_delay=0)
+    job_id = queue.enqueue({"imagePath": "a.jpg"})
+    drain(queue)
+
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 3
+    assert job["error"] == "Server error: 500 - boom"
+    assert len(queue._session.posts) == 3
+    assert queue.stats() == {"failed": 1}
+
+
+def test_falls_back_to_single_uploads_without_the_batch_endpoint(tmp_path):
+    def old_server(path, kwargs):
+        if path == "/api/upload-batch":
+            return Response(404)
+        return server(path, kwargs)
+
+    queue = make_queue(tmp_path, old_server)
+    first = [queue.enqueue({"imagePath": f"{i}.jpg"}) for i in range(3)]
+    drain(queue)
+    assert [path for path, _ in queue._session.posts] == ["/api/upload-batch"] + ["/api/upload-image"] * 3
+    assert all(queue.get(job_id)["status"] == "done" for job_id in first)
+
+    # Once the batch endpoint is known to be missing it isn't tried again
+    queue._session.posts.clear()
+    queue.enqueue({"imagePath": "a.jpg"})
+    queue.enqueue({"imagePath": "b.jpg"})
+    drain(queue)
+    assert [path for path, _ in queue._session.posts] == ["/api/upload-image"] * 2
+
+
+def test_batch_results_are_matched_by_id(tmp_path):
+    def partial(path, kwargs):
+        first, second = kwargs["json"]["items"]
+        return Response(200, {"results": [{"id": second["id"], "success": False, "error": "bad image"},
+                                          uploaded(first)]})
+
+    queue = make_queue(tmp_path, partial)
+    first = queue.enqueue({"imagePath": "a.jpg"})
+    second = queue.enqueue({"imagePath": "b.jpg"})
+    queue._send(queue._claim())
+
+    assert queue.get(first)["status"] == "done"
+    assert queue.get(first)["result"]["data"]["imageUrl"] == "ipfs://a.jpg"
+    assert queue.get(second)["status"] == "pending"
+    assert queue.get(second)["error"] == "bad image"
+
+
+def test_a_retry_after_a_timeout_carries_the_same_id(tmp_path):
+    attempts = []
+
+    def slow_then_ok(path, kwargs):
+        attempts.append(kwargs["json"]["id"])
+        if len(attempts) == 1:
+            raise Timeout("read timed out")
+        return server(path, kwargs)
+
+    queue = make_queue(tmp_path, slow_then_ok, base_delay=0)
+    job_id = queue.enqueue({"imagePath": "a.jpg"})
+    queue._send(queue._claim())
+    assert queue.get(job_id)["error"] == "read timed out"
+    drain(queue)
+
+    assert attempts == [job_id, job_id]
+    assert queue.get(job_id)["status"] == "done"
+
+
+def test_readings_are_posted_as_columns(tmp_path):
+    body = b"\x01columns"
+    queue = make_queue(tmp_path)
+    job_id = queue.enqueue({"readings": base64.b64encode(body).decode()})
+    drain(queue)
+
+    [(path, kwargs)] = queue._session.posts
+    assert path == "/api/upload-readings"
+    assert kwargs["data"] == body
+    assert kwargs["headers"]["Content-Type"] == wire.COLUMNS_TYPE
+    assert queue.get(job_id)["status"] == "done"
+
+
+def test_an_uploaded_image_is_answered_from_the_cache(tmp_path):
+    cache = UploadCache(str(tmp_path / "cache.db"))
+    queue = make_queue(tmp_path, cache=cache)
+    path = image(tmp_path, "a.jpg", b"still")
+    first = queue.enqueue({"imagePath": path, "temperature": 21.5})
+    drain(queue)
+    assert len(queue._session.posts) == 1
+
+    # The same bytes under another name are not uploaded again
+    copy = image(tmp_path, "copy.jpg", b"still")
+    second = queue.enqueue({"imagePath": copy, "temperature": 22.0})
+    job = queue.get(second)
+    assert job["status"] == "done"
+    assert job["result"]["cached"] is True
+    assert job["result"]["data"]["imageUrl"] == f"ipfs://{path}"
+    assert job["result"]["data"]["temperature"] == 22.0
+    drain(queue)
+    assert len(queue._session.posts) == 1
+    assert queue.get(first)["result"].get("cached") is None
+
+
+def test_repeats_within_a_batch_are_sent_once(tmp_path):
+    cache = UploadCache(str(tmp_path / "cache.db"))
+    queue = make_queue(tmp_path, cache=cache)
+    path = image(tmp_path, "a.jpg", b"still")
+    # Queued before anything is cached, so the worker has to sort them out
+    cache_before, queue.cache = queue.cache, None
+    jobs = [queue.enqueue({"imagePath": path}) for _ in range(3)]
+    other = queue.enqueue({"imagePath": image(tmp_path, "b.jpg", b"other")})
+    queue.cache = cache_before
+
+    drain(queue)
+
+    [(endpoint, kwargs)] = queue._session.posts
+    assert endpoint == "/api/upload-batch"
+    assert [item["id"] for item in kwargs["json"]["items"]] == [jobs[0], other]
+    assert [queue.get(job_id)["status"] for job_id in jobs + [other]] == ["done"] * 4
+    assert [bool(queue.get(job_id)["result"].get("cached")) for job_id in jobs] == [False, True, True]
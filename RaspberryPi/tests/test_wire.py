@@ -0,0 +1,77 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+from werkzeug.datastructures import MIMEAccept
+
+import wire
+
+
+def header(body):
+    length = struct.unpack_from("<I", body, 5)[0]
+    return json.loads(body[9:9 + length])
+
+
+def test_columns_round_trip():
+    ts = np.arange(1747164784, 1747164784 + 3 * 500, 3, dtype=np.int64)
+    temp_c = np.round(22 + np.cumsum(np.random.default_rng(0).normal(0, 0.05, 500)), 1)
+    humidity = np.linspace(40, 90, 500)
+    body = wire.encode_columns({"timestamp": ts, "temperature_c": temp_c, "humidity": humidity},
+                               decimals={"humidity": 3}, meta={"sensor_id": "air"})
+
+    meta, columns = wire.decode_columns(body)
+    assert meta == {"sensor_id": "air"}
+    assert list(columns) == ["timestamp", "temperature_c", "humidity"]
+    assert columns["timestamp"].dtype == np.int64
+    assert columns["timestamp"].tolist() == ts.tolist()
+    assert np.allclose(columns["temperature_c"], temp_c, atol=0.005)
+    assert np.allclose(columns["humidity"], humidity, atol=0.0005)
+    # Slowly changing columns take a byte per row
+    assert [column["width"] for column in header(body)["columns"]] == [1, 1, 1]
+
+
+def test_delta_width_grows_with_the_largest_step():
+    for step, width in ((127, 1), (128, 2), (40000, 4), (3 * 10 ** 9, 8)):
+        body = wire.encode_columns({"n": np.array([0, step, 0], dtype=np.int64)})
+        assert header(body)["columns"][0]["width"] == width
+        assert wire.decode_columns(body)[1]["n"].tolist() == [0, step, 0]
+
+
+@pytest.mark.parametrize("rows", [0, 1])
+def test_short_columns_round_trip(rows):
+    body = wire.encode_columns({"timestamp": np.arange(rows, dtype=np.int64), "humidity": np.full(rows, 55.5)})
+    _, columns = wire.decode_columns(body)
+    assert columns["timestamp"].tolist() == list(range(rows))
+    assert columns["humidity"].tolist() == [55.5] * rows
+
+
+def test_encode_rejects_bad_columns():
+    with pytest.raises(ValueError):
+        wire.encode_columns({"a": np.zeros(3), "b": np.zeros(2)})
+    with pytest.raises(ValueError):
+        wire.encode_columns({"a": np.array([1.0, np.nan])})
+
+
+def test_decode_rejects_other_bodies():
+    with pytest.raises(ValueError):
+        wire.decode_columns(b'{"rows": 1}')
+    body = bytearray(wire.encode_columns({"a": np.arange(3)}))
+    body[4] = 9
+    with pytest.raises(ValueError, match="version"):
+        wire.decode_columns(bytes(body))
+
+
+def test_choose_type_prefers_json():
+    assert wire.choose_type(MIMEAccept([("*/*", 1)]), columns=True) == wire.JSON_TYPE
+    assert wire.choose_type(MIMEAccept([]), columns=True) == wire.JSON_TYPE
+    assert wire.choose_type(MIMEAccept([(wire.COLUMNS_TYPE, 1)]), columns=True) == wire.COLUMNS_TYPE
+    # Columns are only offered for tables
+    assert wire.choose_type(MIMEAccept([(wire.COLUMNS_TYPE, 1)])) == wire.JSON_TYPE
+
+
+@pytest.mark.skipif(wire.msgpack is None, reason="needs msgpack")
+def test_msgpack_round_trip():
+    document = {"temperature_c": 21.5, "sensors": {"air": {"humidity": 60}}, "timestamp": None}
+    assert wire.unpack(wire.pack(document)) == document
+    assert wire.choose_type(MIMEAccept([(wire.MSGPACK_TYPE, 1)])) == wire.MSGPACK_TYPE
@@ -0,0 +1,198 @@
+"""
+Resized JPEG variants of captured images, cached on disk.
+
+``/api/images/<name>?w=320&q=70`` is served from ``<cache_dir>`` instead of
+sending the full-resolution still. Variants are generated lazily on first
+request, or eagerly by a background worker right after capture, and the
+cache is kept under a byte budget by evicting the least recently used files.
+
+Resizing needs Pillow. Without it ``available`` is False and callers should
+fall back to the original image.
+"""
+
+import os
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; originals are served without it
+    Image = None
+
+MIN_WIDTH = 16
+MAX_WIDTH = 2048
+DEFAULT_QUALITY = 75
+
+
+def variant_name(image_name, width, quality):
+    stem, _ = os.path.splitext(os.path.basename(image_name))
+    return f"{stem}_w{width}_q{quality}.jpg"
+
+
+class ThumbnailCache:
+    """Size-capped LRU cache of resized JPEGs with an optional eager worker."""
+
+    def __init__(self, cache_dir, max_bytes=200 * 1024 * 1024, eager_widths=(),
+                 eager_quality=DEFAULT_QUALITY, log=print):
+        """
+        Args:
+            cache_dir (str): Directory for cached variants
+            max_bytes (int): Total size budget for the cache
+            eager_widths (tuple): Widths generated right after each capture
+            eager_quality (int): JPEG quality for eager variants
+            log (callable): ``log(message, error=False)``
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.eager_widths = tuple(eager_widths)
+        self.eager_quality = eager_quality
+        self.log = log
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # name -> size, least recently used first
+        self._total = 0
+        self._queue = queue.Queue(maxsize=64)
+        self._thread = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load()
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def _load(self):
+        """Seed the LRU order from the files already in the cache directory."""
+        with os.scandir(self.cache_dir) as entries:
+            files = [(e.stat().st_atime, e.name, e.stat().st_size)
+                     for e in entries if e.is_file() and e.name.endswith(".jpg")]
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+        with self._lock:
+            self._evict_locked()
+
+    def get(self, image_path, width, quality=DEFAULT_QUALITY):
+        """
+        Return the path of a ``width``-pixel-wide variant of ``image_path``,
+        generating it if it is not cached or older than the original.
+
+        Another request can still evict the variant before the caller opens
+        it; on ``FileNotFoundError`` call ``get()`` again to regenerate it.
+        """
+        width = max(MIN_WIDTH, min(MAX_WIDTH, int(width)))
+        quality = max(10, min(95, int(quality)))
+        name = variant_name(image_path, width, quality)
+        path = os.path.join(self.cache_dir, name)
+
+        with self._lock:
+            cached = name in self._entries
+            if cached:
+                self._entries.move_to_end(name)
+        if cached:
+            try:
+                if os.path.getmtime(path) >= os.path.getmtime(image_path):
+                    self.hits += 1
+                    return path
+            except OSError:
+                pass
+
+        self.misses += 1
+        self._generate(image_path, path, width, quality)
+        return path
+
+    def _generate(self, image_path, path, width, quality):
+        with Image.open(image_path) as img:
+            height = max(1, round(img.height * width / img.width))
+            if width < img.width:
+                # Let the JPEG decoder downscale by 1/2, 1/4 or 1/8 while
+                # decoding; far cheaper than decoding the full still first
+                img.draft("RGB", (width, height))
+                img = img.convert("RGB").resize((width, height), Image.BILINEAR)
+            else:
+                img = img.convert("RGB")
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            img.save(tmp_path, "JPEG", quality=quality)
+        os.replace(tmp_path, path)
+
+        size = os.path.getsize(path)
+        name = os.path.basename(path)
+        with self._lock:
+            self._total += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._evict_locked(keep=name)
+
+    def _evict_locked(self, keep=None):
+        """
+        Remove least recently used files until the cache is within budget.
+        ``keep`` (the variant about to be served) is never removed, even if
+        it alone is over budget; it goes on the next eviction instead.
+        """
+        while self._total > self.max_bytes and self._entries:
+            if next(iter(self._entries)) == keep:
+                break  # the most recently used entry, so nothing else is left
+            name, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def discard(self, image_name):
+        """Remove every cached variant of an image (e.g. when it is deleted)."""
+        stem, _ = os.path.splitext(os.path.basename(image_name))
+        prefix = f"{stem}_w"
+        with self._lock:
+            for name in [n for n in self._entries if n.startswith(prefix)]:
+                self._total -= self._entries.pop(name)
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    # ------------------------------------------------------------------
+    # Eager generation
+    # ------------------------------------------------------------------
+    def submit(self, image_path):
+        """Queue eager variants for a new capture; dropped if the worker is behind."""
+        if not self.available or not self.eager_widths:
+            return
+        try:
+            self._queue.put_nowait(image_path)
+        except queue.Full:
+            self.log(f"Thumbnail queue full, skipping eager variants for {image_path}", error=True)
+
+    def start(self):
+        if self.available and self.eager_widths and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._run, name="thumbnails", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(5)
+
+    def _run(self):
+        while True:
+            image_path = self._queue.get()
+            if image_path is None:
+                return
+            for width in self.eager_widths:
+                try:
+                    self.get(image_path, width, self.eager_quality)
+                except Exception as e:
+                    self.log(f"Failed to generate {width}px variant of {image_path}: {str(e)}", error=True)
@@ -0,0 +1,147 @@
+"""
+Daily timelapse videos assembled from the captured stills.
+
+Assembly runs offline, for days that are over, never on the capture path.
+A day's images (``image_YYYYMMDD_*.jpg``) are concatenated unchanged into
+``<out_dir>/timelapse_YYYYMMDD.mjpeg``. That is a Motion-JPEG stream, which
+ffmpeg, VLC and mpv play directly (``ffplay -framerate 24 <file>``).
+Nothing is decoded or re-encoded, so assembling a day costs about as much
+as copying its images. When ``ffmpeg`` is on the PATH, a much smaller
+H.264 ``timelapse_YYYYMMDD.mp4`` is made from the stream as well, at the
+lowest CPU priority.
+
+Runs from the ``timelapse`` scheduler job in CAPTURE_MODE=timelapse, or by
+hand:
+
+    python3 timelapse.py [--day 20250513] [--fps 24] [--no-mp4]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import uuid
+from datetime import datetime, timedelta
+
+from image_index import ImageIndex
+
+PREFIX = "timelapse_"
+SUFFIXES = (".mjpeg", ".mp4")
+
+
+def day_range(day):
+    """Epoch ``(start, end)`` of a ``YYYYMMDD`` day in local time."""
+    start = datetime.strptime(day, "%Y%m%d")
+    return start.timestamp(), (start + timedelta(days=1)).timestamp()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _encode_mp4(ffmpeg, mjpeg_path, mp4_path, fps):
+    tmp_path = f"{mp4_path}.{uuid.uuid4().hex}.tmp"
+    command = [ffmpeg, "-y", "-loglevel", "error", "-f", "mjpeg", "-framerate", str(fps), "-i", mjpeg_path,
+               "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+               # yuv420p needs even dimensions
+               "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2", "-f", "mp4", tmp_path]
+    try:
+        subprocess.run(command, check=True, capture_output=True, preexec_fn=lambda: os.nice(19))
+        os.replace(tmp_path, mp4_path)
+    finally:
+        _remove(tmp_path)
+
+
+def assemble_day(index, day, out_dir, fps=24, mp4=True, log=print):
+    """
+    Build the timelapse of one day from the images in ``index``.
+
+    Returns:
+        dict: ``day``, ``frames`` and the ``mjpeg``/``mp4`` paths (``mp4`` is
+        None without ffmpeg), or None if the day has no images
+    """
+    names, _ = index.list(*day_range(day))
+    if not names:
+        return None
+    os.makedirs(out_dir, exist_ok=True)
+    mjpeg_path = os.path.join(out_dir, f"{PREFIX}{day}.mjpeg")
+    tmp_path = f"{mjpeg_path}.{uuid.uuid4().hex}.tmp"
+    frames = 0
+    try:
+        with open(tmp_path, "wb") as out:
+            for name in names:
+                try:
+                    with open(os.path.join(index.image_dir, name), "rb") as f:
+                        shutil.copyfileobj(f, out, 1024 * 1024)
+                    frames += 1
+                except OSError:
+                    continue  # deleted since it was listed
+        os.replace(tmp_path, mjpeg_path)
+    finally:
+        _remove(tmp_path)
+
+    result = {"day": day, "frames": frames, "mjpeg": mjpeg_path, "mp4": None}
+    ffmpeg = shutil.which("ffmpeg") if mp4 else None
+    if ffmpeg is not None:
+        mp4_path = os.path.join(out_dir, f"{PREFIX}{day}.mp4")
+        try:
+            _encode_mp4(ffmpeg, mjpeg_path, mp4_path, fps)
+            result["mp4"] = mp4_path
+        except (OSError, subprocess.CalledProcessError) as e:
+            stderr = getattr(e, "stderr", b"") or b""
+            log(f"ffmpeg failed for the {day} timelapse: {stderr.decode(errors='replace').strip() or e}",
+                error=True)
+    return result
+
+
+def pending_days(index, out_dir, today, days_back=7):
+    """
+    Finished days (before ``today``, both ``YYYYMMDD``) from the last
+    ``days_back`` that have images but no timelapse yet.
+    """
+    first = datetime.strptime(today, "%Y%m%d")
+    days = []
+    for n in range(days_back, 0, -1):
+        day = (first - timedelta(days=n)).strftime("%Y%m%d")
+        if os.path.exists(os.path.join(out_dir, f"{PREFIX}{day}.mjpeg")):
+            continue
+        if index.list(*day_range(day), limit=1)[0]:
+            days.append(day)
+    return days
+
+
+def list_videos(out_dir):
+    """The assembled videos, oldest first, as ``{"name", "size"}`` dicts."""
+    if not os.path.isdir(out_dir):
+        return []
+    with os.scandir(out_dir) as entries:
+        videos = [{"name": e.name, "size": e.stat().st_size} for e in entries
+                  if e.is_file() and e.name.startswith(PREFIX) and e.name.endswith(SUFFIXES)]
+    return sorted(videos, key=lambda v: v["name"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assemble a day's images into a timelapse video.")
+    parser.add_argument("--images", default="images", help="Image directory")
+    parser.add_argument("--out", default="timelapse", help="Output directory")
+    parser.add_argument("--day", default=(datetime.now() - timedelta(days=1)).strftime("%Y%m%d"),
+                        help="Day to assemble, YYYYMMDD (default: yesterday)")
+    parser.add_argument("--fps", type=int, default=24)
+    parser.add_argument("--no-mp4", action="store_true", help="Only write the MJPEG stream")
+    args = parser.parse_args()
+
+    index = ImageIndex(args.images)
+    index.rebuild()
+    result = assemble_day(index, args.day, args.out, args.fps, not args.no_mp4,
+                          log=lambda message, error=False: print(message))
+    if result is None:
+        print(f"No images for {args.day}")
+        return
+    print(f"{result['frames']} frames -> {result['mjpeg']}" + (f", {result['mp4']}" if result["mp4"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Content-addressed cache of images already uploaded to the server.
+
+The server pins every image it is sent to IPFS, so uploading the same still
+twice (two manual uploads in a row, or an automatic upload with no new
+capture) pins it twice. This cache maps the SHA-256 of an image's bytes to
+the ``imageUrl``/``shortUrl`` the server returned for it, so the upload
+queue can answer a repeat upload locally without a network round trip.
+
+Entries live in a small SQLite database, so they survive restarts. The
+cache holds at most ``max_entries`` entries; the least recently used are
+evicted first. Hashing a still means reading all of it, so digests are
+memoized by path, size and modification time. The same image is only hashed
+again if it changes, e.g. when retention shrinks it.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploaded (
+    sha256 TEXT PRIMARY KEY,
+    image_url TEXT,
+    short_url TEXT,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploaded_lru ON uploaded (last_used_at);
+"""
+
+HASH_CHUNK = 1024 * 1024
+# Paths whose digest is remembered
+DIGEST_MEMO = 256
+
+
+class UploadCache:
+    """SQLite-backed, LRU-bounded map from image SHA-256 to uploaded URLs."""
+
+    def __init__(self, db_path, max_entries=10000):
+        """
+        Args:
+            db_path (str): SQLite database file
+            max_entries (int): Entries kept before the least recently used are evicted
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.stored = 0
+        self.evicted = 0
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._digests = OrderedDict()  # path -> (size, mtime_ns, sha256)
+        self._count = self._db.execute("SELECT COUNT(*) FROM uploaded").fetchone()[0]
+
+    def digest(self, path):
+        """Return the hex SHA-256 of a file, or None if it can't be read."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            memo = self._digests.get(path)
+            if memo is not None and memo[:2] == key:
+                self._digests.move_to_end(path)
+                return memo[2]
+        sha = hashlib.sha256()
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                    sha.update(chunk)
+        except OSError:
+            return None
+        digest = sha.hexdigest()
+        with self._lock:
+            self._digests[path] = key + (digest,)
+            self._digests.move_to_end(path)
+            if len(self._digests) > DIGEST_MEMO:
+                self._digests.popitem(last=False)
+        return digest
+
+    def get(self, digest):
+        """Return ``{"imageUrl", "shortUrl"}`` for an uploaded image, or None."""
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT image_url, short_url FROM uploaded WHERE sha256=?", (digest,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE uploaded SET last_used_at=? WHERE sha256=?", (now, digest))
+            self.hits += 1
+        return {"imageUrl": row[0], "shortUrl": row[1]}
+
+    def lookup(self, path):
+        """``get()`` by file; returns ``(digest, urls)``, ``urls`` None on a miss."""
+        digest = self.digest(path)
+        return digest, (self.get(digest) if digest is not None else None)
+
+    def put(self, digest, image_url, short_url, size=0):
+        """Remember the URLs an image was uploaded to, evicting the least recently used."""
+        now = time.time()
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO uploaded (sha256, image_url, short_url, size, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (digest, image_url, short_url, size, now, now))
+            if cursor.rowcount == 0:
+                self._db.execute(
+                    "UPDATE uploaded SET image_url=?, short_url=?, last_used_at=? WHERE sha256=?",
+                    (image_url, short_url, now, digest))
+                return
+            self.stored += 1
+            self._count += 1
+            excess = self._count - self.max_entries
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM uploaded WHERE sha256 IN "
+                    "(SELECT sha256 FROM uploaded ORDER BY last_used_at LIMIT ?)", (excess,))
+                self._count -= excess
+                self.evicted += excess
+
+    def __len__(self):
+        return self._count
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": self._count,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "stored": self.stored,
+                "evicted": self.evicted,
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
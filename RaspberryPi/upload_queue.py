@@ -0,0 +1,433 @@
+"""
+Durable outbound upload queue.
+
+Uploads to ``{SERVER_URL}/api/upload-image`` are written to a small SQLite
+database and drained by a background worker, so Flask handlers return
+immediately and nothing is lost if the server is slow, unreachable or the Pi
+restarts mid-upload. The worker sends due jobs in batches over a pooled
+``requests.Session`` and retries failures with exponential backoff. Every
+upload carries its job ``id``, which the server uses to process a job once
+even when a request that timed out here is retried.
+``requests`` is imported by the worker thread rather than at startup, so
+it doesn't hold up the HTTP API.
+
+With an ``UploadCache``, a job whose image has already been uploaded is
+finished locally with the URLs from the cache, when it is queued or when
+the worker picks it up. Jobs in one batch with the same image are sent
+once; the others wait for the next batch and are answered from the cache.
+
+A job whose payload has ``readings`` (base64 of a wire.py columns body)
+is a batch of readings; it is posted as is to ``/api/upload-readings``.
+
+Job states:
+    pending  waiting to be sent (or waiting for its next retry)
+    sending  claimed by the worker; reset to pending on restart
+    done     server accepted it; ``result`` holds the response data
+    failed   gave up after ``max_attempts``
+"""
+
+import base64
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import metrics
+import wire
+
+# Imported by the worker on start; see _import_requests()
+requests = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS uploads_due ON uploads (status, next_attempt_at);
+"""
+
+UPLOAD_REQUEST_SECONDS = metrics.histogram(
+    "agrox_upload_request_seconds", "Round-trip time of upload requests to the server", ("endpoint",))
+_BATCH_REQUEST_SECONDS = UPLOAD_REQUEST_SECONDS.labels("upload-batch")
+_SINGLE_REQUEST_SECONDS = UPLOAD_REQUEST_SECONDS.labels("upload-image")
+_READINGS_REQUEST_SECONDS = UPLOAD_REQUEST_SECONDS.labels("upload-readings")
+UPLOAD_ATTEMPTS = metrics.counter(
+    "agrox_upload_attempts_total", "Upload attempts by outcome (done, retry, failed)", ("result",))
+
+
+class UploadQueue:
+    """SQLite-backed upload queue with a batching background worker."""
+
+    def __init__(self, db_path, server_url, batch_size=10, max_attempts=8,
+                 base_delay=2.0, max_delay=300.0, timeout=30, keep_days=7,
+                 cache=None, log=print):
+        """
+        Args:
+            db_path (str): SQLite database file
+            server_url (callable): Returns the current server base URL
+            batch_size (int): Max jobs sent per batch request
+            max_attempts (int): Attempts before a job is marked failed
+            base_delay (float): First retry delay in seconds, doubled per attempt
+            max_delay (float): Upper bound on the retry delay
+            timeout (float): Per-request timeout in seconds
+            keep_days (float): Finished jobs older than this are pruned
+            cache: Optional ``UploadCache`` of images already uploaded
+            log (callable): ``log(message, error=False)``
+        """
+        self.server_url = server_url
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.keep_days = keep_days
+        self.cache = cache
+        self.log = log
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        # Older servers only have /api/upload-image; switch to per-item
+        # requests the first time the batch endpoint is missing
+        self._batch_supported = True
+
+        # Jobs claimed by a worker that never finished (crash, power loss)
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE uploads SET status='pending' WHERE status='sending'")
+
+        self._session = None
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+    def enqueue(self, payload):
+        """Persist an upload job and wake the worker. Returns the job id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        urls = None
+        if self.cache is not None and payload.get("imagePath"):
+            _, urls = self.cache.lookup(payload["imagePath"])
+        status = "pending" if urls is None else "done"
+        result = None if urls is None else json.dumps(_cached_result(payload, urls))
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO uploads (id, status, payload, next_attempt_at, created_at, updated_at, result) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, status, json.dumps(payload), now, now, now, result))
+        if urls is None:
+            self._wake.set()
+        else:
+            self.log(f"Upload {job_id} answered from the upload cache: {urls['imageUrl']}")
+        return job_id
+
+    def get(self, job_id):
+        """Return a job as a dict, or None if it does not exist."""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM uploads WHERE id=?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def wait(self, job_id, timeout):
+        """Poll until a job is done/failed or ``timeout`` seconds pass."""
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        while job and job["status"] in ("pending", "sending") and time.monotonic() < deadline:
+            time.sleep(0.1)
+            job = self.get(job_id)
+        return job
+
+    def stats(self):
+        """Return job counts by status."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) AS n FROM uploads GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    @staticmethod
+    def _row_to_dict(row):
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "payload": json.loads(row["payload"]),
+            "attempts": row["attempts"],
+            "next_attempt_at": row["next_attempt_at"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+        }
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    def start(self):
+        """Start the background worker thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="upload-queue", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._session is not None:
+            self._session.close()
+
+    def _run(self):
+        if self._session is None:
+            self._session = _new_session()
+        self.log("Upload queue worker started")
+        self._prune()
+        last_prune = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                batch = self._claim()
+                if batch:
+                    self._send(batch)
+                    continue
+                if time.monotonic() - last_prune > 3600:
+                    self._prune()
+                    last_prune = time.monotonic()
+                self._wake.wait(self._next_due_in())
+                self._wake.clear()
+            except Exception as e:
+                self.log(f"Upload queue worker error: {str(e)}", error=True)
+                self._stop.wait(5)
+
+    def _claim(self):
+        """Atomically mark up to ``batch_size`` due jobs as sending."""
+        now = time.time()
+        with self._lock, self._db:
+            rows = self._db.execute(
+                "SELECT id, payload, attempts FROM uploads "
+                "WHERE status='pending' AND next_attempt_at<=? "
+                "ORDER BY created_at LIMIT ?", (now, self.batch_size)).fetchall()
+            if rows:
+                self._db.executemany(
+                    "UPDATE uploads SET status='sending', updated_at=? WHERE id=?",
+                    [(now, row["id"]) for row in rows])
+        return [(row["id"], json.loads(row["payload"]), row["attempts"]) for row in rows]
+
+    def _next_due_in(self):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(next_attempt_at) AS due FROM uploads WHERE status='pending'").fetchone()
+        if row["due"] is None:
+            return 60.0
+        return min(60.0, max(0.0, row["due"] - time.time()))
+
+    def _send(self, batch):
+        # Reading batches have their own endpoint, one request each
+        readings = [job for job in batch if "readings" in job[1]]
+        if readings:
+            base_url = self.server_url()
+            for job_id, payload, attempts in readings:
+                ok, result, error = self._send_readings(base_url, payload)
+                self._finish(job_id, attempts + 1, ok, result, error)
+            batch = [job for job in batch if "readings" not in job[1]]
+            if not batch:
+                return
+        if self.cache is not None:
+            batch = self._answer_from_cache(batch)
+            if not batch:
+                return
+        base_url = self.server_url()
+        if self._batch_supported and len(batch) > 1:
+            try:
+                outcomes = self._send_batch(base_url, batch)
+            except _BatchUnsupported:
+                self.log("Server has no batch upload endpoint, sending uploads individually")
+                self._batch_supported = False
+                outcomes = [self._send_one(base_url, job_id, payload) for job_id, payload, _ in batch]
+        else:
+            outcomes = [self._send_one(base_url, job_id, payload) for job_id, payload, _ in batch]
+
+        for (job_id, payload, attempts), (ok, result, error) in zip(batch, outcomes):
+            self._finish(job_id, attempts + 1, ok, result, error)
+            data = (result or {}).get("data") or {}
+            if ok and self.cache is not None and payload.get("imagePath") and data.get("imageUrl"):
+                digest = self.cache.digest(payload["imagePath"])
+                if digest is not None:
+                    try:
+                        size = os.path.getsize(payload["imagePath"])
+                    except OSError:
+                        size = 0
+                    self.cache.put(digest, data["imageUrl"], data.get("shortUrl"), size)
+
+    def _answer_from_cache(self, batch):
+        """
+        Finish the jobs whose image is already uploaded and hold back repeats
+        of an image within the batch. Returns the jobs left to send.
+        """
+        to_send, digests, held = [], set(), []
+        for job in batch:
+            job_id, payload, _ = job
+            digest = self.cache.digest(payload["imagePath"]) if payload.get("imagePath") else None
+            if digest is None:
+                to_send.append(job)
+                continue
+            urls = self.cache.get(digest)
+            if urls is not None:
+                now = time.time()
+                with self._lock, self._db:
+                    self._db.execute(
+                        "UPDATE uploads SET status='done', updated_at=?, result=?, error=NULL WHERE id=?",
+                        (now, json.dumps(_cached_result(payload, urls)), job_id))
+                self.log(f"Upload {job_id} answered from the upload cache: {urls['imageUrl']}")
+            elif digest in digests:
+                held.append(job_id)
+            else:
+                digests.add(digest)
+                to_send.append(job)
+        if held:
+            # Claimed again after this batch, when the first copy is cached
+            now = time.time()
+            with self._lock, self._db:
+                self._db.executemany(
+                    "UPDATE uploads SET status='pending', next_attempt_at=?, updated_at=? WHERE id=?",
+                    [(now, now, job_id) for job_id in held])
+        return to_send
+
+    def _send_batch(self, base_url, batch):
+        items = [dict(payload, id=job_id) for job_id, payload, _ in batch]
+        started = time.perf_counter()
+        try:
+            response = self._session.post(
+                f"{base_url}/api/upload-batch", json={"items": items}, timeout=self.timeout)
+        except requests.RequestException as e:
+            return [(False, None, str(e))] * len(batch)
+        finally:
+            _BATCH_REQUEST_SECONDS.observe(time.perf_counter() - started)
+        if response.status_code == 404:
+            raise _BatchUnsupported()
+        if response.status_code != 200:
+            error = f"Server error: {response.status_code}"
+            return [(False, None, error)] * len(batch)
+
+        results = {r.get("id"): r for r in response.json().get("results", [])}
+        outcomes = []
+        for job_id, _, _ in batch:
+            r = results.get(job_id)
+            if r is None:
+                outcomes.append((False, None, "Missing from batch response"))
+            elif r.get("success"):
+                outcomes.append((True, r, None))
+            else:
+                outcomes.append((False, None, r.get("error", "Upload failed")))
+        return outcomes
+
+    def _send_one(self, base_url, job_id, payload):
+        started = time.perf_counter()
+        try:
+            response = self._session.post(
+                f"{base_url}/api/upload-image", json=dict(payload, id=job_id), timeout=self.timeout)
+        except requests.RequestException as e:
+            return False, None, str(e)
+        finally:
+            _SINGLE_REQUEST_SECONDS.observe(time.perf_counter() - started)
+        if response.status_code == 200:
+            return True, response.json(), None
+        return False, None, f"Server error: {response.status_code} - {response.text[:200]}"
+
+    def _send_readings(self, base_url, payload):
+        """POST a batch of readings as delta-encoded columns (see wire.py)."""
+        started = time.perf_counter()
+        try:
+            response = self._session.post(
+                f"{base_url}/api/upload-readings", data=base64.b64decode(payload["readings"]),
+                headers={"Content-Type": wire.COLUMNS_TYPE}, timeout=self.timeout)
+        except requests.RequestException as e:
+            return False, None, str(e)
+        finally:
+            _READINGS_REQUEST_SECONDS.observe(time.perf_counter() - started)
+        if response.status_code == 200:
+            return True, response.json(), None
+        return False, None, f"Server error: {response.status_code} - {response.text[:200]}"
+
+    def _finish(self, job_id, attempts, ok, result, error):
+        now = time.time()
+        if ok:
+            status, next_at = "done", now
+            self.log(f"Upload {job_id} sent: {result.get('message', 'ok')}")
+        elif attempts >= self.max_attempts:
+            status, next_at = "failed", now
+            self.log(f"Upload {job_id} failed after {attempts} attempts: {error}", error=True)
+        else:
+            # Exponential backoff with jitter so a fleet doesn't retry in lockstep
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+            status, next_at = "pending", now + delay * random.uniform(0.5, 1.0)
+            self.log(f"Upload {job_id} attempt {attempts} failed ({error}), retrying in {next_at - now:.0f}s",
+                     error=True)
+        UPLOAD_ATTEMPTS.labels("retry" if status == "pending" else status).inc()
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE uploads SET status=?, attempts=?, next_attempt_at=?, updated_at=?, "
+                "result=?, error=? WHERE id=?",
+                (status, attempts, next_at, now,
+                 json.dumps(result) if result is not None else None,
+                 None if ok else error, job_id))
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_days * 86400
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM uploads WHERE status IN ('done', 'failed') AND updated_at<?", (cutoff,))
+
+
+def _import_requests():
+    global requests
+    if requests is None:
+        import requests as module
+        requests = module
+    return requests
+
+
+def _new_session():
+    """A pooled ``requests.Session``; importing requests takes a while on a Pi."""
+    _import_requests()
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _cached_result(payload, urls):
+    """A server-style upload result for a job answered from the cache."""
+    return {
+        "success": True,
+        "message": "Image already uploaded, answered from the upload cache",
+        "cached": True,
+        "data": {
+            "temperature": payload.get("temperature"),
+            "humidity": payload.get("humidity"),
+            "imageUrl": urls["imageUrl"],
+            "shortUrl": urls["shortUrl"],
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+        },
+    }
+
+
+class _BatchUnsupported(Exception):
+    pass
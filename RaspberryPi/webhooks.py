@@ -0,0 +1,139 @@
+"""
+Non-blocking webhook delivery for alert rules.
+
+``send()`` only puts the request on a bounded in-memory queue and returns,
+so a slow or unreachable receiver never holds up the sensor job that
+raised the alert. A few worker threads POST the queued payloads as JSON,
+retrying failed deliveries with a short exponential backoff. If the queue
+is full, e.g. because a receiver is down and alerts keep coming, new
+webhooks are dropped and counted rather than piling up in memory.
+
+Unlike uploads (upload_queue.py), webhooks are not persisted: an alert
+that is minutes old by the time it could be delivered after a restart is
+not worth sending.
+"""
+
+import queue
+import threading
+import time
+
+# Imported by the workers on start, like upload_queue's requests
+requests = None
+
+
+class WebhookDispatcher:
+    """Bounded queue of webhook POSTs drained by background workers."""
+
+    def __init__(self, workers=2, max_queue=1000, timeout=5.0, attempts=3, base_delay=1.0, log=print):
+        """
+        Args:
+            workers (int): Threads delivering webhooks
+            max_queue (int): Webhooks waiting before new ones are dropped
+            timeout (float): Per-request timeout in seconds
+            attempts (int): Deliveries tried before giving up on one
+            base_delay (float): First retry delay in seconds, doubled per attempt
+            log (callable): ``log(message, error=False)``
+        """
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.log = log
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._session = None
+
+    def send(self, url, payload):
+        """Queue a POST of ``payload`` to ``url``. Returns False if it was dropped."""
+        try:
+            self._queue.put_nowait((url, payload))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def start(self):
+        """Start the worker threads (idempotent)."""
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"webhook-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self._session is not None:
+            self._session.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "sent": self.sent,
+                "failed": self.failed,
+                "dropped": self.dropped,
+            }
+
+    def _run(self):
+        with self._lock:
+            if self._session is None:
+                self._session = _new_session(self.workers)
+        while not self._stop.is_set():
+            item = self._queue.get()
+            if item is None:
+                return
+            url, payload = item
+            ok, error = self._deliver(url, payload)
+            with self._lock:
+                if ok:
+                    self.sent += 1
+                else:
+                    self.failed += 1
+            if not ok:
+                self.log(f"Webhook to {url} failed after {self.attempts} attempts: {error}", error=True)
+
+    def _deliver(self, url, payload):
+        error = None
+        for attempt in range(self.attempts):
+            if attempt and self._stop.wait(self.base_delay * 2 ** (attempt - 1)):
+                break
+            try:
+                response = self._session.post(url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = str(e)
+                continue
+            if response.status_code < 300:
+                return True, None
+            error = f"HTTP {response.status_code}"
+            if response.status_code < 500 and response.status_code != 429:
+                break  # the receiver rejected it; retrying won't help
+        return False, error
+
+
+def _new_session(pool_size):
+    global requests
+    if requests is None:
+        import requests as module
+        requests = module
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
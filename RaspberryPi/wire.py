@@ -0,0 +1,155 @@
+"""
+Compact encodings for readings served by the API and sent to the server.
+
+JSON stays the default. A client that asks for it with ``Accept`` can get
+instead:
+
+    application/vnd.agrox.columns
+        Tables of readings (history, reading batches) as delta-encoded
+        fixed-point columns, see below. Always available.
+    application/msgpack
+        MessagePack of the JSON document, when the optional ``msgpack``
+        package is installed.
+
+A columns body is a small JSON header followed by one binary block per
+column:
+
+    b"AGXC", version (u8), header length (u32 LE), header (UTF-8 JSON)
+    per column: first value (i64 LE), then rows - 1 deltas (LE, signed)
+
+The header is ``{"rows": n, "columns": [{"name", "decimals", "width"}],
+"meta": {...}}``. Values are stored as integers ``round(value * 10**decimals)``
+and each column as its first value and the differences between neighbours,
+``width`` bytes each: the smallest of 1, 2, 4 or 8 that fits the largest
+difference. Readings change slowly, so most columns take one byte per row.
+Decoding is a cumulative sum per column; ``decode_columns`` does it with
+NumPy, and Server/server.js has the same in JavaScript.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is optional; JSON and columns always work
+    msgpack = None
+
+JSON_TYPE = "application/json"
+COLUMNS_TYPE = "application/vnd.agrox.columns"
+MSGPACK_TYPE = "application/msgpack"
+
+MAGIC = b"AGXC"
+VERSION = 1
+WIDTHS = (1, 2, 4, 8)
+# Decimals kept for float columns unless the caller says otherwise
+DEFAULT_DECIMALS = 2
+
+
+def offered_types(columns=False):
+    """Content types a response can be sent as, JSON first."""
+    types = [JSON_TYPE]
+    if columns:
+        types.append(COLUMNS_TYPE)
+    if msgpack is not None:
+        types.append(MSGPACK_TYPE)
+    return types
+
+
+def choose_type(accept_mimetypes, columns=False):
+    """
+    Pick the response type from a parsed Accept header
+    (``request.accept_mimetypes``). JSON wins ties, so ``*/*`` and
+    browsers get what they always did.
+    """
+    return accept_mimetypes.best_match(offered_types(columns), default=JSON_TYPE)
+
+
+def pack(document):
+    """MessagePack of a JSON-compatible document."""
+    return msgpack.packb(document, use_bin_type=True)
+
+
+def unpack(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+def encode_columns(columns, decimals=None, meta=None):
+    """
+    Encode equal-length columns.
+
+    Args:
+        columns (dict): Name -> array of values, all the same length
+        decimals (dict, optional): Name -> decimal places kept; integer
+            columns default to 0 and float columns to DEFAULT_DECIMALS
+        meta (dict, optional): JSON-compatible values sent in the header
+
+    Returns:
+        bytes: The encoded body
+
+    Raises:
+        ValueError: If the columns differ in length or hold NaN or infinity
+    """
+    decimals = decimals or {}
+    arrays = {name: np.asarray(values) for name, values in columns.items()}
+    lengths = {len(values) for values in arrays.values()}
+    if len(lengths) > 1:
+        raise ValueError("columns must all have the same length")
+    rows = lengths.pop() if lengths else 0
+
+    specs, blocks = [], []
+    for name, values in arrays.items():
+        places = decimals.get(name, 0 if np.issubdtype(values.dtype, np.integer) else DEFAULT_DECIMALS)
+        if np.issubdtype(values.dtype, np.integer) and places == 0:
+            fixed = values.astype(np.int64)
+        else:
+            if not np.all(np.isfinite(values)):
+                raise ValueError(f"column '{name}' has NaN or infinite values")
+            fixed = np.round(values.astype(np.float64) * 10 ** places).astype(np.int64)
+        deltas = np.diff(fixed)
+        largest = int(np.abs(deltas).max()) if len(deltas) else 0
+        width = next(w for w in WIDTHS if largest < 2 ** (8 * w - 1))
+        specs.append({"name": name, "decimals": places, "width": width})
+        if rows:
+            blocks.append(fixed[:1].astype("<i8").tobytes())
+            blocks.append(deltas.astype(f"<i{width}").tobytes())
+
+    header = json.dumps({"rows": rows, "columns": specs, "meta": meta or {}},
+                        separators=(",", ":")).encode()
+    return b"".join([MAGIC, struct.pack("<BI", VERSION, len(header)), header] + blocks)
+
+
+def decode_columns(data):
+    """
+    Decode ``encode_columns`` output.
+
+    Returns:
+        tuple: ``(meta, columns)``; integer columns (0 decimals) come back
+        as int64 arrays, the others as float64
+
+    Raises:
+        ValueError: If ``data`` is not a columns body
+    """
+    if data[:4] != MAGIC or len(data) < 9:
+        raise ValueError("not an AGXC columns body")
+    version, header_len = struct.unpack_from("<BI", data, 4)
+    if version != VERSION:
+        raise ValueError(f"unsupported columns version {version}")
+    offset = 9 + header_len
+    header = json.loads(data[9:offset])
+    rows = header["rows"]
+
+    columns = {}
+    for spec in header["columns"]:
+        if not rows:
+            fixed = np.empty(0, dtype=np.int64)
+        else:
+            first = np.frombuffer(data, dtype="<i8", count=1, offset=offset)
+            offset += 8
+            deltas = np.frombuffer(data, dtype=f"<i{spec['width']}", count=rows - 1, offset=offset)
+            offset += (rows - 1) * spec["width"]
+            fixed = np.cumsum(np.concatenate([first, deltas.astype(np.int64)]))
+        places = spec["decimals"]
+        columns[spec["name"]] = fixed if places == 0 else fixed / 10 ** places
+    return header["meta"], columns
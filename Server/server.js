@@ -73,59 +73,102 @@ app.get('/s/:shortCode', (req, res) => {
   }
 });
 
-// API endpoint to process sensor data 
-app.post('/api/upload-image', async (req, res) => {
-  try {
-    const { temperature, humidity, imagePath } = req.body;
-    
-    if (temperature === undefined || humidity === undefined) {
-      return res.status(400).json({ 
+// Process one sensor reading, uploading its image to IPFS if one is given.
+// Returns { status, body } so single and batch endpoints share the logic.
+async function processSensorData({ temperature, humidity, imagePath }) {
+  if (temperature === undefined || humidity === undefined) {
+    return {
+      status: 400,
+      body: {
         success: false,
-        error: 'Missing required fields (temperature and humidity)' 
-      });
-    }
-    
-    // Optional image handling
-    let imageUrl = null;
-    let shortUrl = null;
-    if (imagePath) {
-      // Construct the full path to the image
-      const fullImagePath = path.join('/home/hariz/Desktop/AgroX-IoT/RaspberryPi', imagePath);
-      
-      if (fs.existsSync(fullImagePath)) {
-        const ipfsData = await uploadImageToIPFS(
-          fullImagePath, 
-          `Sensor Data Image`, 
-          `Sensor data: Temp ${temperature}°C, Humidity ${humidity}%`
-        );
-        imageUrl = ipfsData.imageUrl;
-        shortUrl = ipfsData.shortUrl;
-        console.log(`IPFS image URL: ${imageUrl}`);
-        console.log(`Short URL: ${shortUrl}`);
-      } else {
-        console.warn(`Image file not found: ${fullImagePath}`);
-        return res.status(404).json({
+        error: 'Missing required fields (temperature and humidity)'
+      }
+    };
+  }
+
+  // Optional image handling
+  let imageUrl = null;
+  let shortUrl = null;
+  if (imagePath) {
+    // Construct the full path to the image
+    const fullImagePath = path.join('/home/hariz/Desktop/AgroX-IoT/RaspberryPi', imagePath);
+
+    if (fs.existsSync(fullImagePath)) {
+      const ipfsData = await uploadImageToIPFS(
+        fullImagePath, 
+        `Sensor Data Image`, 
+        `Sensor data: Temp ${temperature}°C, Humidity ${humidity}%`
+      );
+      imageUrl = ipfsData.imageUrl;
+      shortUrl = ipfsData.shortUrl;
+      console.log(`IPFS image URL: ${imageUrl}`);
+      console.log(`Short URL: ${shortUrl}`);
+    } else {
+      console.warn(`Image file not found: ${fullImagePath}`);
+      return {
+        status: 404,
+        body: {
           success: false,
           error: 'Image file not found'
-        });
-      }
+        }
+      };
     }
-    
-    // Prepare data response
-    const sensorData = {
-      temperature,
-      humidity,
-      imageUrl,
-      shortUrl,
-      timestamp: new Date().toISOString()
-    };
-    
-    // Return the prepared data
-    return res.status(200).json({ 
-      success: true, 
+  }
+
+  // Prepare data response
+  const sensorData = {
+    temperature,
+    humidity,
+    imageUrl,
+    shortUrl,
+    timestamp: new Date().toISOString()
+  };
+
+  return {
+    status: 200,
+    body: {
+      success: true,
       message: 'Data processed successfully',
       data: sensorData
+    }
+  };
+}
+
+// Uploads from the Pi's queue carry the queue's job `id`. A request that
+// timed out on the Pi is retried with the same ids, so each id is processed
+// once: a retry waits for, or reuses, the first attempt's result instead of
+// pinning the image again. Failed attempts are forgotten so they can retry.
+const MAX_REMEMBERED_UPLOADS = 1000;
+const uploadsById = new Map();
+
+function processUpload(item) {
+  if (!item || !item.id) {
+    return processSensorData(item || {});
+  }
+  let upload = uploadsById.get(item.id);
+  if (!upload) {
+    upload = processSensorData(item).then((outcome) => {
+      if (outcome.status !== 200) {
+        uploadsById.delete(item.id);
+      }
+      return outcome;
+    }, (error) => {
+      uploadsById.delete(item.id);
+      throw error;
     });
+    uploadsById.set(item.id, upload);
+    if (uploadsById.size > MAX_REMEMBERED_UPLOADS) {
+      uploadsById.delete(uploadsById.keys().next().value);
+    }
+  }
+  return upload;
+}
+
+// API endpoint to process sensor data 
+app.post('/api/upload-image', async (req, res) => {
+  try {
+    const { status, body } = await processUpload(req.body);
+    return res.status(status).json(body);
   } catch (error) {
     console.error('Error processing sensor data:', error);
     return res.status(500).json({ 
@@ -135,6 +178,100 @@ app.post('/api/upload-image', async (req, res) => {
   }
 });
 
+// API endpoint to process a batch of sensor readings in one request.
+// Each item is handled independently, all at once, and echoes back its `id`.
+app.post('/api/upload-batch', async (req, res) => {
+  const { items } = req.body;
+
+  if (!Array.isArray(items)) {
+    return res.status(400).json({
+      success: false,
+      error: 'Missing required field (items)'
+    });
+  }
+
+  const results = await Promise.all(items.map(async (item) => {
+    try {
+      const { body } = await processUpload(item);
+      return { id: item.id, ...body };
+    } catch (error) {
+      console.error('Error processing batch item:', error);
+      return { id: item.id, success: false, error: error.message };
+    }
+  }));
+
+  return res.status(200).json({ success: true, results });
+});
+
+// Decode an application/vnd.agrox.columns body (see RaspberryPi/wire.py):
+// a JSON header, then per column a first value and the deltas between
+// neighbours, as fixed-point integers with `decimals` decimal places.
+const COLUMNS_TYPE = 'application/vnd.agrox.columns';
+
+function decodeColumns(buffer) {
+  if (!Buffer.isBuffer(buffer) || buffer.length < 9 || buffer.toString('latin1', 0, 4) !== 'AGXC') {
+    throw new Error('Not an AGXC columns body');
+  }
+  const version = buffer.readUInt8(4);
+  if (version !== 1) {
+    throw new Error(`Unsupported columns version ${version}`);
+  }
+  let offset = 9 + buffer.readUInt32LE(5);
+  const header = JSON.parse(buffer.toString('utf8', 9, offset));
+  const readDelta = {
+    1: (at) => buffer.readInt8(at),
+    2: (at) => buffer.readInt16LE(at),
+    4: (at) => buffer.readInt32LE(at),
+    8: (at) => Number(buffer.readBigInt64LE(at))
+  };
+
+  const columns = {};
+  for (const { name, decimals, width } of header.columns) {
+    const values = new Array(header.rows);
+    if (header.rows > 0) {
+      let value = Number(buffer.readBigInt64LE(offset));
+      offset += 8;
+      values[0] = value;
+      for (let i = 1; i < header.rows; i++) {
+        value += readDelta[width](offset);
+        offset += width;
+        values[i] = value;
+      }
+    }
+    const scale = 10 ** decimals;
+    columns[name] = decimals ? values.map(v => v / scale) : values;
+  }
+  return { meta: header.meta, rows: header.rows, columns };
+}
+
+// API endpoint to receive a batch of sensor readings as delta-encoded columns
+app.post('/api/upload-readings', express.raw({ type: COLUMNS_TYPE, limit: '10mb' }), (req, res) => {
+  let batch;
+  try {
+    batch = decodeColumns(req.body);
+  } catch (error) {
+    return res.status(400).json({
+      success: false,
+      error: error.message
+    });
+  }
+
+  const { meta, rows, columns } = batch;
+  const timestamps = columns.timestamp || [];
+  console.log(`Received ${rows} readings from ${meta.machine_id || 'unknown'} (sensor ${meta.sensor_id || 'primary'})`);
+
+  return res.status(200).json({
+    success: true,
+    message: `Received ${rows} readings`,
+    data: {
+      sensorId: meta.sensor_id,
+      count: rows,
+      from: rows ? new Date(timestamps[0] * 1000).toISOString() : null,
+      to: rows ? new Date(timestamps[rows - 1] * 1000).toISOString() : null
+    }
+  });
+});
+
 // API endpoint to check server status
 app.get('/api/status', (req, res) => {
   res.status(200).json({ 
@@ -148,5 +285,7 @@ app.listen(PORT, () => {
   console.log(`AgroX Server running on port ${PORT}`);
   console.log(`API endpoints:`);
   console.log(`- POST /api/sensor-data - To process sensor data and images`);
+  console.log(`- POST /api/upload-batch - To process a batch of sensor readings`);
+  console.log(`- POST /api/upload-readings - To receive readings as delta-encoded columns`);
   console.log(`- GET /api/status - To check server status`);
 });